@@ -7,6 +7,7 @@ from fastapi import APIRouter, Depends, Query
 from typing import Optional, List
 from datetime import datetime, timezone, timedelta
 import uuid
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/activity", tags=["activity"])
 
@@ -14,19 +15,12 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user_simple(credentials = Depends(__import__('fastapi.security', fromlist=['HTTPBearer']).HTTPBearer())):
-    """Simple auth check"""
-    import jwt
-    import os
-    token = credentials.credentials
-    JWT_SECRET = os.environ.get("JWT_SECRET_KEY")
-    if not JWT_SECRET:
-        raise RuntimeError("JWT_SECRET_KEY is missing in environment")
-    payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-    return {
-        "user_id": payload.get("user_id") or payload.get("sub"),
-        "org_id": payload.get("org_id", "default"),
-        "full_name": payload.get("full_name", "User")}
+# Shared cached auth dependency (auth_utils.get_current_principal)
+async def get_current_user_simple(current_user: dict = Depends(get_current_principal)) -> dict:
+    """Org-less tokens act on the "default" org, never on every activity without one"""
+    if current_user.get("org_id"):
+        return current_user
+    return {**current_user, "org_id": "default"}
 
 @router.get("/feed")
 async def get_activity_feed(
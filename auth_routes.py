@@ -15,7 +15,6 @@ auth_routes.py (UPDATED - ORG-based multi-tenant)
 
 from fastapi import APIRouter, HTTPException, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from passlib.context import CryptContext
 import jwt
 import os
 import secrets
@@ -33,8 +32,9 @@ from auth_masters import (
     USER_ROLES, INDUSTRIES, COMPANY_SIZES, BUSINESS_TYPES,
     COUNTRIES, LANGUAGES, TIMEZONES, SOLUTIONS, INSIGHTS_MODULE
 )
-from auth_utils import create_access_token, verify_token, DEBUG
+from auth_utils import create_access_token, verify_token, get_user_profile, invalidate_user_profile, DEBUG
 from log_utils import get_logger
+from password_hasher import hash_password_async, verify_and_rehash_async
 
 logger = logging.getLogger(__name__)
 auth_logger = get_logger(__name__)
@@ -43,9 +43,6 @@ print("USING AUTH FILE:", __file__)
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 security = HTTPBearer()
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Temporary signup storage (use Redis in prod)
 signup_sessions = {}
 
@@ -59,12 +56,9 @@ def get_db():
 
 # ==================== CRYPTO / JWT ====================
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def hash_password(password: str) -> str:
+    """bcrypt hash, computed on the bounded hashing pool (off the event loop)"""
+    return await hash_password_async(password)
 
 
 async def get_current_user(
@@ -85,7 +79,7 @@ async def get_current_user(
     user_id = payload["user_id"]
     org_id = payload.get("org_id")
 
-    user = await db.users.find_one({"user_id": user_id})
+    user = await get_user_profile(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -185,7 +179,7 @@ async def signup_step1(request: SignupStep1Request, db=Depends(get_db)):
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered. Please login instead.")
 
-        password_hash = hash_password(request.password)
+        password_hash = await hash_password(request.password)
 
         session_id = secrets.token_urlsafe(32)
         signup_sessions[session_id] = {
@@ -537,7 +531,7 @@ async def login(request: LoginRequest, db=Depends(get_db)):
             auth_logger.login_failure(request.email, reason="inactive_account")
             raise HTTPException(status_code=403, detail="Account is inactive")
 
-        password_valid = verify_password(request.password, user["password_hash"])
+        password_valid, upgraded_hash = await verify_and_rehash_async(request.password, user["password_hash"])
         auth_logger.info("login_password_verify", 
             email=request.email, 
             valid=password_valid
@@ -547,6 +541,13 @@ async def login(request: LoginRequest, db=Depends(get_db)):
             auth_logger.login_failure(request.email, reason="invalid_password")
             raise HTTPException(status_code=401, detail="Incorrect email or password")
 
+        # Transparently upgrade hashes made with an old bcrypt cost factor
+        if upgraded_hash:
+            await db.users.update_one(
+                {"_id": user["_id"]},
+                {"$set": {"password_hash": upgraded_hash}}
+            )
+
         if not user.get("email_verified"):
             auth_logger.login_failure(request.email, reason="email_not_verified")
             raise HTTPException(status_code=403, detail="Please verify your email")
@@ -794,7 +795,7 @@ async def reset_password(request: ResetPasswordRequest, db=Depends(get_db)):
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        new_password_hash = hash_password(request.new_password)
+        new_password_hash = await hash_password(request.new_password)
 
         await db.users.update_one(
             {"email": request.email},
@@ -864,7 +865,7 @@ async def accept_invite(request: AcceptInviteRequest, db=Depends(get_db)):
         if not user:
             # Create new user
             user_id = secrets.token_urlsafe(16)
-            password_hash = hash_password(request.password)
+            password_hash = await hash_password(request.password)
             
             auth_logger.info("accept_invite_create_user", 
                 email=repr(email), 
@@ -908,7 +909,7 @@ async def accept_invite(request: AcceptInviteRequest, db=Depends(get_db)):
             }
             
             if request.password:
-                password_hash = hash_password(request.password)
+                password_hash = await hash_password(request.password)
                 update_fields["password_hash"] = password_hash
                 auth_logger.info("accept_invite_update_hash", hash_prefix=password_hash[:4])
                 
@@ -919,6 +920,7 @@ async def accept_invite(request: AcceptInviteRequest, db=Depends(get_db)):
                 {"user_id": user_id},
                 {"$set": update_fields}
             )
+            invalidate_user_profile(user_id)
             
         # 4. Link to Org (org_users)
         existing_mapping = await db.org_users.find_one({
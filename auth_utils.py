@@ -1,10 +1,20 @@
 from datetime import datetime, timedelta, timezone
 import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
 import jwt
-from fastapi import HTTPException, status
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional, Dict, Any
 import secrets
 
+from permission_cache import _TTLMap
+
+logger = logging.getLogger(__name__)
+
 # Initial Configuration (will be loaded from env)
 JWT_SECRET = os.getenv("JWT_SECRET_KEY")
 if not JWT_SECRET:
@@ -15,6 +25,68 @@ ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 DEBUG = os.getenv("DEBUG", "false").lower() == "true" or os.getenv("ENVIRONMENT") == "development"
 
+# Verified-token LRU and user profile cache sizing
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+USER_PROFILE_CACHE_TTL_SECONDS = float(os.getenv("USER_PROFILE_CACHE_TTL_SECONDS", "30"))
+
+
+class VerifiedTokenCache:
+    """
+    Bounded LRU of sha256(token) -> decoded payload.
+    Entries expire at the token's own `exp`, so a cached token is never
+    accepted for longer than the signature check would have accepted it.
+    """
+
+    def __init__(self, max_entries: int = TOKEN_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self.key(token)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            exp, payload = entry
+            if exp is not None and exp <= time.time():
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return payload
+
+    def set(self, token: str, payload: Dict[str, Any]):
+        key = self.key(token)
+        with self._lock:
+            self._data[key] = (payload.get("exp"), payload)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+token_cache = VerifiedTokenCache()
+
 def create_access_token(
     user_id: str,
     org_id: Optional[str] = None,
@@ -99,47 +171,117 @@ def verify_token(token: str, verify_type: str = "access") -> Dict[str, Any]:
     - Checks signature and expiration using PyJWT's built-in validation
     - Checks 'type' claim (if present in token) matches verify_type
     - Normalizes payload (ensures user_id exists if sub exists)
+    Verified payloads are cached until `exp`; callers get their own copy.
     """
-    try:
-        # PyJWT's decode verifies the signature and 'exp' claim by default
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        
-        # Debug logging for development
-        now_ts = int(datetime.now(timezone.utc).timestamp())
-        exp_ts = payload.get("exp")
-        if exp_ts:
-            remaining = exp_ts - now_ts
-            print(f"DEBUG: Token verified. now={now_ts}, exp={exp_ts}, remaining={remaining}s")
-
-        # Verify type if the token has it
-        token_type = payload.get("type")
-        if token_type and token_type != verify_type:
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            # PyJWT's decode verifies the signature and 'exp' claim by default
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            logger.debug("Token expired")
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token has expired"
+            )
+        except jwt.InvalidTokenError as e:
+            logger.debug(f"InvalidTokenError: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=f"Invalid token type. Expected {verify_type}, got {token_type}"
+                detail="Invalid token"
             )
 
         # Normalize user_id
         if "user_id" not in payload and "sub" in payload:
             payload["user_id"] = payload["sub"]
-            
+
         if "user_id" not in payload:
-             raise HTTPException(
+            raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token: missing user identifier"
             )
-            
-        return payload
-        
-    except jwt.ExpiredSignatureError:
-        print(f"DEBUG: Token expired. now={int(datetime.now(timezone.utc).timestamp())}")
+
+        token_cache.set(token, payload)
+
+    # Verify type if the token has it
+    token_type = payload.get("type")
+    if token_type and token_type != verify_type:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has expired"
+            detail=f"Invalid token type. Expected {verify_type}, got {token_type}"
         )
-    except jwt.InvalidTokenError as e:
-        print(f"DEBUG: InvalidTokenError: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid token"
+
+    return dict(payload)
+
+
+# ==================== SHARED AUTH DEPENDENCY ====================
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def principal_from_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Request principal built from verified token claims (no DB access)"""
+    return {
+        "user_id": payload.get("user_id") or payload.get("sub"),
+        "org_id": payload.get("org_id"),
+        "role_id": payload.get("role_id"),
+        "is_super_admin": payload.get("is_super_admin", False),
+        "subscription_status": payload.get("subscription_status"),
+        "email": payload.get("email"),
+        "full_name": payload.get("full_name", "User"),
+    }
+
+
+async def get_current_principal(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme)
+) -> Dict[str, Any]:
+    """
+    FastAPI dependency shared by all routers that only need token claims.
+    One HMAC check for a new token, none for a cached one.
+    """
+    if credentials is None or not credentials.credentials:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    payload = verify_token(credentials.credentials, verify_type="access")
+    return principal_from_payload(payload)
+
+
+# ==================== USER PROFILE CACHE ====================
+
+user_profile_cache = _TTLMap(USER_PROFILE_CACHE_TTL_SECONDS)
+
+_PROFILE_QUERIES = {
+    # users documents are keyed by _id, with user_id / id on older records
+    "users": lambda user_id: {"$or": [{"_id": user_id}, {"user_id": user_id}, {"id": user_id}]},
+    "enterprise_users": lambda user_id: {"user_id": user_id},
+}
+
+
+async def get_user_profile(db, user_id: str, collection: str = "users") -> Optional[Dict[str, Any]]:
+    """
+    User document (without password_hash) from `users` or `enterprise_users`
+    with a single indexed lookup, cached for USER_PROFILE_CACHE_TTL_SECONDS.
+    Returns a copy.
+    """
+    key = (collection, user_id)
+    user = user_profile_cache.get(key)
+    if user is None:
+        user = await db[collection].find_one(
+            _PROFILE_QUERIES[collection](user_id),
+            {"password_hash": 0}
         )
+        if user is None:
+            return None
+        user_profile_cache.set(key, user)
+    return dict(user)
+
+
+def invalidate_user_profile(user_id: str):
+    """Drop cached profiles for a user after it is updated or deleted"""
+    user_profile_cache.pop_where(lambda key: key[1] == user_id)
+
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    return {
+        "tokens": token_cache.stats(),
+        "user_profiles": len(user_profile_cache),
+    }
@@ -0,0 +1,186 @@
+"""
+Cash Balance Snapshots
+Monthly running-balance snapshots per bank account, so cash flow opening /
+closing balances need no scan of the full transaction history.
+
+Collection `cash_balance_snapshots`, one document per (bank_account_id, month):
+- month            "YYYY-MM"
+- net              signed movement in the month (Credit +, Debit -)
+- txn_count        transactions in the month
+
+`net` / `txn_count` are maintained with a single $inc upsert per month on
+every transaction insert / delete, so concurrent writers (and backdated
+inserts) never leave a stale figure. Balances are summed from `net` at read
+time: one small document per account-month. rebuild_balance_snapshots() backfills
+from `transactions` account by account with upserts
+(scripts/rebuild_balance_snapshots.py, and after demo seeding). Until the
+first rebuild, readers fall back to aggregating transactions.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOTS = "cash_balance_snapshots"
+SNAPSHOT_META = "cash_balance_snapshot_meta"
+
+# Signed amount expression shared by the aggregation pipelines
+_SIGNED_AMOUNT = {
+    "$cond": [
+        {"$eq": ["$transaction_type", "Credit"]},
+        {"$ifNull": ["$amount", 0]},
+        {"$multiply": [{"$ifNull": ["$amount", 0]}, -1]}
+    ]
+}
+
+
+def month_key(value: Any) -> Optional[str]:
+    """'YYYY-MM' for an ISO date string or datetime"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m")
+    return str(value)[:7] or None
+
+
+def signed_amount(txn: dict) -> float:
+    amount = txn.get('amount', 0) or 0
+    return amount if txn.get('transaction_type') == 'Credit' else -amount
+
+
+async def snapshots_ready(db) -> bool:
+    """True once a full rebuild has run (incremental upkeep starts from there)"""
+    return await db[SNAPSHOT_META].find_one({"_id": "global"}) is not None
+
+
+# ==================== INCREMENTAL UPKEEP ====================
+
+async def apply_transactions(db, transactions: Iterable[dict], sign: int = 1):
+    """
+    Fold inserted (sign=1) or deleted (sign=-1) transactions into the
+    snapshots. Call after the write to `transactions` succeeds.
+    """
+    deltas: Dict[tuple, list] = {}
+    for txn in transactions:
+        month = month_key(txn.get('transaction_date'))
+        if not month:
+            continue
+        entry = deltas.setdefault((txn.get('bank_account_id'), month), [0.0, 0])
+        entry[0] += sign * signed_amount(txn)
+        entry[1] += sign
+    if not deltas:
+        return
+
+    now = datetime.now(timezone.utc).isoformat()
+    await db[SNAPSHOTS].bulk_write([
+        UpdateOne(
+            {"bank_account_id": account_id, "month": month},
+            {"$inc": {"net": net, "txn_count": count}, "$set": {"updated_at": now}},
+            upsert=True
+        )
+        for (account_id, month), (net, count) in deltas.items()
+    ], ordered=False)
+
+
+async def record_transaction(db, txn: dict):
+    await apply_transactions(db, [txn], sign=1)
+
+
+async def remove_transaction(db, txn: dict):
+    await apply_transactions(db, [txn], sign=-1)
+
+
+async def drop_account_snapshots(db, bank_account_id: str):
+    await db[SNAPSHOTS].delete_many({"bank_account_id": bank_account_id})
+
+
+# ==================== REBUILD ====================
+
+async def _rebuild_account(db, bank_account_id: Any, now: str) -> int:
+    """
+    Recompute one account's snapshots in place: upsert each month with its
+    recomputed figures and drop months that no longer have transactions.
+    Other accounts' $inc upkeep is never interrupted, and no month is ever
+    missing from the collection mid-rebuild.
+    """
+    monthly = await db.transactions.aggregate([
+        {"$match": {"bank_account_id": bank_account_id, "transaction_date": {"$ne": None}}},
+        {"$group": {
+            "_id": {"$substrCP": [{"$toString": "$transaction_date"}, 0, 7]},
+            "net": {"$sum": _SIGNED_AMOUNT},
+            "txn_count": {"$sum": 1}
+        }}
+    ]).to_list(None)
+
+    months = [row["_id"] for row in monthly]
+    if monthly:
+        await db[SNAPSHOTS].bulk_write([
+            ReplaceOne(
+                {"bank_account_id": bank_account_id, "month": row["_id"]},
+                {
+                    "bank_account_id": bank_account_id,
+                    "month": row["_id"],
+                    "net": row["net"],
+                    "txn_count": row["txn_count"],
+                    "updated_at": now
+                },
+                upsert=True
+            )
+            for row in monthly
+        ], ordered=False)
+    await db[SNAPSHOTS].delete_many({"bank_account_id": bank_account_id, "month": {"$nin": months}})
+    return len(monthly)
+
+
+async def rebuild_balance_snapshots(db, bank_account_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Recompute snapshots from the transactions collection, one account at a
+    time. Pass `bank_account_id` to rebuild just that account.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    if bank_account_id is not None:
+        count = await _rebuild_account(db, bank_account_id, now)
+        logger.info(f"Rebuilt {count} cash balance snapshots for account {bank_account_id}")
+        return {"snapshots": count, "accounts": 1, "built_at": now}
+
+    accounts = set(await db.transactions.distinct("bank_account_id"))
+    accounts.update(await db[SNAPSHOTS].distinct("bank_account_id"))
+    total = 0
+    for account_id in accounts:
+        total += await _rebuild_account(db, account_id, now)
+
+    await db[SNAPSHOT_META].update_one(
+        {"_id": "global"},
+        {"$set": {"built_at": now, "snapshots": total}},
+        upsert=True
+    )
+    logger.info(f"Rebuilt {total} cash balance snapshots for {len(accounts)} accounts")
+    return {"snapshots": total, "accounts": len(accounts), "built_at": now}
+
+
+# ==================== READS ====================
+
+async def opening_balance(db, before_month: str, bank_account_id: Optional[str] = None) -> float:
+    """Sum of all movement before `before_month` ('YYYY-MM'): the snapshot nets of earlier months"""
+    if not await snapshots_ready(db):
+        # Not backfilled yet: aggregate on the server instead of loading rows
+        match: Dict[str, Any] = {"transaction_date": {"$lt": before_month}}
+        if bank_account_id:
+            match["bank_account_id"] = bank_account_id
+        result = await db.transactions.aggregate([
+            {"$match": match},
+            {"$group": {"_id": None, "total": {"$sum": _SIGNED_AMOUNT}}}
+        ]).to_list(1)
+        return result[0]["total"] if result else 0
+
+    match = {"month": {"$lt": before_month}}
+    if bank_account_id:
+        match["bank_account_id"] = bank_account_id
+    result = await db[SNAPSHOTS].aggregate([
+        {"$match": match},
+        {"$group": {"_id": None, "total": {"$sum": "$net"}}}
+    ]).to_list(1)
+    return round(result[0]["total"], 2) if result else 0
@@ -9,6 +9,8 @@ from datetime import datetime, timezone
 from pydantic import BaseModel
 import csv
 import io
+from auth_utils import get_current_principal
+from report_compiler import touch_report_data
 
 router = APIRouter(prefix="/api/bulk", tags=["bulk"])
 
@@ -16,16 +18,8 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user_simple(credentials = Depends(__import__('fastapi.security', fromlist=['HTTPBearer']).HTTPBearer())):
-    import jwt
-    import os
-    token = credentials.credentials
-    JWT_SECRET = os.environ.get("JWT_SECRET_KEY")
-    if not JWT_SECRET:
-        raise RuntimeError("JWT_SECRET_KEY is missing in environment")
-
-    payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-    return {"user_id": payload.get("user_id") or payload.get("sub"), "org_id": payload.get("org_id", "default")}
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user_simple = get_current_principal
 
 class BulkUpdateRequest(BaseModel):
     entity_type: str
@@ -94,6 +88,7 @@ async def bulk_update(
         {id_field: {"$in": request.entity_ids}},
         {"$set": updates}
     )
+    await touch_report_data(db, collection)
     
     return {
         "success": True,
@@ -126,6 +121,7 @@ async def bulk_delete(
             "deleted_by": current_user.get("user_id")
         }}
     )
+    await touch_report_data(db, collection)
     
     return {
         "success": True,
@@ -163,6 +159,7 @@ async def bulk_assign(
         {id_field: {"$in": request.entity_ids}},
         {"$set": updates}
     )
+    await touch_report_data(db, collection)
     
     return {
         "success": True,
@@ -198,6 +195,7 @@ async def bulk_status_change(
             "updated_by": current_user.get("user_id")
         }}
     )
+    await touch_report_data(db, collection)
     
     return {
         "success": True,
@@ -281,6 +279,7 @@ async def bulk_add_tags(
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
         }
     )
+    await touch_report_data(db, collection)
     
     return {
         "success": True,
@@ -312,6 +311,7 @@ async def bulk_remove_tags(
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
         }
     )
+    await touch_report_data(db, collection)
     
     return {
         "success": True,
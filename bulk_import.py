@@ -0,0 +1,502 @@
+"""
+Bulk Import Engine
+Chunked, background Excel/CSV imports for the /upload endpoints.
+
+- Files are staged to IMPORT_STAGING_DIR and read in chunks (pandas CSV
+  chunks, openpyxl read-only rows), never loaded whole. Staging writes and
+  chunk reads run in worker threads so parsing never blocks the event loop.
+- Each entity registers an ImportSpec whose `prepare` turns one chunk
+  (a DataFrame with normalised snake_case headers and a `__row__` column
+  holding the sheet row number) into documents + row errors, using
+  vectorised validation and one $in prefetch per chunk for foreign keys.
+- Documents are written with one unordered bulk insert per chunk.
+- Progress, per-row errors (`import_job_errors`) and a resume checkpoint
+  (`next_row`) live on the job document (`import_jobs`). A resumed job
+  first removes rows written after the last checkpoint, then continues.
+- The staged file is removed once a job completes or is cancelled. A
+  failed job keeps it for IMPORT_STAGING_RETENTION_HOURS so it can be
+  resumed; purge_staged_files() (hourly scheduled job) removes it after.
+"""
+import os
+import re
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from itertools import islice
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from pymongo import InsertOne, ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from report_compiler import touch_report_data
+from sequence_service import reserve_block
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '2000'))
+IMPORT_STAGING_DIR = os.environ.get('IMPORT_STAGING_DIR', '/tmp/innovatebooks_imports')
+# Uploads up to this size run inline and answer with the legacy response
+IMPORT_INLINE_MAX_BYTES = int(os.environ.get('IMPORT_INLINE_MAX_BYTES', str(1024 * 1024)))
+# A running job without a heartbeat for this long is considered abandoned
+IMPORT_STALE_AFTER_SECONDS = int(os.environ.get('IMPORT_STALE_AFTER_SECONDS', '120'))
+# Failed jobs keep their staged file (for /resume) this long
+IMPORT_STAGING_RETENTION_HOURS = int(os.environ.get('IMPORT_STAGING_RETENTION_HOURS', '24'))
+
+IMPORT_JOBS = "import_jobs"
+IMPORT_ERRORS = "import_job_errors"
+
+EMAIL_PATTERN = r'^[^@\s]+@[^@\s]+\.[^@\s]+$'
+
+PrepareFn = Callable[[Any, pd.DataFrame, dict], Awaitable[Tuple[List[dict], List[Tuple[int, str]]]]]
+HookFn = Callable[[Any, List[dict], dict], Awaitable[None]]
+
+
+class ImportSpec:
+    """How one entity is imported"""
+
+    def __init__(
+        self,
+        entity: str,
+        collection: str,
+        prepare: PrepareFn,
+        count_key: str,
+        after_chunk: Optional[HookFn] = None,
+        rollback: Optional[HookFn] = None
+    ):
+        self.entity = entity
+        self.collection = collection
+        self.prepare = prepare
+        self.count_key = count_key            # legacy response field, e.g. "invoices_added"
+        self.after_chunk = after_chunk        # side effects of inserted docs (balances, snapshots)
+        self.rollback = rollback              # undo after_chunk for docs removed on resume
+
+
+IMPORT_SPECS: Dict[str, ImportSpec] = {}
+
+# Keep references to running tasks so they are not garbage collected
+_running: Dict[str, asyncio.Task] = {}
+
+
+def register_import_spec(spec: ImportSpec):
+    IMPORT_SPECS[spec.entity] = spec
+
+
+# ==================== READING ====================
+
+def normalise_header(name: Any) -> str:
+    """'Closing Balance' -> 'closing_balance'"""
+    return re.sub(r'\s+', '_', str(name).strip().lower())
+
+
+def _frame(rows: List[tuple], header: List[str], row_numbers: List[int]) -> pd.DataFrame:
+    df = pd.DataFrame(rows, columns=header)
+    df['__row__'] = row_numbers
+    return df
+
+
+def iter_chunks(path: str, chunk_size: int = IMPORT_CHUNK_SIZE, start: int = 0) -> Iterator[Tuple[int, int, pd.DataFrame]]:
+    """
+    Yield (offset, next_offset, chunk) for the data rows of a CSV / Excel
+    file, skipping the first `start` data rows. Offsets count raw rows,
+    blank ones included, so they can be used as resume checkpoints; blank
+    rows are dropped from the chunk afterwards and a chunk that is entirely
+    blank is not yielded. Sheet row numbers are offset + 2 (header is
+    row 1), matching the old "Row N" error messages.
+    """
+    if path.lower().endswith('.csv'):
+        reader = pd.read_csv(
+            path, chunksize=chunk_size, dtype=object, skip_blank_lines=False,
+            skiprows=range(1, start + 1) if start else None
+        )
+        offset = start
+        for chunk in reader:
+            raw_rows = len(chunk)
+            chunk.columns = [normalise_header(c) for c in chunk.columns]
+            chunk['__row__'] = range(offset + 2, offset + 2 + raw_rows)
+            chunk = chunk[chunk.drop(columns='__row__').notna().any(axis=1)]
+            if len(chunk):
+                yield offset, offset + raw_rows, chunk.reset_index(drop=True)
+            offset += raw_rows
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header_row = next(rows, None)
+        if header_row is None:
+            return
+        header = [normalise_header(c) if c is not None else f"column_{i}" for i, c in enumerate(header_row)]
+        rows = islice(rows, start, None)
+        offset = start
+        while True:
+            raw = list(islice(rows, chunk_size))
+            if not raw:
+                break
+            kept = [(offset + 2 + i, row) for i, row in enumerate(raw) if any(v is not None for v in row)]
+            if kept:
+                yield offset, offset + len(raw), _frame([row for _, row in kept], header, [n for n, _ in kept])
+            offset += len(raw)
+    finally:
+        workbook.close()
+
+
+# ==================== VECTORISED COLUMN HELPERS ====================
+
+def column(df: pd.DataFrame, name: str) -> pd.Series:
+    """Column as object Series (all-NaN when absent)"""
+    if name in df.columns:
+        return df[name].astype(object).where(df[name].notna(), None)
+    return pd.Series([None] * len(df), index=df.index, dtype=object)
+
+
+def _cell_text(value: Any) -> str:
+    # Excel hands back 9876543210.0 for numeric phone / id cells
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def text(df: pd.DataFrame, name: str, default: str = '') -> pd.Series:
+    values = column(df, name)
+    return values.map(lambda v: default if v is None or _cell_text(v) == '' else _cell_text(v))
+
+
+def optional_text(df: pd.DataFrame, name: str) -> pd.Series:
+    values = column(df, name)
+    return values.map(lambda v: None if v is None or _cell_text(v) == '' else _cell_text(v))
+
+
+def number(df: pd.DataFrame, name: str, default: float, invalid: pd.Series) -> pd.Series:
+    """Numeric column; blanks take `default`, unparseable cells set `invalid`"""
+    raw = column(df, name)
+    parsed = pd.to_numeric(raw, errors='coerce')
+    bad = raw.notna() & parsed.isna()
+    invalid[bad] = True
+    return parsed.fillna(default).astype(float)
+
+
+def _parse_dates(raw: pd.Series) -> pd.Series:
+    try:
+        return pd.to_datetime(raw, errors='coerce', format='mixed')
+    except (ValueError, TypeError):
+        # e.g. mixed timezone offsets in one column
+        return raw.map(lambda v: pd.to_datetime(v, errors='coerce'))
+
+
+def dates(df: pd.DataFrame, name: str, invalid: pd.Series, default: Optional[datetime] = None) -> pd.Series:
+    """
+    Column of python datetimes; blanks take `default` (or are invalid
+    without one), unparseable cells set `invalid`
+    """
+    raw = column(df, name)
+    parsed = _parse_dates(raw)
+    bad = raw.notna() & parsed.isna()
+    if default is None:
+        bad |= raw.isna()
+    invalid[bad] = True
+    return pd.Series(
+        [default if pd.isna(v) else v.to_pydatetime() for v in parsed],
+        index=df.index, dtype=object
+    )
+
+
+def valid_emails(df: pd.DataFrame, name: str) -> pd.Series:
+    return text(df, name).str.match(EMAIL_PATTERN)
+
+
+# ==================== SEQUENCES ====================
+
+async def allocate_numbers(
+    db,
+    key: str,
+    count: int,
+    fmt: Callable[[int], str],
+    seed: Callable[[], Awaitable[int]],
+    collection: Optional[str] = None,
+    field: Optional[str] = None,
+    reserved: Optional[set] = None
+) -> List[str]:
+    """
+    `count` formatted document numbers reserved as one block from the
+    sequence service (sequence_service.reserve_block). Numbers that
+    already exist in `collection.field` (or in `reserved`) are skipped, so
+    the sequence may have gaps but never hands out a taken number.
+    """
+    numbers: List[str] = []
+    reserved = reserved or set()
+    while len(numbers) < count:
+        need = count - len(numbers)
+        first = await reserve_block(db, key, need, seed)
+        block = [fmt(value) for value in range(first, first + need)]
+        taken = set(reserved)
+        if collection and field:
+            taken.update(
+                doc[field] for doc in await db[collection].find(
+                    {field: {"$in": block}}, {"_id": 0, field: 1}
+                ).to_list(None)
+            )
+        numbers.extend(number for number in block if number not in taken)
+    return numbers
+
+
+# ==================== JOBS ====================
+
+async def stage_upload(upload, job_id: str) -> Tuple[str, int]:
+    """Copy an UploadFile to the staging dir in 1 MiB pieces; returns (path, bytes)"""
+    os.makedirs(IMPORT_STAGING_DIR, exist_ok=True)
+    suffix = '.csv' if upload.filename.lower().endswith('.csv') else '.xlsx'
+    path = os.path.join(IMPORT_STAGING_DIR, f"{job_id}{suffix}")
+    size = 0
+    with open(path, 'wb') as out:
+        while True:
+            piece = await upload.read(1024 * 1024)
+            if not piece:
+                break
+            await asyncio.to_thread(out.write, piece)
+            size += len(piece)
+    return path, size
+
+
+def remove_staged_file(path: Optional[str]):
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove staged import file {path}: {e}")
+
+
+async def _release_staged_file(db, job_id: str, path: Optional[str]):
+    """Delete a job's staged file and forget its path"""
+    remove_staged_file(path)
+    await db[IMPORT_JOBS].update_one({"job_id": job_id}, {"$set": {"path": None}})
+
+
+async def create_import_job(db, entity: str, upload, user_id: Optional[str], context: Optional[dict] = None) -> dict:
+    if entity not in IMPORT_SPECS:
+        raise ValueError(f"No import spec registered for '{entity}'")
+    job_id = f"IMP-{uuid.uuid4().hex[:12].upper()}"
+    path, size = await stage_upload(upload, job_id)
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "job_id": job_id,
+        "entity": entity,
+        "filename": upload.filename,
+        "path": path,
+        "size_bytes": size,
+        "status": "queued",  # queued | running | completed | failed | cancelled
+        "next_row": 0,
+        "rows_processed": 0,
+        "rows_inserted": 0,
+        "rows_failed": 0,
+        "context": context or {},
+        "created_by": user_id,
+        "created_at": now,
+        "heartbeat_at": now
+    }
+    await db[IMPORT_JOBS].insert_one(job)
+    job.pop("_id", None)
+    return job
+
+
+async def _claim(db, job_id: str) -> Optional[dict]:
+    """Atomically take ownership of a job that is not actively running elsewhere"""
+    now = datetime.now(timezone.utc)
+    stale = (now - timedelta(seconds=IMPORT_STALE_AFTER_SECONDS)).isoformat()
+    claimed = await db[IMPORT_JOBS].update_one(
+        {"job_id": job_id, "$or": [
+            {"status": {"$in": ["queued", "failed"]}},
+            {"status": "running", "heartbeat_at": {"$lt": stale}}
+        ]},
+        {"$set": {"status": "running", "heartbeat_at": now.isoformat(), "error": None}}
+    )
+    if claimed.modified_count == 0:
+        return None
+    return await db[IMPORT_JOBS].find_one({"job_id": job_id}, {"_id": 0})
+
+
+async def _discard_uncommitted(db, spec: ImportSpec, job: dict):
+    """Remove documents written after the last checkpoint (crash mid-chunk)"""
+    first_row = job["next_row"] + 2
+    query = {"import_job_id": job["job_id"], "import_row": {"$gte": first_row}}
+    removed = await db[spec.collection].find(query, {"_id": 0}).to_list(None)
+    if removed:
+        await db[spec.collection].delete_many(query)
+        if spec.rollback:
+            await spec.rollback(db, removed, job["context"])
+        logger.info(f"Import {job['job_id']}: discarded {len(removed)} rows past checkpoint")
+    await db[IMPORT_ERRORS].delete_many({"job_id": job["job_id"], "row": {"$gte": first_row}})
+
+
+async def _write_chunk(db, spec: ImportSpec, job_id: str, docs: List[dict], errors: List[Tuple[int, str]]) -> List[dict]:
+    """Unordered bulk insert; per-document failures become row errors"""
+    if not docs:
+        return []
+    for doc in docs:
+        doc["import_job_id"] = job_id
+    try:
+        await db[spec.collection].bulk_write([InsertOne(doc) for doc in docs], ordered=False)
+        failed = set()
+    except BulkWriteError as e:
+        failed = set()
+        for write_error in e.details.get("writeErrors", []):
+            failed.add(write_error["index"])
+            errors.append((docs[write_error["index"]].get("import_row"), write_error.get("errmsg", "write failed")))
+    inserted = [doc for i, doc in enumerate(docs) if i not in failed]
+    for doc in inserted:
+        doc.pop("_id", None)
+    return inserted
+
+
+async def run_import_job(db, job_id: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> Optional[dict]:
+    """Process (or resume) a job until the file is exhausted"""
+    job = await _claim(db, job_id)
+    if not job:
+        return None
+    spec = IMPORT_SPECS[job["entity"]]
+    context = job.get("context") or {}
+    job["context"] = context
+
+    chunks = None
+    try:
+        await _discard_uncommitted(db, spec, job)
+        chunks = iter_chunks(job["path"], chunk_size, start=job["next_row"])
+        while True:
+            # File parsing (pandas / openpyxl) runs off the event loop, one chunk at a time
+            item = await asyncio.to_thread(next, chunks, None)
+            if item is None:
+                break
+            offset, next_offset, chunk = item
+            current = await db[IMPORT_JOBS].find_one({"job_id": job_id}, {"_id": 0, "status": 1})
+            if current and current.get("status") == "cancelled":
+                logger.info(f"Import {job_id} cancelled at row {offset + 2}")
+                await _release_staged_file(db, job_id, job["path"])
+                return current
+
+            docs, errors = await spec.prepare(db, chunk, context)
+            inserted = await _write_chunk(db, spec, job_id, docs, errors)
+            if inserted:
+                await touch_report_data(db, spec.collection)
+            if spec.after_chunk and inserted:
+                await spec.after_chunk(db, inserted, context)
+            if errors:
+                await db[IMPORT_ERRORS].insert_many([
+                    {"job_id": job_id, "row": row, "message": message} for row, message in errors
+                ])
+
+            # Checkpoint: everything before next_row is durable
+            await db[IMPORT_JOBS].update_one({"job_id": job_id}, {
+                "$set": {
+                    "next_row": next_offset,
+                    "context": context,
+                    "heartbeat_at": datetime.now(timezone.utc).isoformat()
+                },
+                "$inc": {
+                    "rows_processed": len(chunk),
+                    "rows_inserted": len(inserted),
+                    "rows_failed": len(errors)
+                }
+            })
+
+        remove_staged_file(job["path"])
+        return await db[IMPORT_JOBS].find_one_and_update(
+            {"job_id": job_id},
+            {"$set": {"status": "completed", "path": None, "finished_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        logger.error(f"Import {job_id} failed: {e}")
+        return await db[IMPORT_JOBS].find_one_and_update(
+            {"job_id": job_id},
+            {"$set": {"status": "failed", "error": str(e), "heartbeat_at": datetime.now(timezone.utc).isoformat()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    finally:
+        if chunks is not None:
+            # Closes the CSV reader / workbook when the loop stops early
+            await asyncio.to_thread(chunks.close)
+
+
+def launch_import_job(db, job_id: str) -> asyncio.Task:
+    """Run a job in the background on the current event loop"""
+    task = asyncio.create_task(run_import_job(db, job_id))
+    _running[job_id] = task
+    task.add_done_callback(lambda _: _running.pop(job_id, None))
+    return task
+
+
+async def resume_abandoned_imports(db) -> List[str]:
+    """Relaunch queued jobs and running jobs whose worker stopped heartbeating"""
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=IMPORT_STALE_AFTER_SECONDS)).isoformat()
+    jobs = await db[IMPORT_JOBS].find(
+        {"$or": [{"status": "queued"}, {"status": "running", "heartbeat_at": {"$lt": stale}}]},
+        {"_id": 0, "job_id": 1, "path": 1}
+    ).to_list(100)
+    resumed = []
+    for job in jobs:
+        if job["job_id"] not in _running and os.path.exists(job.get("path") or ""):
+            launch_import_job(db, job["job_id"])
+            resumed.append(job["job_id"])
+    return resumed
+
+
+async def cancel_import(db, job_id: str) -> Optional[dict]:
+    """
+    Mark a job cancelled (a running worker stops after its current chunk)
+    and drop its staged file. Returns None if the job is missing or finished.
+    """
+    job = await db[IMPORT_JOBS].find_one_and_update(
+        {"job_id": job_id, "status": {"$in": ["queued", "running", "failed"]}},
+        {"$set": {"status": "cancelled", "cancelled_at": datetime.now(timezone.utc).isoformat()}},
+        projection={"_id": 0, "job_id": 1, "path": 1}
+    )
+    if job:
+        # An open reader keeps its handle; the worker exits at the next chunk
+        await _release_staged_file(db, job_id, job.get("path"))
+    return job
+
+
+async def purge_staged_files(db) -> int:
+    """
+    Remove staged files of failed jobs past IMPORT_STAGING_RETENTION_HOURS,
+    and any left behind by completed / cancelled jobs
+    """
+    expired = (datetime.now(timezone.utc) - timedelta(hours=IMPORT_STAGING_RETENTION_HOURS)).isoformat()
+    jobs = await db[IMPORT_JOBS].find(
+        {"path": {"$ne": None}, "$or": [
+            {"status": {"$in": ["completed", "cancelled"]}},
+            {"status": "failed", "heartbeat_at": {"$lt": expired}}
+        ]},
+        {"_id": 0, "job_id": 1, "path": 1}
+    ).to_list(None)
+    for job in jobs:
+        await _release_staged_file(db, job["job_id"], job.get("path"))
+    if jobs:
+        logger.info(f"Removed {len(jobs)} staged import files")
+    return len(jobs)
+
+
+async def job_errors(db, job_id: str, skip: int = 0, limit: int = 1000) -> List[dict]:
+    return await db[IMPORT_ERRORS].find(
+        {"job_id": job_id}, {"_id": 0, "row": 1, "message": 1}
+    ).sort("row", 1).skip(skip).limit(limit).to_list(limit)
+
+
+async def legacy_upload_response(db, spec: ImportSpec, job: dict) -> dict:
+    """Shape of the old synchronous /upload responses, plus the job id"""
+    if job.get("status") == "failed":
+        raise RuntimeError(job.get("error") or "import failed")
+    errors = await job_errors(db, job["job_id"])
+    return {
+        "success": True,
+        spec.count_key: job.get("rows_inserted", 0),
+        "errors": [f"Row {e['row']}: {e['message']}" for e in errors],
+        "job_id": job["job_id"]
+    }
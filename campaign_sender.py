@@ -0,0 +1,408 @@
+"""
+Campaign Sender
+Background dispatch of email campaigns for email_campaigns_routes.
+
+- Pending recipients are read in _id order, CAMPAIGN_BATCH_SIZE at a time
+  (keyset pagination, no recipient cap). recipient_id is not unique, so
+  every recipient filter also carries the campaign_id.
+- Messages go through a pluggable EmailTransport ("simulated" by default,
+  "smtp" for a real relay; register_transport adds others), at most
+  CAMPAIGN_SEND_CONCURRENCY in flight and CAMPAIGN_SEND_RATE_PER_SECOND
+  started per second (token bucket, 0 = unlimited).
+- Per batch: outcomes are recorded with one bulk_write on the recipients,
+  then stats, checkpoint (`send.last_recipient_key`, the last _id) and
+  heartbeat move in one campaign update. Pause is checked before every
+  batch; the heartbeat is also refreshed while a batch is in flight.
+- A campaign is sent by one worker at a time (`send.owner`). Sends whose
+  worker stopped heartbeating are resumed at startup from the checkpoint;
+  messages of the batch in flight at the crash may go out twice.
+- A recipient whose message cannot be built (header injection in the
+  address or subject, non-dict variables) is recorded as failed with the
+  error, like a rejected one, so it never stalls the checkpoint.
+- If the transport itself is unavailable the batch's unsent recipients
+  stay pending and the campaign is paused with `send.error`.
+"""
+import os
+import re
+import time
+import uuid
+import socket
+import random
+import asyncio
+import logging
+import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateMany, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+CAMPAIGN_TRANSPORT = os.environ.get('CAMPAIGN_TRANSPORT', 'simulated')
+CAMPAIGN_BATCH_SIZE = int(os.environ.get('CAMPAIGN_BATCH_SIZE', '1000'))
+CAMPAIGN_SEND_CONCURRENCY = int(os.environ.get('CAMPAIGN_SEND_CONCURRENCY', '50'))
+CAMPAIGN_SEND_RATE_PER_SECOND = float(os.environ.get('CAMPAIGN_SEND_RATE_PER_SECOND', '0'))
+CAMPAIGN_FROM_ADDRESS = os.environ.get('CAMPAIGN_FROM_ADDRESS') or os.environ.get('SMTP_USER') or 'no-reply@innovatebooks.com'
+CAMPAIGN_SMTP_TIMEOUT_SECONDS = float(os.environ.get('CAMPAIGN_SMTP_TIMEOUT_SECONDS', '30'))
+# A sending campaign without a heartbeat for this long is considered abandoned
+CAMPAIGN_STALE_AFTER_SECONDS = int(os.environ.get('CAMPAIGN_STALE_AFTER_SECONDS', '120'))
+# Rate-limited batches can outlast the stale window, so the sender beats more often than that
+CAMPAIGN_HEARTBEAT_SECONDS = max(1.0, CAMPAIGN_STALE_AFTER_SECONDS / 4)
+
+RECIPIENT_FIELDS = {"_id": 1, "recipient_id": 1, "email": 1, "name": 1, "variables": 1}
+_PLACEHOLDER = re.compile(r"{{\s*(\w+)\s*}}")
+
+_running: Dict[str, asyncio.Task] = {}
+_owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# ==================== TRANSPORTS ====================
+
+class TransportUnavailable(Exception):
+    """The transport cannot send at all (relay down); the recipient was not rejected"""
+
+
+class EmailTransport:
+    """Sends one message; raises TransportUnavailable or, for a rejected recipient, any other exception"""
+
+    async def send(self, message: EmailMessage):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class SimulatedTransport(EmailTransport):
+    """Demo transport: accepts ~95% of messages without sending anything"""
+
+    def __init__(self, failure_rate: float = 0.05, latency_seconds: float = 0.0):
+        self.failure_rate = failure_rate
+        self.latency_seconds = latency_seconds
+
+    async def send(self, message: EmailMessage):
+        if self.latency_seconds:
+            await asyncio.sleep(self.latency_seconds)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("Simulated delivery failure")
+
+
+class SMTPTransport(EmailTransport):
+    """SMTP relay (SMTP_HOST / SMTP_PORT / SMTP_USER / SMTP_PASS), one kept-open connection per sender thread"""
+
+    def __init__(self, host: Optional[str] = None, port: Optional[int] = None, username: Optional[str] = None,
+                 password: Optional[str] = None, starttls: Optional[bool] = None,
+                 workers: int = CAMPAIGN_SEND_CONCURRENCY):
+        self.host = host or os.environ.get('SMTP_HOST', 'localhost')
+        self.port = int(port or os.environ.get('SMTP_PORT') or 25)
+        self.username = username if username is not None else os.environ.get('SMTP_USER')
+        self.password = password if password is not None else os.environ.get('SMTP_PASS')
+        self.starttls = starttls if starttls is not None else os.environ.get('SMTP_STARTTLS', 'true').lower() == 'true'
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="campaign-smtp")
+        self._local = threading.local()
+        self._connections: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+
+    def _connection(self) -> smtplib.SMTP:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            try:
+                connection = smtplib.SMTP(self.host, self.port, timeout=CAMPAIGN_SMTP_TIMEOUT_SECONDS)
+                if self.starttls:
+                    connection.starttls()
+                if self.username and self.password:
+                    connection.login(self.username, self.password)
+            except (OSError, smtplib.SMTPException) as e:
+                raise TransportUnavailable(f"SMTP {self.host}:{self.port} unavailable: {e}")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def _send(self, message: EmailMessage):
+        for attempt in (1, 2):
+            connection = self._connection()
+            try:
+                connection.send_message(message)
+                return
+            except smtplib.SMTPRecipientsRefused as e:
+                code, reply = next(iter(e.recipients.values()))
+                raise RuntimeError(f"{code} {reply.decode(errors='replace')}")
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                self._local.connection = None
+                if attempt == 2:
+                    raise TransportUnavailable(str(e))
+
+    async def send(self, message: EmailMessage):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._send, message)
+
+    def _quit_all(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            try:
+                connection.quit()
+            except Exception:
+                pass
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._quit_all)
+        self._executor.shutdown(wait=False)
+
+
+TRANSPORTS: Dict[str, Callable[[], EmailTransport]] = {
+    "simulated": SimulatedTransport,
+    "smtp": SMTPTransport,
+}
+
+
+def register_transport(name: str, factory: Callable[[], EmailTransport]):
+    TRANSPORTS[name] = factory
+
+
+def get_transport(name: Optional[str] = None) -> EmailTransport:
+    name = name or CAMPAIGN_TRANSPORT
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown campaign transport '{name}'")
+    return TRANSPORTS[name]()
+
+
+class TokenBucket:
+    """`rate` acquisitions per second on average, bursts up to `burst`; rate <= 0 disables the limit"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# ==================== MESSAGES ====================
+
+def render(text: str, variables: dict) -> str:
+    """Fill {{name}} placeholders; unknown placeholders are left as they are"""
+    return _PLACEHOLDER.sub(lambda m: str(variables.get(m.group(1), m.group(0))), text or "")
+
+
+def build_message(campaign: dict, template: dict, recipient: dict) -> EmailMessage:
+    variables = {"email": recipient.get("email"), "name": recipient.get("name") or "",
+                 **(recipient.get("variables") or {})}
+    message = EmailMessage()
+    message["From"] = CAMPAIGN_FROM_ADDRESS
+    message["To"] = recipient["email"]
+    message["Subject"] = render(campaign.get("subject_override") or template.get("subject", ""), variables)
+    message["X-Campaign-Id"] = campaign["campaign_id"]
+    message["X-Recipient-Id"] = recipient["recipient_id"]
+    if template.get("body_text"):
+        message.set_content(render(template["body_text"], variables))
+        message.add_alternative(render(template.get("body_html", ""), variables), subtype="html")
+    else:
+        message.set_content(render(template.get("body_html", ""), variables), subtype="html")
+    return message
+
+
+def _build(campaign: dict, template: dict, recipient: dict) -> Tuple[Optional[EmailMessage], Optional[str]]:
+    """build_message, or the error that makes this recipient undeliverable"""
+    try:
+        return build_message(campaign, template, recipient), None
+    except Exception as e:
+        return None, str(e) or e.__class__.__name__
+
+
+# ==================== SENDING ====================
+
+async def claim_campaign_send(db, campaign_id: str) -> Optional[dict]:
+    """Become the sender of a campaign in `sending` that has no live sender"""
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=CAMPAIGN_STALE_AFTER_SECONDS)).isoformat()
+    claimed = await db.email_campaigns.update_one(
+        {"campaign_id": campaign_id, "status": "sending",
+         "$or": [{"send.owner": None}, {"send.owner": _owner}, {"send.heartbeat_at": {"$lt": stale}}]},
+        {"$set": {"send.owner": _owner, "send.heartbeat_at": _now()}}
+    )
+    if claimed.modified_count == 0:
+        return None
+    return await db.email_campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+
+
+async def _deliver(transport: EmailTransport, built: Tuple[Optional[EmailMessage], Optional[str]],
+                   slots: asyncio.Semaphore, bucket: TokenBucket) -> Tuple[str, Optional[str]]:
+    message, error = built
+    if message is None:
+        return "failed", error
+    async with slots:
+        await bucket.acquire()
+        try:
+            await transport.send(message)
+            return "sent", None
+        except TransportUnavailable as e:
+            return "unsent", str(e)
+        except Exception as e:
+            return "failed", str(e) or e.__class__.__name__
+
+
+async def _heartbeat(db, campaign_id: str):
+    """Keep `send.heartbeat_at` fresh while a batch is in flight so no other worker takes the campaign over"""
+    while True:
+        await asyncio.sleep(CAMPAIGN_HEARTBEAT_SECONDS)
+        try:
+            await db.email_campaigns.update_one(
+                {"campaign_id": campaign_id, "send.owner": _owner}, {"$set": {"send.heartbeat_at": _now()}}
+            )
+        except Exception as e:
+            logger.warning(f"Campaign {campaign_id} heartbeat failed: {e}")
+
+
+async def _deliver_batch(db, campaign_id: str, transport: EmailTransport,
+                         messages: List[Tuple[Optional[EmailMessage], Optional[str]]],
+                         slots: asyncio.Semaphore, bucket: TokenBucket) -> List[Tuple[str, Optional[str]]]:
+    heartbeat = asyncio.create_task(_heartbeat(db, campaign_id))
+    try:
+        return await asyncio.gather(*(_deliver(transport, m, slots, bucket) for m in messages))
+    finally:
+        heartbeat.cancel()
+
+
+async def _record_batch(db, campaign_id: str, recipients: List[dict],
+                        outcomes: List[Tuple[str, Optional[str]]]) -> Dict[str, int]:
+    """One bulk_write for the batch's outcomes, then stats + checkpoint in one campaign update"""
+    now = _now()
+    sent = [r["_id"] for r, (status, _) in zip(recipients, outcomes) if status == "sent"]
+    failed = [(r["_id"], error) for r, (status, error) in zip(recipients, outcomes) if status == "failed"]
+    ops = []
+    if sent:
+        ops.append(UpdateMany({"_id": {"$in": sent}, "campaign_id": campaign_id, "status": "pending"},
+                              {"$set": {"status": "sent", "sent_at": now}}))
+    ops.extend(UpdateOne({"_id": key, "campaign_id": campaign_id, "status": "pending"},
+                         {"$set": {"status": "failed", "error": error, "failed_at": now}})
+               for key, error in failed)
+    if ops:
+        await db.email_recipients.bulk_write(ops, ordered=False)
+
+    update = {
+        "$set": {"send.heartbeat_at": now},
+        "$inc": {"stats.sent": len(sent), "stats.delivered": len(sent), "stats.bounced": len(failed)}
+    }
+    # The checkpoint only moves past a batch that was fully acknowledged
+    if len(sent) + len(failed) == len(recipients):
+        update["$set"]["send.last_recipient_key"] = recipients[-1]["_id"]
+    await db.email_campaigns.update_one({"campaign_id": campaign_id, "send.owner": _owner}, update)
+    return {"sent": len(sent), "failed": len(failed), "unsent": len(recipients) - len(sent) - len(failed)}
+
+
+async def _release(db, campaign_id: str, fields: Optional[dict] = None) -> bool:
+    """Give up ownership unless the campaign went back to sending meanwhile (paused, then resumed)"""
+    released = await db.email_campaigns.update_one(
+        {"campaign_id": campaign_id, "send.owner": _owner, "status": {"$ne": "sending"}},
+        {"$set": {"send.owner": None, **(fields or {})}}
+    )
+    return released.modified_count == 1
+
+
+async def run_campaign_send(db, campaign_id: str, transport: Optional[EmailTransport] = None,
+                            batch_size: int = CAMPAIGN_BATCH_SIZE,
+                            concurrency: int = CAMPAIGN_SEND_CONCURRENCY,
+                            rate_per_second: float = CAMPAIGN_SEND_RATE_PER_SECOND) -> Optional[dict]:
+    """Send a claimed campaign's pending recipients until done, paused or the transport fails"""
+    campaign = await claim_campaign_send(db, campaign_id)
+    if not campaign:
+        return None
+    template = await db.email_templates.find_one({"template_id": campaign.get("template_id")}, {"_id": 0}) or {}
+    own_transport = transport is None
+    transport = transport or get_transport()
+    slots = asyncio.Semaphore(max(1, concurrency))
+    bucket = TokenBucket(rate_per_second)
+    last_key = (campaign.get("send") or {}).get("last_recipient_key")
+    try:
+        while True:
+            state = await db.email_campaigns.find_one(
+                {"campaign_id": campaign_id}, {"_id": 0, "status": 1, "send.owner": 1}
+            )
+            if not state or (state.get("send") or {}).get("owner") != _owner:
+                logger.warning(f"Campaign {campaign_id} send lost its ownership")
+                return state
+            if state.get("status") != "sending":
+                if await _release(db, campaign_id):
+                    logger.info(f"Campaign {campaign_id} send stopped: {state.get('status')}")
+                    return await db.email_campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+                continue
+
+            query = {"campaign_id": campaign_id, "status": "pending"}
+            if last_key:
+                query["_id"] = {"$gt": last_key}
+            recipients = await db.email_recipients.find(query, RECIPIENT_FIELDS).sort("_id", 1).to_list(batch_size)
+            if not recipients:
+                break
+
+            messages = [_build(campaign, template, recipient) for recipient in recipients]
+            outcomes = await _deliver_batch(db, campaign_id, transport, messages, slots, bucket)
+            counts = await _record_batch(db, campaign_id, recipients, outcomes)
+            if counts["unsent"]:
+                error = next(error for status, error in outcomes if status == "unsent")
+                logger.error(f"Campaign {campaign_id} paused, transport unavailable: {error}")
+                await db.email_campaigns.update_one(
+                    {"campaign_id": campaign_id, "send.owner": _owner},
+                    {"$set": {"status": "paused", "send.owner": None, "send.error": error, "send.paused_at": _now()}}
+                )
+                return await db.email_campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+            last_key = recipients[-1]["_id"]
+
+        await db.email_campaigns.update_one(
+            {"campaign_id": campaign_id, "send.owner": _owner},
+            {"$set": {"status": "completed", "completed_at": _now(), "send.owner": None, "send.error": None}}
+        )
+        return await db.email_campaigns.find_one({"campaign_id": campaign_id}, {"_id": 0})
+    except Exception as e:
+        logger.error(f"Campaign {campaign_id} send failed: {e}")
+        await db.email_campaigns.update_one(
+            {"campaign_id": campaign_id, "send.owner": _owner},
+            {"$set": {"status": "paused", "send.owner": None, "send.error": str(e), "send.paused_at": _now()}}
+        )
+        return None
+    finally:
+        if own_transport:
+            await transport.close()
+
+
+def launch_campaign_send(db, campaign_id: str) -> Optional[asyncio.Task]:
+    """Send a campaign in the background unless this worker is already sending it"""
+    if campaign_id in _running:
+        return _running[campaign_id]
+    task = asyncio.create_task(run_campaign_send(db, campaign_id))
+    _running[campaign_id] = task
+    task.add_done_callback(lambda _: _running.pop(campaign_id, None))
+    return task
+
+
+async def resume_campaign_sends(db) -> List[str]:
+    """Continue campaigns in `sending` whose sender stopped heartbeating (or never started)"""
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=CAMPAIGN_STALE_AFTER_SECONDS)).isoformat()
+    campaigns = await db.email_campaigns.find(
+        {"status": "sending", "$or": [{"send.owner": None}, {"send.heartbeat_at": {"$lt": stale}}]},
+        {"_id": 0, "campaign_id": 1}
+    ).to_list(100)
+    resumed = []
+    for campaign in campaigns:
+        if campaign["campaign_id"] not in _running:
+            launch_campaign_send(db, campaign["campaign_id"])
+            resumed.append(campaign["campaign_id"])
+    return resumed
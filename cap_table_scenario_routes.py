@@ -3,36 +3,25 @@ IB Capital - Cap Table Scenario Modeling
 Simulate dilution from future funding rounds
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone
 import uuid
-import jwt
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/ib-capital/scenario", tags=["Cap Table Scenario Modeling"])
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-db_name = os.environ.get('DB_NAME', 'innovate_books_db')
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+db = get_db()
 
 JWT_SECRET = os.environ["JWT_SECRET_KEY"]  # must be set in backend/.env
 
 
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {"user_id": payload.get("user_id"), 
-                "org_id": payload.get("org_id")}
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 def serialize_doc(doc):
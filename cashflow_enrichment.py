@@ -0,0 +1,149 @@
+"""
+Cash Flow Enrichment
+Batched resolution of the invoices / bills linked to bank transactions for
+the cash flow actuals endpoints. Linked document numbers are collected up
+front and fetched with one $in query per collection (chunked), instead of
+one find_one per transaction.
+"""
+import asyncio
+from typing import Any, Dict, Iterable, List, Tuple
+
+# Max document numbers per $in query
+LOOKUP_CHUNK_SIZE = 5000
+
+# Bill category -> (cash flow category, subcategory) for the transactions view
+BILL_CATEGORY_FLOWS: Dict[str, Tuple[str, str]] = {
+    "Salary": ("Operating", "Payment for Salary"),
+    "Rent": ("Operating", "Payment for Rent"),
+    "Purchase": ("Operating", "Payment for Purchase"),
+    "Utilities": ("Operating", "Payment for Utilities"),
+    "Asset": ("Investing", "Purchase of Fixed Assets"),
+    "Equipment": ("Investing", "Purchase of Fixed Assets"),
+    "Property": ("Investing", "Purchase of Fixed Assets"),
+    "Loan": ("Financing", "Loan Repayment"),
+    "Interest": ("Financing", "Loan Repayment"),
+}
+
+# Ordered keyword rules for the statement view: (keyword, activity, line item).
+# An activity of None keeps the transaction under Operating Activities.
+STATEMENT_BILL_RULES: List[Tuple[str, Any, str]] = [
+    ("asset", "Investing Activities", "Purchase of fixed assets"),
+    ("equipment", "Investing Activities", "Purchase of fixed assets"),
+    ("loan", "Financing Activities", "Repayment of borrowings"),
+    ("interest", "Financing Activities", "Repayment of borrowings"),
+    ("salary", None, "Cash paid to employees"),
+    ("rent", None, "Cash paid for rent"),
+]
+
+
+async def _fetch_by_numbers(collection, field: str, numbers: List[str], projection: Dict[str, int]) -> Dict[str, dict]:
+    """number -> first matching document, using chunked $in queries"""
+    if not numbers:
+        return {}
+    chunks = [numbers[i:i + LOOKUP_CHUNK_SIZE] for i in range(0, len(numbers), LOOKUP_CHUNK_SIZE)]
+    results = await asyncio.gather(*(
+        collection.find({field: {"$in": chunk}}, projection).to_list(None)
+        for chunk in chunks
+    ))
+    by_number: Dict[str, dict] = {}
+    for docs in results:
+        for doc in docs:
+            # keep the first match, like find_one did
+            by_number.setdefault(doc.get(field), doc)
+    return by_number
+
+
+async def resolve_linked_documents(db, transactions: Iterable[dict], include_invoices: bool = True) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """
+    Fetch the invoices (credit lines) and bills (debit lines) referenced by
+    `linked_entity`. Returns (invoices_by_number, bills_by_number).
+    """
+    invoice_numbers, bill_numbers = set(), set()
+    for txn in transactions:
+        linked = txn.get('linked_entity')
+        if not linked:
+            continue
+        if txn.get('transaction_type') == 'Credit':
+            invoice_numbers.add(linked)
+        else:
+            bill_numbers.add(linked)
+
+    invoices_task = _fetch_by_numbers(
+        db.invoices, "invoice_number", sorted(invoice_numbers) if include_invoices else [],
+        {"_id": 0, "invoice_number": 1, "customer_name": 1}
+    )
+    bills_task = _fetch_by_numbers(
+        db.bills, "bill_number", sorted(bill_numbers),
+        {"_id": 0, "bill_number": 1, "vendor_name": 1, "category": 1}
+    )
+    invoices, bills = await asyncio.gather(invoices_task, bills_task)
+    return invoices, bills
+
+
+def enrich_cashflow_transaction(txn: dict, invoices: Dict[str, dict], bills: Dict[str, dict]) -> dict:
+    """Row for /cashflow/actuals/transactions"""
+    linked_doc_id = txn.get('linked_entity')
+    counterparty = None
+    subcategory = "General"
+    flow_category = "Operating"
+
+    if linked_doc_id:
+        if txn.get('transaction_type') == 'Credit':
+            invoice = invoices.get(linked_doc_id)
+            if invoice:
+                counterparty = invoice.get('customer_name')
+                subcategory = "Receipts from Customers"
+        else:
+            bill = bills.get(linked_doc_id)
+            if bill:
+                counterparty = bill.get('vendor_name')
+                mapped = BILL_CATEGORY_FLOWS.get(bill.get('category', 'General'))
+                if mapped:
+                    flow_category, subcategory = mapped
+
+    return {
+        "date": txn.get('transaction_date'),
+        "account": txn.get('account_name', 'Bank Account'),
+        "type": "Inflow" if txn.get('transaction_type') == 'Credit' else "Outflow",
+        "amount": txn.get('amount', 0),
+        "category": flow_category,
+        "subcategory": subcategory,
+        "counterparty": counterparty or "N/A",
+        "linked_doc": linked_doc_id or "N/A",
+        "description": txn.get('description', 'N/A')
+    }
+
+
+def classify_statement_line(txn: dict, bills: Dict[str, dict]) -> Tuple[str, str]:
+    """(activity, line item) for /cashflow/actuals/statement"""
+    txn_type = txn.get('transaction_type')
+    category = "Operating Activities"
+    line_item = "Cash receipts from customers" if txn_type == 'Credit' else "Cash paid to suppliers"
+
+    linked_doc = txn.get('linked_entity')
+    if linked_doc and txn_type == 'Debit':
+        bill = bills.get(linked_doc)
+        if bill:
+            bill_cat = (bill.get('category') or '').lower()
+            for keyword, activity, item in STATEMENT_BILL_RULES:
+                if keyword in bill_cat:
+                    category = activity or category
+                    line_item = item
+                    break
+
+    return category, line_item
+
+
+def build_cashflow_statement(transactions: Iterable[dict], bills: Dict[str, dict]) -> Dict[str, Dict[str, float]]:
+    """Aggregate transactions into the three cash flow activity sections"""
+    statement = {
+        "Operating Activities": {},
+        "Investing Activities": {},
+        "Financing Activities": {}
+    }
+    for txn in transactions:
+        amount = txn.get('amount', 0)
+        category, line_item = classify_statement_line(txn, bills)
+        section = statement[category]
+        section[line_item] = section.get(line_item, 0) + (amount if txn.get('transaction_type') == 'Credit' else -amount)
+    return statement
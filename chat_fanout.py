@@ -0,0 +1,306 @@
+"""
+Chat Fan-out
+WebSocket delivery for chat, shared by every Uvicorn worker.
+
+- ChatHub tracks this worker's sockets by user and by topic (a chat
+  channel or room). Publishing delivers to local sockets and hands the
+  event to the backplane so the other workers deliver to theirs.
+- Backplanes (CHAT_BACKPLANE): "memory" keeps events in-process (one
+  worker, tests); "mongo" appends them to the capped `chat_fanout_events`
+  collection, which every worker tails.
+- Each socket is a Connection with a bounded send queue drained by its own
+  writer task, so a slow client only delays itself. When the queue is
+  full, CHAT_SLOW_CONSUMER_POLICY applies: "drop" discards the oldest
+  queued frame, "disconnect" closes the socket (1013). A send that takes
+  longer than CHAT_SEND_TIMEOUT_SECONDS also closes it.
+- A message is JSON-encoded once per publish and sent as the same text
+  frame to every recipient.
+"""
+import os
+import json
+import uuid
+import socket
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Set
+
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+CHAT_BACKPLANE = os.environ.get('CHAT_BACKPLANE', 'mongo').lower()
+CHAT_SEND_QUEUE_SIZE = int(os.environ.get('CHAT_SEND_QUEUE_SIZE', '256'))
+CHAT_SEND_TIMEOUT_SECONDS = float(os.environ.get('CHAT_SEND_TIMEOUT_SECONDS', '10'))
+CHAT_SLOW_CONSUMER_POLICY = os.environ.get('CHAT_SLOW_CONSUMER_POLICY', 'drop').lower()
+CHAT_FANOUT_CAPPED_BYTES = int(os.environ.get('CHAT_FANOUT_CAPPED_BYTES', str(16 * 1024 * 1024)))
+
+FANOUT_EVENTS = "chat_fanout_events"
+
+# Close code for a consumer that cannot keep up ("try again later")
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+def encode(message: Any) -> str:
+    """One text frame for a message (datetimes and enums as strings)"""
+    return json.dumps(message, default=str, separators=(",", ":"), ensure_ascii=False)
+
+
+# ==================== CONNECTIONS ====================
+
+class Connection:
+    """One accepted WebSocket with its own bounded send queue and writer task"""
+
+    def __init__(self, hub: "ChatHub", websocket, user_id: Optional[str] = None,
+                 queue_size: int = CHAT_SEND_QUEUE_SIZE, policy: str = CHAT_SLOW_CONSUMER_POLICY):
+        self.hub = hub
+        self.websocket = websocket
+        self.user_id = user_id
+        self.policy = policy
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, queue_size))
+        self.topics: Set[str] = set()
+        self.sent = 0
+        self.dropped = 0
+        self.closed = False
+        self._writer: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._writer = asyncio.create_task(self._drain())
+
+    def offer(self, frame: str) -> bool:
+        """Queue a frame without waiting; applies the slow-consumer policy"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "disconnect":
+            logger.info(f"Closing slow chat consumer user={self.user_id}")
+            asyncio.create_task(self.close(SLOW_CONSUMER_CLOSE_CODE))
+            return False
+        self.queue.get_nowait()
+        self.dropped += 1
+        self.queue.put_nowait(frame)
+        return True
+
+    async def _drain(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                await asyncio.wait_for(self.websocket.send_text(frame), CHAT_SEND_TIMEOUT_SECONDS)
+                self.sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Chat socket send failed user={self.user_id}: {e}")
+            self.closed = True
+            self.hub.unregister(self)
+
+    async def close(self, code: int = 1000):
+        """Stop the writer and close the socket (slow consumer or shutdown)"""
+        self.closed = True
+        self.hub.unregister(self)
+        if self._writer is not None and self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+# ==================== BACKPLANES ====================
+
+class InMemoryBackplane:
+    """Single-process backplane: local delivery already reached everyone"""
+
+    name = "memory"
+
+    async def start(self, hub: "ChatHub"):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, kind: str, target: Optional[str], frame: str):
+        pass
+
+
+class MongoBackplane:
+    """Events appended to a capped collection and tailed by every worker"""
+
+    name = "mongo"
+
+    def __init__(self, db, capped_bytes: int = CHAT_FANOUT_CAPPED_BYTES):
+        self.db = db
+        self.capped_bytes = capped_bytes
+        self.origin = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.received = 0
+        self._task: Optional[asyncio.Task] = None
+        self._seen: deque = deque(maxlen=2000)
+
+    async def start(self, hub: "ChatHub"):
+        try:
+            await self.db.create_collection(FANOUT_EVENTS, capped=True, size=self.capped_bytes)
+        except CollectionInvalid:
+            pass  # already exists
+        # A tailable cursor dies at once on an empty capped collection
+        await self.db[FANOUT_EVENTS].insert_one({"origin": self.origin, "kind": "noop"})
+        self._task = asyncio.create_task(self._tail(hub))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def publish(self, kind: str, target: Optional[str], frame: str):
+        await self.db[FANOUT_EVENTS].insert_one({
+            "origin": self.origin, "kind": kind, "target": target, "frame": frame
+        })
+
+    async def _tail(self, hub: "ChatHub"):
+        collection = self.db[FANOUT_EVENTS]
+        resume_from = datetime.now(timezone.utc)
+        while True:
+            try:
+                # ObjectIds from other hosts are only roughly ordered: re-read a
+                # few seconds back after a restart and skip events already seen
+                since = ObjectId.from_datetime(resume_from - timedelta(seconds=5))
+                cursor = collection.find({"_id": {"$gte": since}}, cursor_type=CursorType.TAILABLE_AWAIT)
+                while cursor.alive:
+                    async for event in cursor:
+                        resume_from = event["_id"].generation_time
+                        if event["_id"] in self._seen:
+                            continue
+                        self._seen.append(event["_id"])
+                        if event.get("origin") == self.origin or event.get("kind") == "noop":
+                            continue
+                        self.received += 1
+                        hub.deliver(event["kind"], event.get("target"), event["frame"])
+                    await asyncio.sleep(0.05)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError as e:
+                logger.warning(f"Chat backplane tail interrupted: {e}")
+            await asyncio.sleep(1)
+
+
+# ==================== HUB ====================
+
+class ChatHub:
+    """This worker's chat sockets plus cross-worker publishing"""
+
+    def __init__(self):
+        self.backplane = InMemoryBackplane()
+        self.by_user: Dict[str, Set[Connection]] = {}
+        self.by_topic: Dict[str, Set[Connection]] = {}
+        self.connections: Set[Connection] = set()
+        self.published = 0
+
+    async def start(self, db=None, backplane: Optional[str] = None):
+        backplane = (backplane or CHAT_BACKPLANE).lower()
+        if backplane == "mongo" and db is not None:
+            self.backplane = MongoBackplane(db)
+        elif backplane != "memory":
+            logger.warning(f"Unknown or unavailable chat backplane {backplane!r}; using in-memory")
+        try:
+            await self.backplane.start(self)
+        except Exception:
+            self.backplane = InMemoryBackplane()
+            raise
+        logger.info(f"Chat fan-out started with {self.backplane.name} backplane")
+
+    async def stop(self):
+        await self.backplane.stop()
+        for connection in list(self.connections):
+            await connection.close(1001)
+
+    # ---------- registry ----------
+
+    def register(self, websocket, user_id: Optional[str] = None) -> Connection:
+        """Track an accepted socket and start its writer"""
+        connection = Connection(self, websocket, user_id)
+        self.connections.add(connection)
+        if user_id:
+            self.by_user.setdefault(user_id, set()).add(connection)
+        connection.start()
+        return connection
+
+    def unregister(self, connection: Connection):
+        if connection not in self.connections:
+            return
+        self.connections.discard(connection)
+        if connection.user_id in self.by_user:
+            self.by_user[connection.user_id].discard(connection)
+            if not self.by_user[connection.user_id]:
+                del self.by_user[connection.user_id]
+        for topic in list(connection.topics):
+            self.leave(connection, topic)
+        if connection._writer is not None and connection._writer is not asyncio.current_task():
+            connection._writer.cancel()
+
+    def join(self, connection: Connection, topic: str):
+        if connection.closed:
+            return
+        connection.topics.add(topic)
+        self.by_topic.setdefault(topic, set()).add(connection)
+
+    def leave(self, connection: Connection, topic: str):
+        connection.topics.discard(topic)
+        if topic in self.by_topic:
+            self.by_topic[topic].discard(connection)
+            if not self.by_topic[topic]:
+                del self.by_topic[topic]
+
+    # ---------- delivery ----------
+
+    def deliver(self, kind: str, target: Optional[str], frame: str) -> int:
+        """Queue a frame on this worker's matching sockets; returns how many"""
+        if kind == "topic":
+            recipients = self.by_topic.get(target, ())
+        elif kind == "user":
+            recipients = self.by_user.get(target, ())
+        else:
+            recipients = self.connections
+        return sum(1 for connection in list(recipients) if connection.offer(frame))
+
+    async def _publish(self, kind: str, target: Optional[str], message: Any) -> int:
+        frame = encode(message)
+        self.published += 1
+        delivered = self.deliver(kind, target, frame)
+        try:
+            await self.backplane.publish(kind, target, frame)
+        except PyMongoError as e:
+            logger.warning(f"Chat backplane publish failed ({kind}:{target}): {e}")
+        return delivered
+
+    async def publish(self, topic: str, message: Any) -> int:
+        return await self._publish("topic", topic, message)
+
+    async def publish_to_user(self, user_id: str, message: Any) -> int:
+        return await self._publish("user", user_id, message)
+
+    async def publish_to_all(self, message: Any) -> int:
+        return await self._publish("all", None, message)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backplane": self.backplane.name,
+            "connections": len(self.connections),
+            "users": len(self.by_user),
+            "topics": len(self.by_topic),
+            "published": self.published,
+            "queued": sum(c.queue.qsize() for c in self.connections),
+            "dropped": sum(c.dropped for c in self.connections),
+        }
+
+
+chat_hub = ChatHub()
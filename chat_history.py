@@ -0,0 +1,238 @@
+"""
+Chat History
+Keyset-paginated channel history, cached channel membership and tokenized
+message search for the chat and workspace routers.
+
+Each message collection is described by a MessageStore (its container
+collection, membership field, id field and text field): CHAT_STORE for
+channels/messages, WORKSPACE_CHANNEL_STORE and WORKSPACE_CHAT_STORE for the
+workspace router's channels and chats. Every helper takes a store and
+defaults to CHAT_STORE.
+
+- Cursors are opaque (base64 of created_at + message id) and page over the
+  (container id, created_at, message id) index, so page N costs the same as page 1.
+- History pages are encoded straight from the stored documents into one
+  compact JSON array; no per-message model construction or date parsing.
+- Channel members and each user's channel ids are cached for
+  CHAT_MEMBERSHIP_TTL_SECONDS; channel writes call invalidate_channel().
+- Messages carry `search_terms` (word prefixes, see search_index.py),
+  written on send and edit, so search is an indexed $all lookup within the
+  caller's channels instead of a $regex over `content`.
+"""
+import os
+import json
+import base64
+import binascii
+import logging
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from pymongo import UpdateOne
+
+from permission_cache import _TTLMap
+from search_index import index_terms, query_terms
+
+logger = logging.getLogger(__name__)
+
+CHAT_MEMBERSHIP_TTL_SECONDS = float(os.environ.get('CHAT_MEMBERSHIP_TTL_SECONDS', '30'))
+CHAT_HISTORY_MAX_LIMIT = 200
+
+# Fields sent to clients for a history page (search_terms stays server-side)
+MESSAGE_FIELDS = {
+    "_id": 1, "channel_id": 1, "user_id": 1, "user_name": 1, "user_avatar": 1,
+    "content": 1, "type": 1, "parent_id": 1, "mentions": 1, "reactions": 1,
+    "file_url": 1, "file_name": 1, "edited": 1, "created_at": 1, "updated_at": 1
+}
+WORKSPACE_MESSAGE_FIELDS = {"_id": 0, "search_terms": 0}
+
+
+class MessageStore(NamedTuple):
+    """Where one kind of message lives and how its container grants access"""
+    name: str
+    containers: str           # collection holding channels / chats
+    container_key: str        # container id field ("_id" / "channel_id" / "chat_id")
+    members_field: str        # member id list on the container
+    messages: str             # collection holding the messages
+    parent_field: str         # container id field on each message
+    id_field: str             # unique message id, the cursor tie-break
+    content_field: str        # text that feeds search_terms
+    fields: Dict[str, int]    # projection for history pages
+
+
+CHAT_STORE = MessageStore(
+    "chat", "channels", "_id", "members",
+    "messages", "channel_id", "_id", "content", MESSAGE_FIELDS
+)
+WORKSPACE_CHANNEL_STORE = MessageStore(
+    "workspace_channel", "workspace_channels", "channel_id", "member_users",
+    "workspace_channel_messages", "channel_id", "message_id", "payload", WORKSPACE_MESSAGE_FIELDS
+)
+WORKSPACE_CHAT_STORE = MessageStore(
+    "workspace_chat", "workspace_chats", "chat_id", "participants",
+    "workspace_chat_messages", "chat_id", "message_id", "payload", WORKSPACE_MESSAGE_FIELDS
+)
+MESSAGE_STORES = (CHAT_STORE, WORKSPACE_CHANNEL_STORE, WORKSPACE_CHAT_STORE)
+
+
+# ==================== MEMBERSHIP ====================
+
+channel_members_cache = _TTLMap(CHAT_MEMBERSHIP_TTL_SECONDS)
+user_channels_cache = _TTLMap(CHAT_MEMBERSHIP_TTL_SECONDS)
+
+
+async def channel_members(db, channel_id: str, store: MessageStore = CHAT_STORE) -> Optional[FrozenSet[str]]:
+    """Member ids of a channel (None when the channel does not exist)"""
+    key = (store.name, channel_id)
+    members = channel_members_cache.get(key)
+    if members is None:
+        channel = await db[store.containers].find_one(
+            {store.container_key: channel_id}, {store.members_field: 1}
+        )
+        if channel is None:
+            return None
+        members = frozenset(channel.get(store.members_field, []))
+        channel_members_cache.set(key, members)
+    return members
+
+
+async def is_channel_member(db, channel_id: str, user_id: str, store: MessageStore = CHAT_STORE) -> bool:
+    members = await channel_members(db, channel_id, store)
+    return members is not None and user_id in members
+
+
+async def user_channel_ids(db, user_id: str, store: MessageStore = CHAT_STORE) -> List[str]:
+    key = (store.name, user_id)
+    channel_ids = user_channels_cache.get(key)
+    if channel_ids is None:
+        channels = await db[store.containers].find(
+            {store.members_field: user_id}, {store.container_key: 1}
+        ).to_list(length=None)
+        channel_ids = [channel[store.container_key] for channel in channels]
+        user_channels_cache.set(key, channel_ids)
+    return channel_ids
+
+
+def invalidate_channel(channel_id: str, member_ids: Optional[List[str]] = None, store: MessageStore = CHAT_STORE):
+    """Drop cached membership after a channel is created or its members change"""
+    channel_members_cache.pop((store.name, channel_id))
+    for user_id in member_ids or []:
+        user_channels_cache.pop((store.name, user_id))
+
+
+# ==================== CURSORS ====================
+
+def encode_cursor(created_at: str, message_id: str) -> str:
+    raw = json.dumps([created_at, message_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """(created_at, _id); raises ValueError for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, message_id = json.loads(raw)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    return str(created_at), str(message_id)
+
+
+def history_query(
+    channel_id: str,
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    store: MessageStore = CHAT_STORE
+) -> Dict[str, Any]:
+    """Messages older than the cursor (or the legacy `before` timestamp)"""
+    query: Dict[str, Any] = {store.parent_field: channel_id}
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, store.id_field: {"$lt": message_id}},
+        ]
+    elif before:
+        query["created_at"] = {"$lt": before}
+    return query
+
+
+async def history_page(
+    db,
+    channel_id: str,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    before: Optional[str] = None,
+    store: MessageStore = CHAT_STORE
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    One page of a channel's history, oldest first, plus the cursor for the
+    next (older) page, or None when this is the oldest page.
+    """
+    limit = max(1, min(limit, CHAT_HISTORY_MAX_LIMIT))
+    docs = await db[store.messages].find(
+        history_query(channel_id, cursor, before, store), store.fields
+    ).sort([("created_at", -1), (store.id_field, -1)]).limit(limit + 1).to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        oldest = docs[-1]
+        next_cursor = encode_cursor(oldest["created_at"], oldest[store.id_field])
+    docs.reverse()
+    if store.id_field == "_id":
+        for doc in docs:
+            doc["id"] = doc.pop("_id")
+    return docs, next_cursor
+
+
+def encode_page(docs: List[dict]) -> bytes:
+    """Compact JSON array for a history page"""
+    return json.dumps(docs, default=str, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# ==================== SEARCH ====================
+
+def message_search_terms(content: Optional[str]) -> List[str]:
+    return sorted(index_terms(content))
+
+
+async def search_channel_messages(
+    db,
+    user_id: str,
+    q: str,
+    limit: int = 50,
+    store: MessageStore = CHAT_STORE
+) -> List[dict]:
+    """Newest messages in the user's channels containing every word of `q`"""
+    terms = query_terms(q)
+    if not terms:
+        return []
+    channel_ids = await user_channel_ids(db, user_id, store)
+    if not channel_ids:
+        return []
+    projection = {"search_terms": 0}
+    if store.id_field != "_id":
+        projection["_id"] = 0
+    return await db[store.messages].find(
+        {"search_terms": {"$all": terms}, store.parent_field: {"$in": channel_ids}},
+        projection
+    ).sort("created_at", -1).limit(limit).to_list(length=limit)
+
+
+async def backfill_search_terms(db, batch_size: int = 1000, store: MessageStore = CHAT_STORE) -> int:
+    """Add search_terms to messages written before they existed"""
+    collection = db[store.messages]
+    updated = 0
+    batch = []
+    async for message in collection.find({"search_terms": {"$exists": False}}, {store.content_field: 1}):
+        batch.append(UpdateOne(
+            {"_id": message["_id"]},
+            {"$set": {"search_terms": message_search_terms(message.get(store.content_field))}}
+        ))
+        if len(batch) >= batch_size:
+            await collection.bulk_write(batch, ordered=False)
+            updated += len(batch)
+            batch = []
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        updated += len(batch)
+    logger.info(f"Backfilled search terms on {updated} {store.messages} documents")
+    return updated
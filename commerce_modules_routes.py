@@ -9,6 +9,8 @@ from typing import List, Optional
 from datetime import datetime, timezone, timedelta
 import logging
 
+from sequence_service import next_timestamped_id
+
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/commerce/modules", tags=["Commerce Modules"])
@@ -302,7 +304,7 @@ async def get_catalog_items(search: Optional[str] = None, category: Optional[str
 @router.post("/catalog/items")
 async def create_catalog_item(item: CatalogItemCreate, db = Depends(get_db)):
     data = item.dict()
-    data["item_id"] = f"ITEM-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["item_id"] = await next_timestamped_id("ITEM", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.catalog_items.insert_one(data)
     return {"success": True, "message": "Item created", "item_id": data["item_id"]}
@@ -338,7 +340,7 @@ async def get_catalog_pricing(status: Optional[str] = None, db = Depends(get_db)
 @router.post("/catalog/pricing")
 async def create_catalog_pricing(pricing: CatalogPricingCreate, db = Depends(get_db)):
     data = pricing.dict()
-    data["pricing_id"] = f"PRC-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["pricing_id"] = await next_timestamped_id("PRC", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.catalog_pricing.insert_one(data)
     return {"success": True, "message": "Pricing created", "pricing_id": data["pricing_id"]}
@@ -373,7 +375,7 @@ async def get_catalog_costing(db = Depends(get_db)):
 @router.post("/catalog/costing")
 async def create_catalog_costing(costing: CatalogCostingCreate, db = Depends(get_db)):
     data = costing.dict()
-    data["costing_id"] = f"CST-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["costing_id"] = await next_timestamped_id("CST", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.catalog_costing.insert_one(data)
     return {"success": True, "message": "Costing created", "costing_id": data["costing_id"]}
@@ -408,7 +410,7 @@ async def get_catalog_rules(db = Depends(get_db)):
 @router.post("/catalog/rules")
 async def create_catalog_rule(rule: CatalogRuleCreate, db = Depends(get_db)):
     data = rule.dict()
-    data["rule_id"] = f"RUL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["rule_id"] = await next_timestamped_id("RUL", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.catalog_rules.insert_one(data)
     return {"success": True, "message": "Rule created", "rule_id": data["rule_id"]}
@@ -443,7 +445,7 @@ async def get_catalog_packages(db = Depends(get_db)):
 @router.post("/catalog/packages")
 async def create_catalog_package(package: CatalogPackageCreate, db = Depends(get_db)):
     data = package.dict()
-    data["package_id"] = f"PKG-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["package_id"] = await next_timestamped_id("PKG", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.catalog_packages.insert_one(data)
     return {"success": True, "message": "Package created", "package_id": data["package_id"]}
@@ -1216,7 +1218,7 @@ async def seed_enhanced_leads(db = Depends(get_db)):
 @router.post("/revenue/leads")
 async def create_lead(lead: LeadCreate, db = Depends(get_db)):
     data = lead.dict()
-    data["lead_id"] = f"LEAD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["lead_id"] = await next_timestamped_id("LEAD", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.revenue_leads.insert_one(data)
     return {"success": True, "message": "Lead created", "lead_id": data["lead_id"]}
@@ -1364,7 +1366,7 @@ async def create_lead_activity(lead_id: str, activity: ActivityCreate, db = Depe
         raise HTTPException(status_code=404, detail="Lead not found")
     
     data = activity.dict()
-    data["activity_id"] = f"ACT-{datetime.now().strftime('%Y%m%d%H%M%S%f')[:17]}"
+    data["activity_id"] = await next_timestamped_id("ACT", db=db)
     data["lead_id"] = lead_id
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     
@@ -1492,7 +1494,7 @@ async def create_deal(lead_id: str, deal: DealCreate, db = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Lead not found")
     
     data = deal.dict()
-    data["deal_id"] = f"DEAL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["deal_id"] = await next_timestamped_id("DEAL", db=db)
     data["lead_id"] = lead_id
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     
@@ -1549,7 +1551,7 @@ async def convert_lead(lead_id: str, create_opportunity: bool = True, db = Depen
     
     # Create Account
     account_data = {
-        "account_id": f"ACC-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "account_id": await next_timestamped_id("ACC", db=db),
         "account_name": lead.get("company"),
         "industry": lead.get("industry"),
         "annual_revenue": lead.get("annual_revenue"),
@@ -1568,7 +1570,7 @@ async def convert_lead(lead_id: str, create_opportunity: bool = True, db = Depen
     
     # Create Contact
     contact_data = {
-        "contact_id": f"CON-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "contact_id": await next_timestamped_id("CON", db=db),
         "salutation": lead.get("salutation"),
         "first_name": lead.get("first_name"),
         "last_name": lead.get("last_name"),
@@ -1586,7 +1588,7 @@ async def convert_lead(lead_id: str, create_opportunity: bool = True, db = Depen
     if create_opportunity:
         # Create Opportunity
         opportunity_data = {
-            "opportunity_id": f"OPP-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+            "opportunity_id": await next_timestamped_id("OPP", db=db),
             "opportunity_name": f"{lead.get('company')} - {lead.get('first_name')} {lead.get('last_name')}",
             "account_id": account_data["account_id"],
             "contact_id": contact_data["contact_id"],
@@ -1823,7 +1825,7 @@ async def get_evaluations(db = Depends(get_db)):
 @router.post("/revenue/evaluations")
 async def create_evaluation(evaluation: EvaluationCreate, db = Depends(get_db)):
     data = evaluation.dict()
-    data["evaluation_id"] = f"EVAL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["evaluation_id"] = await next_timestamped_id("EVAL", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.revenue_evaluations.insert_one(data)
     return {"success": True, "message": "Evaluation created", "evaluation_id": data["evaluation_id"]}
@@ -1858,7 +1860,7 @@ async def get_commits(db = Depends(get_db)):
 @router.post("/revenue/commits")
 async def create_commit(commit: CommitCreate, db = Depends(get_db)):
     data = commit.dict()
-    data["commit_id"] = f"CMT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["commit_id"] = await next_timestamped_id("CMT", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.revenue_commits.insert_one(data)
     return {"success": True, "message": "Commit created", "commit_id": data["commit_id"]}
@@ -1893,7 +1895,7 @@ async def get_contracts(db = Depends(get_db)):
 @router.post("/revenue/contracts")
 async def create_contract(contract: ContractCreate, db = Depends(get_db)):
     data = contract.dict()
-    data["contract_id"] = f"CNT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["contract_id"] = await next_timestamped_id("CNT", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.revenue_contracts.insert_one(data)
     return {"success": True, "message": "Contract created", "contract_id": data["contract_id"]}
@@ -1930,7 +1932,7 @@ async def get_procurement_requests(status: Optional[str] = None, db = Depends(ge
 @router.post("/procurement/requests")
 async def create_procurement_request(pr: ProcurementCreate, db = Depends(get_db)):
     data = pr.dict()
-    data["pr_id"] = f"PR-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["pr_id"] = await next_timestamped_id("PR", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.procurement_requests.insert_one(data)
     return {"success": True, "message": "PR created", "pr_id": data["pr_id"]}
@@ -1965,7 +1967,7 @@ async def get_purchase_orders(db = Depends(get_db)):
 @router.post("/procurement/orders")
 async def create_purchase_order(po: PurchaseOrderCreate, db = Depends(get_db)):
     data = po.dict()
-    data["po_id"] = f"PO-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["po_id"] = await next_timestamped_id("PO", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.purchase_orders.insert_one(data)
     return {"success": True, "message": "PO created", "po_id": data["po_id"]}
@@ -2000,7 +2002,7 @@ async def get_procurement_evaluations(db = Depends(get_db)):
 @router.post("/procurement/evaluations")
 async def create_procurement_evaluation(evaluation: EvaluationCreate, db = Depends(get_db)):
     data = evaluation.dict()
-    data["evaluation_id"] = f"PE-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["evaluation_id"] = await next_timestamped_id("PE", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.procurement_evaluations.insert_one(data)
     return {"success": True, "message": "Evaluation created", "evaluation_id": data["evaluation_id"]}
@@ -2035,7 +2037,7 @@ async def get_procurement_commits(db = Depends(get_db)):
 @router.post("/procurement/commits")
 async def create_procurement_commit(commit: CommitCreate, db = Depends(get_db)):
     data = commit.dict()
-    data["commit_id"] = f"PC-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["commit_id"] = await next_timestamped_id("PC", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.procurement_commits.insert_one(data)
     return {"success": True, "message": "Commit created", "commit_id": data["commit_id"]}
@@ -2070,7 +2072,7 @@ async def get_procurement_contracts(db = Depends(get_db)):
 @router.post("/procurement/contracts")
 async def create_procurement_contract(contract: ContractCreate, db = Depends(get_db)):
     data = contract.dict()
-    data["contract_id"] = f"PCT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["contract_id"] = await next_timestamped_id("PCT", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.procurement_contracts.insert_one(data)
     return {"success": True, "message": "Contract created", "contract_id": data["contract_id"]}
@@ -2107,7 +2109,7 @@ async def get_policies(status: Optional[str] = None, db = Depends(get_db)):
 @router.post("/governance/policies")
 async def create_policy(policy: PolicyCreate, db = Depends(get_db)):
     data = policy.dict()
-    data["policy_id"] = f"POL-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["policy_id"] = await next_timestamped_id("POL", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.governance_policies.insert_one(data)
     return {"success": True, "message": "Policy created", "policy_id": data["policy_id"]}
@@ -2142,7 +2144,7 @@ async def get_limits(db = Depends(get_db)):
 @router.post("/governance/limits")
 async def create_limit(limit: LimitCreate, db = Depends(get_db)):
     data = limit.dict()
-    data["limit_id"] = f"LMT-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["limit_id"] = await next_timestamped_id("LMT", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.governance_limits.insert_one(data)
     return {"success": True, "message": "Limit created", "limit_id": data["limit_id"]}
@@ -2177,7 +2179,7 @@ async def get_authorities(db = Depends(get_db)):
 @router.post("/governance/authority")
 async def create_authority(authority: AuthorityCreate, db = Depends(get_db)):
     data = authority.dict()
-    data["authority_id"] = f"AUTH-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["authority_id"] = await next_timestamped_id("AUTH", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.governance_authority.insert_one(data)
     return {"success": True, "message": "Authority created", "authority_id": data["authority_id"]}
@@ -2212,7 +2214,7 @@ async def get_risks(db = Depends(get_db)):
 @router.post("/governance/risks")
 async def create_risk(risk: RiskCreate, db = Depends(get_db)):
     data = risk.dict()
-    data["risk_id"] = f"RSK-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["risk_id"] = await next_timestamped_id("RSK", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.governance_risks.insert_one(data)
     return {"success": True, "message": "Risk created", "risk_id": data["risk_id"]}
@@ -2247,7 +2249,7 @@ async def get_audits(db = Depends(get_db)):
 @router.post("/governance/audits")
 async def create_audit(audit: AuditCreate, db = Depends(get_db)):
     data = audit.dict()
-    data["audit_id"] = f"AUD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["audit_id"] = await next_timestamped_id("AUD", db=db)
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     await db.governance_audits.insert_one(data)
     return {"success": True, "message": "Audit created", "audit_id": data["audit_id"]}
@@ -8,8 +8,8 @@ from typing import List, Optional
 from datetime import datetime, timezone
 from commerce_models import *
 import uuid
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
+from sequence_service import next_value
 from dotenv import load_dotenv
 from pathlib import Path
 from auto_sop_workflow import run_complete_sop_workflow
@@ -27,9 +27,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_shared_db()
 
 # Create router
 commerce_router = APIRouter(prefix="/commerce", tags=["IB Commerce"])
@@ -42,10 +40,21 @@ def get_db():
 
 # ==================== HELPER FUNCTIONS ====================
 
-def generate_sequential_id(prefix: str, count: int) -> str:
+async def next_sequence(db, prefix: str, collection: str, query: Optional[dict] = None) -> int:
+    """Next value of the yearly `prefix` sequence (seeded from the collection count)"""
+    return await next_value(
+        prefix,
+        org_id=(query or {}).get("org_id"),
+        period=str(datetime.now().year),
+        seed=lambda: db[collection].count_documents(query or {}),
+        db=db
+    )
+
+
+def generate_sequential_id(prefix: str, number: int) -> str:
     """Generate sequential IDs like LEAD-2025-001"""
     year = datetime.now().year
-    return f"{prefix}-{year}-{str(count + 1).zfill(3)}"
+    return f"{prefix}-{year}-{str(number).zfill(3)}"
 
 
 # ==================== MODULE 1: LEAD ROUTES ====================
@@ -62,12 +71,12 @@ async def create_lead(
     try:
         # Get count for sequential ID (org-scoped)
         query = {"org_id": org_id} if org_id else {}
-        count = await db.commerce_leads.count_documents(query)
+        number = await next_sequence(db, "LEAD", "commerce_leads", query)
         
         # Create lead object
         lead = Lead(
             **lead_data.dict(),
-            lead_id=generate_sequential_id("LEAD", count),
+            lead_id=generate_sequential_id("LEAD", number),
             captured_by="current_user_id",  # TODO: Get from auth
             org_id=org_id,  # Add org_id
             sop_run_ids=[str(uuid.uuid4())]
@@ -211,11 +220,11 @@ async def update_lead_status(lead_id: str, status: LeadStatus, db=Depends(get_db
 async def create_evaluation(eval_data: EvaluateCreate, db=Depends(get_db)):
     """Create a new evaluation"""
     try:
-        count = await db.commerce_evaluate.count_documents({})
+        number = await next_sequence(db, "EVAL", "commerce_evaluate")
         
         evaluation = Evaluate(
             **eval_data.dict(),
-            evaluation_id=generate_sequential_id("EVAL", count),
+            evaluation_id=generate_sequential_id("EVAL", number),
             initiated_by="current_user_id"
         )
         
@@ -352,12 +361,12 @@ async def update_evaluation_status(evaluation_id: str, status: EvaluationStatus,
 async def create_commit(commit_data: CommitCreate, db=Depends(get_db)):
     """Create a new commitment/contract"""
     try:
-        count = await db.commerce_commit.count_documents({})
+        number = await next_sequence(db, "COMM", "commerce_commit")
         
         commit = Commit(
             **commit_data.dict(),
-            commit_id=generate_sequential_id("COMM", count),
-            contract_number=generate_sequential_id("CONT", count),
+            commit_id=generate_sequential_id("COMM", number),
+            contract_number=generate_sequential_id("CONT", number),
             created_by="current_user_id"
         )
         
@@ -477,11 +486,11 @@ async def update_commit_status(commit_id: str, status: CommitStatus, db=Depends(
 async def create_execution(exec_data: ExecuteCreate, db=Depends(get_db)):
     """Create a new execution record"""
     try:
-        count = await db.commerce_execute.count_documents({})
+        number = await next_sequence(db, "EXEC", "commerce_execute")
         
         execution = Execute(
             **exec_data.dict(),
-            execution_id=generate_sequential_id("EXEC", count)
+            execution_id=generate_sequential_id("EXEC", number)
         )
         
         exec_dict = execution.dict()
@@ -618,7 +627,7 @@ async def update_execution_status(execution_id: str, status: ExecutionStatus, db
 async def create_bill(bill_data: BillCreate, db=Depends(get_db)):
     """Create a new invoice/bill"""
     try:
-        count = await db.commerce_bills.count_documents({})
+        number = await next_sequence(db, "INV", "commerce_bills")
         
         # Calculate amounts
         total_amount = sum(item.line_amount for item in bill_data.items)
@@ -626,7 +635,7 @@ async def create_bill(bill_data: BillCreate, db=Depends(get_db)):
         
         bill = Bill(
             **bill_data.dict(),
-            invoice_id=generate_sequential_id("INV", count),
+            invoice_id=generate_sequential_id("INV", number),
             invoice_amount=total_amount,
             tax_amount=tax_amount,
             net_amount=total_amount + tax_amount,
@@ -785,11 +794,11 @@ async def update_bill_status(invoice_id: str, status: str, db=Depends(get_db)):
 async def create_collection(collect_data: CollectCreate, db=Depends(get_db)):
     """Create a new collection record"""
     try:
-        count = await db.commerce_collect.count_documents({})
+        number = await next_sequence(db, "COLL", "commerce_collect")
         
         collection = Collect(
             **collect_data.dict(),
-            collection_id=generate_sequential_id("COLL", count),
+            collection_id=generate_sequential_id("COLL", number),
             amount_outstanding=collect_data.amount_due,
             due_date=datetime.now(timezone.utc).date()
         )
@@ -975,11 +984,11 @@ async def record_payment(
 async def create_procurement(procure_data: ProcureCreate, db=Depends(get_db)):
     """Create a new procurement requisition"""
     try:
-        count = await db.commerce_procure.count_documents({})
+        number = await next_sequence(db, "REQ", "commerce_procure")
         
         procurement = Procure(
             **procure_data.dict(),
-            requisition_id=generate_sequential_id("REQ", count)
+            requisition_id=generate_sequential_id("REQ", number)
         )
         
         procure_dict = procurement.dict()
@@ -1101,11 +1110,11 @@ async def update_procurement_status(requisition_id: str, status: str, db=Depends
 async def create_payment(pay_data: PayCreate, db=Depends(get_db)):
     """Create a new payment record"""
     try:
-        count = await db.commerce_pay.count_documents({})
+        number = await next_sequence(db, "PAY", "commerce_pay")
         
         payment = Pay(
             **pay_data.dict(),
-            payment_id=generate_sequential_id("PAY", count),
+            payment_id=generate_sequential_id("PAY", number),
             matched_po_id=pay_data.po_id,
             vendor_tax_id="VENDOR_GSTIN"
         )
@@ -1267,11 +1276,11 @@ async def approve_payment(payment_id: str, approver_id: str, remarks: str = None
 async def create_spend(spend_data: SpendCreate, db=Depends(get_db)):
     """Create a new spend/expense record"""
     try:
-        count = await db.commerce_spend.count_documents({})
+        number = await next_sequence(db, "EXP", "commerce_spend")
         
         spend = Spend(
             **spend_data.dict(),
-            expense_id=generate_sequential_id("EXP", count),
+            expense_id=generate_sequential_id("EXP", number),
             reported_by="current_user_id",
             net_expense=spend_data.expense_amount
         )
@@ -1403,11 +1412,11 @@ async def update_spend_status(expense_id: str, status: str, db=Depends(get_db)):
 async def create_tax(tax_data: TaxCreate, db=Depends(get_db)):
     """Create a new tax record"""
     try:
-        count = await db.commerce_tax.count_documents({})
+        number = await next_sequence(db, "TAX", "commerce_tax")
         
         tax = Tax(
             **tax_data.dict(),
-            tax_id=generate_sequential_id("TAX", count)
+            tax_id=generate_sequential_id("TAX", number)
         )
         
         tax_dict = tax.dict()
@@ -1530,11 +1539,11 @@ async def update_tax_status(tax_id: str, status: str, db=Depends(get_db)):
 async def create_reconciliation(reconcile_data: ReconcileCreate, db=Depends(get_db)):
     """Create a new reconciliation record"""
     try:
-        count = await db.commerce_reconcile.count_documents({})
+        number = await next_sequence(db, "REC", "commerce_reconcile")
         
         reconciliation = Reconcile(
             **reconcile_data.dict(),
-            reconcile_id=generate_sequential_id("REC", count)
+            reconcile_id=generate_sequential_id("REC", number)
         )
         
         reconcile_dict = reconciliation.dict()
@@ -1660,11 +1669,11 @@ async def update_reconciliation_status(reconcile_id: str, status: str, db=Depend
 async def create_governance(govern_data: GovernCreate, db=Depends(get_db)):
     """Create a new governance/SOP record"""
     try:
-        count = await db.commerce_govern.count_documents({})
+        number = await next_sequence(db, "GOV", "commerce_govern")
         
         governance = Govern(
             **govern_data.dict(),
-            govern_id=generate_sequential_id("GOV", count)
+            govern_id=generate_sequential_id("GOV", number)
         )
         
         govern_dict = governance.dict()
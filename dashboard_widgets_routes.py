@@ -8,6 +8,7 @@ from typing import Optional, List
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
 import uuid
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/dashboard", tags=["dashboard"])
 
@@ -15,17 +16,8 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user_simple(credentials = Depends(__import__('fastapi.security', fromlist=['HTTPBearer']).HTTPBearer())):
-    import jwt
-    import os
-    token = credentials.credentials
-    JWT_SECRET = os.environ.get("JWT_SECRET_KEY")
-    if not JWT_SECRET:
-        raise RuntimeError("JWT_SECRET_KEY is missing in environment")
-
-    payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-    return {"user_id": payload.get("user_id") or payload.get("sub"), 
-            "org_id": payload.get("org_id", "default")}
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user_simple = get_current_principal
 
 class WidgetConfig(BaseModel):
     widget_id: str
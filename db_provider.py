@@ -0,0 +1,212 @@
+"""
+Shared MongoDB Connection Provider
+Owns the single process-wide Motor client so every router and service shares
+one connection pool instead of opening its own.
+
+Pool settings are read from the environment:
+- MONGO_MAX_POOL_SIZE          (default 100)
+- MONGO_MIN_POOL_SIZE          (default 0)
+- MONGO_MAX_IDLE_TIME_MS       (default: driver default, no limit)
+- MONGO_WAIT_QUEUE_TIMEOUT_MS  (default: driver default, no limit)
+- MONGO_SERVER_SELECTION_TIMEOUT_MS (default 5000)
+- MONGO_READ_PREFERENCE        (e.g. primary, primaryPreferred, secondaryPreferred)
+- MONGO_COMPRESSORS            (comma separated, e.g. "zstd,snappy,zlib")
+"""
+import os
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DB_NAME = 'innovate_books_db'
+
+
+def _env_int(name: str, default: Optional[int] = None) -> Optional[int]:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        logger.warning(f"Ignoring non-integer value for {name}: {value!r}")
+        return default
+
+
+def get_client_options() -> Dict[str, Any]:
+    """Build Motor client keyword options from environment variables"""
+    options: Dict[str, Any] = {
+        "maxPoolSize": _env_int("MONGO_MAX_POOL_SIZE", 100),
+        "minPoolSize": _env_int("MONGO_MIN_POOL_SIZE", 0),
+        "serverSelectionTimeoutMS": _env_int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+    }
+
+    max_idle = _env_int("MONGO_MAX_IDLE_TIME_MS")
+    if max_idle is not None:
+        options["maxIdleTimeMS"] = max_idle
+
+    wait_queue_timeout = _env_int("MONGO_WAIT_QUEUE_TIMEOUT_MS")
+    if wait_queue_timeout is not None:
+        options["waitQueueTimeoutMS"] = wait_queue_timeout
+
+    read_preference = os.environ.get("MONGO_READ_PREFERENCE")
+    if read_preference:
+        options["readPreference"] = read_preference
+
+    compressors = os.environ.get("MONGO_COMPRESSORS")
+    if compressors:
+        options["compressors"] = compressors
+
+    return options
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Collects connection pool metrics from driver CMAP events.
+    Checkout wait time is measured per thread, since the driver checks out
+    a connection synchronously on the executor thread that runs the operation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connections_open = 0
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = 0
+            self.checkout_timeouts = 0
+            self.pool_clears = 0
+            self.total_wait_ms = 0.0
+            self.max_wait_ms = 0.0
+
+    def _record_wait(self) -> float:
+        started = getattr(self._local, "started", None)
+        self._local.started = None
+        if started is None:
+            return 0.0
+        return (time.perf_counter() - started) * 1000
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_open += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.connections_open = max(0, self.connections_open - 1)
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._record_wait()
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.checkout_timeouts += 1
+
+    def connection_checked_out(self, event):
+        wait_ms = self._record_wait()
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_wait_ms += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg_wait = self.total_wait_ms / self.checkouts if self.checkouts else 0.0
+            return {
+                "connections_open": self.connections_open,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "checkout_timeouts": self.checkout_timeouts,
+                "pool_clears": self.pool_clears,
+                "avg_wait_ms": round(avg_wait, 3),
+                "max_wait_ms": round(self.max_wait_ms, 3),
+            }
+
+
+pool_metrics = PoolMetricsListener()
+
+_client: Optional[AsyncIOMotorClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> AsyncIOMotorClient:
+    """Get the shared Motor client, creating it on first use"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+                options = get_client_options()
+                _client = AsyncIOMotorClient(
+                    mongo_url,
+                    event_listeners=[pool_metrics],
+                    **options
+                )
+                logger.info(f"MongoDB shared client initialized with options: {options}")
+    return _client
+
+
+def get_db(db_name: Optional[str] = None):
+    """Get a database handle from the shared client (defaults to DB_NAME)"""
+    if db_name is None:
+        db_name = os.environ.get('DB_NAME', DEFAULT_DB_NAME)
+    return get_client()[db_name]
+
+
+def close_client():
+    """Close the shared client (called on application shutdown)"""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Current pool configuration and metrics for diagnostics"""
+    options = get_client_options()
+    return {
+        "initialized": _client is not None,
+        "options": options,
+        "metrics": pool_metrics.snapshot(),
+    }
@@ -5,6 +5,8 @@ Handles demo data creation, management, and removal
 import logging
 from typing import Dict, Any
 
+from report_compiler import touch_report_data
+
 logger = logging.getLogger(__name__)
 
 # Collections that contain demo data
@@ -68,6 +70,7 @@ async def create_demo_data_for_org(org_id: str, db):
             }
         ]
         await db.customers.insert_many(demo_customers)
+        await touch_report_data(db, "customers")
         
         # Demo Leads
         demo_leads = [
@@ -85,6 +88,7 @@ async def create_demo_data_for_org(org_id: str, db):
             }
         ]
         await db.leads.insert_many(demo_leads)
+        await touch_report_data(db, "leads")
         
         # Demo Invoices
         demo_invoices = [
@@ -104,6 +108,7 @@ async def create_demo_data_for_org(org_id: str, db):
             }
         ]
         await db.invoices.insert_many(demo_invoices)
+        await touch_report_data(db, "invoices")
         
         logger.info(f"✅ Demo data created for org: {org_id}")
         
@@ -135,6 +140,8 @@ async def remove_demo_data(org_id: str, db):
                 "is_demo_record": True
             })
             removed_counts[collection_name] = result.deleted_count
+            if result.deleted_count:
+                await touch_report_data(db, collection_name)
         
         logger.info(f"✅ Demo data removed: {removed_counts}")
         
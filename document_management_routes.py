@@ -10,6 +10,7 @@ from pydantic import BaseModel
 import uuid
 import os
 import shutil
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
@@ -20,18 +21,8 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user_simple(credentials = Depends(__import__('fastapi.security', fromlist=['HTTPBearer']).HTTPBearer())):
-    import jwt
-    token = credentials.credentials
-    JWT_SECRET = os.environ.get("JWT_SECRET_KEY")
-    if not JWT_SECRET:
-        raise RuntimeError("JWT_SECRET_KEY is missing in environment")
-
-    payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-    return {
-        "user_id": payload.get("user_id") or payload.get("sub"), 
-        "org_id": payload.get("org_id", "default"), 
-        "full_name": payload.get("full_name", "User")}
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user_simple = get_current_principal
 
 def generate_id(prefix: str) -> str:
     return f"{prefix}-{uuid.uuid4().hex[:8].upper()}"
@@ -0,0 +1,205 @@
+"""
+Email Tracking
+Write-behind open / click counters for email_campaigns_routes.
+
+- The tracking endpoints only append an event to an in-memory ring buffer
+  (EMAIL_TRACKING_BUFFER_SIZE; when full the oldest events are dropped and
+  counted) and answer immediately; the pixel is a preallocated 1x1 GIF.
+- A flusher drains the buffer every EMAIL_TRACKING_FLUSH_MS, or as soon as
+  EMAIL_TRACKING_FLUSH_EVENTS are waiting: one $in read to drop events for
+  unknown recipients, one bulk_write of per-recipient updates (opened /
+  clicked, latest timestamps, click history) and one bulk_write of
+  per-campaign stats.opened / stats.clicked $inc deltas.
+- recipient_id is not unique, so tracking URLs carry the campaign_id and
+  every event is keyed and filtered on (campaign_id, recipient_id). Events
+  from the older recipient-only URLs (emails already delivered) get their
+  campaign in the same read, when exactly one recipient has that id;
+  ambiguous ones are dropped and counted as unresolved.
+- A flush that fails (or is cancelled) puts its events back at the front
+  of the buffer, as far as capacity allows (the overflow counts as
+  dropped), and the next flush retries them; events already written by
+  the failed flush may then be counted twice. Events still buffered when
+  a worker dies are lost; a clean shutdown flushes the buffer.
+"""
+import os
+import asyncio
+import logging
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+EMAIL_TRACKING_FLUSH_MS = int(os.environ.get('EMAIL_TRACKING_FLUSH_MS', '500'))
+EMAIL_TRACKING_FLUSH_EVENTS = int(os.environ.get('EMAIL_TRACKING_FLUSH_EVENTS', '5000'))
+EMAIL_TRACKING_BUFFER_SIZE = int(os.environ.get('EMAIL_TRACKING_BUFFER_SIZE', '200000'))
+
+# Transparent 1x1 GIF89a
+TRACKING_GIF = (
+    b"GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00"
+    b",\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;"
+)
+TRACKING_GIF_HEADERS = {"Cache-Control": "no-store, no-cache, must-revalidate, max-age=0", "Pragma": "no-cache"}
+
+# (kind, campaign_id, recipient_id, url, at); campaign_id is None for the recipient-only URLs
+TrackingEvent = Tuple[str, Optional[str], str, Optional[str], str]
+
+
+class EmailTrackingBuffer:
+    """Ring buffer of tracking events with a background flusher"""
+
+    def __init__(self, capacity: int = EMAIL_TRACKING_BUFFER_SIZE):
+        self._events: Deque[TrackingEvent] = deque(maxlen=capacity)
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._db = None
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.unresolved = 0
+        self.last_flush_at: Optional[str] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "buffered": len(self._events),
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "unresolved": self.unresolved,
+            "last_flush_at": self.last_flush_at,
+        }
+
+    def start(self, db):
+        self._db = db
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await asyncio.shield(self.flush(self._db))
+
+    # ---------- recording ----------
+
+    def record(self, kind: str, campaign_id: Optional[str], recipient_id: str, url: Optional[str] = None):
+        if len(self._events) == self._events.maxlen:
+            self.dropped += 1
+        self._events.append((kind, campaign_id, recipient_id, url, datetime.now(timezone.utc).isoformat()))
+        self.recorded += 1
+        if len(self._events) >= EMAIL_TRACKING_FLUSH_EVENTS:
+            self._full.set()
+
+    def record_open(self, recipient_id: str, campaign_id: Optional[str] = None):
+        self.record("open", campaign_id, recipient_id)
+
+    def record_click(self, recipient_id: str, url: str, campaign_id: Optional[str] = None):
+        self.record("click", campaign_id, recipient_id, url)
+
+    # ---------- flushing ----------
+
+    async def run(self, db):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), EMAIL_TRACKING_FLUSH_MS / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email tracking flush failed: {e}")
+
+    async def flush(self, db) -> int:
+        """Write every buffered event; returns the number of events written"""
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        if not events:
+            return 0
+        try:
+            self.unresolved += await self._write(db, events)
+        except BaseException:
+            self._requeue(events)
+            raise
+        self.flushed += len(events)
+        self.last_flush_at = datetime.now(timezone.utc).isoformat()
+        return len(events)
+
+    def _requeue(self, events: List[TrackingEvent]):
+        """Put a failed flush's events back ahead of the ones recorded since, dropping the oldest on overflow"""
+        room = self._events.maxlen - len(self._events)
+        keep = events[len(events) - room:] if room > 0 else []
+        self.dropped += len(events) - len(keep)
+        self._events.extendleft(reversed(keep))
+
+    async def _write(self, db, events: List[TrackingEvent]) -> int:
+        """One read, then the recipient and campaign bulk_writes; returns the events left unresolved"""
+        scoped = {(campaign_id, recipient_id) for _k, campaign_id, recipient_id, _u, _a in events if campaign_id}
+        legacy = {recipient_id for _k, campaign_id, recipient_id, _u, _a in events if not campaign_id}
+        clauses = []
+        if scoped:
+            clauses.append({"recipient_id": {"$in": list({recipient_id for _c, recipient_id in scoped})},
+                            "campaign_id": {"$in": list({campaign_id for campaign_id, _r in scoped})}})
+        if legacy:
+            clauses.append({"recipient_id": {"$in": list(legacy)}})
+        campaigns: Dict[str, set] = defaultdict(set)
+        for doc in await db.email_recipients.find(
+            {"$or": clauses}, {"_id": 0, "recipient_id": 1, "campaign_id": 1}
+        ).to_list(length=None):
+            campaigns[doc["recipient_id"]].add(doc.get("campaign_id"))
+
+        opens: Dict[Tuple[str, str], str] = {}
+        clicks: Dict[Tuple[str, str], list] = defaultdict(list)
+        deltas: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        unresolved = 0
+        for kind, campaign_id, recipient_id, url, at in events:
+            if not campaign_id:
+                if len(campaigns[recipient_id]) != 1:
+                    unresolved += 1
+                    continue
+                campaign_id = next(iter(campaigns[recipient_id]))
+            elif campaign_id not in campaigns[recipient_id]:
+                continue
+            key = (campaign_id, recipient_id)
+            if kind == "open":
+                opens[key] = at
+            else:
+                clicks[key].append({"url": url, "clicked_at": at})
+            # Every pixel load / click counts, as before
+            deltas[campaign_id]["stats.opened" if kind == "open" else "stats.clicked"] += 1
+
+        recipient_ops = []
+        for key in set(opens) | set(clicks):
+            update: Dict[str, Any] = {"$set": {}}
+            if key in opens:
+                update["$set"].update({"opened": True, "opened_at": opens[key]})
+            if key in clicks:
+                history = clicks[key]
+                update["$set"].update({"clicked": True, "clicked_at": history[-1]["clicked_at"]})
+                update["$push"] = {"click_history": {"$each": history}}
+            campaign_id, recipient_id = key
+            recipient_ops.append(UpdateOne({"campaign_id": campaign_id, "recipient_id": recipient_id}, update))
+
+        campaign_ops = [
+            UpdateOne({"campaign_id": campaign_id}, {"$inc": dict(inc)}) for campaign_id, inc in deltas.items()
+        ]
+
+        if recipient_ops:
+            await db.email_recipients.bulk_write(recipient_ops, ordered=False)
+        if campaign_ops:
+            await db.email_campaigns.bulk_write(campaign_ops, ordered=False)
+        return unresolved
+
+
+email_tracking = EmailTrackingBuffer()
@@ -3,7 +3,7 @@ Enterprise Authentication Routes
 Handles: Login, Refresh Token, Logout
 """
 from fastapi import APIRouter, HTTPException, status, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
 import logging
 from datetime import datetime, timezone
 
@@ -11,12 +11,11 @@ from enterprise_models import (
     EnterpriseLogin, EnterpriseLoginResponse, RefreshTokenRequest
 )
 from enterprise_auth_service import (
-    verify_password, generate_tokens, verify_refresh_token,
+    generate_tokens, verify_refresh_token,
     is_refresh_token_revoked, revoke_refresh_token
 )
+from password_hasher import verify_and_rehash_async
 from enterprise_middleware import verify_token
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
 from log_utils import get_logger
 
 logger = logging.getLogger(__name__)
@@ -24,10 +23,8 @@ auth_logger = get_logger(__name__)
 
 router = APIRouter(prefix="/enterprise/auth", tags=["Enterprise Auth"])
 
-# Direct MongoDB connection (avoid circular import)
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Shared MongoDB connection pool (avoid circular import)
+db = get_shared_db()
 
 def get_db():
     """Get database instance"""
@@ -77,14 +74,22 @@ async def enterprise_login(credentials: EnterpriseLogin, db = Depends(get_db)):
                 detail="Account is inactive. Contact administrator."
             )
         
-        # Verify password
-        if not verify_password(credentials.password, user["password_hash"]):
+        # Verify password (bcrypt runs on the hashing pool, off the event loop)
+        password_valid, upgraded_hash = await verify_and_rehash_async(credentials.password, user["password_hash"])
+        if not password_valid:
             auth_logger.login_failure(credentials.email, reason="invalid_password")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid email or password"
             )
         
+        # Transparently upgrade hashes made with an old bcrypt cost factor
+        if upgraded_hash:
+            await db.enterprise_users.update_one(
+                {"user_id": user["user_id"]},
+                {"$set": {"password_hash": upgraded_hash}}
+            )
+        
         # Get organization (if not super admin)
         org = None
         if not user.get("is_super_admin"):
@@ -2,7 +2,6 @@
 Enterprise Authentication Service
 Handles JWT generation, refresh tokens, password management
 """
-from passlib.context import CryptContext
 import jwt
 import os
 from datetime import datetime, timezone, timedelta
@@ -13,16 +12,6 @@ from auth_utils import create_access_token, create_refresh_token, verify_token
 
 logger = logging.getLogger(__name__)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    return pwd_context.hash(password)
-
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
-
 def verify_refresh_token(token: str) -> Dict[str, Any]:
     """
     Verify refresh token structure and signature
@@ -4,15 +4,15 @@ Handles: Authentication → Tenant Validation → Subscription Guard → RBAC Gu
 """
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
 import jwt
-import os
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, FrozenSet, Union
 import logging
 from dotenv import load_dotenv
 from pathlib import Path
 from auth_utils import verify_token as verify_jwt
+from permission_cache import permission_cache
 
 # Load environment variables
 ROOT_DIR = Path(__file__).parent
@@ -22,10 +22,8 @@ logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
-# Direct MongoDB connection (avoid circular import)
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db_instance = client[os.environ['DB_NAME']]
+# Shared MongoDB connection pool (avoid circular import)
+db_instance = get_shared_db()
 
 def get_db():
     """Get database instance"""
@@ -95,8 +93,8 @@ async def validate_tenant(
             detail="No organization assigned to user"
         )
 
-    # ✅ Fetch org by org_id (your DB has this field)
-    org = await db.organizations.find_one({"org_id": org_id}, {"_id": 0})
+    # ✅ Fetch org by org_id (served from the permission cache when warm)
+    org = await permission_cache.get_org(org_id, db)
 
     if not org or not org.get("is_active", True):
         raise HTTPException(
@@ -191,52 +189,53 @@ def require_active_subscription(
 
 # ==================== RBAC GUARD MIDDLEWARE ====================
 
+# Marker for users whose role grants every permission (super admin / org admin)
+ALL_PERMISSIONS = "*"
+
+async def get_granted_permissions(user_id: str, db) -> Union[str, FrozenSet[str]]:
+    """
+    Resolve the "module.action" names granted to a user via their role
+    Returns: ALL_PERMISSIONS for admins, otherwise a frozenset (empty if unknown)
+    """
+    user = await permission_cache.get_user(user_id, db)
+    if not user:
+        return frozenset()
+    
+    # Super admin has all permissions
+    if user.get("is_super_admin"):
+        return ALL_PERMISSIONS
+    if user.get("role_id") == "admin":
+        return ALL_PERMISSIONS
+    role_id = user.get("role_id")
+    if not role_id:
+        return frozenset()
+    
+    return await permission_cache.get_role_grants(user.get("org_id"), role_id, db)
+
 async def check_permission(
     user_id: str,
     module: str,
     action: str,
-    db
+    db,
+    request: Optional[Request] = None
 ) -> bool:
     """
     Check if user has permission for module.action
+    Grants are resolved once per request (memoized on request.state) and
+    served from the permission cache across requests.
     Returns: True if allowed, False otherwise
     """
     try:
-        # Get user's role
-        user = await db.enterprise_users.find_one({"user_id": user_id}, {"_id": 0})
-        if not user:
-            return False
+        granted = getattr(request.state, "rbac_permissions", None) if request is not None else None
+        if granted is None:
+            granted = await get_granted_permissions(user_id, db)
+            if request is not None:
+                request.state.rbac_permissions = granted
         
-        # Super admin has all permissions
-        if user.get("is_super_admin"):
+        if granted is ALL_PERMISSIONS:
             return True
-        if user.get("role_id") == "admin":
-            return True
-        role_id = user.get("role_id")
-        if not role_id:
-            return False
-        
-        # Find the submodule
-        submodule_name = f"{module}.{action}"
-        submodule = await db.submodules.find_one(
-            {"submodule_name": submodule_name},
-            {"_id": 0}
-        )
-        if not submodule:
-            logger.warning(f"Submodule not found: {submodule_name}")
-            return False
-        
-        # Check if role has permission
-        permission = await db.role_permissions.find_one(
-            {
-                "role_id": role_id,
-                "submodule_id": submodule["submodule_id"],
-                "granted": True
-            },
-            {"_id": 0}
-        )
         
-        return permission is not None
+        return f"{module}.{action}" in granted
         
     except Exception as e:
         logger.error(f"Permission check error: {e}")
@@ -248,6 +247,7 @@ def require_permission(module: str, action: str):
     Usage: @router.get("/customers", dependencies=[Depends(require_permission("customers", "view"))])
     """
     async def permission_checker(
+        request: Request,
         token_payload: Dict[str, Any] = Depends(subscription_guard),
         db = Depends(get_db)
     ):
@@ -257,7 +257,7 @@ def require_permission(module: str, action: str):
         if token_payload.get("is_super_admin"):
             return token_payload
         
-        has_permission = await check_permission(user_id, module, action, db)
+        has_permission = await check_permission(user_id, module, action, db, request)
         
         if not has_permission:
             raise HTTPException(
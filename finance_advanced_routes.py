@@ -3,12 +3,15 @@ Finance Multi-Currency & Bank Reconciliation Module
 Exchange rate management and bank statement reconciliation
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime, timezone
+from collections import defaultdict
 import uuid
-import jwt
 import os
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/ib-finance", tags=["Finance Multi-Currency & Bank"])
 
@@ -20,19 +23,8 @@ def get_db():
     return db
 
 
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {
-            "user_id": payload.get("user_id"),
-            "org_id": payload.get("org_id")
-        }
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 # ==================== MULTI-CURRENCY ====================
@@ -215,9 +207,25 @@ async def get_bank_statements(
     return {"success": True, "data": entries, "count": len(entries)}
 
 
+def _statement_dedup_keys(account_id: str, entries: List[dict]) -> List[str]:
+    """
+    (account, date, amount, reference) per line. Identical lines within one
+    statement get an occurrence suffix, so a re-import of the same file maps
+    onto the same keys while genuine repeats in it are kept.
+    """
+    seen: Dict[str, int] = defaultdict(int)
+    keys = []
+    for entry in entries:
+        amount = round(float(entry.get("credit", 0) or 0) - float(entry.get("debit", 0) or 0), 2)
+        base = f"{account_id}|{entry.get('date')}|{amount}|{entry.get('reference') or ''}"
+        keys.append(f"{base}#{seen[base]}")
+        seen[base] += 1
+    return keys
+
+
 @router.post("/bank/statements/import")
 async def import_bank_statement(data: dict, current_user: dict = Depends(get_current_user)):
-    """Import bank statement entries"""
+    """Import bank statement entries (lines already imported for the account are skipped)"""
     db = get_db()
     org_id = current_user.get("org_id")
     
@@ -227,9 +235,17 @@ async def import_bank_statement(data: dict, current_user: dict = Depends(get_cur
     if not account_id:
         raise HTTPException(status_code=400, detail="account_id required")
     
+    keys = _statement_dedup_keys(account_id, entries)
+    existing = set(await db.fin_bank_statements.distinct(
+        "dedup_key", {"org_id": org_id, "dedup_key": {"$in": keys}}
+    )) if keys else set()
+    
+    now = datetime.now(timezone.utc).isoformat()
     imported = []
-    for entry in entries:
-        stmt_entry = {
+    for entry, key in zip(entries, keys):
+        if key in existing:
+            continue
+        imported.append({
             "entry_id": f"BST-{uuid.uuid4().hex[:8].upper()}",
             "account_id": account_id,
             "transaction_date": entry.get("date"),
@@ -241,14 +257,118 @@ async def import_bank_statement(data: dict, current_user: dict = Depends(get_cur
             "running_balance": entry.get("balance"),
             "status": "unmatched",  # unmatched, matched, reconciled
             "matched_transactions": [],
-            "created_at": datetime.now(timezone.utc).isoformat(),
+            "dedup_key": key,
+            "created_at": now,
             "org_id": org_id
-        }
-        await db.fin_bank_statements.insert_one(stmt_entry)
-        stmt_entry.pop("_id", None)
-        imported.append(stmt_entry)
+        })
+    
+    if imported:
+        # Unique (org_id, dedup_key) index: a concurrent import of the same lines loses here
+        try:
+            await db.fin_bank_statements.insert_many(imported, ordered=False)
+            failed = set()
+        except BulkWriteError as e:
+            failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") == 11000}
+            if len(failed) != len(e.details.get("writeErrors", [])):
+                raise
+        imported = [doc for i, doc in enumerate(imported) if i not in failed]
+        for doc in imported:
+            doc.pop("_id", None)
+    
+    return {
+        "success": True,
+        "data": imported,
+        "count": len(imported),
+        "duplicates_skipped": len(entries) - len(imported)
+    }
+
+
+def _plan_matches(unmatched: List[dict], payments: List[dict], payables: List[dict]) -> List[Tuple[dict, str, dict, float]]:
+    """
+    (entry, kind, counterparty, amount) links from in-memory hash maps:
+    receipts by exact (amount, date), paid payables by exact amount. Each
+    counterparty is used once, oldest first.
+    """
+    payments_by_key = defaultdict(list)
+    for payment in sorted(payments, key=lambda p: str(p.get("payment_id"))):
+        payments_by_key[(payment.get("amount"), str(payment.get("payment_date") or "")[:10])].append(payment)
+    payables_by_amount = defaultdict(list)
+    for payable in sorted(payables, key=lambda p: str(p.get("payable_id"))):
+        payables_by_amount[payable.get("bill_amount")].append(payable)
+    
+    links = []
+    for entry in unmatched:
+        amount = (entry.get("credit_amount") or 0) - (entry.get("debit_amount") or 0)
+        if amount > 0:  # Credit = receipt
+            candidates = payments_by_key.get((amount, str(entry.get("transaction_date") or "")[:10]))
+            if candidates:
+                links.append((entry, "receivable_payment", candidates.pop(0), amount))
+        elif amount < 0:  # Debit = payment
+            candidates = payables_by_amount.get(abs(amount))
+            if candidates:
+                links.append((entry, "payable_payment", candidates.pop(0), abs(amount)))
+    return links
+
+
+async def _commit_matches(db, org_id: str, links: List[Tuple[dict, str, dict, float]]) -> int:
+    """
+    Apply planned links with one bulk_write per collection. Counterparties
+    are claimed first (only while not yet reconciled), then the statement
+    lines of the claims that won (only while still unmatched); claims whose
+    line was taken meanwhile are released. Concurrent runs therefore never
+    reconcile a line or a counterparty twice.
+    """
+    run_id = f"BRM-{uuid.uuid4().hex[:12].upper()}"
+    collections = {
+        "receivable_payment": (db.fin_receivable_payments, "payment_id"),
+        "payable_payment": (db.fin_payables, "payable_id"),
+    }
     
-    return {"success": True, "data": imported, "count": len(imported)}
+    won: Dict[str, Tuple[str, dict, float]] = {}
+    for kind, (collection, id_field) in collections.items():
+        claims = {link[2].get(id_field): link for link in links if link[1] == kind}
+        if not claims:
+            continue
+        await collection.bulk_write([
+            UpdateOne(
+                {"org_id": org_id, id_field: counterparty_id, "reconciled": {"$ne": True}},
+                {"$set": {"reconciled": True, "bank_entry_id": entry["entry_id"], "reconcile_run_id": run_id}}
+            )
+            for counterparty_id, (entry, _, _, _) in claims.items()
+        ], ordered=False)
+        async for doc in collection.find(
+            {"org_id": org_id, id_field: {"$in": list(claims)}, "reconcile_run_id": run_id},
+            {"_id": 0, id_field: 1}
+        ):
+            entry, _, _, amount = claims[doc[id_field]]
+            won[entry["entry_id"]] = (kind, doc[id_field], amount)
+    if not won:
+        return 0
+    
+    await db.fin_bank_statements.bulk_write([
+        UpdateOne(
+            {"org_id": org_id, "entry_id": entry_id, "status": "unmatched"},
+            {"$set": {
+                "status": "matched",
+                "reconcile_run_id": run_id,
+                "matched_transactions": [{"type": kind, "id": counterparty_id, "amount": amount}]
+            }}
+        )
+        for entry_id, (kind, counterparty_id, amount) in won.items()
+    ], ordered=False)
+    matched = set(await db.fin_bank_statements.distinct(
+        "entry_id", {"org_id": org_id, "entry_id": {"$in": list(won)}, "reconcile_run_id": run_id}
+    ))
+    
+    lost = [entry_id for entry_id in won if entry_id not in matched]
+    for kind, (collection, id_field) in collections.items():
+        released = [won[entry_id][1] for entry_id in lost if won[entry_id][0] == kind]
+        if released:
+            await collection.update_many(
+                {"org_id": org_id, id_field: {"$in": released}, "reconcile_run_id": run_id},
+                {"$set": {"reconciled": False}, "$unset": {"bank_entry_id": "", "reconcile_run_id": ""}}
+            )
+    return len(matched)
 
 
 @router.post("/bank/reconcile/auto-match")
@@ -264,68 +384,24 @@ async def auto_match_transactions(data: dict, current_user: dict = Depends(get_c
         "org_id": org_id,
         "account_id": account_id,
         "status": "unmatched"
-    }, {"_id": 0}).to_list(length=500)
+    }, {"_id": 0}).sort("transaction_date", 1).to_list(length=None)
     
-    matched_count = 0
+    # Prefetch every open candidate for the amounts on the statement, once
+    credits = {amount for amount in ((e.get("credit_amount") or 0) - (e.get("debit_amount") or 0) for e in unmatched) if amount > 0}
+    debits = {-amount for amount in ((e.get("credit_amount") or 0) - (e.get("debit_amount") or 0) for e in unmatched) if amount < 0}
+    payments = await db.fin_receivable_payments.find({
+        "org_id": org_id,
+        "amount": {"$in": list(credits)},
+        "reconciled": {"$ne": True}
+    }, {"_id": 0, "payment_id": 1, "amount": 1, "payment_date": 1}).to_list(length=None) if credits else []
+    payables = await db.fin_payables.find({
+        "org_id": org_id,
+        "bill_amount": {"$in": list(debits)},
+        "status": "paid",
+        "reconciled": {"$ne": True}
+    }, {"_id": 0, "payable_id": 1, "bill_amount": 1}).to_list(length=None) if debits else []
     
-    for entry in unmatched:
-        amount = entry.get("credit_amount", 0) - entry.get("debit_amount", 0)
-        
-        # Try to match with receivable payments
-        if amount > 0:  # Credit = receipt
-            rcv_payment = await db.fin_receivable_payments.find_one({
-                "org_id": org_id,
-                "amount": amount,
-                "payment_date": entry.get("transaction_date"),
-                "reconciled": {"$ne": True}
-            })
-            
-            if rcv_payment:
-                await db.fin_bank_statements.update_one(
-                    {"entry_id": entry["entry_id"]},
-                    {"$set": {
-                        "status": "matched",
-                        "matched_transactions": [{
-                            "type": "receivable_payment",
-                            "id": rcv_payment.get("payment_id"),
-                            "amount": amount
-                        }]
-                    }}
-                )
-                await db.fin_receivable_payments.update_one(
-                    {"payment_id": rcv_payment.get("payment_id")},
-                    {"$set": {"reconciled": True, "bank_entry_id": entry["entry_id"]}}
-                )
-                matched_count += 1
-                continue
-        
-        # Try to match with payable payments
-        if amount < 0:  # Debit = payment
-            pay_amount = abs(amount)
-            payable = await db.fin_payables.find_one({
-                "org_id": org_id,
-                "bill_amount": pay_amount,
-                "status": "paid",
-                "reconciled": {"$ne": True}
-            })
-            
-            if payable:
-                await db.fin_bank_statements.update_one(
-                    {"entry_id": entry["entry_id"]},
-                    {"$set": {
-                        "status": "matched",
-                        "matched_transactions": [{
-                            "type": "payable_payment",
-                            "id": payable.get("payable_id"),
-                            "amount": pay_amount
-                        }]
-                    }}
-                )
-                await db.fin_payables.update_one(
-                    {"payable_id": payable.get("payable_id")},
-                    {"$set": {"reconciled": True, "bank_entry_id": entry["entry_id"]}}
-                )
-                matched_count += 1
+    matched_count = await _commit_matches(db, org_id, _plan_matches(unmatched, payments, payables))
     
     return {
         "success": True,
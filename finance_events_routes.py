@@ -3,13 +3,14 @@ Finance Real-Time Notifications & Events
 WebSocket events for period close alerts and finance notifications
 """
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, Header, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
 from typing import Dict, List, Set
 import json
 import asyncio
 from datetime import datetime, timezone
 import jwt
 import os
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/finance-events", tags=["Finance Events"])
 
@@ -160,21 +161,8 @@ async def trigger_period_closed(org_id: str, period: str):
 
 # ==================== REST ENDPOINTS ====================
 
-async def get_current_user(authorization: str = Header(None)):
-    """Extract current user from JWT token"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {
-            "user_id": payload.get("user_id"),
-            "org_id": payload.get("org_id"),
-            "role_id": payload.get("role_id")
-        }
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 @router.get("/notifications")
@@ -278,12 +266,8 @@ async def get_finance_notifications(current_user: dict = Depends(get_current_use
     }
 
 
-@router.post("/check-alerts")
-async def check_and_send_alerts(current_user: dict = Depends(get_current_user)):
-    """Check for alerts and broadcast via WebSocket"""
-    db = get_db()
-    org_id = current_user.get("org_id")
-    
+async def send_overdue_alerts(db, org_id: str) -> int:
+    """Broadcast an alert for every overdue receivable of an org; returns how many"""
     today = datetime.now(timezone.utc)
     alerts_sent = 0
     
@@ -311,6 +295,13 @@ async def check_and_send_alerts(current_user: dict = Depends(get_current_user)):
             days_overdue
         )
         alerts_sent += 1
+    return alerts_sent
+
+
+@router.post("/check-alerts")
+async def check_and_send_alerts(current_user: dict = Depends(get_current_user)):
+    """Check for alerts and broadcast via WebSocket"""
+    alerts_sent = await send_overdue_alerts(get_db(), current_user.get("org_id"))
     
     return {
         "success": True,
@@ -3,12 +3,12 @@ Finance PDF Export Routes
 Generate PDF reports for Financial Statements
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, Depends
 from fastapi.responses import StreamingResponse
 from datetime import datetime, timezone
-import jwt
 import os
 import io
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/ib-finance/export", tags=["Finance Export"])
 
@@ -20,19 +20,8 @@ def get_db():
     return db
 
 
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {
-            "user_id": payload.get("user_id"),
-            "org_id": payload.get("org_id")
-        }
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 def generate_html_statement(title: str, period: str, content: str, org_name: str = "InnovateBooks"):
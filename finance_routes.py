@@ -4,10 +4,11 @@ Handles all finance-related endpoints with multi-tenant support
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 from datetime import datetime, timezone
 from typing import Optional, List
-import os
+from sequence_service import next_id
+from report_compiler import touch_report_data
 
 # Import enterprise middleware
 from enterprise_middleware import (
@@ -20,10 +21,7 @@ from enterprise_middleware import (
 router = APIRouter(prefix="/api/finance", tags=["Finance"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ['DB_NAME']
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+db = get_db()
 
 # ========================
 # CUSTOMERS
@@ -58,13 +56,14 @@ async def create_customer(customer_data: dict, org_id: Optional[str] = Depends(g
     """Create new customer (org-scoped, requires active subscription)"""
     try:
         query = {"org_id": org_id} if org_id else {}
-        customer_data["id"] = f"CUST-{str(await db.customers.count_documents(query) + 1).zfill(4)}"
+        customer_data["id"] = await next_id("CUST", org_id=org_id, seed=lambda: db.customers.count_documents(query))
         customer_data["created_at"] = datetime.now(timezone.utc)
         if org_id:
             customer_data["org_id"] = org_id
         
         # Insert to DB
         result = await db.customers.insert_one(customer_data)
+        await touch_report_data(db, "customers")
         
         # Return without MongoDB _id
         customer_data.pop("_id", None)
@@ -80,6 +79,7 @@ async def update_customer(customer_id: str, customer_data: dict, org_id: Optiona
         if org_id:
             query["org_id"] = org_id
         result = await db.customers.update_one(query, {"$set": customer_data})
+        await touch_report_data(db, "customers")
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Customer not found")
         return {"success": True, "message": "Customer updated"}
@@ -119,7 +119,7 @@ async def create_vendor(vendor_data: dict, org_id: Optional[str] = Depends(get_o
     """Create new vendor (org-scoped, requires active subscription)"""
     try:
         query = {"org_id": org_id} if org_id else {}
-        vendor_data["id"] = f"VEND-{str(await db.vendors.count_documents(query) + 1).zfill(4)}"
+        vendor_data["id"] = await next_id("VEND", org_id=org_id, seed=lambda: db.vendors.count_documents(query))
         vendor_data["created_at"] = datetime.utcnow()
         if org_id:
             vendor_data["org_id"] = org_id
@@ -182,6 +182,7 @@ async def create_invoice(invoice_data: dict, org_id: Optional[str] = Depends(get
             invoice_data["org_id"] = org_id
         invoice_data["created_at"] = datetime.utcnow()
         await db.invoices.insert_one(invoice_data)
+        await touch_report_data(db, "invoices")
         return {"success": True, "invoice": invoice_data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -194,6 +195,7 @@ async def update_invoice(invoice_id: str, invoice_data: dict, org_id: Optional[s
         if org_id:
             query["org_id"] = org_id
         result = await db.invoices.update_one(query, {"$set": invoice_data})
+        await touch_report_data(db, "invoices")
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Invoice not found")
         return {"success": True, "message": "Invoice updated"}
@@ -240,6 +242,7 @@ async def create_bill(bill_data: dict, org_id: Optional[str] = Depends(get_org_s
         if org_id:
             bill_data["org_id"] = org_id
         await db.bills.insert_one(bill_data)
+        await touch_report_data(db, "bills")
         return {"success": True, "bill": bill_data}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -252,6 +255,7 @@ async def update_bill(bill_id: str, bill_data: dict, org_id: Optional[str] = Dep
         if org_id:
             query["org_id"] = org_id
         result = await db.bills.update_one(query, {"$set": bill_data})
+        await touch_report_data(db, "bills")
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Bill not found")
         return {"success": True, "message": "Bill updated"}
@@ -6,15 +6,16 @@ from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
+import asyncio
 import os
-from pymongo import MongoClient
+import time
+from db_provider import get_db
+from sequence_service import next_id, next_timestamped_id
 
 router = APIRouter(prefix="/commerce/governance-engine", tags=["Governance Engine"])
 
-# MongoDB connection
-MONGO_URL = os.environ.get("MONGO_URL")
-client = MongoClient(MONGO_URL)
-db = client[os.environ.get("DB_NAME", "innovatebooks")]
+# MongoDB connection (shared async pool)
+db = get_db()
 
 # Collections
 policies_collection = db["governance_policies"]
@@ -23,6 +24,10 @@ authority_collection = db["governance_authority"]
 risk_rules_collection = db["governance_risk_rules"]
 audit_logs_collection = db["governance_audit_logs"]
 
+# Local rule writes invalidate the rule set immediately; the TTL bounds how
+# long another worker can keep serving a rule set after a change.
+RULESET_TTL_SECONDS = float(os.environ.get("GOVERNANCE_RULESET_TTL_SECONDS", "30"))
+
 # ==================== PYDANTIC MODELS ====================
 
 class PolicyCreate(BaseModel):
@@ -74,6 +79,100 @@ class GovernanceEvaluation(BaseModel):
     risk_score: Optional[int] = None
     department: Optional[str] = None
 
+# ==================== RULE SET ====================
+
+class GovernanceRuleSet:
+    """
+    In-process, version-stamped snapshot of the active governance rules.
+    /evaluate reads from this snapshot; the snapshot is reloaded after a rule
+    change or when the TTL expires. Limit usage is not part of the snapshot:
+    it moves with every deal, so /evaluate reads it fresh (live_limit_usage).
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self.loaded_at = 0.0
+        self.policies: List[dict] = []
+        self.limits: List[dict] = []
+        self.risk_rules: List[dict] = []
+        self.authority_rules: List[dict] = []
+        self._policies_by_scope: Dict[str, List[dict]] = {}
+        self._shared_policies: List[dict] = []
+        self._stale = True
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        """Mark the rule set stale so the next evaluation reloads it"""
+        self._stale = True
+
+    def is_fresh(self) -> bool:
+        return not self._stale and (time.monotonic() - self.loaded_at) < self.ttl_seconds
+
+    def policies_for(self, scope: str) -> List[dict]:
+        """Active policies applying to a context type (its own scope plus 'both')"""
+        return self._policies_by_scope.get(scope, self._shared_policies)
+
+    async def get(self) -> "GovernanceRuleSet":
+        if self.is_fresh():
+            return self
+        async with self._lock:
+            if not self.is_fresh():
+                await self._load()
+        return self
+
+    async def _load(self):
+        # Cleared before reading, so an invalidate() racing the load forces another reload
+        self._stale = False
+        try:
+            policies, limits, risk_rules, authority_rules = await asyncio.gather(
+                policies_collection.find({"active": True}, {"_id": 0}).to_list(length=None),
+                limits_collection.find({"active": True}, {"_id": 0, "current_usage": 0}).to_list(length=None),
+                risk_rules_collection.find({"active": True}, {"_id": 0}).to_list(length=None),
+                authority_collection.find({"active": True}, {"_id": 0}).to_list(length=None)
+            )
+        except Exception:
+            # Keep retrying on the next evaluation rather than serving the old rules until the TTL
+            self._stale = True
+            raise
+
+        scopes = {p.get("scope") for p in policies} - {"both"}
+        self._shared_policies = [p for p in policies if p.get("scope") == "both"]
+        self._policies_by_scope = {
+            scope: [p for p in policies if p.get("scope") in (scope, "both")]
+            for scope in scopes
+        }
+        self.policies = policies
+        self.limits = limits
+        self.risk_rules = risk_rules
+        self.authority_rules = authority_rules
+        self.version += 1
+        self.loaded_at = time.monotonic()
+
+    def summary(self) -> dict:
+        return {
+            "version": self.version,
+            "age_seconds": round(time.monotonic() - self.loaded_at, 1) if self.version else None,
+            "stale": not self.is_fresh(),
+            "policies": len(self.policies),
+            "limits": len(self.limits),
+            "risk_rules": len(self.risk_rules),
+            "authority_rules": len(self.authority_rules)
+        }
+
+governance_rules = GovernanceRuleSet(RULESET_TTL_SECONDS)
+
+
+async def live_limit_usage(limits: List[dict]) -> Dict[str, float]:
+    """Current usage of the given limits, read fresh so every worker enforces the latest figure"""
+    if not limits:
+        return {}
+    docs = await limits_collection.find(
+        {"limit_id": {"$in": [limit["limit_id"] for limit in limits]}},
+        {"_id": 0, "limit_id": 1, "current_usage": 1}
+    ).to_list(length=None)
+    return {doc["limit_id"]: doc.get("current_usage", 0) for doc in docs}
+
 # ==================== HELPER FUNCTIONS ====================
 
 def serialize_doc(doc):
@@ -81,9 +180,9 @@ def serialize_doc(doc):
         del doc["_id"]
     return doc
 
-def log_governance_audit(context_type: str, context_id: str, action: str, decision: dict, actor: str = "system"):
+async def log_governance_audit(context_type: str, context_id: str, action: str, decision: dict, actor: str = "system"):
     """Log governance decision for audit"""
-    audit_logs_collection.insert_one({
+    await audit_logs_collection.insert_one({
         "context_type": context_type,
         "context_id": context_id,
         "action": action,
@@ -123,12 +222,12 @@ def evaluate_policy(policy: dict, context: dict) -> dict:
     
     return result
 
-def evaluate_limit(limit: dict, context: dict) -> dict:
+def evaluate_limit(limit: dict, context: dict, current_usage: Optional[float] = None) -> dict:
     """Evaluate a single limit against context"""
     result = {"limit_id": limit["limit_id"], "limit_name": limit["limit_name"], "passed": True, "message": None}
     
     threshold = limit.get("threshold_value", 0)
-    current = limit.get("current_usage", 0)
+    current = limit.get("current_usage", 0) if current_usage is None else current_usage
     proposed = context.get("deal_value", 0)
     
     post_deal = current + proposed
@@ -143,11 +242,10 @@ def evaluate_limit(limit: dict, context: dict) -> dict:
     
     return result
 
-def resolve_authority(context: dict) -> List[dict]:
-    """Resolve which approvers are required based on context"""
+def resolve_authority(context: dict, rules: List[dict]) -> List[dict]:
+    """Resolve which approvers are required based on context and active authority rules"""
     approvers = []
     
-    rules = list(authority_collection.find({"active": True}, {"_id": 0}))
     deal_value = context.get("deal_value", 0)
     margin = context.get("margin_percent", 100)
     risk_score = context.get("risk_score", 0)
@@ -199,7 +297,7 @@ async def list_policies(scope: Optional[str] = None, active: Optional[bool] = No
     if active is not None:
         query["active"] = active
     
-    policies = list(policies_collection.find(query, {"_id": 0}))
+    policies = await policies_collection.find(query, {"_id": 0}).to_list(length=None)
     stats = {
         "total": len(policies),
         "active": len([p for p in policies if p.get("active")]),
@@ -211,8 +309,7 @@ async def list_policies(scope: Optional[str] = None, active: Optional[bool] = No
 @router.post("/policies")
 async def create_policy(policy: PolicyCreate):
     """Create a new policy"""
-    count = policies_collection.count_documents({}) + 1
-    policy_id = f"POL-{count:04d}"
+    policy_id = await next_id("POL", seed=lambda: policies_collection.count_documents({}))
     
     policy_doc = {
         **policy.dict(),
@@ -221,13 +318,14 @@ async def create_policy(policy: PolicyCreate):
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    policies_collection.insert_one(policy_doc)
+    await policies_collection.insert_one(policy_doc)
+    governance_rules.invalidate()
     return {"success": True, "policy_id": policy_id}
 
 @router.get("/policies/{policy_id}")
 async def get_policy(policy_id: str):
     """Get policy details"""
-    policy = policies_collection.find_one({"policy_id": policy_id}, {"_id": 0})
+    policy = await policies_collection.find_one({"policy_id": policy_id}, {"_id": 0})
     if not policy:
         raise HTTPException(status_code=404, detail="Policy not found")
     return {"success": True, "policy": policy}
@@ -235,23 +333,25 @@ async def get_policy(policy_id: str):
 @router.put("/policies/{policy_id}")
 async def update_policy(policy_id: str, policy: PolicyCreate):
     """Update a policy"""
-    result = policies_collection.update_one(
+    result = await policies_collection.update_one(
         {"policy_id": policy_id},
         {"$set": {**policy.dict(), "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Policy not found")
+    governance_rules.invalidate()
     return {"success": True, "message": "Policy updated"}
 
 @router.delete("/policies/{policy_id}")
 async def delete_policy(policy_id: str):
     """Deactivate a policy"""
-    result = policies_collection.update_one(
+    result = await policies_collection.update_one(
         {"policy_id": policy_id},
         {"$set": {"active": False, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Policy not found")
+    governance_rules.invalidate()
     return {"success": True, "message": "Policy deactivated"}
 
 # ==================== LIMITS CRUD ====================
@@ -265,7 +365,7 @@ async def list_limits(scope: Optional[str] = None, limit_type: Optional[str] = N
     if limit_type:
         query["limit_type"] = limit_type
     
-    limits = list(limits_collection.find(query, {"_id": 0}))
+    limits = await limits_collection.find(query, {"_id": 0}).to_list(length=None)
     
     # Calculate utilization for each limit
     for limit in limits:
@@ -278,8 +378,7 @@ async def list_limits(scope: Optional[str] = None, limit_type: Optional[str] = N
 @router.post("/limits")
 async def create_limit(limit: LimitCreate):
     """Create a new limit"""
-    count = limits_collection.count_documents({}) + 1
-    limit_id = f"LIM-{count:04d}"
+    limit_id = await next_id("LIM", seed=lambda: limits_collection.count_documents({}))
     
     limit_doc = {
         **limit.dict(),
@@ -288,13 +387,14 @@ async def create_limit(limit: LimitCreate):
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    limits_collection.insert_one(limit_doc)
+    await limits_collection.insert_one(limit_doc)
+    governance_rules.invalidate()
     return {"success": True, "limit_id": limit_id}
 
 @router.get("/limits/{limit_id}")
 async def get_limit(limit_id: str):
     """Get limit details"""
-    limit = limits_collection.find_one({"limit_id": limit_id}, {"_id": 0})
+    limit = await limits_collection.find_one({"limit_id": limit_id}, {"_id": 0})
     if not limit:
         raise HTTPException(status_code=404, detail="Limit not found")
     return {"success": True, "limit": limit}
@@ -302,23 +402,25 @@ async def get_limit(limit_id: str):
 @router.put("/limits/{limit_id}")
 async def update_limit(limit_id: str, limit: LimitCreate):
     """Update a limit"""
-    result = limits_collection.update_one(
+    result = await limits_collection.update_one(
         {"limit_id": limit_id},
         {"$set": {**limit.dict(), "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Limit not found")
+    governance_rules.invalidate()
     return {"success": True, "message": "Limit updated"}
 
 @router.post("/limits/{limit_id}/update-usage")
 async def update_limit_usage(limit_id: str, amount: float):
     """Update limit usage"""
-    result = limits_collection.update_one(
+    result = await limits_collection.update_one(
         {"limit_id": limit_id},
         {"$inc": {"current_usage": amount}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Limit not found")
+    # Usage is read live by /evaluate; the cached rule set holds no usage
     return {"success": True, "message": "Usage updated"}
 
 # ==================== AUTHORITY CRUD ====================
@@ -330,14 +432,13 @@ async def list_authority_rules(scope: Optional[str] = None):
     if scope:
         query["$or"] = [{"scope": scope}, {"scope": "both"}]
     
-    rules = list(authority_collection.find(query, {"_id": 0}))
+    rules = await authority_collection.find(query, {"_id": 0}).to_list(length=None)
     return {"success": True, "authority_rules": rules}
 
 @router.post("/authority")
 async def create_authority_rule(authority: AuthorityCreate):
     """Create a new authority rule"""
-    count = authority_collection.count_documents({}) + 1
-    authority_id = f"AUTH-{count:04d}"
+    authority_id = await next_id("AUTH", seed=lambda: authority_collection.count_documents({}))
     
     authority_doc = {
         **authority.dict(),
@@ -346,13 +447,14 @@ async def create_authority_rule(authority: AuthorityCreate):
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    authority_collection.insert_one(authority_doc)
+    await authority_collection.insert_one(authority_doc)
+    governance_rules.invalidate()
     return {"success": True, "authority_id": authority_id}
 
 @router.get("/authority/{authority_id}")
 async def get_authority_rule(authority_id: str):
     """Get authority rule details"""
-    rule = authority_collection.find_one({"authority_id": authority_id}, {"_id": 0})
+    rule = await authority_collection.find_one({"authority_id": authority_id}, {"_id": 0})
     if not rule:
         raise HTTPException(status_code=404, detail="Authority rule not found")
     return {"success": True, "authority_rule": rule}
@@ -360,12 +462,13 @@ async def get_authority_rule(authority_id: str):
 @router.put("/authority/{authority_id}")
 async def update_authority_rule(authority_id: str, authority: AuthorityCreate):
     """Update an authority rule"""
-    result = authority_collection.update_one(
+    result = await authority_collection.update_one(
         {"authority_id": authority_id},
         {"$set": {**authority.dict(), "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Authority rule not found")
+    governance_rules.invalidate()
     return {"success": True, "message": "Authority rule updated"}
 
 # ==================== RISK RULES ====================
@@ -373,14 +476,13 @@ async def update_authority_rule(authority_id: str, authority: AuthorityCreate):
 @router.get("/risk-rules")
 async def list_risk_rules():
     """List all risk rules"""
-    rules = list(risk_rules_collection.find({}, {"_id": 0}))
+    rules = await risk_rules_collection.find({}, {"_id": 0}).to_list(length=None)
     return {"success": True, "risk_rules": rules}
 
 @router.post("/risk-rules")
 async def create_risk_rule(rule: RiskRuleCreate):
     """Create a new risk rule"""
-    count = risk_rules_collection.count_documents({}) + 1
-    rule_id = f"RISK-{count:04d}"
+    rule_id = await next_id("RISK", seed=lambda: risk_rules_collection.count_documents({}))
     
     rule_doc = {
         **rule.dict(),
@@ -388,7 +490,8 @@ async def create_risk_rule(rule: RiskRuleCreate):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
-    risk_rules_collection.insert_one(rule_doc)
+    await risk_rules_collection.insert_one(rule_doc)
+    governance_rules.invalidate()
     return {"success": True, "rule_id": rule_id}
 
 # ==================== AUDIT LOGS ====================
@@ -407,8 +510,8 @@ async def list_audit_logs(
     if context_id:
         query["context_id"] = context_id
     
-    logs = list(audit_logs_collection.find(query, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(limit))
-    total = audit_logs_collection.count_documents(query)
+    logs = await audit_logs_collection.find(query, {"_id": 0}).sort("timestamp", -1).skip(skip).limit(limit).to_list(length=limit)
+    total = await audit_logs_collection.count_documents(query)
     return {"success": True, "audit_logs": logs, "total": total}
 
 # ==================== GOVERNANCE EVALUATION ENGINE ====================
@@ -418,8 +521,11 @@ async def evaluate_governance(evaluation: GovernanceEvaluation):
     """
     Main Governance Engine - Evaluates policies, limits, risk, and resolves authority
     Returns decision on whether to proceed, block, or require approval
+    Rules come from the in-process rule set; the only reads are live limit usage.
     """
     context = evaluation.dict()
+    rules = await governance_rules.get()
+    usage = await live_limit_usage(rules.limits)
     
     result = {
         "allowed": True,
@@ -429,16 +535,12 @@ async def evaluate_governance(evaluation: GovernanceEvaluation):
         "warnings": [],
         "policy_results": [],
         "limit_results": [],
-        "audit_reference": None
+        "audit_reference": None,
+        "ruleset_version": rules.version
     }
     
-    # 1. POLICY EVALUATION
-    policies = list(policies_collection.find({"active": True}, {"_id": 0}))
-    for policy in policies:
-        # Check scope matches
-        if policy["scope"] != "both" and policy["scope"] != evaluation.context_type:
-            continue
-        
+    # 1. POLICY EVALUATION (rule set is pre-bucketed by scope)
+    for policy in rules.policies_for(evaluation.context_type):
         policy_result = evaluate_policy(policy, context)
         result["policy_results"].append(policy_result)
         
@@ -450,9 +552,8 @@ async def evaluate_governance(evaluation: GovernanceEvaluation):
                 result["soft_blocks"].append(policy_result["message"])
     
     # 2. LIMIT EVALUATION
-    limits = list(limits_collection.find({"active": True}, {"_id": 0}))
-    for limit in limits:
-        limit_result = evaluate_limit(limit, context)
+    for limit in rules.limits:
+        limit_result = evaluate_limit(limit, context, usage.get(limit["limit_id"], 0))
         result["limit_results"].append(limit_result)
         
         if not limit_result["passed"]:
@@ -464,8 +565,7 @@ async def evaluate_governance(evaluation: GovernanceEvaluation):
     
     # 3. RISK EVALUATION
     risk_score = evaluation.risk_score or 0
-    risk_rules = list(risk_rules_collection.find({"active": True}, {"_id": 0}))
-    for rule in risk_rules:
+    for rule in rules.risk_rules:
         if risk_score >= rule["threshold"]:
             if rule["enforcement_type"] == "HARD":
                 result["hard_blocks"].append(f"Risk score ({risk_score}) exceeds hard threshold ({rule['threshold']})")
@@ -480,7 +580,7 @@ async def evaluate_governance(evaluation: GovernanceEvaluation):
     
     # 4. AUTHORITY RESOLUTION
     if result["soft_blocks"] or evaluation.deal_value > 100000:  # Example threshold
-        authority_approvers = resolve_authority(context)
+        authority_approvers = resolve_authority(context, rules.authority_rules)
         for approver in authority_approvers:
             result["approvals_required"].append({
                 "role": approver["approver_role"],
@@ -489,8 +589,8 @@ async def evaluate_governance(evaluation: GovernanceEvaluation):
             })
     
     # 5. AUDIT LOGGING
-    audit_ref = f"GOV-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}"
-    log_governance_audit(
+    audit_ref = await next_timestamped_id("GOV")
+    await log_governance_audit(
         evaluation.context_type,
         evaluation.context_id,
         "governance_evaluation",
@@ -501,6 +601,18 @@ async def evaluate_governance(evaluation: GovernanceEvaluation):
     
     return {"success": True, "governance_decision": result}
 
+@router.get("/ruleset")
+async def get_ruleset_status():
+    """Version and size of the in-process rule set used by /evaluate"""
+    return {"success": True, "ruleset": governance_rules.summary()}
+
+@router.post("/ruleset/refresh")
+async def refresh_ruleset():
+    """Force a reload of the in-process rule set"""
+    governance_rules.invalidate()
+    rules = await governance_rules.get()
+    return {"success": True, "ruleset": rules.summary()}
+
 # ==================== SEED DATA ====================
 
 @router.post("/seed-governance")
@@ -518,8 +630,8 @@ async def seed_governance():
     
     for i, policy in enumerate(sample_policies):
         policy_id = f"POL-{i+1:04d}"
-        if not policies_collection.find_one({"policy_id": policy_id}):
-            policies_collection.insert_one({**policy, "policy_id": policy_id, "created_at": datetime.now(timezone.utc).isoformat()})
+        if not await policies_collection.find_one({"policy_id": policy_id}):
+            await policies_collection.insert_one({**policy, "policy_id": policy_id, "created_at": datetime.now(timezone.utc).isoformat()})
     
     # Seed Limits
     sample_limits = [
@@ -531,8 +643,8 @@ async def seed_governance():
     
     for i, limit in enumerate(sample_limits):
         limit_id = f"LIM-{i+1:04d}"
-        if not limits_collection.find_one({"limit_id": limit_id}):
-            limits_collection.insert_one({**limit, "limit_id": limit_id, "created_at": datetime.now(timezone.utc).isoformat()})
+        if not await limits_collection.find_one({"limit_id": limit_id}):
+            await limits_collection.insert_one({**limit, "limit_id": limit_id, "created_at": datetime.now(timezone.utc).isoformat()})
     
     # Seed Authority Rules
     sample_authority = [
@@ -544,8 +656,8 @@ async def seed_governance():
     
     for i, auth in enumerate(sample_authority):
         auth_id = f"AUTH-{i+1:04d}"
-        if not authority_collection.find_one({"authority_id": auth_id}):
-            authority_collection.insert_one({**auth, "authority_id": auth_id, "created_at": datetime.now(timezone.utc).isoformat()})
+        if not await authority_collection.find_one({"authority_id": auth_id}):
+            await authority_collection.insert_one({**auth, "authority_id": auth_id, "created_at": datetime.now(timezone.utc).isoformat()})
     
     # Seed Risk Rules
     sample_risk_rules = [
@@ -556,7 +668,8 @@ async def seed_governance():
     
     for i, rule in enumerate(sample_risk_rules):
         rule_id = f"RISK-{i+1:04d}"
-        if not risk_rules_collection.find_one({"rule_id": rule_id}):
-            risk_rules_collection.insert_one({**rule, "rule_id": rule_id, "created_at": datetime.now(timezone.utc).isoformat()})
+        if not await risk_rules_collection.find_one({"rule_id": rule_id}):
+            await risk_rules_collection.insert_one({**rule, "rule_id": rule_id, "created_at": datetime.now(timezone.utc).isoformat()})
     
+    governance_rules.invalidate()
     return {"success": True, "message": "Governance data seeded"}
@@ -0,0 +1,264 @@
+"""
+IB Finance - Period Balance Buckets
+Per-account, per-day debit / credit totals written when a journal is posted,
+so trial balance and statements can answer for any as-of date or period
+range by summing buckets instead of replaying fin_journals.
+
+Collection `fin_balance_buckets`, one document per (org_id, account_id, day):
+- period      "YYYY-MM-DD" (journal_date day)
+- month       "YYYY-MM"
+- debit       total debit_amount posted to the account that day
+- credit      total credit_amount posted to the account that day
+- line_count  journal lines folded in
+
+Buckets hold raw debits / credits; the natural balance sign is applied at
+read time from the account type. Account balances that predate any journal
+(seeded or migrated `fin_accounts.balance` values) are carried as an implied
+opening balance: the balance counter minus all bucketed movement.
+
+verify_balance_buckets() re-derives the buckets from posted journals and
+reports differences; rebuild_balance_buckets() rewrites them.
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = "fin_balance_buckets"
+
+# Assets & Expenses increase with debits; Liabilities, Equity & Revenue with credits
+DEBIT_NORMAL_TYPES = ("asset", "expense")
+
+_DAY_EXPR = {"$substrCP": [{"$toString": "$journal_date"}, 0, 10]}
+
+
+def day_key(value: Any) -> Optional[str]:
+    """'YYYY-MM-DD' for an ISO date string or datetime"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10] or None
+
+
+def natural_balance(account_type: Optional[str], debit: float, credit: float) -> float:
+    """Signed balance in the account's normal direction"""
+    if account_type in DEBIT_NORMAL_TYPES:
+        return debit - credit
+    return credit - debit
+
+
+def period_range(period: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """
+    (first day, last day) for 'YYYY', 'YYYY-Qn', 'YYYY-MM' or 'YYYY-MM-DD'.
+    Returns (None, None) when no period is given.
+    """
+    if not period:
+        return None, None
+    period = period.strip().upper()
+    try:
+        if len(period) == 4:
+            int(period)
+            return f"{period}-01-01", f"{period}-12-31"
+        if "-Q" in period:
+            year, quarter = period.split("-Q")
+            quarter = int(quarter)
+            if not 1 <= quarter <= 4:
+                raise ValueError(period)
+            start_month = (quarter - 1) * 3 + 1
+            return f"{int(year):04d}-{start_month:02d}-01", f"{int(year):04d}-{start_month + 2:02d}-31"
+        if len(period) == 7:
+            datetime.strptime(period, "%Y-%m")
+            return f"{period}-01", f"{period}-31"
+        if len(period) == 10:
+            datetime.strptime(period, "%Y-%m-%d")
+            return period, period
+    except ValueError:
+        pass
+    raise ValueError(f"Unrecognised period '{period}' (use YYYY, YYYY-Qn, YYYY-MM or YYYY-MM-DD)")
+
+
+# ==================== POSTING ====================
+
+def _line_deltas(journal: dict) -> Dict[Tuple[str, str], List[float]]:
+    """(account_id, day) -> [debit, credit, line_count] for one journal"""
+    day = day_key(journal.get("journal_date"))
+    deltas: Dict[Tuple[str, str], List[float]] = {}
+    if not day:
+        return deltas
+    for line in journal.get("lines", []):
+        account_id = line.get("account_id")
+        if not account_id:
+            continue
+        entry = deltas.setdefault((account_id, day), [0.0, 0.0, 0])
+        entry[0] += line.get("debit_amount", 0) or 0
+        entry[1] += line.get("credit_amount", 0) or 0
+        entry[2] += 1
+    return deltas
+
+
+async def record_journal(db, journal: dict, sign: int = 1):
+    """Fold a posted journal's lines into the buckets (sign=-1 removes them)"""
+    org_id = journal.get("org_id")
+    deltas = _line_deltas(journal)
+    if not deltas:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    await db[BUCKETS].bulk_write([
+        UpdateOne(
+            {"org_id": org_id, "account_id": account_id, "period": day},
+            {
+                "$inc": {"debit": sign * debit, "credit": sign * credit, "line_count": sign * count},
+                "$set": {"month": day[:7], "updated_at": now}
+            },
+            upsert=True
+        )
+        for (account_id, day), (debit, credit, count) in deltas.items()
+    ], ordered=False)
+
+
+async def drop_org_buckets(db, org_id: str):
+    await db[BUCKETS].delete_many({"org_id": org_id})
+
+
+# ==================== READS ====================
+
+async def bucket_totals(
+    db,
+    org_id: str,
+    start_day: Optional[str] = None,
+    end_day: Optional[str] = None
+) -> Dict[str, Dict[str, float]]:
+    """account_id -> {"debit", "credit"} summed over buckets in [start_day, end_day]"""
+    match: Dict[str, Any] = {"org_id": org_id}
+    period_filter: Dict[str, str] = {}
+    if start_day:
+        period_filter["$gte"] = start_day
+    if end_day:
+        period_filter["$lte"] = end_day
+    if period_filter:
+        match["period"] = period_filter
+
+    rows = await db[BUCKETS].aggregate([
+        {"$match": match},
+        {"$group": {"_id": "$account_id", "debit": {"$sum": "$debit"}, "credit": {"$sum": "$credit"}}}
+    ]).to_list(None)
+    return {row["_id"]: {"debit": row["debit"], "credit": row["credit"]} for row in rows}
+
+
+async def account_balances(
+    db,
+    org_id: str,
+    as_of_date: Optional[str] = None,
+    start_date: Optional[str] = None,
+    account_types: Optional[Iterable[str]] = None
+) -> List[dict]:
+    """
+    Active accounts with `balance` replaced by the natural balance as of
+    `as_of_date` (inclusive). With `start_date`, only movement inside
+    [start_date, as_of_date] is counted (P&L style); otherwise the implied
+    opening balance is included (balance sheet / trial balance style).
+    """
+    query: Dict[str, Any] = {"org_id": org_id, "is_active": True}
+    if account_types:
+        query["account_type"] = {"$in": list(account_types)}
+    accounts = await db.fin_accounts.find(query, {"_id": 0}).sort("account_code", 1).to_list(length=1000)
+
+    end_day = day_key(as_of_date)
+    lifetime = await bucket_totals(db, org_id)
+    if start_date:
+        window = await bucket_totals(db, org_id, day_key(start_date), end_day)
+    else:
+        window = await bucket_totals(db, org_id, None, end_day) if end_day else lifetime
+
+    for account in accounts:
+        account_type = account.get("account_type")
+        totals = window.get(account["account_id"], {"debit": 0, "credit": 0})
+        movement = natural_balance(account_type, totals["debit"], totals["credit"])
+        if start_date:
+            account["balance"] = round(movement, 2)
+            continue
+        all_time = lifetime.get(account["account_id"], {"debit": 0, "credit": 0})
+        opening = (account.get("balance", 0) or 0) - natural_balance(account_type, all_time["debit"], all_time["credit"])
+        account["opening_balance"] = round(opening, 2)
+        account["balance"] = round(opening + movement, 2)
+    return accounts
+
+
+# ==================== CONSISTENCY ====================
+
+async def _derive_from_journals(db, org_id: Optional[str] = None) -> Dict[Tuple, List[float]]:
+    """(org_id, account_id, day) -> [debit, credit, line_count] from posted journals"""
+    match: Dict[str, Any] = {"status": "posted", "journal_date": {"$ne": None}}
+    if org_id:
+        match["org_id"] = org_id
+    rows = await db.fin_journals.aggregate([
+        {"$match": match},
+        {"$unwind": "$lines"},
+        {"$group": {
+            "_id": {"org_id": "$org_id", "account_id": "$lines.account_id", "period": _DAY_EXPR},
+            "debit": {"$sum": {"$ifNull": ["$lines.debit_amount", 0]}},
+            "credit": {"$sum": {"$ifNull": ["$lines.credit_amount", 0]}},
+            "line_count": {"$sum": 1}
+        }}
+    ]).to_list(None)
+    return {
+        (row["_id"].get("org_id"), row["_id"].get("account_id"), row["_id"]["period"]):
+            [row["debit"], row["credit"], row["line_count"]]
+        for row in rows
+        if row["_id"].get("account_id")
+    }
+
+
+async def verify_balance_buckets(db, org_id: Optional[str] = None, tolerance: float = 0.01) -> Dict[str, Any]:
+    """Compare stored buckets with buckets re-derived from posted journals"""
+    expected = await _derive_from_journals(db, org_id)
+    query = {"org_id": org_id} if org_id else {}
+    stored = {
+        (doc.get("org_id"), doc.get("account_id"), doc.get("period")):
+            [doc.get("debit", 0), doc.get("credit", 0), doc.get("line_count", 0)]
+        for doc in await db[BUCKETS].find(query, {"_id": 0}).to_list(None)
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored), key=lambda k: tuple(str(p) for p in k)):
+        want = expected.get(key, [0, 0, 0])
+        have = stored.get(key, [0, 0, 0])
+        if abs(want[0] - have[0]) > tolerance or abs(want[1] - have[1]) > tolerance or want[2] != have[2]:
+            mismatches.append({
+                "org_id": key[0],
+                "account_id": key[1],
+                "period": key[2],
+                "expected": {"debit": want[0], "credit": want[1], "line_count": want[2]},
+                "stored": {"debit": have[0], "credit": have[1], "line_count": have[2]}
+            })
+
+    return {
+        "consistent": not mismatches,
+        "buckets_expected": len(expected),
+        "buckets_stored": len(stored),
+        "mismatches": mismatches[:500],
+        "mismatch_count": len(mismatches),
+        "checked_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+async def rebuild_balance_buckets(db, org_id: Optional[str] = None) -> Dict[str, Any]:
+    """Rewrite buckets from posted journals (one org, or all when org_id is None)"""
+    expected = await _derive_from_journals(db, org_id)
+    now = datetime.now(timezone.utc).isoformat()
+    documents = [
+        {
+            "org_id": key_org, "account_id": account_id, "period": day, "month": day[:7],
+            "debit": debit, "credit": credit, "line_count": count, "updated_at": now
+        }
+        for (key_org, account_id, day), (debit, credit, count) in expected.items()
+    ]
+    await db[BUCKETS].delete_many({"org_id": org_id} if org_id else {})
+    if documents:
+        await db[BUCKETS].insert_many(documents)
+    logger.info(f"Rebuilt {len(documents)} IB Finance balance buckets (org={org_id or 'all'})")
+    return {"buckets": len(documents), "built_at": now}
@@ -6,6 +6,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import Optional
 from datetime import datetime, timezone
 import uuid
+from sequence_service import next_id
+from gst_returns import touch_gst_data
 from . import get_db, get_current_user
 
 router = APIRouter(tags=["IB Finance - Billing"])
@@ -68,6 +70,7 @@ async def create_billing_record(data: dict, current_user: dict = Depends(get_cur
         "org_id": current_user.get("org_id")
     }
     await db.fin_billing_records.insert_one(billing_record)
+    await touch_gst_data(db, current_user.get("org_id"))
     billing_record.pop("_id", None)
     return {"success": True, "data": billing_record}
 
@@ -86,6 +89,7 @@ async def update_billing_record(billing_id: str, data: dict, current_user: dict
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Billing record not found or cannot be updated")
+    await touch_gst_data(db, current_user.get("org_id"))
     
     updated = await db.fin_billing_records.find_one({"billing_id": billing_id}, {"_id": 0})
     return {"success": True, "data": updated}
@@ -105,6 +109,7 @@ async def approve_billing(billing_id: str, current_user: dict = Depends(get_curr
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Billing record not found or already processed")
+    await touch_gst_data(db, current_user.get("org_id"))
     return {"success": True, "message": "Billing record approved"}
 
 
@@ -120,8 +125,12 @@ async def issue_billing(billing_id: str, current_user: dict = Depends(get_curren
     if not record or record.get("status") != "approved":
         raise HTTPException(status_code=400, detail="Billing must be approved before issuing")
     
-    count = await db.fin_billing_records.count_documents({"org_id": current_user.get("org_id"), "invoice_number": {"$exists": True}})
-    invoice_number = f"INV-{datetime.now().strftime('%Y%m')}-{str(count + 1).zfill(4)}"
+    org_id = current_user.get("org_id")
+    invoice_number = await next_id(
+        "INV", org_id=org_id, period=datetime.now().strftime('%Y%m'),
+        seed=lambda: db.fin_billing_records.count_documents({"org_id": org_id, "invoice_number": {"$exists": True}}),
+        db=db
+    )
     
     await db.fin_billing_records.update_one(
         {"billing_id": billing_id},
@@ -132,6 +141,7 @@ async def issue_billing(billing_id: str, current_user: dict = Depends(get_curren
             "issued_by": current_user.get("user_id")
         }}
     )
+    await touch_gst_data(db, current_user.get("org_id"))
     
     receivable = {
         "receivable_id": f"RCV-{uuid.uuid4().hex[:8].upper()}",
@@ -169,6 +179,7 @@ async def cancel_billing(billing_id: str, data: dict, current_user: dict = Depen
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Billing record not found or cannot be cancelled")
+    await touch_gst_data(db, current_user.get("org_id"))
     return {"success": True, "message": "Billing record cancelled"}
 
 
@@ -181,6 +192,7 @@ async def delete_billing(billing_id: str, current_user: dict = Depends(get_curre
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Billing record not found or cannot be deleted")
+    await touch_gst_data(db, current_user.get("org_id"))
     return {"success": True, "message": "Billing record deleted"}
 
 
@@ -238,5 +250,6 @@ async def create_billing_with_tax(data: dict, current_user: dict = Depends(get_c
         "org_id": current_user.get("org_id")
     }
     await db.fin_tax_transactions.insert_one(tax_txn)
+    await touch_gst_data(db, current_user.get("org_id"))
     
     return {"success": True, "data": billing_record, "tax_transaction": tax_txn["tax_txn_id"]}
@@ -6,7 +6,9 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import Optional
 from datetime import datetime, timezone
 import uuid
+from pymongo import UpdateOne
 from . import get_db, get_current_user
+from .balances import natural_balance, record_journal, account_balances, verify_balance_buckets, rebuild_balance_buckets
 
 router = APIRouter(tags=["IB Finance - Ledger"])
 
@@ -165,36 +167,42 @@ async def post_journal(journal_id: str, current_user: dict = Depends(get_current
     if not journal or journal.get("status") != "draft":
         raise HTTPException(status_code=400, detail="Journal not found or already posted")
     
-    # Update account balances
-    for line in journal.get("lines", []):
-        account_id = line.get("account_id")
-        debit = line.get("debit_amount", 0)
-        credit = line.get("credit_amount", 0)
-        
-        account = await db.fin_accounts.find_one({"account_id": account_id}, {"_id": 0})
-        if account:
-            account_type = account.get("account_type")
-            # Assets & Expenses increase with debits
-            # Liabilities, Equity & Revenue increase with credits
-            if account_type in ["asset", "expense"]:
-                balance_change = debit - credit
-            else:
-                balance_change = credit - debit
-            
-            await db.fin_accounts.update_one(
-                {"account_id": account_id},
-                {"$inc": {"balance": balance_change}}
-            )
-    
-    # Update journal status
-    await db.fin_journals.update_one(
-        {"journal_id": journal_id},
+    # Claim the draft -> posted transition first so a double submit cannot apply twice
+    claimed = await db.fin_journals.update_one(
+        {"journal_id": journal_id, "status": "draft"},
         {"$set": {
             "status": "posted",
             "posted_by": current_user.get("user_id"),
             "posted_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    if claimed.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Journal not found or already posted")
+    
+    # Update account balances (one bulk write) and the per-period balance buckets
+    lines = journal.get("lines", [])
+    account_ids = list({line.get("account_id") for line in lines if line.get("account_id")})
+    accounts = await db.fin_accounts.find(
+        {"account_id": {"$in": account_ids}},
+        {"_id": 0, "account_id": 1, "account_type": 1}
+    ).to_list(length=None)
+    account_types = {a["account_id"]: a.get("account_type") for a in accounts}
+    
+    balance_changes = {}
+    for line in lines:
+        account_id = line.get("account_id")
+        if account_id not in account_types:
+            continue
+        balance_changes[account_id] = balance_changes.get(account_id, 0) + natural_balance(
+            account_types[account_id], line.get("debit_amount", 0), line.get("credit_amount", 0)
+        )
+    if balance_changes:
+        await db.fin_accounts.bulk_write([
+            UpdateOne({"account_id": account_id}, {"$inc": {"balance": change}})
+            for account_id, change in balance_changes.items()
+        ], ordered=False)
+    
+    await record_journal(db, journal)
     
     return {"success": True, "message": "Journal posted successfully"}
 
@@ -261,13 +269,10 @@ async def get_trial_balance(
     as_of_date: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get trial balance"""
+    """Get trial balance as of a date (defaults to all posted activity)"""
     db = get_db()
     
-    accounts = await db.fin_accounts.find(
-        {"org_id": current_user.get("org_id"), "is_active": True},
-        {"_id": 0}
-    ).to_list(length=1000)
+    accounts = await account_balances(db, current_user.get("org_id"), as_of_date=as_of_date)
     
     trial_balance = []
     total_debit = 0
@@ -306,3 +311,19 @@ async def get_trial_balance(
             "is_balanced": abs(total_debit - total_credit) < 0.01
         }
     }
+
+
+@router.get("/ledger/balance-buckets/verify")
+async def verify_buckets(current_user: dict = Depends(get_current_user)):
+    """Re-derive the period balance buckets from posted journals and report drift"""
+    db = get_db()
+    result = await verify_balance_buckets(db, current_user.get("org_id"))
+    return {"success": True, "data": result}
+
+
+@router.post("/ledger/balance-buckets/rebuild")
+async def rebuild_buckets(current_user: dict = Depends(get_current_user)):
+    """Rewrite the period balance buckets from posted journals"""
+    db = get_db()
+    result = await rebuild_balance_buckets(db, current_user.get("org_id"))
+    return {"success": True, "data": result}
@@ -7,6 +7,7 @@ from typing import Optional
 from datetime import datetime, timezone
 import uuid
 from . import get_db, get_current_user
+from gst_returns import touch_gst_data
 
 router = APIRouter(tags=["IB Finance - Payables"])
 
@@ -301,5 +302,6 @@ async def create_payable_with_tax(data: dict, current_user: dict = Depends(get_c
         "org_id": current_user.get("org_id")
     }
     await db.fin_tax_transactions.insert_one(tax_txn)
+    await touch_gst_data(db, current_user.get("org_id"))
     
     return {"success": True, "data": payable, "tax_transaction": tax_txn["tax_txn_id"]}
@@ -6,6 +6,8 @@ from fastapi import APIRouter, Depends
 from datetime import datetime, timezone
 import uuid
 from . import get_db, get_current_user
+from gst_returns import touch_gst_data
+from .balances import drop_org_buckets
 
 router = APIRouter(tags=["IB Finance - Seed"])
 
@@ -24,6 +26,7 @@ async def seed_finance_data(current_user: dict = Depends(get_current_user)):
     await db.fin_payables.delete_many({"org_id": org_id})
     await db.fin_accounts.delete_many({"org_id": org_id})
     await db.fin_journals.delete_many({"org_id": org_id})
+    await drop_org_buckets(db, org_id)
     await db.fin_assets.delete_many({"org_id": org_id})
     await db.fin_tax_transactions.delete_many({"org_id": org_id})
     await db.fin_periods.delete_many({"org_id": org_id})
@@ -78,6 +81,7 @@ async def seed_finance_data(current_user: dict = Depends(get_current_user)):
         {"tax_txn_id": f"TAX-{uuid.uuid4().hex[:8].upper()}", "source_type": "payable", "source_id": payables[0]["payable_id"], "transaction_date": now, "tax_type": "GST", "tax_code": "GST18", "taxable_amount": 150000, "tax_rate": 18, "tax_amount": 27000, "direction": "input", "status": "claimed", "party_id": "VND001", "party_name": "CloudHost Services", "org_id": org_id, "created_at": now},
     ]
     await db.fin_tax_transactions.insert_many(tax_txns)
+    await touch_gst_data(db, org_id)
     
     # Seed Accounting Period
     period = {
@@ -136,6 +140,7 @@ async def seed_finance_data_internal():
         {"billing_id": f"BIL-{uuid.uuid4().hex[:8].upper()}", "billing_type": "subscription", "party_id": "CUST002", "party_name": "TechStart Inc", "billing_period": "2024-12", "currency": "INR", "gross_amount": 100000, "tax_amount": 18000, "net_amount": 118000, "status": "approved", "org_id": org_id, "created_at": now, "created_by": user_id},
     ]
     await db.fin_billing_records.insert_many(billings)
+    await touch_gst_data(db, org_id)
     
     # Seed Receivables
     receivables = [
@@ -6,6 +6,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from typing import Optional
 from datetime import datetime, timezone
 from . import get_db, get_current_user
+from .balances import account_balances, period_range
 
 router = APIRouter(tags=["IB Finance - Statements"])
 
@@ -13,23 +14,28 @@ router = APIRouter(tags=["IB Finance - Statements"])
 @router.get("/statements/profit-loss")
 async def get_profit_loss(
     period: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get Profit & Loss statement"""
+    """Get Profit & Loss statement for a period (YYYY, YYYY-Qn, YYYY-MM) or date range"""
     db = get_db()
     org_id = current_user.get("org_id")
     
-    # Get revenue accounts
-    revenue_accounts = await db.fin_accounts.find(
-        {"org_id": org_id, "account_type": "revenue", "is_active": True},
-        {"_id": 0}
-    ).to_list(length=100)
-    
-    # Get expense accounts
-    expense_accounts = await db.fin_accounts.find(
-        {"org_id": org_id, "account_type": "expense", "is_active": True},
-        {"_id": 0}
-    ).to_list(length=100)
+    try:
+        period_start, period_end = period_range(period)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    start_date = start_date or period_start
+    end_date = end_date or period_end
+    
+    # Movement inside the window when bounded, otherwise cumulative balances
+    accounts = await account_balances(
+        db, org_id, as_of_date=end_date, start_date=start_date,
+        account_types=("revenue", "expense")
+    )
+    revenue_accounts = [a for a in accounts if a.get("account_type") == "revenue"]
+    expense_accounts = [a for a in accounts if a.get("account_type") == "expense"]
     
     total_revenue = sum(acc.get("balance", 0) for acc in revenue_accounts)
     total_expenses = sum(acc.get("balance", 0) for acc in expense_accounts)
@@ -38,7 +44,9 @@ async def get_profit_loss(
     return {
         "success": True,
         "data": {
-            "period": period or "Current",
+            "period": period or ("Custom" if start_date or end_date else "Current"),
+            "start_date": start_date,
+            "end_date": end_date,
             "revenue": {
                 "accounts": revenue_accounts,
                 "total": total_revenue
@@ -58,15 +66,12 @@ async def get_balance_sheet(
     as_of_date: Optional[str] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Get Balance Sheet"""
+    """Get Balance Sheet as of a date (defaults to all posted activity)"""
     db = get_db()
     org_id = current_user.get("org_id")
     
-    # Get all accounts by type
-    accounts = await db.fin_accounts.find(
-        {"org_id": org_id, "is_active": True},
-        {"_id": 0}
-    ).to_list(length=1000)
+    # Get all accounts by type, balances as of the requested date
+    accounts = await account_balances(db, org_id, as_of_date=as_of_date)
     
     assets = [a for a in accounts if a.get("account_type") == "asset"]
     liabilities = [a for a in accounts if a.get("account_type") == "liability"]
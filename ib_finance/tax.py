@@ -7,6 +7,7 @@ from typing import Optional
 from datetime import datetime, timezone
 import uuid
 from . import get_db, get_current_user
+from gst_returns import touch_gst_data
 
 router = APIRouter(tags=["IB Finance - Tax"])
 
@@ -121,6 +122,7 @@ async def create_tax_transaction(data: dict, current_user: dict = Depends(get_cu
         "org_id": current_user.get("org_id")
     }
     await db.fin_tax_transactions.insert_one(txn)
+    await touch_gst_data(db, current_user.get("org_id"))
     txn.pop("_id", None)
     return {"success": True, "data": txn}
 
@@ -138,6 +140,7 @@ async def update_tax_transaction(tax_txn_id: str, data: dict, current_user: dict
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Tax transaction not found")
+    await touch_gst_data(db, current_user.get("org_id"))
     
     updated = await db.fin_tax_transactions.find_one({"tax_txn_id": tax_txn_id}, {"_id": 0})
     return {"success": True, "data": updated}
@@ -152,6 +155,7 @@ async def delete_tax_transaction(tax_txn_id: str, current_user: dict = Depends(g
     )
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Tax transaction not found or cannot be deleted")
+    await touch_gst_data(db, current_user.get("org_id"))
     return {"success": True, "message": "Tax transaction deleted"}
 
 
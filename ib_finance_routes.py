@@ -4,12 +4,13 @@ Financial Truth & Settlement Engine
 7 Core Modules: Billing, Receivables, Payables, Ledger, Assets, Tax, Close
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from datetime import datetime, timezone
 import uuid
-import jwt
 import os
+from auth_utils import get_current_principal
+from sequence_service import next_id
 
 router = APIRouter(prefix="/api/ib-finance", tags=["IB Finance"])
 
@@ -20,23 +21,8 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user(authorization: str = Header(None)):
-    """Extract current user from JWT token"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {
-            "user_id": payload.get("user_id"),
-            "org_id": payload.get("org_id"),
-            "role_id": payload.get("role_id")
-        }
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 # ==================== DASHBOARD ====================
@@ -171,8 +157,12 @@ async def issue_billing(billing_id: str, current_user: dict = Depends(get_curren
         raise HTTPException(status_code=400, detail="Billing must be approved before issuing")
     
     # Generate invoice number
-    count = await db.fin_billing_records.count_documents({"org_id": current_user.get("org_id"), "invoice_number": {"$exists": True}})
-    invoice_number = f"INV-{datetime.now().strftime('%Y%m')}-{str(count + 1).zfill(4)}"
+    org_id = current_user.get("org_id")
+    invoice_number = await next_id(
+        "INV", org_id=org_id, period=datetime.now().strftime('%Y%m'),
+        seed=lambda: db.fin_billing_records.count_documents({"org_id": org_id, "invoice_number": {"$exists": True}}),
+        db=db
+    )
     
     # Update billing record
     await db.fin_billing_records.update_one(
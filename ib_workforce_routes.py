@@ -6,6 +6,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 import uuid
+from payroll_engine import PAYROLL_INLINE_MAX_EMPLOYEES, claim_payrun, run_calculation, launch_calculation
+from report_compiler import touch_report_data
 
 router = APIRouter(prefix="/api/ib-workforce", tags=["IB Workforce"])
 
@@ -179,6 +181,7 @@ async def create_person(data: dict, current_user: dict = Depends(get_current_use
     }
     
     await db.wf_people.insert_one(person)
+    await touch_report_data(db, "wf_people")
     
     # Create employment profile if provided
     if data.get("employee_code") or data.get("designation"):
@@ -224,6 +227,7 @@ async def update_person(person_id: str, data: dict, current_user: dict = Depends
     }
     
     await db.wf_people.update_one({"person_id": person_id}, {"$set": update_fields})
+    await touch_report_data(db, "wf_people")
     
     updated = await db.wf_people.find_one({"person_id": person_id}, {"_id": 0})
     return {"success": True, "data": updated}
@@ -253,6 +257,7 @@ async def activate_person(person_id: str, current_user: dict = Depends(get_curre
         {"person_id": person_id},
         {"$set": {"status": "active", "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await touch_report_data(db, "wf_people")
     
     return {"success": True, "message": "Person activated successfully"}
 
@@ -280,6 +285,7 @@ async def suspend_person(person_id: str, data: dict, current_user: dict = Depend
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await touch_report_data(db, "wf_people")
     
     return {"success": True, "message": "Person suspended successfully"}
 
@@ -308,6 +314,7 @@ async def exit_person(person_id: str, data: dict, current_user: dict = Depends(g
             "updated_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    await touch_report_data(db, "wf_people")
     
     # Revoke all active role assignments
     await db.wf_role_assignments.update_many(
@@ -1034,7 +1041,7 @@ async def create_payrun(data: dict, current_user: dict = Depends(get_current_use
         "org_id": current_user.get("org_id"),
         "period": data.get("period"),
         "payroll_group": data.get("payroll_group", "default"),
-        "status": "draft",  # draft | calculated | approved | posted
+        "status": "draft",  # draft | calculating | calculated | approved | posted
         "total_gross": 0,
         "total_deductions": 0,
         "total_net": 0,
@@ -1049,7 +1056,7 @@ async def create_payrun(data: dict, current_user: dict = Depends(get_current_use
 
 @router.post("/payruns/{payrun_id}/calculate")
 async def calculate_payrun(payrun_id: str, current_user: dict = Depends(get_current_user)):
-    """Calculate payroll for all eligible employees"""
+    """Calculate payroll for all eligible employees (large pay runs continue in the background)"""
     db = get_db()
     
     payrun = await db.wf_payruns.find_one(
@@ -1059,104 +1066,51 @@ async def calculate_payrun(payrun_id: str, current_user: dict = Depends(get_curr
     if not payrun:
         raise HTTPException(status_code=404, detail="Pay run not found")
     
-    if payrun.get("status") not in ["draft", "calculated"]:
+    if payrun.get("status") not in ["draft", "calculated", "calculating"]:
         raise HTTPException(status_code=400, detail="Cannot recalculate approved/posted pay run")
     
-    # Get all active people with compensation profiles
-    org_id = current_user.get("org_id")
-    active_people = await db.wf_people.find(
-        {"org_id": org_id, "status": "active", "deleted": {"$ne": True}},
-        {"_id": 0}
-    ).to_list(1000)
-    
-    total_gross = 0
-    total_deductions = 0
-    total_net = 0
-    
-    # Delete existing payslips for this run
-    await db.wf_payslips.delete_many({"payrun_id": payrun_id})
-    
-    for person in active_people:
-        # Get compensation profile
-        comp = await db.wf_compensation.find_one(
-            {"person_id": person["person_id"], "status": "active"},
-            {"_id": 0}
-        )
-        if not comp:
-            continue
-        
-        # Get approved timesheet for period
-        timesheet = await db.wf_timesheets.find_one({
-            "person_id": person["person_id"],
-            "period": payrun["period"],
-            "status": "approved"
-        })
-        
-        base_pay = comp.get("base_pay", 0)
-        
-        # Calculate earnings
-        gross_pay = base_pay
-        
-        # Calculate deductions (simplified statutory)
-        tax_deduction = gross_pay * 0.10  # 10% flat tax
-        pf_deduction = gross_pay * 0.12  # 12% PF
-        total_ded = tax_deduction + pf_deduction
-        
-        net_pay = gross_pay - total_ded
-        
-        payslip = {
-            "payslip_id": generate_id("SLIP"),
-            "payrun_id": payrun_id,
-            "org_id": org_id,
-            "person_id": person["person_id"],
-            "person_name": f"{person.get('first_name', '')} {person.get('last_name', '')}",
-            "period": payrun["period"],
-            "gross_pay": gross_pay,
-            "earnings": [
-                {"component": "Basic", "amount": base_pay * 0.5},
-                {"component": "HRA", "amount": base_pay * 0.3},
-                {"component": "Special Allowance", "amount": base_pay * 0.2}
-            ],
-            "deductions": [
-                {"component": "Income Tax", "amount": tax_deduction},
-                {"component": "Provident Fund", "amount": pf_deduction}
-            ],
-            "total_deductions": total_ded,
-            "net_pay": net_pay,
-            "currency": comp.get("currency", "INR"),
-            "created_at": datetime.now(timezone.utc).isoformat()
+    # Claiming resets totals and replaces the run's payslips
+    payrun = await claim_payrun(db, payrun_id, current_user.get("org_id"))
+    if not payrun:
+        raise HTTPException(status_code=409, detail="Pay run calculation already in progress")
+    
+    if payrun["calculation"]["employees_total"] > PAYROLL_INLINE_MAX_EMPLOYEES:
+        launch_calculation(db, payrun)
+        return {
+            "success": True,
+            "message": "Payroll calculation started",
+            "data": {"payrun_id": payrun_id, "status": "calculating", "calculation": payrun["calculation"]}
         }
-        
-        await db.wf_payslips.insert_one(payslip)
-        
-        total_gross += gross_pay
-        total_deductions += total_ded
-        total_net += net_pay
     
-    # Update pay run
-    await db.wf_payruns.update_one(
-        {"payrun_id": payrun_id},
-        {"$set": {
-            "status": "calculated",
-            "total_gross": total_gross,
-            "total_deductions": total_deductions,
-            "total_net": total_net,
-            "calculated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    payrun = await run_calculation(db, payrun)
+    if payrun["calculation"]["status"] == "failed":
+        raise HTTPException(status_code=500, detail=f"Payroll calculation failed: {payrun['calculation'].get('error')}")
     
     return {
         "success": True,
         "message": "Payroll calculated successfully",
         "data": {
-            "total_gross": total_gross,
-            "total_deductions": total_deductions,
-            "total_net": total_net,
-            "employees_processed": len(active_people)
+            "total_gross": payrun["total_gross"],
+            "total_deductions": payrun["total_deductions"],
+            "total_net": payrun["total_net"],
+            "employees_processed": payrun["calculation"]["employees_processed"]
         }
     }
 
 
+@router.get("/payruns/{payrun_id}/calculation")
+async def get_payrun_calculation(payrun_id: str, current_user: dict = Depends(get_current_user)):
+    """Progress of a pay run calculation"""
+    db = get_db()
+    payrun = await db.wf_payruns.find_one(
+        {"payrun_id": payrun_id, "org_id": current_user.get("org_id")},
+        {"_id": 0, "payrun_id": 1, "status": 1, "total_gross": 1, "total_deductions": 1, "total_net": 1, "calculation": 1}
+    )
+    if not payrun:
+        raise HTTPException(status_code=404, detail="Pay run not found")
+    return {"success": True, "data": payrun}
+
+
 @router.post("/payruns/{payrun_id}/approve")
 async def approve_payrun(payrun_id: str, current_user: dict = Depends(get_current_user)):
     """Approve pay run"""
@@ -1481,6 +1435,7 @@ async def seed_workforce_data(current_user: dict = Depends(get_current_user)):
             {"$set": person},
             upsert=True
         )
+        await touch_report_data(db, "wf_people")
         created_people.append(person)
         
         # Create employment profile
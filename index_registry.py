@@ -0,0 +1,499 @@
+"""
+MongoDB Index Registry
+Single declarative list of the indexes each hot collection needs.
+
+- INDEX_SPECS     collection -> list of index specs (keys + options)
+- ensure_indexes  creates missing indexes (idempotent; run at startup)
+- index_drift_report  missing / extra / unused indexes per collection
+- unindexed_query_report  query shapes the server actually ran as
+                  collection scans, read from the profiler (system.profile)
+
+Index names default to MongoDB's own "field_1_other_-1" naming, so indexes
+already created by older seed scripts are recognised instead of duplicated.
+CLI: python scripts/manage_indexes.py {apply,drift,profile,audit}
+"""
+import os
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+APPLY_INDEXES_ON_STARTUP = os.environ.get("APPLY_INDEXES_ON_STARTUP", "true").lower() == "true"
+
+
+def _idx(*keys, name: Optional[str] = None, **options) -> Dict[str, Any]:
+    """Index spec: _idx("org_id", ("created_at", DESCENDING), unique=True)"""
+    key_list = [k if isinstance(k, tuple) else (k, ASCENDING) for k in keys]
+    if name is None:
+        name = "_".join(f"{field}_{direction}" for field, direction in key_list)
+    return {"keys": key_list, "name": name, "options": options}
+
+
+# ==================== INDEX SPECS ====================
+
+INDEX_SPECS: Dict[str, List[Dict[str, Any]]] = {
+    # ---------- auth / tenancy ----------
+    "users": [
+        _idx("email", name="unique_email_idx", unique=True),
+        _idx("user_id"),
+        _idx("id"),
+    ],
+    "org_users": [
+        _idx("user_id", "org_id", name="unique_org_membership_idx", unique=True),
+    ],
+    "enterprise_users": [
+        _idx("user_id"),
+        _idx("email"),
+        _idx("org_id"),
+    ],
+    "organizations": [
+        _idx("org_id"),
+    ],
+    "role_permissions": [
+        _idx("role_id", "granted"),
+    ],
+    "roles": [
+        _idx("role_id"),
+    ],
+    "submodules": [
+        _idx("submodule_id"),
+    ],
+
+    # ---------- core finance (main.py) ----------
+    "transactions": [
+        _idx("id"),
+        _idx("transaction_date"),
+        _idx("bank_account_id", "transaction_date"),
+        _idx("import_job_id", "import_row", sparse=True),
+    ],
+    "invoices": [
+        _idx("id"),
+        _idx("invoice_number"),
+        _idx("status"),
+        _idx("org_id", "status"),
+        _idx("import_job_id", "import_row", sparse=True),
+    ],
+    "bills": [
+        _idx("id"),
+        _idx("bill_number"),
+        _idx("status"),
+        _idx("org_id", "status"),
+        _idx("import_job_id", "import_row", sparse=True),
+    ],
+    "journal_entries": [
+        _idx("id"),
+        _idx("transaction_id"),
+        _idx("transaction_type"),
+        _idx("entry_date"),
+        _idx("line_items.account", "entry_date"),
+    ],
+    "category_master": [
+        _idx("id", unique=True),
+        _idx("cashflow_activity"),
+        _idx("cashflow_flow"),
+        _idx("statement_type"),
+    ],
+    "cash_balance_snapshots": [
+        _idx("bank_account_id", "month", unique=True),
+        _idx("month"),
+    ],
+    "adjustment_entries": [
+        _idx("id"),
+    ],
+    "bank_accounts": [
+        _idx("id"),
+    ],
+
+    # ---------- IB Finance ----------
+    "fin_receivables": [
+        _idx("receivable_id"),
+        _idx("org_id", "status", "due_date"),
+    ],
+    "fin_payables": [
+        _idx("payable_id"),
+        _idx("org_id", "status", "due_date"),
+    ],
+    "fin_accounts": [
+        _idx("org_id", "account_id"),
+    ],
+    "fin_journals": [
+        _idx("journal_id"),
+        _idx("org_id", "period"),
+    ],
+    "fin_balance_buckets": [
+        _idx("org_id", "account_id", "period", unique=True),
+        _idx("org_id", "period"),
+    ],
+    "fin_assets": [
+        _idx("asset_id"),
+    ],
+    "fin_billing_records": [
+        _idx("billing_id"),
+        _idx("org_id", "status"),
+        _idx("org_id", "status", "issued_at"),
+        _idx("org_id", "status", "created_at"),
+    ],
+    "fin_tax_transactions": [
+        _idx("tax_txn_id"),
+        _idx("org_id", "period", "direction"),
+    ],
+    "fin_bank_statements": [
+        _idx("entry_id"),
+        _idx("org_id", "matched", "transaction_date"),
+        _idx("org_id", "reconciliation_id"),
+        _idx("org_id", "account_id", "status", "transaction_date"),
+        _idx("org_id", "dedup_key", unique=True, partialFilterExpression={"dedup_key": {"$type": "string"}}),
+    ],
+    "fin_receivable_payments": [
+        _idx("payment_id"),
+        _idx("org_id", "amount"),
+    ],
+    "fin_reconciliations": [
+        _idx("reconciliation_id"),
+        _idx("org_id", "bank_entry_id"),
+    ],
+    "fin_reconciliation_jobs": [
+        _idx("job_id", unique=True),
+        _idx("org_id", ("created_at", DESCENDING)),
+    ],
+
+    # ---------- IB Workforce payroll (payroll_engine.py) ----------
+    "wf_people": [
+        _idx("person_id"),
+        _idx("org_id", "status", "person_id"),
+    ],
+    "wf_compensation": [
+        _idx("person_id", "status"),
+    ],
+    "wf_payruns": [
+        _idx("payrun_id"),
+        _idx("status", "calculation.heartbeat_at"),
+    ],
+    "wf_payslips": [
+        _idx("payrun_id", "person_id", unique=True),
+        _idx("org_id", "person_id"),
+    ],
+
+    # ---------- workspace / collaboration ----------
+    "messages": [
+        _idx("channel_id", ("created_at", DESCENDING), ("_id", DESCENDING)),
+        _idx("search_terms", "channel_id", ("created_at", DESCENDING)),
+    ],
+    "channels": [
+        _idx("members"),
+    ],
+    "workspace_chats": [
+        _idx("chat_id"),
+        _idx("participants"),
+        _idx("context_id", "org_id"),
+    ],
+    "workspace_chat_messages": [
+        _idx("chat_id", ("created_at", DESCENDING), ("message_id", DESCENDING)),
+        _idx("search_terms", "chat_id", ("created_at", DESCENDING)),
+    ],
+    "workspace_channels": [
+        _idx("channel_id"),
+        _idx("member_users"),
+    ],
+    "workspace_channel_messages": [
+        _idx("channel_id", ("created_at", DESCENDING), ("message_id", DESCENDING)),
+        _idx("search_terms", "channel_id", ("created_at", DESCENDING)),
+    ],
+    "workspace_tasks": [
+        _idx("task_id"),
+    ],
+    "workspace_approvals": [
+        _idx("approval_id"),
+    ],
+    "activity_feed": [
+        _idx(("timestamp", DESCENDING)),
+        _idx("entity_type", "entity_id", ("timestamp", DESCENDING)),
+    ],
+    "audit_trail": [
+        _idx("entity_type", "entity_id", ("timestamp", DESCENDING)),
+        _idx("user_id", ("timestamp", DESCENDING)),
+    ],
+
+    # ---------- revenue / commerce ----------
+    "revenue_workflow_leads": [
+        _idx("lead_id"),
+        _idx("org_id"),
+        _idx("stage", "owner_id"),
+    ],
+    "revenue_leads": [
+        _idx("lead_id"),
+    ],
+    "commerce_leads": [
+        _idx("lead_id"),
+        _idx("lead_status"),
+    ],
+    "commerce_pay": [
+        _idx("payment_id"),
+    ],
+    "commerce_collect": [
+        _idx("collection_id"),
+    ],
+    "parties_customers": [
+        _idx("id"),
+        _idx("customer_id"),
+        _idx("import_job_id", "import_row", sparse=True),
+    ],
+    "parties_vendors": [
+        _idx("id"),
+        _idx("import_job_id", "import_row", sparse=True),
+    ],
+    "governance_limits": [
+        _idx("limit_id"),
+    ],
+
+    # ---------- bulk uploads (bulk_import.py) ----------
+    "import_jobs": [
+        _idx("job_id", unique=True),
+        _idx("status", "heartbeat_at"),
+        _idx(("created_at", DESCENDING)),
+    ],
+    "import_job_errors": [
+        _idx("job_id", "row"),
+    ],
+
+    # ---------- global search (search_index.py) ----------
+    "search_index": [
+        _idx("terms", "org_id", "kind", ("touched_at", DESCENDING)),
+        _idx("kind", "indexed_at"),
+    ],
+
+    # ---------- job scheduler (job_scheduler.py) ----------
+    "scheduler_runs": [
+        _idx("run_id", unique=True),
+        _idx("job", ("started_at", DESCENDING)),
+        _idx("expires_at", expireAfterSeconds=0),
+    ],
+    "custom_reports": [
+        _idx("report_id"),
+        _idx("schedule.enabled", "schedule.next_run_at"),
+    ],
+    "report_runs": [
+        _idx("run_id", unique=True),
+        _idx("report_id", ("created_at", DESCENDING)),
+    ],
+
+    # ---------- email campaigns (campaign_sender.py) ----------
+    "email_campaigns": [
+        _idx("campaign_id"),
+        _idx("status", "send.heartbeat_at"),
+    ],
+    "email_recipients": [
+        _idx("recipient_id", "campaign_id"),
+        _idx("campaign_id", "status", "_id"),
+    ],
+
+    # ---------- workflow builder (workflow_runtime.py) ----------
+    "workflow_definitions": [
+        _idx("workflow_id"),
+        _idx("org_id", "is_active", "trigger.event_type"),
+    ],
+    "workflow_runs": [
+        _idx("run_id", unique=True),
+        _idx("status", "due_at"),
+        _idx("workflow_id", ("started_at", DESCENDING)),
+    ],
+    "workflow_step_logs": [
+        _idx("run_id", "started_at"),
+    ],
+
+    # ---------- manufacturing automation (manufacturing_automation_engine.py) ----------
+    "mfg_leads": [
+        _idx("lead_id"),
+    ],
+    "mfg_tasks": [
+        _idx("lead_id", "status", "due_date"),
+    ],
+    "mfg_automation_logs": [
+        _idx("lead_id", ("timestamp", DESCENDING)),
+        _idx("run_id"),
+    ],
+
+    # ---------- operations / intelligence ----------
+    "ops_projects": [
+        _idx("org_id", "sla_status"),
+    ],
+    "intel_metrics": [
+        _idx("org_id", "name"),
+    ],
+    "documents": [
+        _idx("document_id"),
+    ],
+}
+
+
+# ==================== APPLY / DRIFT ====================
+
+def _key_signature(keys) -> Tuple[Tuple[str, Any], ...]:
+    # Servers may report directions as floats (1.0); normalise numeric ones
+    return tuple(
+        (field, int(direction) if isinstance(direction, (int, float)) else direction)
+        for field, direction in keys
+    )
+
+
+async def ensure_indexes(db, collections: Optional[Iterable[str]] = None, dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Create every missing index from INDEX_SPECS. Existing indexes with the
+    same key pattern are left alone, so this is safe to run repeatedly.
+    """
+    targets = list(collections) if collections else list(INDEX_SPECS)
+    created, existing, failed = [], [], []
+
+    for collection in targets:
+        specs = INDEX_SPECS.get(collection, [])
+        try:
+            current = await db[collection].index_information()
+        except OperationFailure:
+            current = {}
+        current_keys = {_key_signature(info["key"]) for info in current.values()}
+
+        for spec in specs:
+            label = f"{collection}.{spec['name']}"
+            if _key_signature(spec["keys"]) in current_keys:
+                existing.append(label)
+                continue
+            if dry_run:
+                created.append(label)
+                continue
+            try:
+                await db[collection].create_indexes([
+                    IndexModel(spec["keys"], name=spec["name"], **spec["options"])
+                ])
+                created.append(label)
+            except OperationFailure as e:
+                # e.g. unique index over duplicate data, or a name clash
+                logger.warning(f"Index {label} not created: {e}")
+                failed.append({"index": label, "error": str(e)})
+
+    if created:
+        logger.info(f"{'Would create' if dry_run else 'Created'} {len(created)} indexes: {created}")
+    return {"created": created, "existing": existing, "failed": failed, "dry_run": dry_run}
+
+
+async def index_drift_report(db, collections: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Compare live indexes with INDEX_SPECS.
+    missing: declared but not present
+    extra:   present but not declared (excluding _id_)
+    unused:  present with zero $indexStats accesses since the server started
+    """
+    targets = list(collections) if collections else list(INDEX_SPECS)
+    report = {}
+
+    for collection in targets:
+        declared = {_key_signature(spec["keys"]): spec["name"] for spec in INDEX_SPECS.get(collection, [])}
+        try:
+            current = await db[collection].index_information()
+        except OperationFailure:
+            current = {}
+        live = {_key_signature(info["key"]): name for name, info in current.items()}
+
+        missing = [name for keys, name in declared.items() if keys not in live]
+        extra = [name for keys, name in live.items() if keys not in declared and name != "_id_"]
+
+        unused = []
+        try:
+            stats = await db[collection].aggregate([{"$indexStats": {}}]).to_list(None)
+            unused = [
+                s["name"] for s in stats
+                if s.get("name") != "_id_" and s.get("accesses", {}).get("ops", 0) == 0
+            ]
+        except Exception as e:
+            logger.debug(f"$indexStats unavailable for {collection}: {e}")
+
+        if missing or extra or unused:
+            report[collection] = {"missing": missing, "extra": extra, "unused": unused}
+
+    return {
+        "collections_checked": len(targets),
+        "drift": report,
+    }
+
+
+# ==================== UNINDEXED QUERY AUDIT ====================
+# Coverage is checked against the queries the routes really send: with
+# COLLSCAN profiling on, the server records every operation it had to answer
+# with a collection scan, and the audit groups them by query shape.
+
+COLLSCAN_PROFILE_FILTER = {"planSummary": {"$regex": "COLLSCAN"}}
+
+
+async def set_collscan_profiling(db, enabled: bool) -> Dict[str, Any]:
+    """Record (or stop recording) collection-scan operations in system.profile (MongoDB 4.4.2+)"""
+    if enabled:
+        return await db.command({"profile": 1, "filter": COLLSCAN_PROFILE_FILTER})
+    return await db.command({"profile": 0})
+
+
+def _query_filter(command: Dict[str, Any]) -> Dict[str, Any]:
+    if "filter" in command:
+        return command["filter"] or {}
+    if "q" in command:
+        return command["q"] or {}
+    if "query" in command:
+        return command["query"] or {}
+    pipeline = command.get("pipeline") or []
+    if pipeline and "$match" in pipeline[0]:
+        return pipeline[0]["$match"]
+    return {}
+
+
+def _filter_fields(query: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """(equality fields, range fields) of a query filter; $and / $or branches are merged"""
+    equality, ranges = set(), set()
+    for field, value in query.items():
+        if field in ("$and", "$or", "$nor"):
+            for branch in value:
+                eq, rg = _filter_fields(branch)
+                equality.update(eq)
+                ranges.update(rg)
+        elif field.startswith("$"):
+            continue
+        elif isinstance(value, dict) and any(op in value for op in ("$gt", "$gte", "$lt", "$lte", "$ne", "$exists", "$regex")):
+            ranges.add(field)
+        else:
+            equality.add(field)
+    return sorted(equality), sorted(ranges)
+
+
+async def unindexed_query_report(db, collections: Optional[Iterable[str]] = None, limit: int = 10000) -> Dict[str, Any]:
+    """
+    Group the collection scans recorded by set_collscan_profiling() by
+    collection and query shape (equality fields, range fields, sort).
+    """
+    query: Dict[str, Any] = dict(COLLSCAN_PROFILE_FILTER)
+    if collections:
+        query["ns"] = {"$in": [f"{db.name}.{name}" for name in collections]}
+    else:
+        query["ns"] = {"$not": {"$regex": r"\.system\."}}
+
+    shapes: Dict[Tuple, Dict[str, Any]] = {}
+    entries = await db["system.profile"].find(
+        query, {"ns": 1, "op": 1, "command": 1, "docsExamined": 1, "millis": 1}
+    ).sort("ts", DESCENDING).limit(limit).to_list(None)
+    for entry in entries:
+        command = entry.get("command") or {}
+        equality, ranges = _filter_fields(_query_filter(command))
+        sort = list((command.get("sort") or {}).keys())
+        collection = entry["ns"].split(".", 1)[1]
+        key = (collection, entry.get("op"), tuple(equality), tuple(ranges), tuple(sort))
+        shape = shapes.setdefault(key, {
+            "collection": collection, "op": entry.get("op"),
+            "equality": equality, "range": ranges, "sort": sort,
+            "count": 0, "max_docs_examined": 0, "max_millis": 0,
+            "declared_collection": collection in INDEX_SPECS,
+        })
+        shape["count"] += 1
+        shape["max_docs_examined"] = max(shape["max_docs_examined"], entry.get("docsExamined", 0))
+        shape["max_millis"] = max(shape["max_millis"], entry.get("millis", 0))
+
+    unindexed = sorted(shapes.values(), key=lambda s: (-s["max_docs_examined"], s["collection"]))
+    return {"profiled_operations": len(entries), "unindexed_query_shapes": unindexed}
@@ -13,7 +13,7 @@ import logging
 from datetime import datetime, timezone
 
 from rbac_engine import initialize_modules_and_permissions, create_system_roles
-from enterprise_auth_service import hash_password
+from password_hasher import hash_password_async
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -59,7 +59,7 @@ async def main():
             "user_id": "user_super_admin",
             "org_id": None,
             "email": super_admin_email,
-            "password_hash": hash_password(super_admin_password),
+            "password_hash": await hash_password_async(super_admin_password),
             "full_name": "Super Administrator",
             "role_id": None,
             "is_super_admin": True,
@@ -0,0 +1,424 @@
+"""
+Job Scheduler
+In-process async scheduler for periodic jobs, safe to run in every worker.
+
+- Jobs have cron triggers ("*/30 * * * *", "0 2 * * *", @daily ...) evaluated
+  in SCHEDULER_TIMEZONE. Job state lives in `scheduler_jobs`, one document
+  per job with its next_run_at and lease.
+- A worker runs a slot only after claiming it: find_one_and_update on the
+  job's current next_run_at with no live lease. Exactly one worker in the
+  cluster wins, and the same job never overlaps itself.
+- Optional jitter before the claim; at most SCHEDULER_MAX_CONCURRENCY jobs
+  run at once per worker; each run is cut off after its timeout.
+- Missed slots (every worker down): catch_up="latest" runs once and moves
+  on, "all" runs every missed slot in order, "skip" drops slots older than
+  SCHEDULER_MISFIRE_GRACE_SECONDS.
+- Every run is recorded in `scheduler_runs` (status, duration, result or
+  error), expired after SCHEDULER_RUN_HISTORY_DAYS by a TTL index.
+- run_in_process() sends CPU-heavy sync work (reconciliation matching) to a
+  process pool so it never blocks the event loop serving requests. A
+  timed-out run stops waiting, but work already in a child process finishes.
+"""
+import os
+import uuid
+import random
+import socket
+import asyncio
+import logging
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+SCHEDULER_TIMEZONE = os.environ.get('SCHEDULER_TIMEZONE', 'UTC')
+SCHEDULER_TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK_SECONDS', '15'))
+SCHEDULER_MAX_CONCURRENCY = int(os.environ.get('SCHEDULER_MAX_CONCURRENCY', '4'))
+SCHEDULER_DEFAULT_TIMEOUT_SECONDS = float(os.environ.get('SCHEDULER_DEFAULT_TIMEOUT_SECONDS', '900'))
+SCHEDULER_DEFAULT_JITTER_SECONDS = float(os.environ.get('SCHEDULER_DEFAULT_JITTER_SECONDS', '10'))
+SCHEDULER_MISFIRE_GRACE_SECONDS = float(os.environ.get('SCHEDULER_MISFIRE_GRACE_SECONDS', '300'))
+SCHEDULER_RUN_HISTORY_DAYS = int(os.environ.get('SCHEDULER_RUN_HISTORY_DAYS', '30'))
+SCHEDULER_PROCESS_WORKERS = int(os.environ.get('SCHEDULER_PROCESS_WORKERS', '2'))
+
+SCHEDULER_JOBS = "scheduler_jobs"
+SCHEDULER_RUNS = "scheduler_runs"
+
+# Extra lease time beyond a job's timeout before another worker may take over
+LEASE_GRACE_SECONDS = 60
+CATCH_UP_POLICIES = ("latest", "all", "skip")
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# ==================== CRON TRIGGERS ====================
+
+CRON_ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# (low, high) for minute, hour, day of month, month, day of week (0 = Sunday)
+CRON_FIELDS = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+
+
+def _parse_cron_field(text: str, low: int, high: int) -> List[int]:
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step < 1:
+                raise ValueError(f"Invalid cron step in {text!r}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if start < low or end > high or start > end:
+            raise ValueError(f"Cron field {text!r} out of range {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return sorted(values)
+
+
+class CronTrigger:
+    """Five-field cron expression: minute hour day-of-month month day-of-week"""
+
+    def __init__(self, expression: str, tz: str = SCHEDULER_TIMEZONE):
+        self.expression = expression.strip()
+        fields = CRON_ALIASES.get(self.expression, self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression needs 5 fields: {expression!r}")
+        self.tz = ZoneInfo(tz)
+        minutes, hours, days, months, weekdays = (
+            _parse_cron_field(text, low, high) for text, (low, high) in zip(fields, CRON_FIELDS)
+        )
+        self.minutes, self.hours = minutes, hours
+        self.days, self.months = set(days), set(months)
+        self.weekdays = {7 if d == 0 else d for d in weekdays}  # isoweekday numbering
+        # Standard cron: when both day fields are restricted, either may match
+        self.day_or = fields[2] != "*" and fields[4] != "*"
+
+    def _day_matches(self, day: date) -> bool:
+        if day.month not in self.months:
+            return False
+        dom = day.day in self.days
+        dow = day.isoweekday() in self.weekdays
+        return (dom or dow) if self.day_or else (dom and dow)
+
+    def next_after(self, after: datetime) -> datetime:
+        """First fire time strictly after `after`, as an aware UTC datetime"""
+        local = after.astimezone(self.tz).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = local.date()
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour in self.hours:
+                    for minute in self.minutes:
+                        candidate = datetime(day.year, day.month, day.day, hour, minute, tzinfo=self.tz)
+                        if candidate >= local:
+                            return candidate.astimezone(timezone.utc)
+            day += timedelta(days=1)
+        raise ValueError(f"Cron expression {self.expression!r} never fires")
+
+
+# ==================== PROCESS POOL ====================
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+
+
+def process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        # spawn: children must not inherit the event loop or Mongo client
+        _process_pool = ProcessPoolExecutor(
+            max_workers=max(1, SCHEDULER_PROCESS_WORKERS),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+
+async def run_in_process(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run a picklable module-level sync function in the scheduler's process pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(process_pool(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+
+
+# ==================== JOBS ====================
+
+JobFunc = Callable[[Any, datetime], Awaitable[Any]]
+
+
+class Job:
+    """A registered periodic job; func(db, scheduled_for) returns a small result summary"""
+
+    def __init__(
+        self,
+        name: str,
+        cron: str,
+        func: JobFunc,
+        description: str = "",
+        timeout_seconds: float = SCHEDULER_DEFAULT_TIMEOUT_SECONDS,
+        jitter_seconds: float = SCHEDULER_DEFAULT_JITTER_SECONDS,
+        catch_up: str = "latest",
+    ):
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"catch_up must be one of {CATCH_UP_POLICIES}")
+        self.name = name
+        self.trigger = CronTrigger(cron)
+        self.func = func
+        self.description = description
+        self.timeout_seconds = timeout_seconds
+        self.jitter_seconds = jitter_seconds
+        self.catch_up = catch_up
+
+    def following(self, scheduled_for: datetime, now: datetime) -> datetime:
+        """next_run_at once the slot at `scheduled_for` has been claimed"""
+        if self.catch_up == "all":
+            return self.trigger.next_after(scheduled_for)
+        return self.trigger.next_after(now)
+
+
+class JobScheduler:
+    """Cron jobs for this worker, coordinated with other workers through Mongo"""
+
+    def __init__(self):
+        self.jobs: Dict[str, Job] = {}
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._slots = asyncio.Semaphore(max(1, SCHEDULER_MAX_CONCURRENCY))
+        self._active: Dict[str, asyncio.Task] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, name: str, cron: str, func: JobFunc, **options) -> Job:
+        job = Job(name, cron, func, **options)
+        self.jobs[name] = job
+        return job
+
+    def job(self, name: str, cron: str, **options):
+        """Decorator form of register()"""
+        def wrap(func: JobFunc) -> JobFunc:
+            self.register(name, cron, func, **options)
+            return func
+        return wrap
+
+    def start(self, db):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(db))
+
+    async def stop(self):
+        tasks = [t for t in (self._task, *self._active.values()) if t is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._active.clear()
+        shutdown_process_pool()
+
+    # ---------- state ----------
+
+    async def _sync_jobs(self, db):
+        """Create state documents for new jobs; reschedule jobs whose cron changed"""
+        now = _utcnow()
+        for job in self.jobs.values():
+            state = await db[SCHEDULER_JOBS].find_one({"_id": job.name}, {"cron": 1})
+            if state is not None and state.get("cron") == job.trigger.expression:
+                await db[SCHEDULER_JOBS].update_one(
+                    {"_id": job.name}, {"$set": {"description": job.description}}
+                )
+                continue
+            await db[SCHEDULER_JOBS].update_one(
+                {"_id": job.name},
+                {
+                    "$set": {
+                        "cron": job.trigger.expression,
+                        "description": job.description,
+                        "next_run_at": job.trigger.next_after(now).isoformat(),
+                    },
+                    "$setOnInsert": {"lease_owner": None, "lease_expires_at": None, "created_at": now.isoformat()},
+                },
+                upsert=True
+            )
+
+    async def run(self, db):
+        while True:
+            try:
+                await self._sync_jobs(db)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler could not load job state: {e}")
+                await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+        logger.info(f"Scheduler started with {len(self.jobs)} jobs as {self.owner}")
+
+        while True:
+            try:
+                due = await db[SCHEDULER_JOBS].find(
+                    {"_id": {"$in": list(self.jobs)}, "next_run_at": {"$lte": _utcnow().isoformat()}},
+                    {"next_run_at": 1}
+                ).to_list(length=None)
+                for state in due:
+                    name = state["_id"]
+                    if name not in self._active:
+                        task = asyncio.create_task(self._run_slot(db, self.jobs[name], state["next_run_at"]))
+                        self._active[name] = task
+                        task.add_done_callback(lambda _t, name=name: self._active.pop(name, None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}")
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+
+    async def _claim(self, db, job: Job, scheduled_for: str) -> bool:
+        now = _utcnow()
+        lease_until = now + timedelta(seconds=job.timeout_seconds + LEASE_GRACE_SECONDS)
+        following = job.following(datetime.fromisoformat(scheduled_for), now)
+        previous = await db[SCHEDULER_JOBS].find_one_and_update(
+            {
+                "_id": job.name,
+                "next_run_at": scheduled_for,
+                "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now.isoformat()}}],
+            },
+            {"$set": {
+                "next_run_at": following.isoformat(),
+                "lease_owner": self.owner,
+                "lease_expires_at": lease_until.isoformat(),
+            }}
+        )
+        return previous is not None
+
+    async def _release(self, db, job: Job, run: Dict[str, Any]):
+        await db[SCHEDULER_JOBS].update_one(
+            {"_id": job.name, "lease_owner": self.owner},
+            {"$set": {
+                "lease_owner": None,
+                "lease_expires_at": None,
+                "last_run_id": run["run_id"],
+                "last_status": run["status"],
+                "last_started_at": run["started_at"],
+                "last_finished_at": run["finished_at"],
+                "last_duration_ms": run["duration_ms"],
+                "last_error": run.get("error"),
+            }}
+        )
+
+    # ---------- runs ----------
+
+    async def _run_slot(self, db, job: Job, scheduled_for: str):
+        try:
+            if job.jitter_seconds:
+                await asyncio.sleep(random.uniform(0, job.jitter_seconds))
+            async with self._slots:
+                if not await self._claim(db, job, scheduled_for):
+                    return  # another worker took this slot
+                late = (_utcnow() - datetime.fromisoformat(scheduled_for)).total_seconds()
+                if job.catch_up == "skip" and late > SCHEDULER_MISFIRE_GRACE_SECONDS:
+                    await self._record(db, job, scheduled_for, "skipped", error=f"missed by {late:.0f}s")
+                    return
+                await self._execute(db, job, scheduled_for)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Scheduler failed to run {job.name}: {e}")
+
+    async def _execute(self, db, job: Job, scheduled_for: str):
+        started = _utcnow()
+        run_id = f"RUN-{uuid.uuid4().hex[:12].upper()}"
+        await db[SCHEDULER_RUNS].insert_one({
+            "run_id": run_id, "job": job.name, "scheduled_for": scheduled_for,
+            "started_at": started.isoformat(), "owner": self.owner, "status": "running",
+            "expires_at": started + timedelta(days=SCHEDULER_RUN_HISTORY_DAYS),
+        })
+        status, result, error = "success", None, None
+        try:
+            result = await asyncio.wait_for(
+                job.func(db, datetime.fromisoformat(scheduled_for)), job.timeout_seconds
+            )
+        except asyncio.TimeoutError:
+            status, error = "timeout", f"exceeded {job.timeout_seconds:g}s"
+        except asyncio.CancelledError:
+            status, error = "cancelled", "worker shutting down"
+            raise
+        except Exception as e:
+            status, error = "failed", str(e)
+            logger.exception(f"Scheduled job {job.name} failed")
+        finally:
+            await self._record(db, job, scheduled_for, status, result, error, run_id, started)
+
+    async def _record(self, db, job: Job, scheduled_for: str, status: str, result: Any = None,
+                      error: Optional[str] = None, run_id: Optional[str] = None,
+                      started: Optional[datetime] = None):
+        finished = _utcnow()
+        started = started or finished
+        run = {
+            "run_id": run_id or f"RUN-{uuid.uuid4().hex[:12].upper()}",
+            "job": job.name,
+            "scheduled_for": scheduled_for,
+            "started_at": started.isoformat(),
+            "finished_at": finished.isoformat(),
+            "duration_ms": round((finished - started).total_seconds() * 1000),
+            "owner": self.owner,
+            "status": status,
+            "result": result if isinstance(result, (dict, list, str, int, float, bool)) else None,
+            "error": error,
+            "expires_at": started + timedelta(days=SCHEDULER_RUN_HISTORY_DAYS),
+        }
+        await db[SCHEDULER_RUNS].update_one({"run_id": run["run_id"]}, {"$set": run}, upsert=True)
+        await self._release(db, job, run)
+        level = logging.INFO if status in ("success", "skipped") else logging.WARNING
+        logger.log(level, f"Scheduled job {job.name} {status} in {run['duration_ms']}ms")
+
+    # ---------- admin ----------
+
+    async def trigger(self, db, name: str) -> bool:
+        """Make a job due now; returns False for an unknown job"""
+        if name not in self.jobs:
+            return False
+        result = await db[SCHEDULER_JOBS].update_one(
+            {"_id": name}, {"$set": {"next_run_at": _utcnow().isoformat()}}
+        )
+        return result.matched_count == 1
+
+    async def status(self, db) -> List[Dict[str, Any]]:
+        states = {
+            s["_id"]: s for s in await db[SCHEDULER_JOBS].find({"_id": {"$in": list(self.jobs)}}).to_list(length=None)
+        }
+        jobs = []
+        for name, job in sorted(self.jobs.items()):
+            state = states.get(name, {})
+            state.pop("_id", None)
+            jobs.append({
+                "name": name,
+                "description": job.description,
+                "cron": job.trigger.expression,
+                "timeout_seconds": job.timeout_seconds,
+                "catch_up": job.catch_up,
+                "running_here": name in self._active,
+                **state,
+            })
+        return jobs
+
+    async def history(self, db, name: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return await db[SCHEDULER_RUNS].find(
+            {"job": name}, {"_id": 0, "expires_at": 0}
+        ).sort("started_at", -1).limit(limit).to_list(length=limit)
+
+
+scheduler = JobScheduler()
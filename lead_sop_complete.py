@@ -15,7 +15,8 @@ import uuid
 import os
 import json
 import re
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
+from sequence_service import next_id
 from dotenv import load_dotenv
 from pathlib import Path
 # from emergentintegrations.llm.chat import LlmChat, UserMessage
@@ -31,9 +32,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_shared_db()
 
 # Create router
 lead_router = APIRouter(prefix="/commerce/leads", tags=["Lead Management"])
@@ -97,9 +96,10 @@ async def create_lead(lead_data: LeadCreate, db=Depends(get_db)):
     """
     try:
         # Generate lead_id
-        lead_count = await db.commerce_leads.count_documents({})
-        year = datetime.now().year
-        lead_id = f"LD-{year}-{str(lead_count + 1).zfill(6)}"
+        lead_id = await next_id(
+            "LD", width=6, period=str(datetime.now().year),
+            seed=lambda: db.commerce_leads.count_documents({}), db=db
+        )
         
         # Generate fingerprint for duplicate detection
         fingerprint = generate_fingerprint(lead_data.dict())
@@ -1026,9 +1026,10 @@ async def convert_lead(lead_id: str, db=Depends(get_db)):
             }
         
         # Create evaluation record
-        eval_count = await db.commerce_evaluate.count_documents({})
-        year = datetime.now().year
-        eval_id = f"EV-{year}-{str(eval_count + 1).zfill(5)}"
+        eval_id = await next_id(
+            "EV", width=5, period=str(datetime.now().year),
+            seed=lambda: db.commerce_evaluate.count_documents({}), db=db
+        )
         
         evaluation_data = {
             "id": str(uuid.uuid4()),
@@ -1118,35 +1119,41 @@ async def get_audit_trail(lead_id: str, db=Depends(get_db)):
 
 # ==================== BATCH OPERATIONS ====================
 
+async def mark_dormant_leads(db) -> int:
+    """Flag leads with no activity in 30 days as dormant; returns how many"""
+    cutoff_date = datetime.now(timezone.utc) - timedelta(days=30)
+    
+    # Find leads with no activity in 30 days
+    dormant_leads = await db.commerce_leads.find({
+        "last_activity_date": {"$lt": cutoff_date},
+        "dormant_flag": False,
+        "lead_status": {"$nin": [LeadStatus.CONVERTED.value, LeadStatus.CLOSED.value]}
+    }).to_list(length=1000)
+    
+    count = 0
+    for lead in dormant_leads:
+        await db.commerce_leads.update_one(
+            {"lead_id": lead['lead_id']},
+            {
+                "$set": {
+                    "dormant_flag": True,
+                    "dormant_since": datetime.now(timezone.utc),
+                    "lead_status": LeadStatus.DORMANT.value
+                }
+            }
+        )
+        count += 1
+    return count
+
+
 @lead_router.post("/batch/review-dormant")
 async def review_dormant_leads(db=Depends(get_db)):
     """
     Background job: Review all leads for dormancy
-    Runs nightly or weekly
+    Runs nightly via the job scheduler (scheduled_jobs.py)
     """
     try:
-        cutoff_date = datetime.now(timezone.utc) - timedelta(days=30)
-        
-        # Find leads with no activity in 30 days
-        dormant_leads = await db.commerce_leads.find({
-            "last_activity_date": {"$lt": cutoff_date},
-            "dormant_flag": False,
-            "lead_status": {"$nin": [LeadStatus.CONVERTED.value, LeadStatus.CLOSED.value]}
-        }).to_list(length=1000)
-        
-        count = 0
-        for lead in dormant_leads:
-            await db.commerce_leads.update_one(
-                {"lead_id": lead['lead_id']},
-                {
-                    "$set": {
-                        "dormant_flag": True,
-                        "dormant_since": datetime.now(timezone.utc),
-                        "lead_status": LeadStatus.DORMANT.value
-                    }
-                }
-            )
-            count += 1
+        count = await mark_dormant_leads(db)
         
         return {
             "success": True,
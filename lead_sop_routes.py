@@ -10,7 +10,8 @@ from commerce_models import Lead, SOPStage
 import uuid
 import os
 import json
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
+from sequence_service import next_id
 from dotenv import load_dotenv
 from pathlib import Path
 # from emergentintegrations.llm.chat import LlmChat, UserMessage
@@ -25,9 +26,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_shared_db()
 
 # Create router
 lead_sop_router = APIRouter(prefix="/commerce/leads/sop", tags=["Lead SOP"])
@@ -811,9 +810,10 @@ async def lead_convert_sop(
         evaluation_id = None
         if create_evaluation:
             # Create evaluation record in Evaluate module
-            eval_count = await db.commerce_evaluate.count_documents({})
-            year = datetime.now().year
-            evaluation_id = f"EVAL-{year}-{str(eval_count + 1).zfill(3)}"
+            evaluation_id = await next_id(
+                "EVAL", width=3, period=str(datetime.now().year),
+                seed=lambda: db.commerce_evaluate.count_documents({}), db=db
+            )
             
             evaluation_data = {
                 "id": str(uuid.uuid4()),
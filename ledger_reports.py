@@ -0,0 +1,373 @@
+"""
+Ledger Report Engine
+Server-side aggregation for the journal based financial reports
+(profit & loss, balance sheet, trial balance, general ledger, cash flow).
+
+- Journal lines are summed per account with $unwind / $group pipelines,
+  so no report loads journal_entries documents into Python.
+- Accounts are classified once through an account -> report section map
+  built from category_master (coa_account / fs_head / statement_type),
+  with the legacy name keyword rules only as fallback for accounts that
+  are not in the category master (system accounts such as "Output GST").
+- The general ledger pages per account with an opaque cursor and carries
+  the running balance forward from an opening balance computed before
+  the period start.
+"""
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_MAP_TTL_SECONDS = float(os.environ.get("ACCOUNT_MAP_TTL_SECONDS", "300"))
+
+PL_SECTIONS = ("revenue", "cogs", "operating_expenses", "other_income", "other_expenses")
+BS_SECTIONS = ("current_assets", "non_current_assets", "current_liabilities", "non_current_liabilities", "equity")
+
+_NUM = lambda field: {"$ifNull": [field, 0]}  # noqa: E731
+
+
+# ==================== ACCOUNT CLASSIFICATION ====================
+
+def _classify_fs_head(fs_head: str, statement_type: str) -> Optional[str]:
+    """Report section for a category master fs_head (None if unrecognised)"""
+    head = (fs_head or "").lower()
+    statement = (statement_type or "").lower()
+
+    if "profit" in statement or "p&l" in statement:
+        if "cost of goods" in head or "cost of materials" in head or "cost of sales" in head or "stock-in-trade" in head:
+            return "cogs"
+        if "other income" in head or "non-operating" in head:
+            return "other_income"
+        if "revenue" in head or "operating income" in head or "sales" in head:
+            return "revenue"
+        if "finance cost" in head or "exceptional" in head or head.startswith("other expense"):
+            return "other_expenses"
+        if "expense" in head or "cost" in head or "depreciation" in head or "tax" in head:
+            return "operating_expenses"
+        return None
+
+    if "balance" in statement:
+        if "equity" in head or "share capital" in head or "reserves" in head:
+            return "equity"
+        if "liabilit" in head or "payable" in head or "borrowing" in head or "provision" in head:
+            return "non_current_liabilities" if "non-current" in head or "long-term" in head else "current_liabilities"
+        if "asset" in head or "receivable" in head or "inventor" in head or "cash" in head \
+                or "property" in head or "investment" in head or "intangible" in head:
+            if "non-current" in head or "property" in head or "intangible" in head or "capital work" in head:
+                return "non_current_assets"
+            return "current_assets"
+    return None
+
+
+def _classify_by_name(account: str) -> Optional[str]:
+    """Legacy keyword rules on the account name"""
+    name = account.lower()
+    if any(k in name for k in ['revenue', 'sales', 'income', 'service']):
+        return "other_income" if ('other' in name or 'non-operating' in name) else "revenue"
+    if any(k in name for k in ['cogs', 'cost of goods', 'cost of sales']):
+        return "cogs"
+    if any(k in name for k in ['expense', 'salary', 'rent', 'utilities', 'marketing', 'payroll', 'purchase', 'material', 'supplies', 'cost']):
+        return "other_expenses" if 'other' in name else "operating_expenses"
+    if any(k in name for k in ['cash', 'bank', 'receivable', 'inventory', 'prepaid']):
+        return "current_assets"
+    if any(k in name for k in ['property', 'equipment', 'investment', 'intangible']):
+        return "non_current_assets"
+    if any(k in name for k in ['payable', 'accrued', 'short-term']):
+        return "current_liabilities"
+    if any(k in name for k in ['loan', 'long-term', 'bonds']):
+        return "non_current_liabilities"
+    if any(k in name for k in ['equity', 'capital', 'retained']):
+        return "equity"
+    return None
+
+
+class AccountMap:
+    """account name -> report section, loaded from category_master"""
+
+    def __init__(self, ttl_seconds: float = ACCOUNT_MAP_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.loaded_at = 0.0
+        self._sections: Dict[str, Optional[str]] = {}
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self.loaded_at = 0.0
+
+    async def get(self, db) -> "AccountMap":
+        if time.monotonic() - self.loaded_at > self.ttl_seconds:
+            async with self._lock:
+                if time.monotonic() - self.loaded_at > self.ttl_seconds:
+                    categories = await db.category_master.find(
+                        {}, {"_id": 0, "coa_account": 1, "fs_head": 1, "statement_type": 1}
+                    ).to_list(None)
+                    sections = {}
+                    for cat in categories:
+                        account = cat.get("coa_account")
+                        section = _classify_fs_head(cat.get("fs_head"), cat.get("statement_type"))
+                        if account and section and account not in sections:
+                            sections[account] = section
+                    self._sections = sections
+                    self.loaded_at = time.monotonic()
+        return self
+
+    def section(self, account: str) -> Optional[str]:
+        if account not in self._sections:
+            # Memoize the fallback so each name is classified once per load
+            self._sections[account] = _classify_by_name(account)
+        return self._sections[account]
+
+
+account_map = AccountMap()
+
+
+def invalidate_account_map():
+    account_map.invalidate()
+
+
+# ==================== AGGREGATIONS ====================
+
+def date_range_query(start_dt: Optional[datetime] = None, end_dt: Optional[datetime] = None) -> Dict[str, Any]:
+    query: Dict[str, Any] = {}
+    if start_dt or end_dt:
+        query["entry_date"] = {}
+        if start_dt:
+            query["entry_date"]["$gte"] = start_dt
+        if end_dt:
+            query["entry_date"]["$lte"] = end_dt
+    return query
+
+
+async def account_totals(db, query: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """account -> {"debit", "credit"} summed over matching journal lines"""
+    rows = await db.journal_entries.aggregate([
+        {"$match": query},
+        {"$unwind": "$line_items"},
+        {"$group": {
+            "_id": "$line_items.account",
+            "debit": {"$sum": _NUM("$line_items.debit")},
+            "credit": {"$sum": _NUM("$line_items.credit")}
+        }}
+    ]).to_list(None)
+    return {row["_id"]: {"debit": row["debit"], "credit": row["credit"]} for row in rows if row["_id"] is not None}
+
+
+def build_profit_loss(totals: Dict[str, Dict[str, float]], accounts: AccountMap) -> Dict[str, Any]:
+    sections = {key: {"items": [], "total": 0} for key in PL_SECTIONS}
+    for account, amounts in totals.items():
+        section = accounts.section(account)
+        if section not in sections:
+            continue
+        net_amount = amounts["credit"] - amounts["debit"]
+        # Income sections report credit - debit, expense sections the absolute cost
+        amount = net_amount if section in ("revenue", "other_income") else abs(net_amount)
+        sections[section]["items"].append({"account": account, "amount": amount})
+        sections[section]["total"] += amount
+
+    gross_profit = sections["revenue"]["total"] - sections["cogs"]["total"]
+    operating_profit = gross_profit - sections["operating_expenses"]["total"]
+    net_before_tax = operating_profit + sections["other_income"]["total"] - sections["other_expenses"]["total"]
+    return {
+        **sections,
+        "gross_profit": gross_profit,
+        "operating_profit": operating_profit,
+        "net_profit_before_tax": net_before_tax,
+        "net_profit": net_before_tax,  # Assuming no tax for now
+    }
+
+
+def build_balance_sheet(totals: Dict[str, Dict[str, float]], accounts: AccountMap) -> Dict[str, Any]:
+    sheet = {
+        "assets": {
+            "current_assets": {"items": [], "total": 0},
+            "non_current_assets": {"items": [], "total": 0},
+            "total": 0
+        },
+        "liabilities": {
+            "current_liabilities": {"items": [], "total": 0},
+            "non_current_liabilities": {"items": [], "total": 0},
+            "total": 0
+        },
+        "equity": {"items": [], "total": 0},
+        "total_liabilities_equity": 0
+    }
+
+    def add(group: dict, account: str, amount: float):
+        group["items"].append({"account": account, "amount": amount})
+        group["total"] += amount
+
+    period_profit = 0
+    for account, amounts in totals.items():
+        balance = amounts["debit"] - amounts["credit"]
+        if balance == 0:
+            continue
+        section = accounts.section(account)
+
+        if section in PL_SECTIONS:
+            # Income / expense accounts close into equity as the period result
+            period_profit -= balance
+        elif section == "equity":
+            add(sheet["equity"], account, -balance)
+        elif section in ("current_liabilities", "non_current_liabilities"):
+            add(sheet["liabilities"][section], account, -balance)
+        elif section in ("current_assets", "non_current_assets"):
+            add(sheet["assets"][section], account, balance)
+        elif balance > 0:
+            add(sheet["assets"]["current_assets"], account, balance)
+        else:
+            add(sheet["liabilities"]["current_liabilities"], account, -balance)
+
+    if period_profit:
+        add(sheet["equity"], "Retained Earnings (Current Period)", period_profit)
+
+    sheet["assets"]["total"] = sheet["assets"]["current_assets"]["total"] + sheet["assets"]["non_current_assets"]["total"]
+    sheet["liabilities"]["total"] = (
+        sheet["liabilities"]["current_liabilities"]["total"] + sheet["liabilities"]["non_current_liabilities"]["total"]
+    )
+    sheet["total_liabilities_equity"] = sheet["liabilities"]["total"] + sheet["equity"]["total"]
+    return sheet
+
+
+def build_trial_balance(totals: Dict[str, Dict[str, float]]) -> Tuple[List[dict], float, float]:
+    rows, total_debit, total_credit = [], 0, 0
+    for account, amounts in sorted(totals.items()):
+        rows.append({
+            "account": account,
+            "debit": amounts["debit"],
+            "credit": amounts["credit"],
+            "balance": amounts["debit"] - amounts["credit"]
+        })
+        total_debit += amounts["debit"]
+        total_credit += amounts["credit"]
+    return rows, total_debit, total_credit
+
+
+async def cash_lines(db, query: Dict[str, Any]) -> List[dict]:
+    """Journal lines that touch cash / bank accounts: {description, amount (debit - credit)}"""
+    return await db.journal_entries.aggregate([
+        {"$match": {**query, "line_items.account": {"$regex": "cash|bank", "$options": "i"}}},
+        {"$unwind": "$line_items"},
+        {"$match": {"line_items.account": {"$regex": "cash|bank", "$options": "i"}}},
+        {"$project": {
+            "_id": 0,
+            "description": {"$ifNull": ["$description", ""]},
+            "amount": {"$subtract": [_NUM("$line_items.debit"), _NUM("$line_items.credit")]}
+        }}
+    ]).to_list(None)
+
+
+# ==================== GENERAL LEDGER ====================
+
+def encode_cursor(entry_date: Any, entry_id: Any, line_index: int, balance: float) -> str:
+    # Keep entry_date in its stored BSON type (entries store isoformat strings):
+    # $gt across types never matches, so a converted value ends paging early
+    payload = {
+        "d": entry_date.isoformat() if isinstance(entry_date, datetime) else entry_date,
+        "i": entry_id,
+        "l": line_index,
+        "b": balance,
+    }
+    if isinstance(entry_date, datetime):
+        payload["dt"] = True
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+        if payload.pop("dt", False):
+            payload["d"] = datetime.fromisoformat(payload["d"])
+        return payload
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def account_opening_balance(db, account: str, start_dt: Optional[datetime]) -> float:
+    """Debit - credit for the account before the period start"""
+    if not start_dt:
+        return 0
+    rows = await db.journal_entries.aggregate([
+        {"$match": {"line_items.account": account, "entry_date": {"$lt": start_dt}}},
+        {"$unwind": "$line_items"},
+        {"$match": {"line_items.account": account}},
+        {"$group": {
+            "_id": None,
+            "balance": {"$sum": {"$subtract": [_NUM("$line_items.debit"), _NUM("$line_items.credit")]}}
+        }}
+    ]).to_list(1)
+    return rows[0]["balance"] if rows else 0
+
+
+async def ledger_page(
+    db,
+    account: str,
+    start_dt: Optional[datetime] = None,
+    end_dt: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: int = 500
+) -> Dict[str, Any]:
+    """One page of an account's ledger, ordered by (entry_date, entry id, line)"""
+    query = {**date_range_query(start_dt, end_dt), "line_items.account": account}
+
+    if cursor:
+        position = decode_cursor(cursor)
+        opening = position["b"]
+        after = {"$or": [
+            {"entry_date": {"$gt": position["d"]}},
+            {"entry_date": position["d"], "id": {"$gt": position["i"]}},
+            {"entry_date": position["d"], "id": position["i"], "line_index": {"$gt": position["l"]}},
+        ]}
+    else:
+        opening = await account_opening_balance(db, account, start_dt)
+        after = {}
+
+    rows = await db.journal_entries.aggregate([
+        {"$match": query},
+        {"$unwind": {"path": "$line_items", "includeArrayIndex": "line_index"}},
+        {"$match": {"line_items.account": account, **after}},
+        {"$sort": {"entry_date": 1, "id": 1, "line_index": 1}},
+        {"$limit": limit + 1},
+        {"$project": {
+            "_id": 0, "entry_date": 1, "id": 1, "description": 1, "line_index": 1,
+            "line_description": "$line_items.description",
+            "debit": _NUM("$line_items.debit"),
+            "credit": _NUM("$line_items.credit")
+        }}
+    ]).to_list(None)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    running_balance = opening
+    transactions = []
+    for row in rows:
+        running_balance += row["debit"] - row["credit"]
+        transactions.append({
+            "date": row.get("entry_date"),
+            "entry_id": row.get("id"),
+            "description": (row.get("description") or "") + " - " + (row.get("line_description") or ""),
+            "debit": row["debit"],
+            "credit": row["credit"],
+            "balance": running_balance
+        })
+
+    next_cursor = None
+    if has_more and rows:
+        last = rows[-1]
+        next_cursor = encode_cursor(last.get("entry_date"), last.get("id"), last["line_index"], running_balance)
+
+    return {
+        "account": account,
+        "transactions": transactions,
+        "opening_balance": opening,
+        "closing_balance": running_balance,
+        "next_cursor": next_cursor,
+        "has_more": has_more
+    }
@@ -1,9 +1,8 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, status, UploadFile, File
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
 import logging
 from pathlib import Path
@@ -11,7 +10,6 @@ from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional, Dict, Any
 import uuid
 from datetime import datetime, timezone, timedelta
-from passlib.context import CryptContext
 # import jwt  # Removed in favor of auth_utils
 # from emergentintegrations.llm.chat import LlmChat, UserMessage
 try:
@@ -23,6 +21,7 @@ except ImportError:
 
 
 import asyncio
+import numpy as np
 import pandas as pd
 import io
 
@@ -40,13 +39,43 @@ load_dotenv(ROOT_DIR / '.env')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# MongoDB connection with error handling
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+# MongoDB connection with error handling (shared pool from db_provider)
+from db_provider import get_client, get_db, close_client, get_pool_stats
+from index_registry import ensure_indexes, APPLY_INDEXES_ON_STARTUP
+from cashflow_enrichment import resolve_linked_documents, enrich_cashflow_transaction, build_cashflow_statement
+from ledger_reports import (
+    account_map, account_totals, date_range_query, build_profit_loss,
+    build_balance_sheet, build_trial_balance, cash_lines, ledger_page, invalidate_account_map
+)
+from balance_snapshots import (
+    opening_balance as snapshot_opening_balance,
+    apply_transactions as apply_snapshot_transactions,
+    record_transaction, remove_transaction, drop_account_snapshots,
+    rebuild_balance_snapshots
+)
+from bulk_import import (
+    ImportSpec, register_import_spec, IMPORT_SPECS, IMPORT_JOBS, IMPORT_INLINE_MAX_BYTES,
+    number, dates, text, optional_text, valid_emails, allocate_numbers,
+    create_import_job, run_import_job, launch_import_job, resume_abandoned_imports,
+    cancel_import, job_errors, legacy_upload_response
+)
+from sequence_service import sequence_key, next_id
+from report_compiler import touch_report_data
+from search_index import SEARCH_SYNC_ENABLED, search_sync
+from chat_fanout import chat_hub
+from job_scheduler import SCHEDULER_ENABLED, scheduler
+from workflow_runtime import WORKFLOW_RUNTIME_ENABLED, workflow_runtime
+from email_tracking import email_tracking
+from recon_matcher import suggestion_scores, resume_reconciliation_jobs
+from payroll_engine import resume_abandoned_payruns
+from campaign_sender import resume_campaign_sends
+import scheduled_jobs  # noqa: F401  registers the periodic jobs
+
 db_name = os.environ.get('DB_NAME', 'innovate_books_db')
 
 try:
-    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=5000)
-    db = client[db_name]
+    client = get_client()
+    db = get_db(db_name)
     logger.info(f"MongoDB client initialized for database: {db_name}")
 except Exception as e:
     logger.error(f"Failed to initialize MongoDB client: {e}")
@@ -59,12 +88,12 @@ except Exception as e:
 
 
 
-# Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Security (bcrypt runs on the bounded hashing pool in password_hasher)
+from password_hasher import hash_password_async, verify_password_async
 security = HTTPBearer()
 
 # Imported from auth_utils to ensure consistency
-from auth_utils import create_access_token, verify_token
+from auth_utils import create_access_token, verify_token, get_user_profile, get_auth_cache_stats
 
 # Create the main app without a prefix
 app = FastAPI()
@@ -123,6 +152,29 @@ async def api_health_check():
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
 
+@app.get("/api/health/db-pool")
+async def db_pool_diagnostics():
+    """
+    MongoDB connection pool diagnostics.
+    Reports the configured pool options and live metrics (connections open,
+    checked out, checkout wait time) for the shared client.
+    """
+    return {
+        "status": "ok",
+        "pool": get_pool_stats(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
+
+@app.get("/api/health/auth-cache")
+async def auth_cache_diagnostics():
+    """Verified-token LRU and user profile cache sizes and hit counts"""
+    return {
+        "status": "ok",
+        "cache": get_auth_cache_stats(),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    }
+
 # ==================== MODELS ====================
 
 # Auth Models
@@ -447,11 +499,11 @@ class AdjustmentEntry(BaseModel):
 
 # ==================== HELPER FUNCTIONS ====================
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def hash_password(password: str) -> str:
+    return await hash_password_async(password)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return await verify_password_async(plain_password, hashed_password)
 
 # Local create_access_token removed. Using auth_utils.create_access_token instead.
 
@@ -499,12 +551,9 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         payload = verify_token(token, verify_type="access")
 
         user_id = payload.get("user_id") # auth_utils normalizes this
-        
-        user = await db.users.find_one({"_id": user_id})
-        if user is None:
-            user = await db.users.find_one({"user_id": user_id})
-        if user is None:
-            user = await db.users.find_one({"id": user_id})
+
+        # Single $or lookup on _id / user_id / id, served from the profile cache when warm
+        user = await get_user_profile(db, user_id)
 
         if user is None:
             user = {
@@ -599,7 +648,7 @@ async def register(user_data: UserRegister):
     )
     
     user_dict = user.model_dump()
-    user_dict['password'] = hash_password(user_data.password)
+    user_dict['password'] = await hash_password(user_data.password)
     user_dict['created_at'] = user_dict['created_at'].isoformat()
     
     await db.users.insert_one(user_dict)
@@ -715,6 +764,7 @@ async def fix_invoice_totals(current_user: User = Depends(get_current_user)):
                     {"id": invoice['id']},
                     {"$set": update_data}
                 )
+                await touch_report_data(db, "invoices")
                 
                 fixes.append({
                     "invoice_number": invoice_number,
@@ -757,18 +807,10 @@ async def get_cashflow_summary(
     last_day = calendar.monthrange(year, month)[1]
     end_date = datetime(year, month, last_day, 23, 59, 59, tzinfo=timezone.utc)
     
-    # Get opening balance (sum of all transactions before period start)
-    opening_query = {"transaction_date": {"$lt": start_date.isoformat()}}
-    if account_id:
-        opening_query["account_id"] = account_id
+    # Opening balance from the monthly balance snapshots (no history scan)
+    opening_balance = await snapshot_opening_balance(db, f"{year:04d}-{month:02d}", account_id)
     
-    opening_txns = await db.transactions.find(opening_query, {"_id": 0}).to_list(None)
-    opening_balance = sum(
-        t.get('amount', 0) if t.get('transaction_type') == 'Credit' else -t.get('amount', 0)
-        for t in opening_txns
-    )
-    
-    # Get transactions for the period
+    # Inflows / outflows for the period, aggregated on the server
     period_query = {
         "transaction_date": {
             "$gte": start_date.isoformat(),
@@ -776,12 +818,16 @@ async def get_cashflow_summary(
         }
     }
     if account_id:
-        period_query["account_id"] = account_id
+        period_query["bank_account_id"] = account_id
     
-    period_txns = await db.transactions.find(period_query, {"_id": 0}).to_list(None)
+    period_totals = await db.transactions.aggregate([
+        {"$match": period_query},
+        {"$group": {"_id": "$transaction_type", "total": {"$sum": "$amount"}}}
+    ]).to_list(None)
+    totals = {row["_id"]: row["total"] for row in period_totals}
     
-    inflows = sum(t.get('amount', 0) for t in period_txns if t.get('transaction_type') == 'Credit')
-    outflows = sum(t.get('amount', 0) for t in period_txns if t.get('transaction_type') == 'Debit')
+    inflows = totals.get('Credit', 0)
+    outflows = totals.get('Debit', 0)
     
     net_cash_flow = inflows - outflows
     closing_balance = opening_balance + net_cash_flow
@@ -795,6 +841,13 @@ async def get_cashflow_summary(
     }
 
 
+@api_router.post("/cashflow/snapshots/rebuild")
+async def rebuild_cashflow_snapshots(current_user: User = Depends(get_current_user)):
+    """Recompute the monthly cash balance snapshots from all transactions"""
+    result = await rebuild_balance_snapshots(db)
+    return {"success": True, **result}
+
+
 @api_router.get("/cashflow/actuals/transactions")
 async def get_cashflow_transactions(
     month: int = None,
@@ -831,50 +884,9 @@ async def get_cashflow_transactions(
     skip = (page - 1) * limit
     transactions = await db.transactions.find(query, {"_id": 0}).sort("transaction_date", -1).skip(skip).limit(limit).to_list(limit)
     
-    # Enrich with linked document data
-    enriched = []
-    for txn in transactions:
-        linked_doc_id = txn.get('linked_entity')
-        counterparty = None
-        subcategory = "General"
-        flow_category = "Operating"
-        
-        if linked_doc_id:
-            if txn.get('transaction_type') == 'Credit':
-                # Check invoices
-                invoice = await db.invoices.find_one({"invoice_number": linked_doc_id}, {"_id": 0})
-                if invoice:
-                    counterparty = invoice.get('customer_name')
-                    subcategory = "Receipts from Customers"
-            else:
-                # Check bills
-                bill = await db.bills.find_one({"bill_number": linked_doc_id}, {"_id": 0})
-                if bill:
-                    counterparty = bill.get('vendor_name')
-                    bill_category = bill.get('category', 'General')
-                    
-                    # Map category to cash flow type
-                    if bill_category in ['Salary', 'Rent', 'Purchase', 'Utilities']:
-                        flow_category = "Operating"
-                        subcategory = f"Payment for {bill_category}"
-                    elif bill_category in ['Asset', 'Equipment', 'Property']:
-                        flow_category = "Investing"
-                        subcategory = "Purchase of Fixed Assets"
-                    elif bill_category in ['Loan', 'Interest']:
-                        flow_category = "Financing"
-                        subcategory = "Loan Repayment"
-        
-        enriched.append({
-            "date": txn.get('transaction_date'),
-            "account": txn.get('account_name', 'Bank Account'),
-            "type": "Inflow" if txn.get('transaction_type') == 'Credit' else "Outflow",
-            "amount": txn.get('amount', 0),
-            "category": flow_category,
-            "subcategory": subcategory,
-            "counterparty": counterparty or "N/A",
-            "linked_doc": linked_doc_id or "N/A",
-            "description": txn.get('description', 'N/A')
-        })
+    # Enrich with linked document data: one $in query per collection for the page
+    invoices, bills = await resolve_linked_documents(db, transactions)
+    enriched = [enrich_cashflow_transaction(txn, invoices, bills) for txn in transactions]
     
     total_count = await db.transactions.count_documents(query)
     
@@ -912,45 +924,13 @@ async def get_cashflow_statement(
         }
     }
     
-    transactions = await db.transactions.find(query, {"_id": 0}).to_list(None)
+    transactions = await db.transactions.find(
+        query, {"_id": 0, "amount": 1, "transaction_type": 1, "linked_entity": 1}
+    ).to_list(None)
     
-    # Initialize statement structure
-    statement = {
-        "Operating Activities": {},
-        "Investing Activities": {},
-        "Financing Activities": {}
-    }
-    
-    for txn in transactions:
-        amount = txn.get('amount', 0)
-        txn_type = txn.get('transaction_type')
-        linked_doc = txn.get('linked_entity')
-        
-        category = "Operating Activities"
-        line_item = "Cash receipts from customers" if txn_type == 'Credit' else "Cash paid to suppliers"
-        
-        # Determine category based on linked document
-        if linked_doc:
-            if txn_type == 'Debit':
-                bill = await db.bills.find_one({"bill_number": linked_doc}, {"_id": 0})
-                if bill:
-                    bill_cat = bill.get('category', '').lower()
-                    if 'asset' in bill_cat or 'equipment' in bill_cat:
-                        category = "Investing Activities"
-                        line_item = "Purchase of fixed assets"
-                    elif 'loan' in bill_cat or 'interest' in bill_cat:
-                        category = "Financing Activities"
-                        line_item = "Repayment of borrowings"
-                    elif 'salary' in bill_cat:
-                        line_item = "Cash paid to employees"
-                    elif 'rent' in bill_cat:
-                        line_item = "Cash paid for rent"
-        
-        # Add to statement
-        if line_item not in statement[category]:
-            statement[category][line_item] = 0
-        
-        statement[category][line_item] += amount if txn_type == 'Credit' else -amount
+    # Only debit lines are classified by their linked bill; resolve all bills in one batch
+    _, bills = await resolve_linked_documents(db, transactions, include_invoices=False)
+    statement = build_cashflow_statement(transactions, bills)
     
     # Calculate net flows
     operating_net = sum(statement["Operating Activities"].values())
@@ -1140,8 +1120,7 @@ async def get_dashboard_metrics(current_user: User = Depends(get_current_user)):
 @api_router.post("/customers", response_model=Customer)
 async def create_customer(customer_data: CustomerCreate, current_user: User = Depends(get_current_user)):
     # Generate sequential customer_id
-    count = await db.parties_customers.count_documents({})
-    customer_id = f"CUST-{str(count + 1).zfill(3)}"
+    customer_id = await next_id("CUST", width=3, seed=lambda: db.parties_customers.count_documents({}), db=db)
     
     customer = Customer(**customer_data.model_dump(), customer_id=customer_id)
     doc = customer.model_dump()
@@ -1305,8 +1284,7 @@ async def create_invoice(invoice_data: InvoiceCreate, current_user: User = Depen
         raise HTTPException(status_code=404, detail="Customer not found")
     
     # Generate invoice number
-    count = await db.invoices.count_documents({})
-    invoice_number = f"INV-{count + 1001}"
+    invoice_number = await next_id("INV", width=1, offset=1000, seed=lambda: db.invoices.count_documents({}), db=db)
     
     invoice = Invoice(
         invoice_number=invoice_number,
@@ -1322,6 +1300,7 @@ async def create_invoice(invoice_data: InvoiceCreate, current_user: User = Depen
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.invoices.insert_one(doc)
+    await touch_report_data(db, "invoices")
     
     # Phase 2: Auto-post journal entry if status is "Finalized"
     if invoice_data.status == "Finalized":
@@ -1344,6 +1323,7 @@ async def create_invoice(invoice_data: InvoiceCreate, current_user: User = Depen
             {"id": invoice.id},
             {"$set": {"journal_entry_id": journal['id']}}
         )
+        await touch_report_data(db, "invoices")
         invoice.journal_entry_id = journal['id']
     
     return invoice
@@ -1568,6 +1548,7 @@ async def update_invoice(invoice_id: str, invoice_data: InvoiceCreate, current_u
         {"id": invoice_id},
         {"$set": update_data}
     )
+    await touch_report_data(db, "invoices")
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Invoice not found or no changes made")
@@ -1578,6 +1559,7 @@ async def update_invoice(invoice_id: str, invoice_data: InvoiceCreate, current_u
 async def delete_invoice(invoice_id: str, current_user: User = Depends(get_current_user)):
     """Delete invoice"""
     result = await db.invoices.delete_one({"id": invoice_id})
+    await touch_report_data(db, "invoices")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Invoice not found")
     return {"message": "Invoice deleted successfully"}
@@ -1619,8 +1601,7 @@ async def create_bill(bill_data: BillCreate, current_user: User = Depends(get_cu
         raise HTTPException(status_code=404, detail="Vendor not found")
     
     # Generate bill number
-    count = await db.bills.count_documents({})
-    bill_number = f"BILL-{count + 2001}"
+    bill_number = await next_id("BILL", width=1, offset=2000, seed=lambda: db.bills.count_documents({}), db=db)
     
     bill = Bill(
         bill_number=bill_number,
@@ -1636,6 +1617,7 @@ async def create_bill(bill_data: BillCreate, current_user: User = Depends(get_cu
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.bills.insert_one(doc)
+    await touch_report_data(db, "bills")
     
     # Phase 2: Auto-post journal entry if status is "Approved"
     if bill_data.status == "Approved":
@@ -1658,6 +1640,7 @@ async def create_bill(bill_data: BillCreate, current_user: User = Depends(get_cu
             {"id": bill.id},
             {"$set": {"journal_entry_id": journal['id']}}
         )
+        await touch_report_data(db, "bills")
         bill.journal_entry_id = journal['id']
     
     return bill
@@ -1809,6 +1792,7 @@ async def update_bill(bill_id: str, bill_data: BillCreate, current_user: User =
         {"id": bill_id},
         {"$set": update_data}
     )
+    await touch_report_data(db, "bills")
     
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Bill not found or no changes made")
@@ -1819,6 +1803,7 @@ async def update_bill(bill_id: str, bill_data: BillCreate, current_user: User =
 async def delete_bill(bill_id: str, current_user: User = Depends(get_current_user)):
     """Delete bill"""
     result = await db.bills.delete_one({"id": bill_id})
+    await touch_report_data(db, "bills")
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Bill not found")
     return {"message": "Bill deleted successfully"}
@@ -1886,6 +1871,7 @@ async def create_transaction(trans_data: TransactionCreate, current_user: User =
     doc['created_at'] = doc['created_at'].isoformat()
     
     await db.transactions.insert_one(doc)
+    await record_transaction(db, doc)
     
     # Update bank account balance
     await db.bank_accounts.update_one(
@@ -2003,6 +1989,7 @@ async def match_transaction(
             {"id": entity_id},
             {"$set": update_data}
         )
+        await touch_report_data(db, "invoices")
         
         # Update transaction
         await db.transactions.update_one(
@@ -2047,6 +2034,7 @@ async def match_transaction(
                 }
             }
         )
+        await touch_report_data(db, "bills")
         
         # Update transaction
         await db.transactions.update_one(
@@ -2091,6 +2079,7 @@ async def delete_bank_account(account_id: str, current_user: User = Depends(get_
     
     # Delete all transactions for this account
     await db.transactions.delete_many({"bank_account_id": account_id})
+    await drop_account_snapshots(db, account_id)
     
     # Delete the account
     await db.bank_accounts.delete_one({"id": account_id})
@@ -2122,6 +2111,7 @@ async def delete_transaction(transaction_id: str, current_user: User = Depends(g
     
     # Delete the transaction
     await db.transactions.delete_one({"id": transaction_id})
+    await remove_transaction(db, transaction)
     
     return {"message": "Transaction deleted successfully"}
 
@@ -2159,148 +2149,53 @@ async def get_enhanced_match_suggestions(transaction_id: str, current_user: User
     
     amount = transaction.get('amount', 0)
     trans_type = transaction.get('transaction_type')
-    description = transaction.get('description', '').lower()
-    
-    def calculate_name_match_score(name, description):
-        """Calculate how well a name matches the description using fuzzy logic"""
-        name_lower = name.lower()
-        
-        # Exact full name match
-        if name_lower in description:
-            return 100
-        
-        # Split name into words and check partial matches
-        name_words = set(name_lower.split())
-        desc_words = set(description.split())
-        
-        # Calculate word overlap
-        if name_words:
-            common_words = name_words.intersection(desc_words)
-            word_overlap_ratio = len(common_words) / len(name_words)
-            
-            if word_overlap_ratio >= 0.8:  # 80% words match
-                return 95
-            elif word_overlap_ratio >= 0.6:  # 60% words match
-                return 85
-            elif word_overlap_ratio >= 0.4:  # 40% words match
-                return 70
-            elif word_overlap_ratio > 0:  # Any words match
-                return 50
-        
-        # Check for substring matches (for abbreviations)
-        for word in name_words:
-            if len(word) >= 3:  # Only check meaningful words
-                for desc_word in desc_words:
-                    if word in desc_word or desc_word in word:
-                        return 40
-        
-        return 0
-    
-    suggestions = []
+    description = transaction.get('description', '')
     
+    # Credits match unpaid invoices by customer, debits pending bills by vendor
     if trans_type == "Credit":
-        # Match with unpaid invoices - prioritize customer name matching
-        invoices = await db.invoices.find({
-            "status": {"$in": ["Unpaid", "Partially Paid"]}
-        }, {"_id": 0}).to_list(100)
-        
-        # First, identify potential customers from description
-        customer_matches = []
-        
-        for inv in invoices:
-            customer_name = inv.get('customer_name', '')
-            invoice_amount = inv.get('amount_outstanding', 0)
-            invoice_date = inv.get('invoice_date')
-            
-            # Calculate name match score (70% weight for description matching)
-            name_match = calculate_name_match_score(customer_name, description)
-            
-            # Calculate amount match score (30% weight)
-            amount_match = 0
-            if invoice_amount > 0:
-                amount_diff = abs(amount - invoice_amount) / invoice_amount
-                if amount_diff == 0:
-                    amount_match = 100
-                elif amount_diff <= 0.02:  # Within 2%
-                    amount_match = 98
-                elif amount_diff <= 0.05:  # Within 5%
-                    amount_match = 95
-                elif amount_diff <= 0.10:  # Within 10%
-                    amount_match = 85
-                elif amount_diff <= 0.20:  # Within 20%
-                    amount_match = 70
-                else:
-                    amount_match = max(0, 50 - (amount_diff * 50))
-            
-            # Weighted match score: 70% name, 30% amount
-            match_score = (name_match * 0.7) + (amount_match * 0.3)
-            
-            # If name matches well (>50%), show even if amount doesn't match perfectly
-            # This allows matching by customer first, then amount
-            if name_match >= 50 or match_score > 25:
-                suggestions.append({
-                    "type": "invoice",
-                    "id": inv['id'],
-                    "reference": inv['invoice_number'],
-                    "party": inv['customer_name'],
-                    "amount": inv['total_amount'],
-                    "pending_amount": invoice_amount,
-                    "date": invoice_date,
-                    "match_score": round(match_score, 1),
-                    "name_match": round(name_match, 1),
-                    "amount_match": round(amount_match, 1),
-                    "match_reason": "Customer name found in description" if name_match >= 50 else "Amount similarity"
-                })
-    
+        kind, collection, statuses, party_field, number_field, date_field = (
+            "invoice", db.invoices, ["Unpaid", "Partially Paid"], "customer_name", "invoice_number", "invoice_date")
     elif trans_type == "Debit":
-        # Match with pending bills - prioritize vendor name matching
-        bills = await db.bills.find({
-            "status": {"$in": ["Pending", "Partially Paid"]}
-        }, {"_id": 0}).to_list(100)
-        
-        for bill in bills:
-            vendor_name = bill.get('vendor_name', '')
-            bill_amount = bill.get('amount_outstanding', 0)
-            bill_date = bill.get('bill_date')
-            
-            # Calculate name match score (70% weight for description matching)
-            name_match = calculate_name_match_score(vendor_name, description)
-            
-            # Calculate amount match score (30% weight)
-            amount_match = 0
-            if bill_amount > 0:
-                amount_diff = abs(amount - bill_amount) / bill_amount
-                if amount_diff == 0:
-                    amount_match = 100
-                elif amount_diff <= 0.02:
-                    amount_match = 98
-                elif amount_diff <= 0.05:
-                    amount_match = 95
-                elif amount_diff <= 0.10:
-                    amount_match = 85
-                elif amount_diff <= 0.20:
-                    amount_match = 70
-                else:
-                    amount_match = max(0, 50 - (amount_diff * 50))
-            
-            # Weighted match score: 70% name, 30% amount
-            match_score = (name_match * 0.7) + (amount_match * 0.3)
-            
-            # If name matches well (>50%), show even if amount doesn't match perfectly
-            if name_match >= 50 or match_score > 25:
-                suggestions.append({
-                    "type": "bill",
-                    "id": bill['id'],
-                    "reference": bill['bill_number'],
-                    "party": bill['vendor_name'],
-                    "amount": bill['total_amount'],
-                    "pending_amount": bill_amount,
-                    "date": bill_date,
-                    "match_score": round(match_score, 1),
-                    "name_match": round(name_match, 1),
-                    "amount_match": round(amount_match, 1),
-                    "match_reason": "Vendor name found in description" if name_match >= 50 else "Amount similarity"
-                })
+        kind, collection, statuses, party_field, number_field, date_field = (
+            "bill", db.bills, ["Pending", "Partially Paid"], "vendor_name", "bill_number", "bill_date")
+    else:
+        return []
+    
+    candidates = await collection.find(
+        {"status": {"$in": statuses}},
+        {"_id": 0, "id": 1, number_field: 1, party_field: 1, "total_amount": 1, "amount_outstanding": 1, date_field: 1}
+    ).to_list(length=None)
+    if not candidates:
+        return []
+    
+    # Scored in arrays: 70% name found in description, 30% amount
+    name_match, amount_match, match_score = suggestion_scores(
+        description, amount,
+        [doc.get(party_field, '') for doc in candidates],
+        [doc.get('amount_outstanding', 0) or 0 for doc in candidates]
+    )
+    
+    # If name matches well (>50%), show even if amount doesn't match perfectly
+    # This allows matching by customer / vendor first, then amount
+    selected = np.flatnonzero((name_match >= 50) | (match_score > 25))
+    selected = selected[np.lexsort((-name_match[selected], -np.round(match_score[selected], 1)))][:20]
+    party_label = "Customer" if kind == "invoice" else "Vendor"
+    suggestions = []
+    for i in selected:
+        doc = candidates[i]
+        suggestions.append({
+            "type": kind,
+            "id": doc['id'],
+            "reference": doc[number_field],
+            "party": doc[party_field],
+            "amount": doc['total_amount'],
+            "pending_amount": doc.get('amount_outstanding', 0),
+            "date": doc.get(date_field),
+            "match_score": round(float(match_score[i]), 1),
+            "name_match": round(float(name_match[i]), 1),
+            "amount_match": round(float(amount_match[i]), 1),
+            "match_reason": f"{party_label} name found in description" if name_match[i] >= 50 else "Amount similarity"
+        })
     
     # Sort by match score (highest first), then by name match
     suggestions.sort(key=lambda x: (x['match_score'], x.get('name_match', 0)), reverse=True)
@@ -2365,6 +2260,7 @@ async def match_transaction_manual(
                 {"id": entity_id},
                 {"$set": update_data}
             )
+            await touch_report_data(db, "invoices")
             
             matched_entities.append(f"Invoice {invoice['invoice_number']}")
             
@@ -2398,6 +2294,7 @@ async def match_transaction_manual(
                     }
                 }
             )
+            await touch_report_data(db, "bills")
             
             matched_entities.append(f"Bill {bill['bill_number']}")
     
@@ -2484,6 +2381,7 @@ async def dematch_transaction(
                 {"id": invoice['id']},
                 {"$set": update_data}
             )
+            await touch_report_data(db, "invoices")
             
             # Add activity
             await db.invoice_activities.insert_one({
@@ -2523,6 +2421,7 @@ async def dematch_transaction(
                     "status": new_status
                 }}
             )
+            await touch_report_data(db, "bills")
     
     # Update transaction to uncategorized
     await db.transactions.update_one(
@@ -3051,6 +2950,13 @@ async def get_ap_report(current_user: User = Depends(get_current_user)):
 
 # ==================== FINANCIAL REPORTING ENDPOINTS ====================
 
+def _report_date_range(start_date: Optional[str], end_date: Optional[str]):
+    """Inclusive datetime bounds for YYYY-MM-DD report parameters"""
+    start_dt = datetime.strptime(start_date, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0)
+    end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start_dt, end_dt
+
+
 @api_router.get("/reports/profit-loss")
 async def get_profit_loss_statement(
     start_date: Optional[str] = None,
@@ -3064,85 +2970,19 @@ async def get_profit_loss_statement(
     query = {}
     
     if start_date and end_date:
-        # Convert date strings to datetime objects for comparison
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0)
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
-        query['entry_date'] = {
-            "$gte": start_dt,
-            "$lte": end_dt
-        }
+        query = date_range_query(*_report_date_range(start_date, end_date))
     
-    # Get all journal entries
-    journal_entries = await db.journal_entries.find(query, {"_id": 0}).to_list(length=None)
+    # Per-account debit/credit totals, aggregated on the server
+    totals, accounts = await asyncio.gather(account_totals(db, query), account_map.get(db))
     
-    # Initialize P&L structure
     pl_statement = {
         "period": {
             "from": start_date or "Inception",
             "to": end_date or datetime.now(timezone.utc).isoformat()
         },
-        "revenue": {"items": [], "total": 0},
-        "cogs": {"items": [], "total": 0},
-        "operating_expenses": {"items": [], "total": 0},
-        "other_income": {"items": [], "total": 0},
-        "other_expenses": {"items": [], "total": 0},
-        "gross_profit": 0,
-        "operating_profit": 0,
-        "net_profit_before_tax": 0,
-        "net_profit": 0
+        **build_profit_loss(totals, accounts)
     }
     
-    # Aggregate amounts by account
-    account_totals = {}
-    
-    for entry in journal_entries:
-        for line_item in entry.get('line_items', []):
-            account = line_item['account']
-            
-            # Calculate net amount (credit - debit for income, debit - credit for expenses)
-            if account not in account_totals:
-                account_totals[account] = {"debit": 0, "credit": 0, "net": 0}
-            
-            account_totals[account]["debit"] += line_item.get('debit', 0)
-            account_totals[account]["credit"] += line_item.get('credit', 0)
-    
-    # Calculate net and categorize accounts
-    for account, amounts in account_totals.items():
-        net_amount = amounts["credit"] - amounts["debit"]
-        
-        # Categorize based on account name (simple classification)
-        account_lower = account.lower()
-        
-        if any(keyword in account_lower for keyword in ['revenue', 'sales', 'income', 'service']):
-            if 'other' not in account_lower and 'non-operating' not in account_lower:
-                pl_statement["revenue"]["items"].append({"account": account, "amount": net_amount})
-                pl_statement["revenue"]["total"] += net_amount
-            else:
-                pl_statement["other_income"]["items"].append({"account": account, "amount": net_amount})
-                pl_statement["other_income"]["total"] += net_amount
-        
-        elif any(keyword in account_lower for keyword in ['cogs', 'cost of goods', 'cost of sales']):
-            pl_statement["cogs"]["items"].append({"account": account, "amount": abs(net_amount)})
-            pl_statement["cogs"]["total"] += abs(net_amount)
-        
-        elif any(keyword in account_lower for keyword in ['expense', 'salary', 'rent', 'utilities', 'marketing', 'payroll', 'purchase', 'material', 'supplies', 'cost']):
-            if 'other' not in account_lower:
-                pl_statement["operating_expenses"]["items"].append({"account": account, "amount": abs(net_amount)})
-                pl_statement["operating_expenses"]["total"] += abs(net_amount)
-            else:
-                pl_statement["other_expenses"]["items"].append({"account": account, "amount": abs(net_amount)})
-                pl_statement["other_expenses"]["total"] += abs(net_amount)
-    
-    # Calculate totals
-    pl_statement["gross_profit"] = pl_statement["revenue"]["total"] - pl_statement["cogs"]["total"]
-    pl_statement["operating_profit"] = pl_statement["gross_profit"] - pl_statement["operating_expenses"]["total"]
-    pl_statement["net_profit_before_tax"] = (
-        pl_statement["operating_profit"] + 
-        pl_statement["other_income"]["total"] - 
-        pl_statement["other_expenses"]["total"]
-    )
-    pl_statement["net_profit"] = pl_statement["net_profit_before_tax"]  # Assuming no tax for now
-    
     return pl_statement
 
 @api_router.get("/reports/balance-sheet")
@@ -3159,92 +2999,15 @@ async def get_balance_sheet(
     if as_of_date:
         # Convert date string to datetime object for comparison
         end_dt = datetime.strptime(as_of_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
-        query['entry_date'] = {"$lte": end_dt}
+        query = date_range_query(end_dt=end_dt)
     
-    # Get all journal entries up to the date
-    journal_entries = await db.journal_entries.find(query, {"_id": 0}).to_list(length=None)
+    totals, accounts = await asyncio.gather(account_totals(db, query), account_map.get(db))
     
-    # Initialize Balance Sheet structure
     balance_sheet = {
         "as_of_date": as_of_date or datetime.now(timezone.utc).date().isoformat(),
-        "assets": {
-            "current_assets": {"items": [], "total": 0},
-            "non_current_assets": {"items": [], "total": 0},
-            "total": 0
-        },
-        "liabilities": {
-            "current_liabilities": {"items": [], "total": 0},
-            "non_current_liabilities": {"items": [], "total": 0},
-            "total": 0
-        },
-        "equity": {"items": [], "total": 0},
-        "total_liabilities_equity": 0
+        **build_balance_sheet(totals, accounts)
     }
     
-    # Aggregate amounts by account
-    account_balances = {}
-    
-    for entry in journal_entries:
-        for line_item in entry.get('line_items', []):
-            account = line_item['account']
-            
-            if account not in account_balances:
-                account_balances[account] = {"debit": 0, "credit": 0, "balance": 0}
-            
-            account_balances[account]["debit"] += line_item.get('debit', 0)
-            account_balances[account]["credit"] += line_item.get('credit', 0)
-    
-    # Calculate balances and categorize
-    for account, amounts in account_balances.items():
-        # Assets have debit balance, Liabilities/Equity have credit balance
-        balance = amounts["debit"] - amounts["credit"]
-        account_lower = account.lower()
-        
-        # Assets (debit balance)
-        if balance > 0:
-            if any(keyword in account_lower for keyword in ['cash', 'bank', 'receivable', 'inventory', 'prepaid']):
-                balance_sheet["assets"]["current_assets"]["items"].append({"account": account, "amount": balance})
-                balance_sheet["assets"]["current_assets"]["total"] += balance
-            elif any(keyword in account_lower for keyword in ['property', 'equipment', 'investment', 'intangible']):
-                balance_sheet["assets"]["non_current_assets"]["items"].append({"account": account, "amount": balance})
-                balance_sheet["assets"]["non_current_assets"]["total"] += balance
-            else:
-                # Default to current assets
-                balance_sheet["assets"]["current_assets"]["items"].append({"account": account, "amount": balance})
-                balance_sheet["assets"]["current_assets"]["total"] += balance
-        
-        # Liabilities and Equity (credit balance)
-        elif balance < 0:
-            abs_balance = abs(balance)
-            
-            if any(keyword in account_lower for keyword in ['payable', 'accrued', 'short-term']):
-                balance_sheet["liabilities"]["current_liabilities"]["items"].append({"account": account, "amount": abs_balance})
-                balance_sheet["liabilities"]["current_liabilities"]["total"] += abs_balance
-            elif any(keyword in account_lower for keyword in ['loan', 'long-term', 'bonds']):
-                balance_sheet["liabilities"]["non_current_liabilities"]["items"].append({"account": account, "amount": abs_balance})
-                balance_sheet["liabilities"]["non_current_liabilities"]["total"] += abs_balance
-            elif any(keyword in account_lower for keyword in ['equity', 'capital', 'retained']):
-                balance_sheet["equity"]["items"].append({"account": account, "amount": abs_balance})
-                balance_sheet["equity"]["total"] += abs_balance
-            else:
-                # Default to current liabilities
-                balance_sheet["liabilities"]["current_liabilities"]["items"].append({"account": account, "amount": abs_balance})
-                balance_sheet["liabilities"]["current_liabilities"]["total"] += abs_balance
-    
-    # Calculate totals
-    balance_sheet["assets"]["total"] = (
-        balance_sheet["assets"]["current_assets"]["total"] + 
-        balance_sheet["assets"]["non_current_assets"]["total"]
-    )
-    balance_sheet["liabilities"]["total"] = (
-        balance_sheet["liabilities"]["current_liabilities"]["total"] + 
-        balance_sheet["liabilities"]["non_current_liabilities"]["total"]
-    )
-    balance_sheet["total_liabilities_equity"] = (
-        balance_sheet["liabilities"]["total"] + 
-        balance_sheet["equity"]["total"]
-    )
-    
     return balance_sheet
 
 @api_router.get("/reports/trial-balance")
@@ -3260,47 +3023,10 @@ async def get_trial_balance(
     query = {}
     
     if start_date and end_date:
-        # Convert date strings to datetime objects for comparison
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0)
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
-        query['entry_date'] = {
-            "$gte": start_dt,
-            "$lte": end_dt
-        }
-    
-    journal_entries = await db.journal_entries.find(query, {"_id": 0}).to_list(length=None)
-    
-    # Aggregate by account
-    accounts = {}
+        query = date_range_query(*_report_date_range(start_date, end_date))
     
-    for entry in journal_entries:
-        for line_item in entry.get('line_items', []):
-            account = line_item['account']
-            
-            if account not in accounts:
-                accounts[account] = {"debit": 0, "credit": 0}
-            
-            accounts[account]["debit"] += line_item.get('debit', 0)
-            accounts[account]["credit"] += line_item.get('credit', 0)
-    
-    # Convert to list with balance
-    trial_balance_list = []
-    total_debit = 0
-    total_credit = 0
-    
-    for account, amounts in sorted(accounts.items()):
-        debit_balance = amounts["debit"]
-        credit_balance = amounts["credit"]
-        
-        trial_balance_list.append({
-            "account": account,
-            "debit": debit_balance,
-            "credit": credit_balance,
-            "balance": debit_balance - credit_balance
-        })
-        
-        total_debit += debit_balance
-        total_credit += credit_balance
+    totals = await account_totals(db, query)
+    trial_balance_list, total_debit, total_credit = build_trial_balance(totals)
     
     return {
         "period": {
@@ -3320,75 +3046,36 @@ async def get_general_ledger(
     account: Optional[str] = None,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(500, ge=1, le=5000),
     current_user: User = Depends(get_current_user)
 ):
     """
     Generate General Ledger - detailed transaction view
-    Filter by account and date range
+    Filter by account and date range.
+    With an account, pages through its lines: pass back `next_cursor` as
+    `cursor` to continue; the running balance is carried forward from the
+    opening balance before start_date. Without an account, returns the
+    first page of every account.
     """
-    query = {}
-    
+    start_dt = end_dt = None
     if start_date and end_date:
-        # Convert date strings to datetime objects for comparison
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0)
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
-        query['entry_date'] = {
-            "$gte": start_dt,
-            "$lte": end_dt
-        }
+        start_dt, end_dt = _report_date_range(start_date, end_date)
     
-    journal_entries = await db.journal_entries.find(query, {"_id": 0}).sort("entry_date", 1).to_list(length=None)
-    
-    # Group by account
-    ledger = {}
-    
-    for entry in journal_entries:
-        entry_date = entry.get('entry_date')
-        entry_id = entry.get('id')
-        description = entry.get('description', '')
-        
-        for line_item in entry.get('line_items', []):
-            acc = line_item['account']
-            
-            # Filter by account if specified
-            if account and acc != account:
-                continue
-            
-            if acc not in ledger:
-                ledger[acc] = {
-                    "account": acc,
-                    "transactions": [],
-                    "opening_balance": 0,
-                    "closing_balance": 0
-                }
-            
-            ledger[acc]["transactions"].append({
-                "date": entry_date,
-                "entry_id": entry_id,
-                "description": description + " - " + line_item.get('description', ''),
-                "debit": line_item.get('debit', 0),
-                "credit": line_item.get('credit', 0)
-            })
-    
-    # Calculate running balances
-    for acc, data in ledger.items():
-        running_balance = 0
-        for txn in data["transactions"]:
-            running_balance += txn["debit"] - txn["credit"]
-            txn["balance"] = running_balance
-        
-        data["closing_balance"] = running_balance
-    
-    # If specific account requested, return that; else return all
     if account:
-        return ledger.get(account, {"account": account, "transactions": [], "opening_balance": 0, "closing_balance": 0})
+        return await ledger_page(db, account, start_dt, end_dt, cursor, limit)
+    
+    accounts = sorted(await account_totals(db, date_range_query(start_dt, end_dt)))
+    pages = await asyncio.gather(*(
+        ledger_page(db, acc, start_dt, end_dt, None, limit) for acc in accounts
+    ))
     
     return {
         "period": {
             "from": start_date or "Inception",
             "to": end_date or datetime.now(timezone.utc).isoformat()
         },
-        "ledger": ledger
+        "ledger": {page["account"]: page for page in pages}
     }
 
 @api_router.get("/reports/cashflow-statement")
@@ -3404,15 +3091,10 @@ async def get_cashflow_statement(
     query = {}
     
     if start_date and end_date:
-        # Convert date strings to datetime objects for comparison
-        start_dt = datetime.strptime(start_date, '%Y-%m-%d').replace(hour=0, minute=0, second=0, microsecond=0)
-        end_dt = datetime.strptime(end_date, '%Y-%m-%d').replace(hour=23, minute=59, second=59, microsecond=999999)
-        query['entry_date'] = {
-            "$gte": start_dt,
-            "$lte": end_dt
-        }
+        query = date_range_query(*_report_date_range(start_date, end_date))
     
-    journal_entries = await db.journal_entries.find(query, {"_id": 0}).to_list(length=None)
+    # Only the cash / bank lines are unwound and returned by the pipeline
+    lines = await cash_lines(db, query)
     
     # Initialize cash flow structure
     cashflow = {
@@ -3428,71 +3110,26 @@ async def get_cashflow_statement(
         "net_change": 0
     }
     
-    # Track cash movements
-    for entry in journal_entries:
-        for line_item in entry.get('line_items', []):
-            account = line_item['account']
-            account_lower = account.lower()
-            debit = line_item.get('debit', 0)
-            credit = line_item.get('credit', 0)
-            
-            # Only track if it involves cash/bank
-            if 'cash' in account_lower or 'bank' in account_lower:
+    activity_keywords = [
+        ("operating_activities", ['invoice', 'sale', 'revenue', 'customer', 'expense', 'supplier', 'bill']),
+        ("investing_activities", ['asset', 'equipment', 'property', 'investment']),
+        ("financing_activities", ['loan', 'equity', 'dividend', 'capital']),
+    ]
+    
+    # Categorize based on transaction description
+    for line in lines:
+        desc = line["description"].lower()
+        amount = line["amount"]
+        for activity, keywords in activity_keywords:
+            if any(keyword in desc for keyword in keywords):
                 # Debit to cash = inflow, Credit from cash = outflow
-                amount = debit - credit
-                
-                # Categorize based on transaction description
-                desc = entry.get('description', '').lower()
-                
-                if any(keyword in desc for keyword in ['invoice', 'sale', 'revenue', 'customer', 'expense', 'supplier', 'bill']):
-                    if amount > 0:
-                        cashflow["operating_activities"]["inflows"].append({
-                            "description": entry.get('description', ''),
-                            "amount": amount
-                        })
-                    else:
-                        cashflow["operating_activities"]["outflows"].append({
-                            "description": entry.get('description', ''),
-                            "amount": abs(amount)
-                        })
-                
-                elif any(keyword in desc for keyword in ['asset', 'equipment', 'property', 'investment']):
-                    if amount > 0:
-                        cashflow["investing_activities"]["inflows"].append({
-                            "description": entry.get('description', ''),
-                            "amount": amount
-                        })
-                    else:
-                        cashflow["investing_activities"]["outflows"].append({
-                            "description": entry.get('description', ''),
-                            "amount": abs(amount)
-                        })
-                
-                elif any(keyword in desc for keyword in ['loan', 'equity', 'dividend', 'capital']):
-                    if amount > 0:
-                        cashflow["financing_activities"]["inflows"].append({
-                            "description": entry.get('description', ''),
-                            "amount": amount
-                        })
-                    else:
-                        cashflow["financing_activities"]["outflows"].append({
-                            "description": entry.get('description', ''),
-                            "amount": abs(amount)
-                        })
-    
-    # Calculate nets
-    cashflow["operating_activities"]["net"] = (
-        sum(item["amount"] for item in cashflow["operating_activities"]["inflows"]) -
-        sum(item["amount"] for item in cashflow["operating_activities"]["outflows"])
-    )
-    cashflow["investing_activities"]["net"] = (
-        sum(item["amount"] for item in cashflow["investing_activities"]["inflows"]) -
-        sum(item["amount"] for item in cashflow["investing_activities"]["outflows"])
-    )
-    cashflow["financing_activities"]["net"] = (
-        sum(item["amount"] for item in cashflow["financing_activities"]["inflows"]) -
-        sum(item["amount"] for item in cashflow["financing_activities"]["outflows"])
-    )
+                bucket = "inflows" if amount > 0 else "outflows"
+                cashflow[activity][bucket].append({
+                    "description": line["description"],
+                    "amount": abs(amount)
+                })
+                cashflow[activity]["net"] += amount
+                break
     
     cashflow["net_change"] = (
         cashflow["operating_activities"]["net"] +
@@ -3507,60 +3144,277 @@ async def get_cashflow_statement(
 
 
 # ==================== EXCEL/CSV UPLOAD ROUTES ====================
+# Uploads run through bulk_import: chunked reads, vectorised validation,
+# one $in prefetch and one bulk insert per chunk, block-allocated numbers.
+# Small files answer inline with the legacy response; larger ones (or
+# ?background=true) return a job id to poll under /api/imports.
+
+def _row_errors(df: pd.DataFrame, mask: pd.Series, message: str) -> List[tuple]:
+    return [(int(row), message) for row in df.loc[mask, '__row__']]
+
+
+async def _prepare_customer_rows(db_, df: pd.DataFrame, context: dict):
+    invalid = pd.Series(False, index=df.index)
+    credit_limit = number(df, 'credit_limit', 0, invalid)
+    closing_balance = number(df, 'closing_balance', 0, invalid)
+    bad_email = ~valid_emails(df, 'email') & ~invalid
+    errors = _row_errors(df, invalid, "Invalid numeric value") + _row_errors(df, bad_email, "Invalid email address")
+    ok = ~(invalid | bad_email)
+
+    name, contact, email, phone = text(df, 'name'), text(df, 'contact_person'), text(df, 'email'), text(df, 'phone')
+    gstin, pan, address = optional_text(df, 'gstin'), optional_text(df, 'pan'), optional_text(df, 'address')
+    terms = text(df, 'payment_terms', 'Net 30')
+
+    rows = df.index[ok]
+    customer_ids = await allocate_numbers(
+        db_, sequence_key("CUST"), len(rows), lambda n: f"CUST-{str(n).zfill(3)}",
+        seed=lambda: db_.parties_customers.count_documents({}),
+        collection="parties_customers", field="customer_id"
+    )
+    docs = []
+    for i, customer_id in zip(rows, customer_ids):
+        doc = Customer.model_construct(
+            customer_id=customer_id, name=name[i], contact_person=contact[i], email=email[i],
+            phone=phone[i], gstin=gstin[i], pan=pan[i], credit_limit=credit_limit[i],
+            payment_terms=terms[i], address=address[i],
+            outstanding_amount=closing_balance[i]  # Map closing_balance to outstanding_amount
+        ).model_dump()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['import_row'] = int(df.at[i, '__row__'])
+        docs.append(doc)
+    return docs, errors
+
+
+async def _prepare_vendor_rows(db_, df: pd.DataFrame, context: dict):
+    bad_email = ~valid_emails(df, 'email')
+    errors = _row_errors(df, bad_email, "Invalid email address")
+
+    name, contact, email, phone = text(df, 'name'), text(df, 'contact_person'), text(df, 'email'), text(df, 'phone')
+    gstin, pan, address = optional_text(df, 'gstin'), optional_text(df, 'pan'), optional_text(df, 'address')
+    bank_account, ifsc = optional_text(df, 'bank_account'), optional_text(df, 'ifsc')
+    terms = text(df, 'payment_terms', 'Net 30')
+
+    docs = []
+    for i in df.index[~bad_email]:
+        doc = Vendor.model_construct(
+            name=name[i], contact_person=contact[i], email=email[i], phone=phone[i],
+            gstin=gstin[i], pan=pan[i], payment_terms=terms[i],
+            bank_account=bank_account[i], ifsc=ifsc[i], address=address[i]
+        ).model_dump()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['import_row'] = int(df.at[i, '__row__'])
+        docs.append(doc)
+    return docs, errors
+
+
+async def _prepare_invoice_rows(db_, df: pd.DataFrame, context: dict):
+    now = datetime.now(timezone.utc)
+    invalid = pd.Series(False, index=df.index)
+    invoice_date = dates(df, 'invoice_date', invalid, default=now)
+    base_amount = number(df, 'base_amount', 0, invalid)
+    gst_percentage = number(df, 'gst_percentage', 18, invalid)
+    tds_percentage = number(df, 'tds_percentage', 0, invalid)
+    payment_terms = number(df, 'payment_terms', 30, invalid).astype(int)  # in days
+    owner = text(df, 'owner', 'N/A')
+    errors = _row_errors(df, invalid, "Invalid date or numeric value")
+
+    # Look up customers by customer_id (CUST-001): one $in for the chunk
+    customer_codes = text(df, 'customer_id')
+    customers = {
+        c['customer_id']: c for c in await db_.parties_customers.find(
+            {"customer_id": {"$in": list(set(customer_codes[~invalid]))}},
+            {"_id": 0, "id": 1, "name": 1, "customer_id": 1}
+        ).to_list(None)
+    }
+    no_customer = ~invalid & ~customer_codes.isin(list(customers))
+    errors += [(int(df.at[i, '__row__']), f"Customer with ID '{customer_codes[i]}' not found") for i in df.index[no_customer]]
+
+    # Invoice numbers from the file must be new; blanks are auto-generated
+    numbers = text(df, 'invoice_number')
+    given = (numbers != '') & ~invalid & ~no_customer
+    existing = {
+        d['invoice_number'] for d in await db_.invoices.find(
+            {"invoice_number": {"$in": list(set(numbers[given]))}}, {"_id": 0, "invoice_number": 1}
+        ).to_list(None)
+    }
+    duplicate = given & (numbers.isin(list(existing)) | numbers.where(given).duplicated(keep='first'))
+    errors += [(int(df.at[i, '__row__']), f"Invoice number '{numbers[i]}' already exists") for i in df.index[duplicate]]
+
+    ok = ~(invalid | no_customer | duplicate)
+    auto = ok & (numbers == '')
+    generated = iter(await allocate_numbers(
+        db_, sequence_key("INV"), int(auto.sum()), lambda n: f"INV-{n + 1000}",
+        seed=lambda: db_.invoices.count_documents({}),
+        collection="invoices", field="invoice_number", reserved=set(numbers[given])
+    ))
+
+    # Amount receivable = base_amount + GST - TDS
+    gst_amount = base_amount * (gst_percentage / 100)
+    tds_amount = base_amount * (tds_percentage / 100)
+    total_amount = base_amount + gst_amount
+    amount_receivable = total_amount - tds_amount
+
+    docs = []
+    for i in df.index[ok]:
+        customer = customers[customer_codes[i]]
+        due_date = invoice_date[i] + timedelta(days=int(payment_terms[i]))
+        doc = Invoice.model_construct(
+            invoice_number=next(generated) if auto[i] else numbers[i],
+            customer_id=customer['id'],  # Store internal customer id
+            customer_name=customer['name'],
+            invoice_date=invoice_date[i],
+            due_date=due_date,
+            base_amount=base_amount[i],
+            gst_percent=gst_percentage[i],
+            gst_amount=gst_amount[i],
+            tds_percent=tds_percentage[i],
+            tds_amount=tds_amount[i],
+            total_amount=total_amount[i],
+            amount_outstanding=amount_receivable[i]  # Outstanding is the net receivable amount
+        ).model_dump()
+        doc['owner'] = owner[i]
+        doc['invoice_date'] = doc['invoice_date'].isoformat()
+        doc['due_date'] = doc['due_date'].isoformat()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['import_row'] = int(df.at[i, '__row__'])
+        docs.append(doc)
+    return docs, errors
+
+
+async def _prepare_bill_rows(db_, df: pd.DataFrame, context: dict):
+    now = datetime.now(timezone.utc)
+    invalid = pd.Series(False, index=df.index)
+    bill_date = dates(df, 'bill_date', invalid, default=now)
+    due_date = dates(df, 'due_date', invalid, default=now)
+    base_amount = number(df, 'base_amount', 0, invalid)
+    gst_percent = number(df, 'gst_percent', 18, invalid)
+    expense_category = text(df, 'expense_category', 'General')
+    errors = _row_errors(df, invalid, "Invalid date or numeric value")
+
+    vendor_ids = text(df, 'vendor_id')
+    vendors = {
+        v['id']: v for v in await db_.parties_vendors.find(
+            {"id": {"$in": list(set(vendor_ids[~invalid]))}}, {"_id": 0, "id": 1, "name": 1}
+        ).to_list(None)
+    }
+    no_vendor = ~invalid & ~vendor_ids.isin(list(vendors))
+    errors += _row_errors(df, no_vendor, "Vendor not found")
+
+    ok = ~(invalid | no_vendor)
+    rows = df.index[ok]
+    bill_numbers = await allocate_numbers(
+        db_, sequence_key("BILL"), len(rows), lambda n: f"BILL-{n + 2000}",
+        seed=lambda: db_.bills.count_documents({}),
+        collection="bills", field="bill_number"
+    )
+    gst_amount = base_amount * (gst_percent / 100)
+    total_amount = base_amount + gst_amount
+
+    docs = []
+    for i, bill_number in zip(rows, bill_numbers):
+        doc = Bill.model_construct(
+            bill_number=bill_number,
+            vendor_id=vendor_ids[i],
+            vendor_name=vendors[vendor_ids[i]]['name'],
+            bill_date=bill_date[i],
+            due_date=due_date[i],
+            base_amount=base_amount[i],
+            gst_percent=gst_percent[i],
+            gst_amount=gst_amount[i],
+            total_amount=total_amount[i],
+            amount_outstanding=total_amount[i],
+            expense_category=expense_category[i]
+        ).model_dump()
+        doc['bill_date'] = doc['bill_date'].isoformat()
+        doc['due_date'] = doc['due_date'].isoformat()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['import_row'] = int(df.at[i, '__row__'])
+        docs.append(doc)
+    return docs, errors
+
+
+async def _prepare_transaction_rows(db_, df: pd.DataFrame, context: dict):
+    invalid = pd.Series(False, index=df.index)
+    transaction_date = dates(df, 'date', invalid, default=datetime.now(timezone.utc))
+    debit = number(df, 'debit', 0, invalid)
+    credit = number(df, 'credit', 0, invalid)
+    particulars = text(df, 'particulars')
+    reference = optional_text(df, 'reference')
+    no_amount = ~invalid & (credit <= 0) & (debit <= 0)
+    errors = _row_errors(df, invalid, "Invalid date or numeric value") + _row_errors(df, no_amount, "No debit or credit amount")
+
+    ok = ~(invalid | no_amount)
+    is_credit = credit > 0
+    amount = credit.where(is_credit, debit)
+    # Running balance continues from the previous chunk
+    balance = context['running_balance'] + amount.where(is_credit, -amount)[ok].cumsum()
+
+    docs = []
+    for i in df.index[ok]:
+        doc = Transaction.model_construct(
+            bank_account_id=context['bank_account_id'],
+            bank_name=context['bank_name'],
+            transaction_date=transaction_date[i],
+            description=particulars[i],
+            transaction_type="Credit" if is_credit[i] else "Debit",
+            amount=amount[i],
+            reference_no=reference[i],
+            balance=balance[i],
+            status="Uncategorized"  # All uploaded transactions are uncategorized
+        ).model_dump()
+        doc['transaction_date'] = doc['transaction_date'].isoformat()
+        doc['created_at'] = doc['created_at'].isoformat()
+        doc['import_row'] = int(df.at[i, '__row__'])
+        docs.append(doc)
+    if len(balance):
+        context['running_balance'] = float(balance.iloc[-1])
+    return docs, errors
+
+
+async def _apply_imported_transactions(db_, docs: List[dict], context: dict):
+    # One snapshot update and one balance write per chunk
+    await apply_snapshot_transactions(db_, docs)
+    await db_.bank_accounts.update_one(
+        {"id": context['bank_account_id']},
+        {"$set": {"current_balance": context['running_balance']}}
+    )
+
+
+async def _rollback_imported_transactions(db_, docs: List[dict], context: dict):
+    # Rows past the checkpoint may or may not have reached this account's snapshots
+    await rebuild_balance_snapshots(db_, context['bank_account_id'])
+    await db_.bank_accounts.update_one(
+        {"id": context['bank_account_id']},
+        {"$set": {"current_balance": context['running_balance']}}
+    )
+
+
+register_import_spec(ImportSpec("customers", "parties_customers", _prepare_customer_rows, "customers_added"))
+register_import_spec(ImportSpec("vendors", "parties_vendors", _prepare_vendor_rows, "vendors_added"))
+register_import_spec(ImportSpec("invoices", "invoices", _prepare_invoice_rows, "invoices_added"))
+register_import_spec(ImportSpec("bills", "bills", _prepare_bill_rows, "bills_added"))
+register_import_spec(ImportSpec(
+    "transactions", "transactions", _prepare_transaction_rows, "transactions_added",
+    after_chunk=_apply_imported_transactions, rollback=_rollback_imported_transactions
+))
+
+
+async def _run_upload(entity: str, file: UploadFile, current_user: User, background: Optional[bool], context: Optional[dict] = None):
+    job = await create_import_job(db, entity, file, current_user.id, context)
+    if background is None:
+        background = job['size_bytes'] > IMPORT_INLINE_MAX_BYTES
+    if background:
+        launch_import_job(db, job['job_id'])
+        return {"success": True, "job_id": job['job_id'], "status": "queued", "background": True}
+    finished = await run_import_job(db, job['job_id'])
+    return await legacy_upload_response(db, IMPORT_SPECS[entity], finished)
+
 
 @api_router.post("/customers/upload")
-async def upload_customers(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_customers(file: UploadFile = File(...), background: Optional[bool] = None, current_user: User = Depends(get_current_user)):
     """Upload customers via Excel/CSV"""
     try:
-        contents = await file.read()
-        
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        customers_added = 0
-        errors = []
-        
-        # Get current customer count for sequential ID generation
-        current_count = await db.parties_customers.count_documents({})
-        
-        for index, row in df.iterrows():
-            try:
-                # Generate sequential customer_id
-                customer_id = f"CUST-{str(current_count + customers_added + 1).zfill(3)}"
-                
-                # Handle closing_balance field
-                closing_balance = float(row.get('closing_balance', row.get('Closing Balance', 0)))
-                
-                customer = Customer(
-                    customer_id=customer_id,
-                    name=str(row.get('name', row.get('Name', ''))),
-                    contact_person=str(row.get('contact_person', row.get('Contact Person', ''))),
-                    email=str(row.get('email', row.get('Email', ''))),
-                    phone=str(row.get('phone', row.get('Phone', ''))),
-                    gstin=str(row.get('gstin', row.get('GSTIN', ''))) if pd.notna(row.get('gstin', row.get('GSTIN'))) else None,
-                    pan=str(row.get('pan', row.get('PAN', ''))) if pd.notna(row.get('pan', row.get('PAN'))) else None,
-                    credit_limit=float(row.get('credit_limit', row.get('Credit Limit', 0))),
-                    payment_terms=str(row.get('payment_terms', row.get('Payment Terms', 'Net 30'))),
-                    address=str(row.get('address', row.get('Address', ''))) if pd.notna(row.get('address', row.get('Address'))) else None,
-                    outstanding_amount=closing_balance  # Map closing_balance to outstanding_amount
-                )
-                
-                doc = customer.model_dump()
-                doc['created_at'] = doc['created_at'].isoformat()
-                await db.parties_customers.insert_one(doc)
-                customers_added += 1
-                
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
-        
-        return {
-            "success": True,
-            "customers_added": customers_added,
-            "errors": errors
-        }
-        
+        return await _run_upload("customers", file, current_user, background)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
 
@@ -3609,292 +3463,104 @@ async def export_customers(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=500, detail=f"Export failed: {str(e)}")
 
 @api_router.post("/bills/upload")
-async def upload_bills(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_bills(file: UploadFile = File(...), background: Optional[bool] = None, current_user: User = Depends(get_current_user)):
     """Upload bills via Excel/CSV"""
     try:
-        contents = await file.read()
-        
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        bills_added = 0
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                vendor_id = str(row.get('vendor_id', ''))
-                vendor = await db.parties_vendors.find_one({"id": vendor_id}, {"_id": 0})
-                if not vendor:
-                    errors.append(f"Row {index + 2}: Vendor not found")
-                    continue
-                
-                count = await db.bills.count_documents({})
-                bill_number = f"BILL-{count + 2001}"
-                
-                bill_date = pd.to_datetime(row.get('bill_date', datetime.now(timezone.utc)))
-                due_date = pd.to_datetime(row.get('due_date', datetime.now(timezone.utc)))
-                base_amount = float(row.get('base_amount', 0))
-                gst_percent = float(row.get('gst_percent', 18))
-                gst_amount = base_amount * (gst_percent / 100)
-                total_amount = base_amount + gst_amount
-                
-                bill = Bill(
-                    bill_number=bill_number,
-                    vendor_id=vendor_id,
-                    vendor_name=vendor['name'],
-                    bill_date=bill_date,
-                    due_date=due_date,
-                    base_amount=base_amount,
-                    gst_percent=gst_percent,
-                    gst_amount=gst_amount,
-                    total_amount=total_amount,
-                    amount_outstanding=total_amount,
-                    expense_category=str(row.get('expense_category', 'General'))
-                )
-                
-                doc = bill.model_dump()
-                doc['bill_date'] = doc['bill_date'].isoformat()
-                doc['due_date'] = doc['due_date'].isoformat()
-                doc['created_at'] = doc['created_at'].isoformat()
-                
-                await db.bills.insert_one(doc)
-                bills_added += 1
-                
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
-        
-        return {
-            "success": True,
-            "bills_added": bills_added,
-            "errors": errors
-        }
-        
+        return await _run_upload("bills", file, current_user, background)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
 
 @api_router.post("/vendors/upload")
-async def upload_vendors(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_vendors(file: UploadFile = File(...), background: Optional[bool] = None, current_user: User = Depends(get_current_user)):
     """Upload vendors via Excel/CSV"""
     try:
-        contents = await file.read()
-        
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        vendors_added = 0
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                vendor = Vendor(
-                    name=str(row.get('name', row.get('Name', ''))),
-                    contact_person=str(row.get('contact_person', row.get('Contact Person', ''))),
-                    email=str(row.get('email', row.get('Email', ''))),
-                    phone=str(row.get('phone', row.get('Phone', ''))),
-                    gstin=str(row.get('gstin', row.get('GSTIN', ''))) if pd.notna(row.get('gstin', row.get('GSTIN'))) else None,
-                    pan=str(row.get('pan', row.get('PAN', ''))) if pd.notna(row.get('pan', row.get('PAN'))) else None,
-                    payment_terms=str(row.get('payment_terms', row.get('Payment Terms', 'Net 30'))),
-                    bank_account=str(row.get('bank_account', row.get('Bank Account', ''))) if pd.notna(row.get('bank_account', row.get('Bank Account'))) else None,
-                    ifsc=str(row.get('ifsc', row.get('IFSC', ''))) if pd.notna(row.get('ifsc', row.get('IFSC'))) else None,
-                    address=str(row.get('address', row.get('Address', ''))) if pd.notna(row.get('address', row.get('Address'))) else None
-                )
-                
-                doc = vendor.model_dump()
-                doc['created_at'] = doc['created_at'].isoformat()
-                await db.parties_vendors.insert_one(doc)
-                vendors_added += 1
-                
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
-        
-        return {
-            "success": True,
-            "vendors_added": vendors_added,
-            "errors": errors
-        }
-        
+        return await _run_upload("vendors", file, current_user, background)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
 
 @api_router.post("/invoices/upload")
-async def upload_invoices(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_invoices(file: UploadFile = File(...), background: Optional[bool] = None, current_user: User = Depends(get_current_user)):
     """Upload invoices via Excel/CSV with new calculation logic"""
     try:
-        contents = await file.read()
-        
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        invoices_added = 0
-        errors = []
-        
-        for index, row in df.iterrows():
-            try:
-                customer_id = str(row.get('customer_id', ''))
-                # Look up customer by customer_id (CUST-001) instead of internal id
-                customer = await db.parties_customers.find_one({"customer_id": customer_id}, {"_id": 0})
-                if not customer:
-                    errors.append(f"Row {index + 2}: Customer with ID '{customer_id}' not found")
-                    continue
-                
-                # Get invoice number from Excel, or auto-generate if empty
-                invoice_number = str(row.get('invoice_number', '')).strip()
-                if not invoice_number:
-                    count = await db.invoices.count_documents({})
-                    invoice_number = f"INV-{count + 1001}"
-                else:
-                    # Check if invoice number already exists
-                    existing = await db.invoices.find_one({"invoice_number": invoice_number}, {"_id": 0})
-                    if existing:
-                        errors.append(f"Row {index + 2}: Invoice number '{invoice_number}' already exists")
-                        continue
-                
-                # Extract values from template
-                invoice_date = pd.to_datetime(row.get('invoice_date', datetime.now(timezone.utc)))
-                base_amount = float(row.get('base_amount', 0))
-                gst_percentage = float(row.get('gst_percentage', 18))
-                tds_percentage = float(row.get('tds_percentage', 0))
-                payment_terms = int(row.get('payment_terms', 30))  # in days
-                owner = str(row.get('owner', 'N/A'))  # New owner field
-                
-                # Calculate amounts using new formula
-                # Amount receivable = base_amount + (base_amount * gst_percentage/100) - (base_amount * tds_percentage/100)
-                gst_amount = base_amount * (gst_percentage / 100)
-                tds_amount = base_amount * (tds_percentage / 100)
-                total_amount = base_amount + gst_amount  # Invoice total
-                amount_receivable = base_amount + gst_amount - tds_amount  # Net amount after TDS
-                
-                # Calculate due date from invoice date + payment terms
-                due_date = invoice_date + pd.Timedelta(days=payment_terms)
-                
-                invoice = Invoice(
-                    invoice_number=invoice_number,
-                    customer_id=customer['id'],  # Store internal customer id
-                    customer_name=customer['name'],
-                    invoice_date=invoice_date,
-                    due_date=due_date,
-                    base_amount=base_amount,
-                    gst_percent=gst_percentage,
-                    gst_amount=gst_amount,
-                    tds_percent=tds_percentage,
-                    tds_amount=tds_amount,
-                    total_amount=total_amount,
-                    amount_outstanding=amount_receivable  # Outstanding is the net receivable amount
-                )
-                
-                doc = invoice.model_dump()
-                doc['owner'] = owner  # Add owner to the document
-                doc['invoice_date'] = doc['invoice_date'].isoformat()
-                doc['due_date'] = doc['due_date'].isoformat()
-                doc['created_at'] = doc['created_at'].isoformat()
-                
-                await db.invoices.insert_one(doc)
-                invoices_added += 1
-                
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
-        
-        return {
-            "success": True,
-            "invoices_added": invoices_added,
-            "errors": errors
-        }
-        
+        return await _run_upload("invoices", file, current_user, background)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
 
 @api_router.post("/transactions/upload")
-async def upload_transactions(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
+async def upload_transactions(
+    file: UploadFile = File(...),
+    bank_account_id: Optional[str] = None,
+    background: Optional[bool] = None,
+    current_user: User = Depends(get_current_user)
+):
     """Upload bank transactions via Excel/CSV with new format"""
+    # Requested bank account, else the first one (MVP behaviour)
+    if bank_account_id:
+        account = await db.bank_accounts.find_one({"id": bank_account_id}, {"_id": 0})
+    else:
+        account = await db.bank_accounts.find_one({}, {"_id": 0})
+    if not account:
+        raise HTTPException(status_code=404, detail="No bank accounts found")
+    
+    context = {
+        "bank_account_id": account['id'],
+        "bank_name": account['bank_name'],
+        "running_balance": account.get('current_balance', 0)
+    }
     try:
-        contents = await file.read()
-        
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(contents))
-        else:
-            df = pd.read_excel(io.BytesIO(contents))
-        
-        transactions_added = 0
-        errors = []
-        
-        # Get first bank account (for MVP - can be enhanced to accept bank_id)
-        accounts = await db.bank_accounts.find({}, {"_id": 0}).to_list(10)
-        if not accounts:
-            raise HTTPException(status_code=404, detail="No bank accounts found")
-        
-        account = accounts[0]  # Use first account
-        
-        for index, row in df.iterrows():
-            try:
-                # New format mapping
-                date_val = row.get('Date', row.get('date'))
-                particulars = str(row.get('Particulars', row.get('particulars', '')))
-                debit = float(row.get('Debit', row.get('debit', 0)))
-                credit = float(row.get('Credit', row.get('credit', 0)))
-                reference = str(row.get('Reference', row.get('reference', '')))
-                
-                # Determine transaction type and amount
-                if credit > 0:
-                    trans_type = "Credit"
-                    amount = credit
-                elif debit > 0:
-                    trans_type = "Debit"
-                    amount = debit
-                else:
-                    errors.append(f"Row {index + 2}: No debit or credit amount")
-                    continue
-                
-                transaction = Transaction(
-                    bank_account_id=account['id'],
-                    bank_name=account['bank_name'],
-                    transaction_date=pd.to_datetime(date_val) if pd.notna(date_val) else datetime.now(timezone.utc),
-                    description=particulars,
-                    transaction_type=trans_type,
-                    amount=amount,
-                    reference_no=reference if pd.notna(reference) and reference != 'nan' else None,
-                    status="Uncategorized"  # All uploaded transactions are uncategorized
-                )
-                
-                # Update balance
-                if trans_type == "Credit":
-                    new_balance = account['current_balance'] + amount
-                else:
-                    new_balance = account['current_balance'] - amount
-                
-                transaction.balance = new_balance
-                
-                doc = transaction.model_dump()
-                doc['transaction_date'] = doc['transaction_date'].isoformat()
-                doc['created_at'] = doc['created_at'].isoformat()
-                
-                await db.transactions.insert_one(doc)
-                
-                # Update bank account balance
-                await db.bank_accounts.update_one(
-                    {"id": account['id']},
-                    {"$set": {"current_balance": new_balance}}
-                )
-                
-                transactions_added += 1
-                
-            except Exception as e:
-                errors.append(f"Row {index + 2}: {str(e)}")
-        
-        return {
-            "success": True,
-            "transactions_added": transactions_added,
-            "errors": errors
-        }
-        
+        return await _run_upload("transactions", file, current_user, background, context)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Upload failed: {str(e)}")
 
+# ==================== IMPORT JOB ROUTES ====================
+
+@api_router.get("/imports")
+async def list_import_jobs(limit: int = Query(50, ge=1, le=500), current_user: User = Depends(get_current_user)):
+    """Recent upload jobs"""
+    jobs = await db[IMPORT_JOBS].find(
+        {}, {"_id": 0, "path": 0, "context": 0}
+    ).sort("created_at", -1).to_list(limit)
+    return {"success": True, "data": jobs}
+
+@api_router.get("/imports/{job_id}")
+async def get_import_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Progress of an upload job"""
+    job = await db[IMPORT_JOBS].find_one({"job_id": job_id}, {"_id": 0, "path": 0, "context": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return {"success": True, "data": job}
+
+@api_router.get("/imports/{job_id}/errors")
+async def get_import_job_errors(
+    job_id: str,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(get_current_user)
+):
+    """Per-row errors of an upload job"""
+    errors = await job_errors(db, job_id, skip, limit)
+    return {"success": True, "data": errors}
+
+@api_router.post("/imports/{job_id}/resume")
+async def resume_import_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Continue a failed or abandoned upload job from its last checkpoint"""
+    job = await db[IMPORT_JOBS].find_one({"job_id": job_id}, {"_id": 0, "status": 1, "path": 1})
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job['status'] in ("completed", "cancelled"):
+        raise HTTPException(status_code=400, detail=f"Import job is {job['status']}")
+    if not job.get('path') or not os.path.exists(job['path']):
+        raise HTTPException(status_code=400, detail="The uploaded file is no longer available; upload it again")
+    launch_import_job(db, job_id)
+    return {"success": True, "job_id": job_id, "status": "resuming"}
+
+@api_router.post("/imports/{job_id}/cancel")
+async def cancel_import_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Stop an upload job after its current chunk"""
+    if not await cancel_import(db, job_id):
+        raise HTTPException(status_code=404, detail="Import job not found or already finished")
+    return {"success": True, "job_id": job_id, "status": "cancelled"}
+
 # ==================== TEMPLATE DOWNLOAD ROUTES ====================
 
 @api_router.get("/templates/invoices")
@@ -4130,6 +3796,7 @@ async def create_category(
         raise HTTPException(status_code=400, detail="Category with this name already exists")
     
     await db.category_master.insert_one(category_dict)
+    invalidate_account_map()
     return Category(**category_dict)
 
 # ==================== JOURNAL ENTRY ENDPOINTS ====================
@@ -4226,8 +3893,7 @@ async def create_adjustment_entry(
         )
     
     # Generate adjustment entry number
-    count = await db.adjustment_entries.count_documents({})
-    entry_number = f"ADJ-{count + 1:04d}"
+    entry_number = await next_id("ADJ", seed=lambda: db.adjustment_entries.count_documents({}), db=db)
     
     adjustment_dict = entry.model_dump()
     adjustment_dict['id'] = str(uuid.uuid4())
@@ -4719,6 +4385,10 @@ app.include_router(email_campaigns_router)
 from workflow_builder_routes import router as workflow_builder_router
 app.include_router(workflow_builder_router)
 
+# Job scheduler status / manual triggers
+from scheduler_routes import router as scheduler_router
+app.include_router(scheduler_router)
+
 
 # Mount static files for uploads
 uploads_dir = "/app/backend/uploads"
@@ -4755,6 +4425,60 @@ async def auto_seed_on_startup():
     #         print(f"{methods:15} {route.path}")
     # print("="*80 + "\n")
     
+    if APPLY_INDEXES_ON_STARTUP:
+        try:
+            result = await ensure_indexes(db)
+            logger.info(
+                f"Index registry applied: {len(result['created'])} created, "
+                f"{len(result['existing'])} existing, {len(result['failed'])} failed"
+            )
+        except Exception as e:
+            logger.error(f"Index registry apply failed: {e}")
+
+    try:
+        resumed = await resume_abandoned_imports(db)
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} interrupted upload jobs: {resumed}")
+    except Exception as e:
+        logger.error(f"Resuming upload jobs failed: {e}")
+
+    try:
+        resumed = await resume_reconciliation_jobs(db)
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} interrupted reconciliation jobs: {resumed}")
+    except Exception as e:
+        logger.error(f"Resuming reconciliation jobs failed: {e}")
+
+    try:
+        resumed = await resume_abandoned_payruns(db)
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} interrupted pay run calculations: {resumed}")
+    except Exception as e:
+        logger.error(f"Resuming pay run calculations failed: {e}")
+
+    try:
+        resumed = await resume_campaign_sends(db)
+        if resumed:
+            logger.info(f"Resumed {len(resumed)} interrupted campaign sends: {resumed}")
+    except Exception as e:
+        logger.error(f"Resuming campaign sends failed: {e}")
+
+    if SEARCH_SYNC_ENABLED:
+        search_sync.start(db)
+
+    try:
+        await chat_hub.start(db)
+    except Exception as e:
+        logger.error(f"Chat fan-out backplane failed to start: {e}")
+
+    if SCHEDULER_ENABLED:
+        scheduler.start(db)
+
+    if WORKFLOW_RUNTIME_ENABLED:
+        workflow_runtime.start(db)
+
+    email_tracking.start(db)
+
     try:
         logger.info("Checking if seed data is needed...")
         
@@ -4792,7 +4516,7 @@ async def auto_seed_on_startup():
         demo_user = await db.users.find_one({"email": "demo@innovatebooks.com"})
         if not demo_user:
             logger.info("Creating demo user...")
-            hashed_password = pwd_context.hash("Demo1234")
+            hashed_password = await hash_password("Demo1234")
             demo_user_data = {
                 "user_id": str(uuid.uuid4()),
                 "email": "demo@innovatebooks.com",
@@ -4816,7 +4540,12 @@ async def auto_seed_on_startup():
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
+    await search_sync.stop()
+    await chat_hub.stop()
+    await scheduler.stop()
+    await workflow_runtime.stop()
+    await email_tracking.stop()
+    close_client()
 
 
 # Public endpoint to check database status and trigger seed if needed
@@ -4861,7 +4590,7 @@ async def seed_all_data():
         # Seed demo user if needed
         demo_user = await db.users.find_one({"email": "demo@innovatebooks.com"})
         if not demo_user:
-            hashed_password = pwd_context.hash("Demo1234")
+            hashed_password = await hash_password("Demo1234")
             demo_user_data = {
                 "user_id": str(uuid.uuid4()),
                 "email": "demo@innovatebooks.com",
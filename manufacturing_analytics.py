@@ -5,12 +5,9 @@ Implements comprehensive analytics and reporting for manufacturing leads
 
 from typing import Dict, Any, List, Optional
 from datetime import datetime, timedelta
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from db_provider import get_db
 
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
-db = client['innovate_books_db']
+db = get_db('innovate_books_db')
 
 
 class ManufacturingAnalytics:
@@ -7,8 +7,7 @@ from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime, date
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 
 from manufacturing_models import (
     ManufacturingLead, ManufacturingLeadCreate, ManufacturingLeadUpdate,
@@ -26,9 +25,7 @@ from manufacturing_validation_engine import validation_engine
 router = APIRouter(prefix="/api/manufacturing", tags=["Manufacturing"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
-db = client['innovate_books_db']
+db = get_db('innovate_books_db')
 
 # Collections
 leads_collection = db['mfg_leads']
@@ -6,8 +6,7 @@ CRUD operations for 90+ additional masters
 from fastapi import APIRouter, HTTPException
 from typing import List, Optional
 from datetime import datetime
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 
 # Import all Phase 2 models
 from manufacturing_models_phase2 import *
@@ -16,9 +15,7 @@ from manufacturing_models_phase2_part2 import *
 router = APIRouter(prefix="/api/manufacturing/phase2", tags=["Manufacturing Phase 2"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
-db = client['innovate_books_db']
+db = get_db('innovate_books_db')
 
 # Helper function
 def serialize_doc(doc):
@@ -7,8 +7,7 @@ from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 
 # Import Phase 3 engines
 from manufacturing_automation_engine import automation_engine
@@ -18,9 +17,7 @@ from manufacturing_analytics import analytics_engine
 router = APIRouter(prefix="/api/manufacturing", tags=["Manufacturing Phase 3"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
-db = client['innovate_books_db']
+db = get_db('innovate_books_db')
 
 
 # ============================================================================
@@ -84,7 +81,11 @@ async def get_validation_history(lead_id: str):
 # ============================================================================
 
 @router.post("/leads/{lead_id}/trigger-automation", response_model=dict)
-async def trigger_automation(lead_id: str, trigger: str = Query(..., description="Automation trigger")):
+async def trigger_automation(
+    lead_id: str,
+    trigger: str = Query(..., description="Automation trigger"),
+    background: bool = Query(False, description="Run the rules off the request path")
+):
     """
     Manually trigger automation rules
     
@@ -98,6 +99,9 @@ async def trigger_automation(lead_id: str, trigger: str = Query(..., description
         - task_check
         - info_check
         - production_feasibility_check
+    
+    With background=true the run is queued and its outcome is written to
+    the automation logs under the returned run_id.
     """
     # Get lead data
     lead = await db['mfg_leads'].find_one({'lead_id': lead_id})
@@ -105,6 +109,17 @@ async def trigger_automation(lead_id: str, trigger: str = Query(..., description
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
     
+    if background:
+        run_id = automation_engine.enqueue_automation(trigger, lead)
+        return {
+            "success": True,
+            "lead_id": lead_id,
+            "trigger": trigger,
+            "run_id": run_id,
+            "status": "queued",
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
     # Execute automation
     results = await automation_engine.execute_automation(trigger, lead)
     
@@ -121,6 +136,7 @@ async def trigger_automation(lead_id: str, trigger: str = Query(..., description
 @router.get("/automation/logs", response_model=dict)
 async def get_automation_logs(
     lead_id: Optional[str] = None,
+    run_id: Optional[str] = None,
     skip: int = 0,
     limit: int = 50
 ):
@@ -128,6 +144,8 @@ async def get_automation_logs(
     query = {}
     if lead_id:
         query['lead_id'] = lead_id
+    if run_id:
+        query['run_id'] = run_id
     
     logs = await db['mfg_automation_logs'].find(query).sort(
         'timestamp', -1
@@ -1,17 +1,22 @@
 """
 ML-Powered Bank Reconciliation Module
-Uses Gemini 3 Flash for intelligent transaction matching
+Uses Gemini 3 Flash for intelligent transaction matching, with the vectorised
+rule-based matcher (recon_matcher.py) as fallback and for full-period jobs
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime, timezone
+import asyncio
 import uuid
-import jwt
 import os
 import json
 from dotenv import load_dotenv
+from auth_utils import get_current_principal
+from recon_matcher import (
+    RECON_AUTO_MATCH_CONFIDENCE, RECON_JOBS, match_transactions, assign_suggestions,
+    load_open_records, apply_matches, create_reconciliation_job, launch_reconciliation_job
+)
 
 load_dotenv()
 
@@ -26,19 +31,8 @@ def get_db():
     return db
 
 
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {
-            "user_id": payload.get("user_id"),
-            "org_id": payload.get("org_id")
-        }
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 class MLMatchRequest(BaseModel):
@@ -46,6 +40,12 @@ class MLMatchRequest(BaseModel):
     accounting_records: List[dict]
 
 
+class ReconciliationJobRequest(BaseModel):
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    min_confidence: float = RECON_AUTO_MATCH_CONFIDENCE
+
+
 class MLMatchResult(BaseModel):
     bank_entry_id: str
     suggested_matches: List[dict]
@@ -66,7 +66,7 @@ async def analyze_transactions_with_ml(bank_entries: List[dict], accounting_reco
     
     if not EMERGENT_LLM_KEY:
         # Fallback to rule-based matching if no API key
-        return rule_based_matching(bank_entries, accounting_records)
+        return await asyncio.to_thread(rule_based_matching, bank_entries, accounting_records)
     
     # Prepare data for ML analysis
     bank_data = json.dumps([{
@@ -142,80 +142,16 @@ Return the JSON array of matches."""
             pass
         
         # Fallback to rule-based if ML parsing fails
-        return rule_based_matching(bank_entries, accounting_records)
+        return await asyncio.to_thread(rule_based_matching, bank_entries, accounting_records)
         
     except Exception as e:
         print(f"ML matching error: {e}")
-        return rule_based_matching(bank_entries, accounting_records)
+        return await asyncio.to_thread(rule_based_matching, bank_entries, accounting_records)
 
 
 def rule_based_matching(bank_entries: List[dict], accounting_records: List[dict]) -> List[dict]:
-    """Fallback rule-based matching algorithm"""
-    results = []
-    
-    for entry in bank_entries:
-        entry_id = entry.get("entry_id", entry.get("id", ""))
-        entry_amount = abs(float(entry.get("amount", 0)))
-        entry_desc = entry.get("description", "").lower()
-        entry_type = entry.get("type", entry.get("entry_type", ""))
-        
-        matches = []
-        
-        for record in accounting_records:
-            record_id = record.get("id", record.get("receivable_id", record.get("payable_id", "")))
-            record_amount = abs(float(record.get("amount", record.get("bill_amount", record.get("invoice_amount", 0)))))
-            record_party = record.get("party_name", record.get("vendor_name", record.get("customer_name", ""))).lower()
-            record_ref = record.get("invoice_number", record.get("bill_number", "")).lower()
-            record_type = record.get("type", "")
-            
-            confidence = 0.0
-            reasons = []
-            
-            # Amount matching (40% weight)
-            amount_diff = abs(entry_amount - record_amount)
-            if amount_diff == 0:
-                confidence += 0.4
-                reasons.append("Exact amount match")
-            elif amount_diff / max(entry_amount, record_amount, 1) < 0.05:
-                confidence += 0.3
-                reasons.append("Amount within 5% tolerance")
-            elif amount_diff / max(entry_amount, record_amount, 1) < 0.1:
-                confidence += 0.2
-                reasons.append("Amount within 10% tolerance")
-            
-            # Description/Party matching (35% weight)
-            if record_party and record_party in entry_desc:
-                confidence += 0.35
-                reasons.append(f"Party name '{record_party}' found in description")
-            elif record_ref and record_ref in entry_desc:
-                confidence += 0.3
-                reasons.append(f"Reference '{record_ref}' found in description")
-            
-            # Type alignment (25% weight)
-            is_credit = entry_type == "credit" or entry.get("amount", 0) > 0
-            is_receivable = record_type == "receivable" or "receivable_id" in record
-            
-            if (is_credit and is_receivable) or (not is_credit and not is_receivable):
-                confidence += 0.25
-                reasons.append("Transaction type aligned")
-            
-            if confidence >= 0.5:
-                matches.append({
-                    "accounting_id": record_id,
-                    "confidence": round(confidence, 2),
-                    "match_reasons": reasons
-                })
-        
-        # Sort matches by confidence
-        matches.sort(key=lambda x: x["confidence"], reverse=True)
-        
-        results.append({
-            "bank_entry_id": entry_id,
-            "matches": matches[:3],  # Top 3 matches
-            "reasoning": f"Found {len(matches)} potential matches" if matches else "No matches found"
-        })
-    
-    return results
+    """Fallback rule-based matching: top 3 matches per bank entry (see recon_matcher)"""
+    return match_transactions(bank_entries, accounting_records).suggestions()
 
 
 @router.post("/analyze")
@@ -250,61 +186,30 @@ async def ml_auto_match(current_user: dict = Depends(get_current_user)):
     bank_entries = await db.fin_bank_statements.find({
         "org_id": org_id,
         "matched": {"$ne": True}
-    }, {"_id": 0}).to_list(100)
+    }, {"_id": 0}).to_list(length=None)
     
     if not bank_entries:
         return {"success": True, "message": "No unmatched bank entries found", "matched": 0}
     
-    # Get open receivables and payables
-    receivables = await db.fin_receivables.find({
-        "org_id": org_id,
-        "status": {"$in": ["open", "partial"]}
-    }, {"_id": 0}).to_list(500)
-    
-    payables = await db.fin_payables.find({
-        "org_id": org_id,
-        "status": {"$in": ["open", "approved"]}
-    }, {"_id": 0}).to_list(500)
-    
-    accounting_records = [
-        {**r, "type": "receivable"} for r in receivables
-    ] + [
-        {**p, "type": "payable"} for p in payables
-    ]
+    # Get open receivables and payables not reconciled yet
+    accounting_records = await load_open_records(db, org_id, unreconciled=True)
     
     if not accounting_records:
         return {"success": True, "message": "No accounting records to match against", "matched": 0}
     
-    # Run ML analysis
-    matches = await analyze_transactions_with_ml(bank_entries, accounting_records)
+    # Auto-apply high confidence matches (>= 0.8), each record to one entry at most
+    if EMERGENT_LLM_KEY:
+        matches = await analyze_transactions_with_ml(bank_entries, accounting_records)
+        assigned = [
+            {"bank_entry_id": result["bank_entry_id"], **match}
+            for result, match in assign_suggestions(matches, RECON_AUTO_MATCH_CONFIDENCE)
+        ]
+    else:
+        result = await asyncio.to_thread(match_transactions, bank_entries, accounting_records)
+        matches = result.suggestions()
+        assigned = result.assignments(RECON_AUTO_MATCH_CONFIDENCE)
     
-    # Auto-apply high confidence matches (>= 0.8)
-    auto_matched = 0
-    for match_result in matches:
-        if match_result.get("matches"):
-            top_match = match_result["matches"][0]
-            if top_match.get("confidence", 0) >= 0.8:
-                # Create reconciliation record
-                recon_id = f"RECON-{uuid.uuid4().hex[:8].upper()}"
-                await db.fin_reconciliations.insert_one({
-                    "reconciliation_id": recon_id,
-                    "org_id": org_id,
-                    "bank_entry_id": match_result["bank_entry_id"],
-                    "accounting_record_id": top_match["accounting_id"],
-                    "confidence": top_match["confidence"],
-                    "match_reasons": top_match["match_reasons"],
-                    "status": "auto_matched",
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "created_by": current_user.get("user_id")
-                })
-                
-                # Mark bank entry as matched
-                await db.fin_bank_statements.update_one(
-                    {"entry_id": match_result["bank_entry_id"], "org_id": org_id},
-                    {"$set": {"matched": True, "reconciliation_id": recon_id}}
-                )
-                
-                auto_matched += 1
+    auto_matched = await apply_matches(db, org_id, assigned, "auto_matched", current_user.get("user_id"))
     
     return {
         "success": True,
@@ -316,6 +221,38 @@ async def ml_auto_match(current_user: dict = Depends(get_current_user)):
     }
 
 
+@router.post("/jobs")
+async def start_reconciliation_job(request: ReconciliationJobRequest, current_user: dict = Depends(get_current_user)):
+    """Reconcile a whole period in the background; poll GET /jobs/{job_id}"""
+    db = get_db()
+    job = await create_reconciliation_job(
+        db, current_user.get("org_id"), current_user.get("user_id"),
+        request.date_from, request.date_to, request.min_confidence
+    )
+    launch_reconciliation_job(db, job["job_id"])
+    return {"success": True, "data": job}
+
+
+@router.get("/jobs")
+async def list_reconciliation_jobs(current_user: dict = Depends(get_current_user)):
+    """Recent reconciliation jobs for the organization"""
+    db = get_db()
+    jobs = await db[RECON_JOBS].find(
+        {"org_id": current_user.get("org_id")}, {"_id": 0}
+    ).sort("created_at", -1).to_list(50)
+    return {"success": True, "data": jobs}
+
+
+@router.get("/jobs/{job_id}")
+async def get_reconciliation_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Status, match stats and results of a reconciliation job"""
+    db = get_db()
+    job = await db[RECON_JOBS].find_one({"job_id": job_id, "org_id": current_user.get("org_id")}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Reconciliation job not found")
+    return {"success": True, "data": job}
+
+
 @router.get("/suggestions/{entry_id}")
 async def get_match_suggestions(entry_id: str, current_user: dict = Depends(get_current_user)):
     """Get ML-powered match suggestions for a specific bank entry"""
@@ -332,21 +269,7 @@ async def get_match_suggestions(entry_id: str, current_user: dict = Depends(get_
         raise HTTPException(status_code=404, detail="Bank entry not found")
     
     # Get potential matches
-    receivables = await db.fin_receivables.find({
-        "org_id": org_id,
-        "status": {"$in": ["open", "partial"]}
-    }, {"_id": 0}).to_list(100)
-    
-    payables = await db.fin_payables.find({
-        "org_id": org_id,
-        "status": {"$in": ["open", "approved"]}
-    }, {"_id": 0}).to_list(100)
-    
-    accounting_records = [
-        {**r, "type": "receivable"} for r in receivables
-    ] + [
-        {**p, "type": "payable"} for p in payables
-    ]
+    accounting_records = await load_open_records(db, org_id)
     
     # Run ML analysis for this single entry
     matches = await analyze_transactions_with_ml([entry], accounting_records)
@@ -377,22 +300,18 @@ async def confirm_match(data: dict, current_user: dict = Depends(get_current_use
     if not entry:
         raise HTTPException(status_code=404, detail="Bank entry not found")
     
-    # Create reconciliation record
-    recon_id = f"RECON-{uuid.uuid4().hex[:8].upper()}"
-    await db.fin_reconciliations.insert_one({
-        "reconciliation_id": recon_id,
-        "org_id": org_id,
+    # Claim both sides like the matcher, so a confirm never double-links an entry or a record
+    match = {
         "bank_entry_id": bank_entry_id,
-        "accounting_record_id": accounting_record_id,
-        "status": "confirmed",
-        "confirmed_by": current_user.get("user_id"),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
-    
-    # Mark bank entry as matched
-    await db.fin_bank_statements.update_one(
-        {"entry_id": bank_entry_id, "org_id": org_id},
-        {"$set": {"matched": True, "reconciliation_id": recon_id}}
+        "accounting_id": accounting_record_id,
+        "confidence": data.get("confidence"),
+        "match_reasons": data.get("match_reasons", [])
+    }
+    if not await apply_matches(db, org_id, [match], "confirmed", current_user.get("user_id")):
+        raise HTTPException(status_code=409, detail="Bank entry or accounting record is already reconciled")
+    entry = await db.fin_bank_statements.find_one(
+        {"entry_id": bank_entry_id, "org_id": org_id}, {"_id": 0, "reconciliation_id": 1}
     )
+    recon_id = entry["reconciliation_id"]
     
     return {"success": True, "reconciliation_id": recon_id, "message": "Match confirmed"}
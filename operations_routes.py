@@ -3,12 +3,13 @@ IB Operations - Backend Routes
 Execution, Delivery, Fulfillment & Control Layer
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends
 from typing import List, Optional
 from datetime import datetime
 import uuid
-import jwt
 import os
+from auth_utils import get_current_principal
+from report_compiler import touch_report_data
 
 router = APIRouter(prefix="/api/operations", tags=["Operations"])
 
@@ -19,23 +20,8 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user(authorization: str = Header(None)):
-    """Extract current user from JWT token"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {
-            "user_id": payload.get("user_id"),
-            "org_id": payload.get("org_id"),
-            "role_id": payload.get("role_id")
-        }
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 # ==================== WORK INTAKE ROUTES ====================
@@ -209,6 +195,7 @@ async def create_project(data: dict, current_user: dict = Depends(get_current_us
         "org_id": current_user.get("org_id")
     }
     await db.ops_projects.insert_one(project)
+    await touch_report_data(db, "ops_projects")
     
     # Update work order status
     if data.get("work_order_id"):
@@ -234,6 +221,7 @@ async def update_project_status(project_id: str, data: dict, current_user: dict
         {"project_id": project_id, "org_id": current_user.get("org_id")},
         {"$set": update}
     )
+    await touch_report_data(db, "ops_projects")
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Project not found")
     return {"success": True, "message": f"Project status updated to {new_status}"}
@@ -675,6 +663,7 @@ async def seed_operations_data(current_user: dict = Depends(get_current_user)):
         }
     ]
     await db.ops_projects.insert_many(projects)
+    await touch_report_data(db, "ops_projects")
     
     # Seed Tasks
     tasks = [
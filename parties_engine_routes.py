@@ -7,15 +7,14 @@ from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 from bson import ObjectId
-import os
-from pymongo import MongoClient
+import asyncio
+from db_provider import get_db
+from sequence_service import next_id
 
 router = APIRouter(prefix="/commerce/parties-engine", tags=["Parties Engine"])
 
-# MongoDB connection
-MONGO_URL = os.environ.get("MONGO_URL")
-client = MongoClient(MONGO_URL)
-db = client[os.environ.get("DB_NAME", "innovatebooks")]
+# MongoDB connection (shared async pool)
+db = get_db()
 
 # Collections
 parties_collection = db["parties_engine"]
@@ -129,9 +128,9 @@ def calculate_risk_score(risk_profile: dict) -> tuple:
     
     return int(score), level
 
-def calculate_readiness(party_id: str) -> PartyReadiness:
+async def calculate_readiness(party_id: str) -> PartyReadiness:
     """Calculate party readiness for commercial transactions"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         return PartyReadiness(
             party_id=party_id,
@@ -139,11 +138,13 @@ def calculate_readiness(party_id: str) -> PartyReadiness:
             blocking_reasons=["Party not found"]
         )
     
-    identity = party_identities.find_one({"party_id": party_id})
-    legal = party_legal_profiles.find_one({"party_id": party_id})
-    tax = party_tax_profiles.find_one({"party_id": party_id})
-    risk = party_risk_profiles.find_one({"party_id": party_id})
-    compliance = party_compliance_profiles.find_one({"party_id": party_id})
+    identity, legal, tax, risk, compliance = await asyncio.gather(
+        party_identities.find_one({"party_id": party_id}),
+        party_legal_profiles.find_one({"party_id": party_id}),
+        party_tax_profiles.find_one({"party_id": party_id}),
+        party_risk_profiles.find_one({"party_id": party_id}),
+        party_compliance_profiles.find_one({"party_id": party_id})
+    )
     
     missing = []
     blocking = []
@@ -217,9 +218,9 @@ def calculate_readiness(party_id: str) -> PartyReadiness:
         can_contract=fully_verified
     )
 
-def log_audit(party_id: str, action: str, actor: str, details: dict = None):
+async def log_audit(party_id: str, action: str, actor: str, details: dict = None):
     """Log audit entry for party changes"""
-    party_audit_logs.insert_one({
+    await party_audit_logs.insert_one({
         "party_id": party_id,
         "action": action,
         "actor": actor,
@@ -258,12 +259,14 @@ async def list_parties(
             {"party_id": {"$regex": search, "$options": "i"}}
         ]
     
-    parties = list(parties_collection.find(query, {"_id": 0}).skip(skip).limit(limit))
-    total = parties_collection.count_documents(query)
+    parties = await parties_collection.find(query, {"_id": 0}).skip(skip).limit(limit).to_list(length=limit)
+    total = await parties_collection.count_documents(query)
     
-    # Add readiness info to each party
-    for party in parties:
-        readiness = calculate_readiness(party["party_id"])
+    # Add readiness info to each party (resolved concurrently)
+    readiness_results = await asyncio.gather(
+        *(calculate_readiness(party["party_id"]) for party in parties)
+    )
+    for party, readiness in zip(parties, readiness_results):
         party["readiness"] = {
             "status": readiness.readiness_status,
             "can_evaluate": readiness.can_evaluate,
@@ -272,14 +275,11 @@ async def list_parties(
         }
     
     # Get stats
-    stats = {
-        "total": parties_collection.count_documents({}),
-        "draft": parties_collection.count_documents({"status": "draft"}),
-        "minimum_ready": parties_collection.count_documents({"status": "minimum_ready"}),
-        "verified": parties_collection.count_documents({"status": "verified"}),
-        "restricted": parties_collection.count_documents({"status": "restricted"}),
-        "blocked": parties_collection.count_documents({"status": "blocked"})
-    }
+    stats = {"total": 0, "draft": 0, "minimum_ready": 0, "verified": 0, "restricted": 0, "blocked": 0}
+    async for row in parties_collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]):
+        stats["total"] += row["count"]
+        if row["_id"] in stats:
+            stats[row["_id"]] = row["count"]
     
     return {"success": True, "parties": parties, "total": total, "stats": stats}
 
@@ -287,8 +287,7 @@ async def list_parties(
 async def create_party(party: PartyCreate):
     """Create a new party"""
     # Generate party ID
-    count = parties_collection.count_documents({}) + 1
-    party_id = f"PTY-{count:04d}"
+    party_id = await next_id("PTY", seed=lambda: parties_collection.count_documents({}))
     
     party_doc = {
         "party_id": party_id,
@@ -302,10 +301,10 @@ async def create_party(party: PartyCreate):
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
     
-    parties_collection.insert_one(party_doc)
+    await parties_collection.insert_one(party_doc)
     
     # Create empty identity profile
-    party_identities.insert_one({
+    await party_identities.insert_one({
         "party_id": party_id,
         "legal_name": party.legal_name,
         "country": party.country,
@@ -313,31 +312,31 @@ async def create_party(party: PartyCreate):
         "created_at": datetime.now(timezone.utc).isoformat()
     })
     
-    log_audit(party_id, "party_created", "system", {"source": party.created_source})
+    await log_audit(party_id, "party_created", "system", {"source": party.created_source})
     
     return {"success": True, "party_id": party_id, "party": serialize_doc(party_doc)}
 
 @router.get("/parties/{party_id}")
 async def get_party(party_id: str):
     """Get party details with all profiles"""
-    party = parties_collection.find_one({"party_id": party_id}, {"_id": 0})
+    party = await parties_collection.find_one({"party_id": party_id}, {"_id": 0})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
     # Get all profiles
-    identity = serialize_doc(party_identities.find_one({"party_id": party_id}))
-    legal = serialize_doc(party_legal_profiles.find_one({"party_id": party_id}))
-    tax = serialize_doc(party_tax_profiles.find_one({"party_id": party_id}))
-    risk = serialize_doc(party_risk_profiles.find_one({"party_id": party_id}))
-    compliance = serialize_doc(party_compliance_profiles.find_one({"party_id": party_id}))
+    identity = serialize_doc(await party_identities.find_one({"party_id": party_id}))
+    legal = serialize_doc(await party_legal_profiles.find_one({"party_id": party_id}))
+    tax = serialize_doc(await party_tax_profiles.find_one({"party_id": party_id}))
+    risk = serialize_doc(await party_risk_profiles.find_one({"party_id": party_id}))
+    compliance = serialize_doc(await party_compliance_profiles.find_one({"party_id": party_id}))
     
     # Calculate readiness
-    readiness = calculate_readiness(party_id)
+    readiness = await calculate_readiness(party_id)
     
     # Get recent audit logs
-    audits = list(party_audit_logs.find(
+    audits = await party_audit_logs.find(
         {"party_id": party_id}, {"_id": 0}
-    ).sort("timestamp", -1).limit(20))
+    ).sort("timestamp", -1).limit(20).to_list(length=20)
     
     return {
         "success": True,
@@ -356,33 +355,33 @@ async def get_party(party_id: str):
 @router.put("/parties/{party_id}")
 async def update_party(party_id: str, update: PartyUpdate):
     """Update party basic info"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
     update_data = {k: v for k, v in update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    parties_collection.update_one(
+    await parties_collection.update_one(
         {"party_id": party_id},
         {"$set": update_data}
     )
     
-    log_audit(party_id, "party_updated", "system", {"changes": list(update_data.keys())})
+    await log_audit(party_id, "party_updated", "system", {"changes": list(update_data.keys())})
     
     return {"success": True, "message": "Party updated"}
 
 @router.delete("/parties/{party_id}")
 async def delete_party(party_id: str):
     """Delete a party (soft delete - set to blocked)"""
-    result = parties_collection.update_one(
+    result = await parties_collection.update_one(
         {"party_id": party_id},
         {"$set": {"status": "blocked", "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="Party not found")
     
-    log_audit(party_id, "party_blocked", "system", {"reason": "deleted"})
+    await log_audit(party_id, "party_blocked", "system", {"reason": "deleted"})
     return {"success": True, "message": "Party blocked"}
 
 # ==================== IDENTITY PROFILE ====================
@@ -390,13 +389,13 @@ async def delete_party(party_id: str):
 @router.get("/parties/{party_id}/identity")
 async def get_identity(party_id: str):
     """Get party identity profile"""
-    identity = party_identities.find_one({"party_id": party_id}, {"_id": 0})
+    identity = await party_identities.find_one({"party_id": party_id}, {"_id": 0})
     return {"success": True, "identity": identity}
 
 @router.put("/parties/{party_id}/identity")
 async def update_identity(party_id: str, identity: PartyIdentity):
     """Update party identity profile"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
@@ -404,7 +403,7 @@ async def update_identity(party_id: str, identity: PartyIdentity):
     identity_doc["party_id"] = party_id
     identity_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    party_identities.update_one(
+    await party_identities.update_one(
         {"party_id": party_id},
         {"$set": identity_doc},
         upsert=True
@@ -412,12 +411,12 @@ async def update_identity(party_id: str, identity: PartyIdentity):
     
     # Also update party's legal_name if changed
     if identity.legal_name:
-        parties_collection.update_one(
+        await parties_collection.update_one(
             {"party_id": party_id},
             {"$set": {"legal_name": identity.legal_name, "updated_at": datetime.now(timezone.utc).isoformat()}}
         )
     
-    log_audit(party_id, "identity_updated", "system")
+    await log_audit(party_id, "identity_updated", "system")
     return {"success": True, "message": "Identity updated"}
 
 # ==================== LEGAL PROFILE ====================
@@ -425,13 +424,13 @@ async def update_identity(party_id: str, identity: PartyIdentity):
 @router.get("/parties/{party_id}/legal")
 async def get_legal_profile(party_id: str):
     """Get party legal profile"""
-    legal = party_legal_profiles.find_one({"party_id": party_id}, {"_id": 0})
+    legal = await party_legal_profiles.find_one({"party_id": party_id}, {"_id": 0})
     return {"success": True, "legal": legal}
 
 @router.put("/parties/{party_id}/legal")
 async def update_legal_profile(party_id: str, legal: LegalProfile):
     """Update party legal profile"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
@@ -439,19 +438,19 @@ async def update_legal_profile(party_id: str, legal: LegalProfile):
     legal_doc["party_id"] = party_id
     legal_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    party_legal_profiles.update_one(
+    await party_legal_profiles.update_one(
         {"party_id": party_id},
         {"$set": legal_doc},
         upsert=True
     )
     
-    log_audit(party_id, "legal_profile_updated", "system")
+    await log_audit(party_id, "legal_profile_updated", "system")
     return {"success": True, "message": "Legal profile updated"}
 
 @router.post("/parties/{party_id}/legal/verify")
 async def verify_legal_profile(party_id: str, verified_by: str = "system"):
     """Verify party legal profile"""
-    party_legal_profiles.update_one(
+    await party_legal_profiles.update_one(
         {"party_id": party_id},
         {"$set": {
             "verification_status": "verified",
@@ -460,7 +459,7 @@ async def verify_legal_profile(party_id: str, verified_by: str = "system"):
         }}
     )
     
-    log_audit(party_id, "legal_verified", verified_by)
+    await log_audit(party_id, "legal_verified", verified_by)
     return {"success": True, "message": "Legal profile verified"}
 
 # ==================== TAX PROFILE ====================
@@ -468,13 +467,13 @@ async def verify_legal_profile(party_id: str, verified_by: str = "system"):
 @router.get("/parties/{party_id}/tax")
 async def get_tax_profile(party_id: str):
     """Get party tax profile"""
-    tax = party_tax_profiles.find_one({"party_id": party_id}, {"_id": 0})
+    tax = await party_tax_profiles.find_one({"party_id": party_id}, {"_id": 0})
     return {"success": True, "tax": tax}
 
 @router.put("/parties/{party_id}/tax")
 async def update_tax_profile(party_id: str, tax: TaxProfile):
     """Update party tax profile"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
@@ -482,19 +481,19 @@ async def update_tax_profile(party_id: str, tax: TaxProfile):
     tax_doc["party_id"] = party_id
     tax_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    party_tax_profiles.update_one(
+    await party_tax_profiles.update_one(
         {"party_id": party_id},
         {"$set": tax_doc},
         upsert=True
     )
     
-    log_audit(party_id, "tax_profile_updated", "system")
+    await log_audit(party_id, "tax_profile_updated", "system")
     return {"success": True, "message": "Tax profile updated"}
 
 @router.post("/parties/{party_id}/tax/verify")
 async def verify_tax_profile(party_id: str, verified_by: str = "system"):
     """Verify party tax profile"""
-    party_tax_profiles.update_one(
+    await party_tax_profiles.update_one(
         {"party_id": party_id},
         {"$set": {
             "verification_status": "verified",
@@ -502,7 +501,7 @@ async def verify_tax_profile(party_id: str, verified_by: str = "system"):
         }}
     )
     
-    log_audit(party_id, "tax_verified", verified_by)
+    await log_audit(party_id, "tax_verified", verified_by)
     return {"success": True, "message": "Tax profile verified"}
 
 # ==================== RISK PROFILE ====================
@@ -510,13 +509,13 @@ async def verify_tax_profile(party_id: str, verified_by: str = "system"):
 @router.get("/parties/{party_id}/risk")
 async def get_risk_profile(party_id: str):
     """Get party risk profile"""
-    risk = party_risk_profiles.find_one({"party_id": party_id}, {"_id": 0})
+    risk = await party_risk_profiles.find_one({"party_id": party_id}, {"_id": 0})
     return {"success": True, "risk": risk}
 
 @router.put("/parties/{party_id}/risk")
 async def update_risk_profile(party_id: str, risk: RiskProfile):
     """Update party risk profile"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
@@ -529,7 +528,7 @@ async def update_risk_profile(party_id: str, risk: RiskProfile):
     risk_doc["party_id"] = party_id
     risk_doc["last_evaluated_at"] = datetime.now(timezone.utc).isoformat()
     
-    party_risk_profiles.update_one(
+    await party_risk_profiles.update_one(
         {"party_id": party_id},
         {"$set": risk_doc},
         upsert=True
@@ -537,18 +536,18 @@ async def update_risk_profile(party_id: str, risk: RiskProfile):
     
     # Update party status if risk is too high
     if score >= 80:
-        parties_collection.update_one(
+        await parties_collection.update_one(
             {"party_id": party_id},
             {"$set": {"status": "blocked", "updated_at": datetime.now(timezone.utc).isoformat()}}
         )
-        log_audit(party_id, "party_blocked_high_risk", "system", {"risk_score": score})
+        await log_audit(party_id, "party_blocked_high_risk", "system", {"risk_score": score})
     elif score >= 60:
-        parties_collection.update_one(
+        await parties_collection.update_one(
             {"party_id": party_id},
             {"$set": {"status": "restricted", "updated_at": datetime.now(timezone.utc).isoformat()}}
         )
     
-    log_audit(party_id, "risk_profile_updated", "system", {"score": score, "level": level})
+    await log_audit(party_id, "risk_profile_updated", "system", {"score": score, "level": level})
     return {"success": True, "message": "Risk profile updated", "risk_score": score, "risk_level": level}
 
 # ==================== COMPLIANCE PROFILE ====================
@@ -556,13 +555,13 @@ async def update_risk_profile(party_id: str, risk: RiskProfile):
 @router.get("/parties/{party_id}/compliance")
 async def get_compliance_profile(party_id: str):
     """Get party compliance profile"""
-    compliance = party_compliance_profiles.find_one({"party_id": party_id}, {"_id": 0})
+    compliance = await party_compliance_profiles.find_one({"party_id": party_id}, {"_id": 0})
     return {"success": True, "compliance": compliance}
 
 @router.put("/parties/{party_id}/compliance")
 async def update_compliance_profile(party_id: str, compliance: ComplianceProfile):
     """Update party compliance profile"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
@@ -570,19 +569,19 @@ async def update_compliance_profile(party_id: str, compliance: ComplianceProfile
     compliance_doc["party_id"] = party_id
     compliance_doc["updated_at"] = datetime.now(timezone.utc).isoformat()
     
-    party_compliance_profiles.update_one(
+    await party_compliance_profiles.update_one(
         {"party_id": party_id},
         {"$set": compliance_doc},
         upsert=True
     )
     
-    log_audit(party_id, "compliance_profile_updated", "system")
+    await log_audit(party_id, "compliance_profile_updated", "system")
     return {"success": True, "message": "Compliance profile updated"}
 
 @router.post("/parties/{party_id}/compliance/verify")
 async def verify_compliance(party_id: str, verified_by: str = "system"):
     """Verify party compliance"""
-    party_compliance_profiles.update_one(
+    await party_compliance_profiles.update_one(
         {"party_id": party_id},
         {"$set": {
             "verification_status": "verified",
@@ -594,7 +593,7 @@ async def verify_compliance(party_id: str, verified_by: str = "system"):
         }}
     )
     
-    log_audit(party_id, "compliance_verified", verified_by)
+    await log_audit(party_id, "compliance_verified", verified_by)
     return {"success": True, "message": "Compliance verified"}
 
 # ==================== READINESS ENGINE ====================
@@ -602,17 +601,17 @@ async def verify_compliance(party_id: str, verified_by: str = "system"):
 @router.get("/parties/{party_id}/readiness")
 async def get_readiness(party_id: str):
     """Get party readiness status"""
-    readiness = calculate_readiness(party_id)
+    readiness = await calculate_readiness(party_id)
     return {"success": True, "readiness": readiness.dict()}
 
 @router.post("/parties/{party_id}/update-status")
 async def update_party_status(party_id: str):
     """Recalculate and update party status based on profiles"""
-    party = parties_collection.find_one({"party_id": party_id})
+    party = await parties_collection.find_one({"party_id": party_id})
     if not party:
         raise HTTPException(status_code=404, detail="Party not found")
     
-    readiness = calculate_readiness(party_id)
+    readiness = await calculate_readiness(party_id)
     
     # Map readiness to status
     if readiness.readiness_status == "fully_verified":
@@ -623,19 +622,19 @@ async def update_party_status(party_id: str):
         new_status = "draft"
     
     # Check if blocked or restricted from risk
-    risk = party_risk_profiles.find_one({"party_id": party_id})
+    risk = await party_risk_profiles.find_one({"party_id": party_id})
     if risk:
         if risk.get("risk_score", 0) >= 80:
             new_status = "blocked"
         elif risk.get("risk_score", 0) >= 60:
             new_status = "restricted"
     
-    parties_collection.update_one(
+    await parties_collection.update_one(
         {"party_id": party_id},
         {"$set": {"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
     
-    log_audit(party_id, "status_updated", "system", {"new_status": new_status})
+    await log_audit(party_id, "status_updated", "system", {"new_status": new_status})
     return {"success": True, "status": new_status, "readiness": readiness.dict()}
 
 # ==================== SEED DATA ====================
@@ -691,7 +690,7 @@ async def seed_parties():
         party_id = f"PTY-{i+1:04d}"
         
         # Check if exists
-        if parties_collection.find_one({"party_id": party_id}):
+        if await parties_collection.find_one({"party_id": party_id}):
             continue
         
         party_doc = {
@@ -700,10 +699,10 @@ async def seed_parties():
             "created_at": datetime.now(timezone.utc).isoformat(),
             "updated_at": datetime.now(timezone.utc).isoformat()
         }
-        parties_collection.insert_one(party_doc)
+        await parties_collection.insert_one(party_doc)
         
         # Create identity
-        party_identities.insert_one({
+        await party_identities.insert_one({
             "party_id": party_id,
             "legal_name": party_data["legal_name"],
             "trade_name": party_data["legal_name"].split()[0],
@@ -716,7 +715,7 @@ async def seed_parties():
         
         # Create legal profile
         is_verified = party_data["status"] in ["verified", "minimum_ready"]
-        party_legal_profiles.insert_one({
+        await party_legal_profiles.insert_one({
             "party_id": party_id,
             "incorporation_certificate": f"cert_{party_id}.pdf" if is_verified else None,
             "certificate_verified": is_verified,
@@ -727,7 +726,7 @@ async def seed_parties():
         })
         
         # Create tax profile
-        party_tax_profiles.insert_one({
+        await party_tax_profiles.insert_one({
             "party_id": party_id,
             "tax_residency": party_data["country"],
             "tax_id": party_data["registration_number"],
@@ -739,7 +738,7 @@ async def seed_parties():
         
         # Create risk profile
         risk_score = 85 if party_data["status"] == "blocked" else (65 if party_data["status"] == "restricted" else 25)
-        party_risk_profiles.insert_one({
+        await party_risk_profiles.insert_one({
             "party_id": party_id,
             "country_risk": risk_score // 4,
             "industry_risk": risk_score // 5,
@@ -753,7 +752,7 @@ async def seed_parties():
         })
         
         # Create compliance profile
-        party_compliance_profiles.insert_one({
+        await party_compliance_profiles.insert_one({
             "party_id": party_id,
             "kyc_status": "verified" if party_data["status"] == "verified" else "pending",
             "kyc_documents": [{"type": "incorporation", "uploaded": True}] if is_verified else [],
@@ -6,7 +6,6 @@ from fastapi import APIRouter, HTTPException, Depends
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime, timezone
 from typing import Optional, List
-import os
 from uuid import uuid4
 
 from parties_models import (
@@ -24,15 +23,12 @@ from enterprise_middleware import (
     require_active_subscription
 )
 
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 
 router = APIRouter(prefix="/api/commerce/parties", tags=["Parties"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ['DB_NAME']
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+db = get_db()
 
 # ==================== CUSTOMERS ====================
 
@@ -0,0 +1,119 @@
+"""
+Password Hashing Pool
+Runs bcrypt hash/verify on a dedicated, size-bounded thread pool so the
+event loop keeps serving other requests during login bursts. bcrypt releases
+the GIL while hashing, so the pool also gives real parallelism.
+
+Settings (env):
+- PASSWORD_HASH_WORKERS     threads in the pool (default: min(4, CPU count))
+- PASSWORD_HASH_MAX_PENDING max running + queued operations before new
+                            requests are rejected with 429 (default 64)
+- BCRYPT_ROUNDS             bcrypt cost factor (default 12). Hashes with a
+                            different cost are re-hashed on the next login.
+"""
+import os
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get("PASSWORD_HASH_MAX_PENDING", "64"))
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+# min/max desired rounds make needs_update() flag hashes made with any other cost
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _acquire_slot():
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_HASH_MAX_PENDING:
+            logger.warning(f"Password hash pool saturated ({_pending} pending)")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many authentication requests, please retry shortly",
+                headers={"Retry-After": "1"}
+            )
+        _pending += 1
+
+
+def _release_slot():
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def _run(func, *args):
+    _acquire_slot()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        _release_slot()
+
+
+def _verify(plain_password: str, hashed_password: Optional[str]) -> bool:
+    if not hashed_password:
+        return False
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    except (ValueError, TypeError):
+        # Unrecognized / malformed hash
+        return False
+
+
+def _verify_and_update(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if not hashed_password:
+        return False, None
+    try:
+        return pwd_context.verify_and_update(plain_password, hashed_password)
+    except (ValueError, TypeError):
+        return False, None
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash a password on the hashing pool"""
+    return await _run(pwd_context.hash, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """Verify a password on the hashing pool"""
+    return await _run(_verify, plain_password, hashed_password)
+
+
+async def verify_and_rehash_async(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password and, when the stored hash uses an outdated cost factor,
+    return a replacement hash.
+    Returns: (valid, new_hash or None)
+    """
+    return await _run(_verify_and_update, plain_password, hashed_password)
+
+
+def get_pool_status() -> dict:
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_pending": PASSWORD_HASH_MAX_PENDING,
+        "pending": _pending,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+    }
@@ -0,0 +1,224 @@
+"""
+Payroll Engine
+Chunked pay run calculation for ib_workforce_routes.
+
+- Active people are read in person_id order, PAYROLL_CHUNK_SIZE at a time
+  (keyset pagination, no headcount cap).
+- Per chunk: one $in query for active compensation profiles, earnings and
+  deductions computed as NumPy arrays, and one insert_many for the payslips.
+- Progress, running totals and the checkpoint (last person_id written) live
+  on the pay run under `calculation` and move in one update per chunk. A
+  resumed run first removes payslips past the checkpoint; a fresh run
+  replaces every payslip of the pay run.
+- Pay runs with more than PAYROLL_INLINE_MAX_EMPLOYEES active people are
+  calculated in the background.
+"""
+import os
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+PAYROLL_CHUNK_SIZE = int(os.environ.get('PAYROLL_CHUNK_SIZE', '2000'))
+PAYROLL_INLINE_MAX_EMPLOYEES = int(os.environ.get('PAYROLL_INLINE_MAX_EMPLOYEES', '1000'))
+# A calculating pay run without a heartbeat for this long is considered abandoned
+PAYROLL_STALE_AFTER_SECONDS = int(os.environ.get('PAYROLL_STALE_AFTER_SECONDS', '120'))
+
+# Simplified statutory deductions and salary structure (share of gross)
+TAX_RATE = 0.10
+PF_RATE = 0.12
+EARNING_SPLIT = (("Basic", 0.5), ("HRA", 0.3), ("Special Allowance", 0.2))
+
+PERSON_FIELDS = {"_id": 0, "person_id": 1, "first_name": 1, "last_name": 1}
+COMPENSATION_FIELDS = {"_id": 0, "person_id": 1, "base_pay": 1, "currency": 1}
+
+_running: Dict[str, asyncio.Task] = {}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def people_query(org_id: str) -> dict:
+    return {"org_id": org_id, "status": "active", "deleted": {"$ne": True}}
+
+
+# ==================== CALCULATION ====================
+
+def compute_payslips(payrun: dict, people: List[dict], compensation: List[dict]) -> Tuple[List[dict], Dict[str, float]]:
+    """Payslips and chunk totals for people with an active compensation profile; gross is the base pay"""
+    profiles = {comp["person_id"]: comp for comp in compensation}  # newest profile last
+
+    paid = [person for person in people if person["person_id"] in profiles]
+    if not paid:
+        return [], {"gross": 0.0, "deductions": 0.0, "net": 0.0}
+    comps = [profiles[person["person_id"]] for person in paid]
+
+    gross = np.array([float(comp.get("base_pay") or 0) for comp in comps])
+    tax = gross * TAX_RATE
+    pf = gross * PF_RATE
+    deductions = tax + pf
+    net = gross - deductions
+    earnings = [(component, (gross * share).tolist()) for component, share in EARNING_SPLIT]
+
+    now = _now()
+    gross_list, tax_list, pf_list = gross.tolist(), tax.tolist(), pf.tolist()
+    deduction_list, net_list = deductions.tolist(), net.tolist()
+    payslips = []
+    for i, (person, comp) in enumerate(zip(paid, comps)):
+        payslips.append({
+            "payslip_id": f"SLIP_{uuid.uuid4().hex[:12]}",
+            "payrun_id": payrun["payrun_id"],
+            "org_id": payrun["org_id"],
+            "person_id": person["person_id"],
+            "person_name": f"{person.get('first_name', '')} {person.get('last_name', '')}",
+            "period": payrun["period"],
+            "gross_pay": gross_list[i],
+            "earnings": [{"component": component, "amount": amounts[i]} for component, amounts in earnings],
+            "deductions": [
+                {"component": "Income Tax", "amount": tax_list[i]},
+                {"component": "Provident Fund", "amount": pf_list[i]}
+            ],
+            "total_deductions": deduction_list[i],
+            "net_pay": net_list[i],
+            "currency": comp.get("currency", "INR"),
+            "created_at": now
+        })
+    totals = {"gross": float(gross.sum()), "deductions": float(deductions.sum()), "net": float(net.sum())}
+    return payslips, totals
+
+
+# ==================== RUNS ====================
+
+async def claim_payrun(db, payrun_id: str, org_id: Optional[str] = None, resume: bool = False) -> Optional[dict]:
+    """
+    Take ownership of a pay run for calculation. A fresh claim (draft,
+    calculated, or an abandoned calculation) resets totals and progress and
+    removes the run's payslips; a resume keeps the checkpoint.
+    """
+    now = _now()
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=PAYROLL_STALE_AFTER_SECONDS)).isoformat()
+    abandoned = {"status": "calculating", "calculation.heartbeat_at": {"$lt": stale}}
+    if resume:
+        query = {"payrun_id": payrun_id, **abandoned}
+        update = {"$set": {"calculation.status": "running", "calculation.heartbeat_at": now}}
+    else:
+        query = {"payrun_id": payrun_id, "org_id": org_id,
+                 "$or": [{"status": {"$in": ["draft", "calculated"]}}, abandoned]}
+        update = {"$set": {
+            "status": "calculating",
+            "total_gross": 0,
+            "total_deductions": 0,
+            "total_net": 0,
+            "calculation": {
+                "job_id": f"PRC-{uuid.uuid4().hex[:12].upper()}",
+                "status": "running",  # running | completed | failed
+                "employees_total": await db.wf_people.count_documents(people_query(org_id)),
+                "employees_processed": 0,
+                "payslips_created": 0,
+                "last_person_id": None,
+                "started_at": now,
+                "heartbeat_at": now
+            }
+        }}
+    claimed = await db.wf_payruns.update_one(query, update)
+    if claimed.modified_count == 0:
+        return None
+    if not resume:
+        await db.wf_payslips.delete_many({"payrun_id": payrun_id})
+    return await db.wf_payruns.find_one({"payrun_id": payrun_id}, {"_id": 0})
+
+
+async def run_calculation(db, payrun: dict, chunk_size: int = PAYROLL_CHUNK_SIZE) -> dict:
+    """Calculate (or continue) a claimed pay run until every active person is processed"""
+    payrun_id = payrun["payrun_id"]
+    last_person_id = payrun["calculation"].get("last_person_id")
+    try:
+        # Payslips past the checkpoint belong to a chunk that never committed;
+        # with no checkpoint yet, that is every payslip of the run
+        leftovers = {"payrun_id": payrun_id}
+        if last_person_id:
+            leftovers["person_id"] = {"$gt": last_person_id}
+        await db.wf_payslips.delete_many(leftovers)
+        while True:
+            query = people_query(payrun["org_id"])
+            if last_person_id:
+                query["person_id"] = {"$gt": last_person_id}
+            people = await db.wf_people.find(query, PERSON_FIELDS).sort("person_id", 1).to_list(chunk_size)
+            if not people:
+                break
+            person_ids = [person["person_id"] for person in people]
+            compensation = await db.wf_compensation.find(
+                {"person_id": {"$in": person_ids}, "status": "active"}, COMPENSATION_FIELDS
+            ).sort("created_at", 1).to_list(length=None)
+
+            payslips, totals = compute_payslips(payrun, people, compensation)
+            if payslips:
+                await db.wf_payslips.insert_many(payslips, ordered=False)
+
+            last_person_id = person_ids[-1]
+            await db.wf_payruns.update_one({"payrun_id": payrun_id}, {
+                "$set": {"calculation.last_person_id": last_person_id, "calculation.heartbeat_at": _now()},
+                "$inc": {
+                    "total_gross": totals["gross"],
+                    "total_deductions": totals["deductions"],
+                    "total_net": totals["net"],
+                    "calculation.employees_processed": len(people),
+                    "calculation.payslips_created": len(payslips)
+                }
+            })
+
+        finished = _now()
+        return await db.wf_payruns.find_one_and_update(
+            {"payrun_id": payrun_id},
+            {"$set": {
+                "status": "calculated",
+                "calculated_at": finished,
+                "calculation.status": "completed",
+                "calculation.finished_at": finished,
+                "calculation.heartbeat_at": finished
+            }},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+    except Exception as e:
+        logger.error(f"Pay run {payrun_id} calculation failed: {e}")
+        return await db.wf_payruns.find_one_and_update(
+            {"payrun_id": payrun_id},
+            {"$set": {"status": "draft", "calculation.status": "failed", "calculation.error": str(e),
+                      "calculation.heartbeat_at": _now()}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+
+def launch_calculation(db, payrun: dict) -> asyncio.Task:
+    """Run a claimed pay run's calculation in the background on the current event loop"""
+    payrun_id = payrun["payrun_id"]
+    task = asyncio.create_task(run_calculation(db, payrun))
+    _running[payrun_id] = task
+    task.add_done_callback(lambda _: _running.pop(payrun_id, None))
+    return task
+
+
+async def resume_abandoned_payruns(db) -> List[str]:
+    """Continue calculations whose worker stopped heartbeating"""
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=PAYROLL_STALE_AFTER_SECONDS)).isoformat()
+    payruns = await db.wf_payruns.find(
+        {"status": "calculating", "calculation.heartbeat_at": {"$lt": stale}}, {"_id": 0, "payrun_id": 1}
+    ).to_list(100)
+    resumed = []
+    for payrun in payruns:
+        if payrun["payrun_id"] in _running:
+            continue
+        claimed = await claim_payrun(db, payrun["payrun_id"], resume=True)
+        if claimed:
+            launch_calculation(db, claimed)
+            resumed.append(payrun["payrun_id"])
+    return resumed
@@ -0,0 +1,200 @@
+"""
+RBAC Permission Cache
+Resolves user roles, role grants and org subscription state once and keeps
+them in process memory, so protected routes do no DB reads on a warm cache.
+
+Entries:
+- user:  user_id -> role_id / is_super_admin / org_id   (enterprise_users)
+- role:  (org_id, role_id) -> frozenset of granted "module.action" names
+- org:   org_id -> active flag, subscription status, plan, name
+- catalog: submodule_id -> submodule_name (static, loaded once)
+
+Entries expire after RBAC_CACHE_TTL_SECONDS (default 60). Writes that change
+roles, grants or org state call the invalidate_* helpers so the change is
+visible immediately on this worker; the TTL bounds staleness on others.
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+RBAC_CACHE_TTL_SECONDS = float(os.environ.get("RBAC_CACHE_TTL_SECONDS", "60"))
+
+
+class _TTLMap:
+    """Small dict with per-entry expiry and predicate invalidation"""
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._data: Dict[Hashable, tuple] = {}
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        if len(self._data) >= self.max_entries:
+            self._evict()
+        self._data[key] = (time.monotonic() + self.ttl_seconds, value)
+
+    def pop(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def pop_where(self, predicate: Callable[[Hashable], bool]):
+        for key in [k for k in self._data if predicate(k)]:
+            self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def _evict(self):
+        now = time.monotonic()
+        expired = [k for k, (expires_at, _) in self._data.items() if expires_at < now]
+        for key in expired:
+            self._data.pop(key, None)
+        if len(self._data) >= self.max_entries:
+            # Drop the oldest inserted half; dicts keep insertion order
+            for key in list(self._data)[: self.max_entries // 2]:
+                self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class PermissionCache:
+    def __init__(self, ttl_seconds: float = RBAC_CACHE_TTL_SECONDS):
+        self.users = _TTLMap(ttl_seconds)
+        self.roles = _TTLMap(ttl_seconds)
+        self.orgs = _TTLMap(ttl_seconds)
+        self._catalog: Optional[Dict[str, str]] = None
+        self._catalog_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---------- loaders ----------
+
+    async def get_user(self, user_id: str, db) -> Optional[Dict[str, Any]]:
+        """Role-relevant fields of an enterprise user (None if unknown)"""
+        cached = self.users.get(user_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        user = await db.enterprise_users.find_one(
+            {"user_id": user_id},
+            {"_id": 0, "user_id": 1, "org_id": 1, "role_id": 1, "is_super_admin": 1}
+        )
+        # Misses are not cached so a newly invited user works immediately
+        if user:
+            self.users.set(user_id, user)
+        return user
+
+    async def get_org(self, org_id: str, db) -> Optional[Dict[str, Any]]:
+        """Org state used by tenant validation (None if unknown)"""
+        cached = self.orgs.get(org_id)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        org = await db.organizations.find_one(
+            {"org_id": org_id},
+            {"_id": 0, "org_id": 1, "is_active": 1, "subscription_status": 1,
+             "status": 1, "plan": 1, "name": 1}
+        )
+        if org:
+            self.orgs.set(org_id, org)
+        return org
+
+    async def get_catalog(self, db) -> Dict[str, str]:
+        """submodule_id -> submodule_name"""
+        if self._catalog is None:
+            async with self._catalog_lock:
+                if self._catalog is None:
+                    submodules = await db.submodules.find(
+                        {}, {"_id": 0, "submodule_id": 1, "submodule_name": 1}
+                    ).to_list(None)
+                    self._catalog = {
+                        s["submodule_id"]: s["submodule_name"]
+                        for s in submodules if s.get("submodule_id")
+                    }
+        return self._catalog
+
+    async def get_role_grants(self, org_id: Optional[str], role_id: str, db) -> FrozenSet[str]:
+        """Granted "module.action" names for a role"""
+        key = (org_id, role_id)
+        cached = self.roles.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        catalog = await self.get_catalog(db)
+        permissions = await db.role_permissions.find(
+            {"role_id": role_id, "granted": True},
+            {"_id": 0, "submodule_id": 1}
+        ).to_list(None)
+        grants = frozenset(
+            catalog[p["submodule_id"]] for p in permissions if p.get("submodule_id") in catalog
+        )
+        self.roles.set(key, grants)
+        return grants
+
+    # ---------- invalidation ----------
+
+    def invalidate_user(self, user_id: str):
+        self.users.pop(user_id)
+
+    def invalidate_role(self, role_id: str):
+        self.roles.pop_where(lambda key: key[1] == role_id)
+
+    def invalidate_org(self, org_id: str):
+        self.orgs.pop(org_id)
+        self.roles.pop_where(lambda key: key[0] == org_id)
+
+    def invalidate_catalog(self):
+        self._catalog = None
+        self.roles.clear()
+
+    def clear(self):
+        self.users.clear()
+        self.roles.clear()
+        self.orgs.clear()
+        self._catalog = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "users": len(self.users),
+            "roles": len(self.roles),
+            "orgs": len(self.orgs),
+            "catalog_loaded": self._catalog is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+permission_cache = PermissionCache()
+
+
+def invalidate_user(user_id: str):
+    permission_cache.invalidate_user(user_id)
+
+
+def invalidate_role(role_id: str):
+    permission_cache.invalidate_role(role_id)
+
+
+def invalidate_org(org_id: str):
+    permission_cache.invalidate_org(org_id)
+
+
+def invalidate_catalog():
+    permission_cache.invalidate_catalog()
@@ -10,6 +10,8 @@ import logging
 from typing import Dict, Any, Optional
 from datetime import datetime, timezone
 
+from permission_cache import invalidate_org
+
 logger = logging.getLogger(__name__)
 
 RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID')
@@ -186,6 +188,7 @@ async def handle_subscription_activated(payload: Dict[str, Any], db):
                 }
             }
         )
+        invalidate_org(org_id)
         
         # Remove demo data (import demo service)
         from demo_mode_service import remove_demo_data
@@ -250,6 +253,7 @@ async def handle_subscription_cancelled(payload: Dict[str, Any], db):
                 }
             }
         )
+        invalidate_org(org_id)
         
         logger.info(f"✅ Org {org_id} marked as cancelled")
         
@@ -14,17 +14,14 @@ from razorpay_service import (
     handle_subscription_cancelled,
     handle_subscription_charged
 )
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 
-# Direct MongoDB connection (avoid circular import)
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Shared MongoDB connection pool (avoid circular import)
+db = get_shared_db()
 
 def get_db():
     """Get database instance"""
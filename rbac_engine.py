@@ -5,6 +5,8 @@ Handles permission checks at module + submodule level
 import logging
 from typing import Dict, List, Optional
 
+from permission_cache import invalidate_role, invalidate_catalog
+
 logger = logging.getLogger(__name__)
 
 # System-level roles
@@ -160,6 +162,7 @@ async def initialize_modules_and_permissions(db):
                 await db.submodules.insert_one(submodule_doc)
                 logger.info(f"✅ Created submodule: {sub['display']}")
     
+    invalidate_catalog()
     logger.info("🎉 Modules and submodules initialized!")
 
 async def create_system_roles(db):
@@ -232,4 +235,5 @@ async def assign_permissions_to_role(role_id: str, submodule_ids: List[str], db)
         }
         await db.role_permissions.insert_one(permission_doc)
     
+    invalidate_role(role_id)
     logger.info(f"✅ Assigned {len(submodule_ids)} permissions to role {role_id}")
@@ -0,0 +1,674 @@
+"""
+Reconciliation Matcher
+Vectorised bank entry <-> accounting record matching for ml_reconciliation_routes
+and the main transaction match suggestions.
+
+- Candidate pairs are blocked, never enumerated: an amount join (records
+  sorted by amount and date, same credit/receivable side, within
+  RECON_AMOUNT_TOLERANCE and RECON_DATE_WINDOW_DAYS) plus a token join on
+  normalised party / reference tokens. Tokens carried by more than
+  RECON_MAX_TOKEN_RECORDS records are too common to block on.
+- Pairs are scored in NumPy arrays with the rule-based weights: amount
+  0.4 / 0.3 / 0.2, every party token in the description 0.35 or every
+  reference token 0.3, type alignment 0.25. Date proximity only orders
+  otherwise equal pairs.
+- assign() is a one-to-one greedy assignment (best remaining pair first),
+  so a record is never matched to two bank entries; apply_matches()
+  claims both the entry and the record (`fin_reconciliation_claims`), so
+  concurrent runs cannot link either twice.
+- Full-period reconciliation runs as a background job
+  (`fin_reconciliation_jobs`) that matches in the process pool.
+"""
+import os
+import re
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+RECON_AMOUNT_TOLERANCE = float(os.environ.get('RECON_AMOUNT_TOLERANCE', '0.05'))
+RECON_DATE_WINDOW_DAYS = int(os.environ.get('RECON_DATE_WINDOW_DAYS', '60'))
+RECON_MIN_CONFIDENCE = float(os.environ.get('RECON_MIN_CONFIDENCE', '0.5'))
+RECON_AUTO_MATCH_CONFIDENCE = float(os.environ.get('RECON_AUTO_MATCH_CONFIDENCE', '0.8'))
+# Tokens on more records than this ("neft", "ltd", ...) do not create candidates
+RECON_MAX_TOKEN_RECORDS = int(os.environ.get('RECON_MAX_TOKEN_RECORDS', '50'))
+# Amount candidates kept per bank entry when many records share an amount
+RECON_MAX_AMOUNT_CANDIDATES = int(os.environ.get('RECON_MAX_AMOUNT_CANDIDATES', '50'))
+RECON_JOB_STALE_SECONDS = int(os.environ.get('RECON_JOB_STALE_SECONDS', '600'))
+RECON_WRITE_BATCH = 1000
+
+RECON_JOBS = "fin_reconciliation_jobs"
+# One document per linked accounting record; _id "<org_id>:<record id>" makes the claim atomic
+RECON_CLAIMS = "fin_reconciliation_claims"
+
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+_DAY_SHIFT = 1 << 17  # date slot in the (amount, date) sort key; days since 1970 fit
+_SUGGESTIONS_PER_ENTRY = 3
+_GREEDY_MIN_ROUND = 64  # fewer picks per vectorised round than this: finish one pair at a time
+
+
+# ==================== FIELDS ====================
+
+def _entry_id(entry: dict) -> str:
+    return entry.get("entry_id", entry.get("id", ""))
+
+
+def _entry_amount(entry: dict) -> float:
+    amount = entry.get("amount") or entry.get("credit_amount") or entry.get("debit_amount") or 0
+    return abs(float(amount))
+
+
+def _entry_is_credit(entry: dict) -> bool:
+    entry_type = entry.get("type", entry.get("entry_type", ""))
+    return entry_type == "credit" or (entry.get("amount") or 0) > 0 or (entry.get("credit_amount") or 0) > 0
+
+
+def _record_id(record: dict) -> str:
+    return record.get("id", record.get("receivable_id", record.get("payable_id", "")))
+
+
+def _record_amount(record: dict) -> float:
+    return abs(float(record.get("amount", record.get("bill_amount", record.get("invoice_amount", 0))) or 0))
+
+
+def _record_party(record: dict) -> str:
+    return record.get("party_name", record.get("vendor_name", record.get("customer_name", ""))) or ""
+
+
+def _record_reference(record: dict) -> str:
+    return record.get("invoice_number", record.get("bill_number", "")) or ""
+
+
+def _record_is_receivable(record: dict) -> bool:
+    return record.get("type", "") == "receivable" or "receivable_id" in record
+
+
+def _days(values: Sequence) -> np.ndarray:
+    """Days since epoch as float (NaN when missing / unparseable)"""
+    parsed = pd.to_datetime(
+        pd.Series([str(v)[:10] if v else None for v in values], dtype=object),
+        format="%Y-%m-%d", errors="coerce"
+    ).to_numpy(dtype="datetime64[D]")
+    days = parsed.astype("int64").astype(float)
+    days[np.isnat(parsed)] = np.nan
+    return days
+
+
+def tokens(text: str) -> List[str]:
+    """Lowercased alphanumeric tokens ("NEFT CR-Acme/INV-7" -> neft, cr, acme, inv, 7)"""
+    return [token for token in _TOKEN_SPLIT.split(text.lower()) if token]
+
+
+class _Vocabulary:
+    """Token -> integer id, shared by both sides of a match"""
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+
+    def encode(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """CSR (row pointers, token ids) with each row's tokens deduplicated"""
+        ptr = np.zeros(len(texts) + 1, dtype=np.int64)
+        flat: List[int] = []
+        for row, text in enumerate(texts):
+            row_ids = {self.ids.setdefault(token, len(self.ids)) for token in tokens(text)}
+            flat.extend(row_ids)
+            ptr[row + 1] = len(flat)
+        return ptr, np.asarray(flat, dtype=np.int64)
+
+
+def _unique(keys: np.ndarray) -> np.ndarray:
+    """Sorted distinct int64 keys (sort + neighbour compare beats np.unique's hashing here)"""
+    keys = np.sort(keys)
+    return keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+
+
+def _expand(lo: np.ndarray, hi: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Flatten half-open ranges [lo, hi) into (owner row, position) arrays"""
+    lengths = np.maximum(hi - lo, 0)
+    owners = np.repeat(np.arange(len(lo)), lengths)
+    starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+    return owners, starts + np.arange(lengths.sum())
+
+
+class _Side:
+    """Column arrays for one side of a match"""
+
+    def __init__(self, ids: List[str], amounts: np.ndarray, days: np.ndarray, flags: np.ndarray,
+                 parties: Optional[List[str]] = None, references: Optional[List[str]] = None):
+        self.ids = ids
+        self.amounts = amounts
+        self.days = days
+        self.flags = flags  # entries: is credit, records: is receivable
+        self.parties = parties
+        self.references = references
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# ==================== MATCHING ====================
+
+class MatchResult:
+    """Scored candidate pairs (entry index, record index) for one matching run"""
+
+    def __init__(self, entries: _Side, records: _Side, pairs: Dict[str, np.ndarray], stats: dict):
+        self.entries = entries
+        self.records = records
+        self.entry_idx = pairs["entry"]
+        self.record_idx = pairs["record"]
+        self.amount_score = pairs["amount"]
+        self.party_score = pairs["party"]
+        self.reference_score = pairs["reference"]
+        self.type_score = pairs["type"]
+        self.proximity = pairs["proximity"]
+        self.confidence = np.round(self.amount_score + np.maximum(self.party_score, self.reference_score)
+                                   + self.type_score, 2)
+        self.stats = stats
+
+    def _order(self, mask: np.ndarray) -> np.ndarray:
+        """Indices of masked pairs, best first: confidence, then date proximity, then input order"""
+        selected = np.flatnonzero(mask)
+        order = np.lexsort((selected, -self.proximity[selected], -self.confidence[selected]))
+        return selected[order]
+
+    def reasons(self, pair: int) -> List[str]:
+        reasons = []
+        amount = self.amount_score[pair]
+        if amount >= 0.4:
+            reasons.append("Exact amount match")
+        elif amount >= 0.3:
+            reasons.append("Amount within 5% tolerance")
+        elif amount > 0:
+            reasons.append("Amount within 10% tolerance")
+        record = self.record_idx[pair]
+        if self.party_score[pair] and self.party_score[pair] >= self.reference_score[pair]:
+            reasons.append(f"Party name '{self.records.parties[record].lower()}' found in description")
+        elif self.reference_score[pair]:
+            reasons.append(f"Reference '{self.records.references[record].lower()}' found in description")
+        if self.type_score[pair]:
+            reasons.append("Transaction type aligned")
+        if self.proximity[pair] > 0:
+            gap = (1 - self.proximity[pair]) * RECON_DATE_WINDOW_DAYS
+            reasons.append(f"Dates within {int(round(gap))} days")
+        return reasons
+
+    def _pair_dict(self, pair: int) -> dict:
+        return {
+            "accounting_id": self.records.ids[self.record_idx[pair]],
+            "confidence": float(self.confidence[pair]),
+            "match_reasons": self.reasons(pair)
+        }
+
+    def suggestions(self, per_entry: int = _SUGGESTIONS_PER_ENTRY, min_confidence: float = RECON_MIN_CONFIDENCE) -> List[dict]:
+        """rule_based_matching shape: one result per bank entry with its top matches"""
+        ranked = self._order(self.confidence >= min_confidence)
+        counts = np.bincount(self.entry_idx[ranked], minlength=len(self.entries))
+        # ranked is globally ordered; a stable sort by entry keeps each entry's best first
+        by_entry = ranked[np.argsort(self.entry_idx[ranked], kind="stable")]
+        starts = np.concatenate(([0], np.cumsum(counts)))
+        results = []
+        for row, entry_id in enumerate(self.entries.ids):
+            top = by_entry[starts[row]:starts[row] + min(counts[row], per_entry)]
+            results.append({
+                "bank_entry_id": entry_id,
+                "matches": [self._pair_dict(pair) for pair in top],
+                "reasoning": f"Found {counts[row]} potential matches" if counts[row] else "No matches found"
+            })
+        return results
+
+    def assign(self, min_confidence: float = RECON_MIN_CONFIDENCE) -> np.ndarray:
+        """Pair indices of a one-to-one assignment, best pairs first"""
+        return greedy_assignment(self.entry_idx, self.record_idx, self._order(self.confidence >= min_confidence))
+
+    def assignments(self, min_confidence: float = RECON_AUTO_MATCH_CONFIDENCE) -> List[dict]:
+        """Assigned pairs as plain dicts (small enough to return from a worker process)"""
+        return [{
+            "bank_entry_id": self.entries.ids[self.entry_idx[pair]],
+            "record_type": "receivable" if self.records.flags[self.record_idx[pair]] else "payable",
+            **self._pair_dict(pair)
+        } for pair in self.assign(min_confidence)]
+
+
+def greedy_assignment(left: np.ndarray, right: np.ndarray, ranked: np.ndarray) -> np.ndarray:
+    """
+    One-to-one greedy matching over pairs given best-first (`ranked` indexes
+    left/right). Each round keeps the pairs that are the best remaining
+    option for both of their ends - exactly the pairs that taking the best
+    pair one at a time would keep - and drops pairs touching a kept end.
+    Long dependency chains finish with the one-at-a-time loop.
+    """
+    position = np.empty(len(left), dtype=np.int64)
+    position[ranked] = np.arange(len(ranked))
+    chosen = []
+    remaining = ranked
+    while len(remaining):
+        _, first_left = np.unique(left[remaining], return_index=True)
+        _, first_right = np.unique(right[remaining], return_index=True)
+        picked = remaining[np.intersect1d(first_left, first_right, assume_unique=True)]
+        chosen.append(picked)
+        remaining = remaining[~(np.isin(left[remaining], left[picked]) | np.isin(right[remaining], right[picked]))]
+        if len(picked) < _GREEDY_MIN_ROUND:
+            chosen.append(_sequential_greedy(left, right, remaining))
+            break
+    picked = np.concatenate(chosen) if chosen else np.empty(0, dtype=np.int64)
+    return picked[np.argsort(position[picked])]
+
+
+def _sequential_greedy(left: np.ndarray, right: np.ndarray, ranked: np.ndarray) -> np.ndarray:
+    used_left, used_right, picked = set(), set(), []
+    for pair, l, r in zip(ranked.tolist(), left[ranked].tolist(), right[ranked].tolist()):
+        if l not in used_left and r not in used_right:
+            used_left.add(l)
+            used_right.add(r)
+            picked.append(pair)
+    return np.asarray(picked, dtype=np.int64)
+
+
+def _sort_keys(amounts: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """int64 keys ordering by (amount in paise, date); undated rows sort first per amount"""
+    dated = np.where(np.isnan(days), 0, np.clip(days, 0, _DAY_SHIFT - 1))
+    return np.round(amounts * 100).astype(np.int64) * _DAY_SHIFT + dated.astype(np.int64)
+
+
+def _amount_candidates(entries: _Side, records: _Side) -> Tuple[np.ndarray, np.ndarray]:
+    """Same-side pairs within the amount tolerance and date window"""
+    tol = RECON_AMOUNT_TOLERANCE
+    cap = RECON_MAX_AMOUNT_CANDIDATES
+    pair_e, pair_r = [], []
+    for flag in (True, False):
+        e_rows = np.flatnonzero(entries.flags == flag)
+        r_rows = np.flatnonzero(records.flags == flag)
+        if not len(e_rows) or not len(r_rows):
+            continue
+        r_keys = _sort_keys(records.amounts[r_rows], records.days[r_rows])
+        order = np.argsort(r_keys, kind="stable")
+        r_rows, r_keys = r_rows[order], r_keys[order]
+
+        amounts = entries.amounts[e_rows]
+        low = amounts - tol * np.maximum(amounts, 1)
+        high = np.maximum(amounts / (1 - tol), amounts + tol)
+        lo = np.searchsorted(r_keys, np.floor(low * 100).astype(np.int64) * _DAY_SHIFT, side="left")
+        hi = np.searchsorted(r_keys, (np.ceil(high * 100).astype(np.int64) + 1) * _DAY_SHIFT, side="left")
+        # Too many candidates (one amount on thousands of records): keep the
+        # `cap` nearest the entry's own (amount, date) position
+        centre = np.searchsorted(r_keys, _sort_keys(amounts, entries.days[e_rows]))
+        crowded = hi - lo > cap
+        lo = np.where(crowded, np.clip(centre - cap // 2, lo, hi - cap), lo)
+        hi = np.where(crowded, lo + cap, hi)
+
+        owners, positions = _expand(lo, hi)
+        pair_e.append(e_rows[owners])
+        pair_r.append(r_rows[positions])
+    if not pair_e:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    e, r = np.concatenate(pair_e), np.concatenate(pair_r)
+    a, b = entries.amounts[e], records.amounts[r]
+    gap = np.abs(entries.days[e] - records.days[r])
+    keep = (np.abs(a - b) / np.maximum(np.maximum(a, b), 1) < tol) & ~(gap > RECON_DATE_WINDOW_DAYS)
+    return e[keep], r[keep]
+
+
+def _token_candidates(entry_owner, entry_tok, record_owner, record_tok) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs sharing at least one token that is rare enough to block on"""
+    if not len(record_tok) or not len(entry_tok):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    usable = np.bincount(record_tok)[record_tok] <= RECON_MAX_TOKEN_RECORDS
+    order = np.argsort(record_tok[usable], kind="stable")
+    index_tok = record_tok[usable][order]
+    index_owner = record_owner[usable][order]
+
+    lo = np.searchsorted(index_tok, entry_tok, side="left")
+    hi = np.searchsorted(index_tok, entry_tok, side="right")
+    owners, positions = _expand(lo, hi)
+    return entry_owner[owners], index_owner[positions]
+
+
+def _coverage(pair_e, pair_r, entry_keys: np.ndarray, vocab_size: int, ptr, tok) -> np.ndarray:
+    """Share of each pair's record tokens (CSR ptr/tok) found among the entry's tokens"""
+    lengths = ptr[pair_r + 1] - ptr[pair_r]
+    owners, positions = _expand(ptr[pair_r], ptr[pair_r + 1])
+    keys = pair_e[owners] * vocab_size + tok[positions]
+    slot = np.minimum(np.searchsorted(entry_keys, keys), max(len(entry_keys) - 1, 0))
+    hits = (entry_keys[slot] == keys) if len(entry_keys) else np.zeros(len(keys), dtype=bool)
+    shared = np.bincount(owners, weights=hits, minlength=len(pair_e))
+    return np.where(lengths > 0, shared / np.maximum(lengths, 1), 0.0)
+
+
+def match_transactions(bank_entries: List[dict], accounting_records: List[dict]) -> MatchResult:
+    """Block, then score every candidate pair of bank entries x accounting records"""
+    entries = _Side(
+        [_entry_id(e) for e in bank_entries],
+        np.array([_entry_amount(e) for e in bank_entries], dtype=float),
+        _days([e.get("date") or e.get("transaction_date") or e.get("value_date") for e in bank_entries]),
+        np.array([_entry_is_credit(e) for e in bank_entries], dtype=bool),
+    )
+    parties = [_record_party(r) for r in accounting_records]
+    references = [_record_reference(r) for r in accounting_records]
+    records = _Side(
+        [_record_id(r) for r in accounting_records],
+        np.array([_record_amount(r) for r in accounting_records], dtype=float),
+        _days([r.get("date") or r.get("due_date") or r.get("invoice_date") or r.get("bill_date")
+               or r.get("created_at") for r in accounting_records]),
+        np.array([_record_is_receivable(r) for r in accounting_records], dtype=bool),
+        parties, references
+    )
+
+    vocab = _Vocabulary()
+    entry_ptr, entry_tok = vocab.encode([f"{e.get('description') or ''} {e.get('reference') or ''}" for e in bank_entries])
+    party_ptr, party_tok = vocab.encode(parties)
+    ref_ptr, ref_tok = vocab.encode(references)
+    vocab_size = max(len(vocab.ids), 1)
+
+    # Blocking index over party and reference tokens together
+    block_owner = np.concatenate((_expand(party_ptr[:-1], party_ptr[1:])[0], _expand(ref_ptr[:-1], ref_ptr[1:])[0]))
+    block_keys = _unique(block_owner * vocab_size + np.concatenate((party_tok, ref_tok)))
+    entry_owner, _ = _expand(entry_ptr[:-1], entry_ptr[1:])
+
+    amount_e, amount_r = _amount_candidates(entries, records)
+    token_e, token_r = _token_candidates(entry_owner, entry_tok, *np.divmod(block_keys, vocab_size))
+    pair_keys = _unique(np.concatenate((amount_e, token_e)) * max(len(records), 1) + np.concatenate((amount_r, token_r)))
+    pair_e, pair_r = np.divmod(pair_keys, max(len(records), 1))
+
+    entry_keys = _unique(entry_owner * vocab_size + entry_tok)
+    party_cover = _coverage(pair_e, pair_r, entry_keys, vocab_size, party_ptr, party_tok)
+    ref_cover = _coverage(pair_e, pair_r, entry_keys, vocab_size, ref_ptr, ref_tok)
+
+    a, b = entries.amounts[pair_e], records.amounts[pair_r]
+    diff = np.abs(a - b)
+    rel = diff / np.maximum(np.maximum(a, b), 1)
+    gap = np.abs(entries.days[pair_e] - records.days[pair_r])
+    pairs = {
+        "entry": pair_e,
+        "record": pair_r,
+        "amount": np.select([diff == 0, rel < 0.05, rel < 0.1], [0.4, 0.3, 0.2], 0.0),
+        "party": np.where(party_cover >= 1, 0.35, 0.0),
+        "reference": np.where(ref_cover >= 1, 0.3, 0.0),
+        "type": np.where(entries.flags[pair_e] == records.flags[pair_r], 0.25, 0.0),
+        "proximity": np.nan_to_num(np.clip(1 - gap / max(RECON_DATE_WINDOW_DAYS, 1), 0, 1)),
+    }
+    stats = {
+        "bank_entries": len(entries),
+        "accounting_records": len(records),
+        "amount_candidates": int(len(amount_e)),
+        "token_candidates": int(len(token_e)),
+        "scored_pairs": int(len(pair_e)),
+    }
+    return MatchResult(entries, records, pairs, stats)
+
+
+def auto_match(bank_entries: List[dict], accounting_records: List[dict],
+               min_confidence: float = RECON_AUTO_MATCH_CONFIDENCE) -> Tuple[List[dict], dict]:
+    """One-to-one assignments at or above min_confidence, plus match stats (process-pool entry point)"""
+    result = match_transactions(bank_entries, accounting_records)
+    return result.assignments(min_confidence), result.stats
+
+
+def assign_suggestions(results: List[dict], min_confidence: float = RECON_AUTO_MATCH_CONFIDENCE) -> List[Tuple[dict, dict]]:
+    """
+    One-to-one (result, match) pairs from per-entry suggestion lists (the
+    rule-based or LLM shape), so a record suggested for several entries is
+    only applied to the most confident one.
+    """
+    flat = [(result, match) for result in results for match in result.get("matches") or []
+            if match.get("confidence", 0) >= min_confidence]
+    if not flat:
+        return []
+    entries = {id(result): n for n, result in enumerate(results)}
+    records: Dict[str, int] = {}
+    left = np.array([entries[id(result)] for result, _ in flat], dtype=np.int64)
+    right = np.array([records.setdefault(match.get("accounting_id"), len(records)) for _, match in flat], dtype=np.int64)
+    confidence = np.array([match.get("confidence", 0) for _, match in flat], dtype=float)
+    ranked = np.lexsort((np.arange(len(flat)), -confidence))
+    return [flat[pair] for pair in greedy_assignment(left, right, ranked)]
+
+
+# ==================== TRANSACTION SUGGESTIONS ====================
+
+def suggestion_scores(description: str, amount: float, names: Sequence[str],
+                      outstanding: Sequence[float]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    (name_match, amount_match, match_score) on a 0-100 scale for one bank
+    transaction against many invoices / bills; match_score weighs the name
+    70% and the amount 30%.
+    """
+    description = (description or "").lower()
+    desc_words = set(description.split())
+    names = [(name or "").lower() for name in names]
+
+    # Per distinct name word: exact word in the description, or (3+ chars)
+    # a substring either way of a description word (abbreviations)
+    vocab: Dict[str, int] = {}
+    ptr = np.zeros(len(names) + 1, dtype=np.int64)
+    flat: List[int] = []
+    for row, name in enumerate(names):
+        flat.extend({vocab.setdefault(word, len(vocab)) for word in name.split()})
+        ptr[row + 1] = len(flat)
+    word_ids = np.asarray(flat, dtype=np.int64)
+    in_desc = np.array([word in desc_words for word in vocab], dtype=float)
+    abbreviation = np.array([len(word) >= 3 and any(word in d or d in word for d in desc_words) for word in vocab],
+                            dtype=float)
+
+    owners, _ = _expand(ptr[:-1], ptr[1:])
+    lengths = np.diff(ptr)
+    overlap = np.bincount(owners, weights=in_desc[word_ids], minlength=len(names)) / np.maximum(lengths, 1)
+    abbreviated = np.bincount(owners, weights=abbreviation[word_ids], minlength=len(names)) > 0
+    contained = np.fromiter((bool(name) and name in description for name in names), dtype=bool, count=len(names))
+    name_match = np.select(
+        [contained, overlap >= 0.8, overlap >= 0.6, overlap >= 0.4, overlap > 0, abbreviated],
+        [100, 95, 85, 70, 50, 40], 0
+    ).astype(float)
+
+    outstanding = np.asarray(outstanding, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amount_diff = np.abs(amount - outstanding) / outstanding
+    amount_match = np.where(outstanding > 0, np.select(
+        [amount_diff == 0, amount_diff <= 0.02, amount_diff <= 0.05, amount_diff <= 0.10, amount_diff <= 0.20],
+        [100, 98, 95, 85, 70], np.maximum(0, 50 - amount_diff * 50)
+    ), 0.0)
+    return name_match, amount_match, name_match * 0.7 + amount_match * 0.3
+
+
+# ==================== PERSISTENCE ====================
+
+ENTRY_FIELDS = {
+    "_id": 0, "entry_id": 1, "id": 1, "amount": 1, "credit_amount": 1, "debit_amount": 1, "type": 1,
+    "entry_type": 1, "description": 1, "reference": 1, "date": 1, "transaction_date": 1, "value_date": 1
+}
+
+
+async def load_open_records(db, org_id: str, unreconciled: bool = False) -> List[dict]:
+    """Open receivables and payables, tagged with their type (optionally minus already reconciled ones)"""
+    receivables = await db.fin_receivables.find(
+        {"org_id": org_id, "status": {"$in": ["open", "partial"]}}, {"_id": 0}
+    ).to_list(length=None)
+    payables = await db.fin_payables.find(
+        {"org_id": org_id, "status": {"$in": ["open", "approved"]}}, {"_id": 0}
+    ).to_list(length=None)
+    records = [{**r, "type": "receivable"} for r in receivables] + [{**p, "type": "payable"} for p in payables]
+    if unreconciled:
+        linked = set(await db.fin_reconciliations.distinct("accounting_record_id", {"org_id": org_id}))
+        records = [record for record in records if _record_id(record) not in linked]
+    return records
+
+
+async def _claim_records(db, org_id: str, batch: Dict[str, dict], now: str) -> List[str]:
+    """Claim each match's accounting record; returns the reconciliation ids whose claim won"""
+    claims = [{
+        "_id": f"{org_id}:{match['accounting_id']}",
+        "org_id": org_id,
+        "accounting_record_id": match["accounting_id"],
+        "bank_entry_id": match["bank_entry_id"],
+        "reconciliation_id": recon_id,
+        "created_at": now
+    } for recon_id, match in batch.items()]
+    try:
+        await db[RECON_CLAIMS].insert_many(claims, ordered=False)
+        return list(batch)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != 11000 for error in errors):
+            raise
+        lost = {claims[error["index"]]["reconciliation_id"] for error in errors}
+        return [recon_id for recon_id in batch if recon_id not in lost]
+
+
+async def apply_matches(db, org_id: str, matches: List[dict], status: str, user_id: Optional[str]) -> int:
+    """
+    Link bank entries to records. Both sides are claimed conditionally: the
+    accounting record through a unique claim document, then the bank entry
+    while it is still unmatched. A match is skipped if either claim loses
+    (a lost bank claim releases the record claim), so concurrent runs never
+    link an entry or a record twice; a reconciliation record is written only
+    for matches that won both.
+    """
+    applied = 0
+    now = datetime.now(timezone.utc).isoformat()
+    for start in range(0, len(matches), RECON_WRITE_BATCH):
+        batch = {f"RECON-{uuid.uuid4().hex[:8].upper()}": match for match in matches[start:start + RECON_WRITE_BATCH]}
+        claimed = await _claim_records(db, org_id, batch, now)
+        if not claimed:
+            continue
+        await db.fin_bank_statements.bulk_write([
+            UpdateOne(
+                {"entry_id": batch[recon_id]["bank_entry_id"], "org_id": org_id, "matched": {"$ne": True}},
+                {"$set": {"matched": True, "status": "matched", "reconciliation_id": recon_id}}
+            )
+            for recon_id in claimed
+        ], ordered=False)
+        linked = set(await db.fin_bank_statements.distinct(
+            "reconciliation_id", {"org_id": org_id, "reconciliation_id": {"$in": claimed}}
+        ))
+        won = [recon_id for recon_id in claimed if recon_id in linked]
+        released = [recon_id for recon_id in claimed if recon_id not in linked]
+        if released:
+            await db[RECON_CLAIMS].delete_many({
+                "_id": {"$in": [f"{org_id}:{batch[recon_id]['accounting_id']}" for recon_id in released]},
+                "reconciliation_id": {"$in": released}
+            })
+        if won:
+            await db.fin_reconciliations.insert_many([{
+                "reconciliation_id": recon_id,
+                "org_id": org_id,
+                "bank_entry_id": batch[recon_id]["bank_entry_id"],
+                "accounting_record_id": batch[recon_id]["accounting_id"],
+                "confidence": batch[recon_id]["confidence"],
+                "match_reasons": batch[recon_id]["match_reasons"],
+                "status": status,
+                "created_at": now,
+                "created_by": user_id
+            } for recon_id in won])
+        applied += len(won)
+    return applied
+
+
+# ==================== BACKGROUND JOBS ====================
+
+_running: Dict[str, asyncio.Task] = {}
+
+
+async def create_reconciliation_job(db, org_id: str, user_id: Optional[str], date_from: Optional[str] = None,
+                                    date_to: Optional[str] = None,
+                                    min_confidence: float = RECON_AUTO_MATCH_CONFIDENCE) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    job = {
+        "job_id": f"RCJ-{uuid.uuid4().hex[:12].upper()}",
+        "org_id": org_id,
+        "status": "queued",  # queued | running | completed | failed
+        "date_from": date_from,
+        "date_to": date_to,
+        "min_confidence": min_confidence,
+        "created_by": user_id,
+        "created_at": now,
+        "heartbeat_at": now
+    }
+    await db[RECON_JOBS].insert_one(job)
+    job.pop("_id", None)
+    return job
+
+
+def _period_query(org_id: str, date_from: Optional[str], date_to: Optional[str]) -> dict:
+    query = {"org_id": org_id, "matched": {"$ne": True}}
+    window = {}
+    if date_from:
+        window["$gte"] = date_from
+    if date_to:
+        # ISO strings: everything on date_to sorts before the next day
+        window["$lt"] = (datetime.strptime(date_to[:10], "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+    if window:
+        query["transaction_date"] = window
+    return query
+
+
+async def run_reconciliation_job(db, job_id: str) -> Optional[dict]:
+    """Match every unmatched entry of the job's period against all open records"""
+    from job_scheduler import run_in_process
+
+    now = datetime.now(timezone.utc)
+    stale = (now - timedelta(seconds=RECON_JOB_STALE_SECONDS)).isoformat()
+    job = await db[RECON_JOBS].find_one_and_update(
+        {"job_id": job_id, "$or": [
+            {"status": "queued"},
+            {"status": "running", "heartbeat_at": {"$lt": stale}}
+        ]},
+        {"$set": {"status": "running", "started_at": now.isoformat(), "heartbeat_at": now.isoformat(), "error": None}},
+        projection={"_id": 0}
+    )
+    if not job:
+        return None
+
+    org_id = job["org_id"]
+    try:
+        entries = await db.fin_bank_statements.find(
+            _period_query(org_id, job.get("date_from"), job.get("date_to")), ENTRY_FIELDS
+        ).to_list(length=None)
+        records = await load_open_records(db, org_id, unreconciled=True)
+        started = datetime.now(timezone.utc)
+        matches, stats = await run_in_process(auto_match, entries, records, job["min_confidence"])
+        stats["match_seconds"] = round((datetime.now(timezone.utc) - started).total_seconds(), 3)
+        await db[RECON_JOBS].update_one(
+            {"job_id": job_id}, {"$set": {"stats": stats, "heartbeat_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        matched = await apply_matches(db, org_id, matches, "auto_matched", job.get("created_by"))
+        result = {
+            "status": "completed",
+            "total_analyzed": len(entries),
+            "auto_matched": matched,
+            "pending_review": len(entries) - matched,
+            "finished_at": datetime.now(timezone.utc).isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Reconciliation job {job_id} failed: {e}")
+        result = {"status": "failed", "error": str(e), "finished_at": datetime.now(timezone.utc).isoformat()}
+    await db[RECON_JOBS].update_one({"job_id": job_id}, {"$set": {**result, "heartbeat_at": result["finished_at"]}})
+    return await db[RECON_JOBS].find_one({"job_id": job_id}, {"_id": 0})
+
+
+def launch_reconciliation_job(db, job_id: str) -> asyncio.Task:
+    """Run a job in the background on the current event loop"""
+    task = asyncio.create_task(run_reconciliation_job(db, job_id))
+    _running[job_id] = task
+    task.add_done_callback(lambda _: _running.pop(job_id, None))
+    return task
+
+
+async def resume_reconciliation_jobs(db) -> List[str]:
+    """Relaunch queued jobs and running jobs whose worker stopped heartbeating"""
+    stale = (datetime.now(timezone.utc) - timedelta(seconds=RECON_JOB_STALE_SECONDS)).isoformat()
+    jobs = await db[RECON_JOBS].find(
+        {"$or": [{"status": "queued"}, {"status": "running", "heartbeat_at": {"$lt": stale}}]},
+        {"_id": 0, "job_id": 1}
+    ).to_list(100)
+    resumed = []
+    for job in jobs:
+        if job["job_id"] not in _running:
+            launch_reconciliation_job(db, job["job_id"])
+            resumed.append(job["job_id"])
+    return resumed
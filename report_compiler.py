@@ -0,0 +1,362 @@
+"""
+Report Compiler
+Turns a saved reports-builder definition (filters, columns, group_by,
+aggregations, sort_by) into MongoDB queries, so rows, totals and group
+summaries are computed by the server instead of in Python loops.
+
+- compile_report()  -> CompiledReport: $match, row projection / sort, and
+                       one $facet pipeline for totals + per-group summaries
+                       (aggregates cover every matched document, no row cap)
+- warnings          filters / sorts on fields the data source does not
+                    declare as indexed, and unanchored `contains` filters
+- execute_report()  runs a compiled report, cached per (definition hash,
+                    org, data version, limit) for REPORT_CACHE_TTL_SECONDS
+- touch_report_data()  bumps a collection's data version; writers of the
+                    report data sources call it, so the next run on any
+                    worker recomputes. The (short) TTL bounds staleness for
+                    writes that do not go through an instrumented path.
+- stream_csv / write_xlsx   exports straight from a cursor, chunk by chunk
+- write_report_file()       CSV/XLSX file for scheduled reports, one cursor
+                            batch at a time, written on a worker thread
+"""
+import io
+import os
+import re
+import csv
+import json
+import asyncio
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from permission_cache import _TTLMap
+
+logger = logging.getLogger(__name__)
+
+REPORT_CACHE_TTL_SECONDS = float(os.environ.get('REPORT_CACHE_TTL_SECONDS', '60'))
+REPORT_CACHE_MAX_ENTRIES = int(os.environ.get('REPORT_CACHE_MAX_ENTRIES', '200'))
+REPORT_MAX_GROUPS = int(os.environ.get('REPORT_MAX_GROUPS', '1000'))
+REPORT_EXPORT_BATCH_SIZE = 2000
+
+# Excel's sheet limit is 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1048575
+
+AGGREGATE_FUNCTIONS = ("count", "sum", "avg", "min", "max")
+FILTER_OPERATORS = {
+    "eq": None, "ne": "$ne", "gt": "$gt", "gte": "$gte",
+    "lt": "$lt", "lte": "$lte", "contains": "$regex", "in": "$in",
+}
+
+REPORT_DATA_VERSIONS = "report_data_versions"
+
+report_cache = _TTLMap(REPORT_CACHE_TTL_SECONDS, max_entries=REPORT_CACHE_MAX_ENTRIES)
+
+
+class CompiledReport:
+    """Mongo query pieces for one report definition"""
+
+    def __init__(self, collection: str, match: Dict[str, Any], projection: Dict[str, int],
+                 sort: Optional[List[tuple]], summary_pipeline: List[dict],
+                 columns: List[str], group_by: Optional[str], warnings: List[str], definition_hash: str):
+        self.collection = collection
+        self.match = match
+        self.projection = projection
+        self.sort = sort
+        self.summary_pipeline = summary_pipeline
+        self.columns = columns
+        self.group_by = group_by
+        self.warnings = warnings
+        self.definition_hash = definition_hash
+
+    def rows_pipeline(self, limit: Optional[int] = None) -> List[dict]:
+        pipeline: List[dict] = [{"$match": self.match}]
+        if self.sort:
+            pipeline.append({"$sort": dict(self.sort)})
+        if limit:
+            pipeline.append({"$limit": limit})
+        pipeline.append({"$project": self.projection})
+        return pipeline
+
+
+def definition_hash(report: Dict[str, Any]) -> str:
+    """Stable hash of the parts of a definition that change its results"""
+    definition = {
+        key: report.get(key)
+        for key in ("data_source", "columns", "filters", "sort_by", "sort_order", "group_by", "aggregations")
+    }
+    raw = json.dumps(definition, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def _compile_filters(filters: List[dict], fields: Dict[str, dict], indexed: set,
+                     source_name: str, warnings: List[str]) -> Dict[str, Any]:
+    match: Dict[str, Any] = {}
+    for item in filters or []:
+        field = item.get("field")
+        operator = item.get("operator", "eq")
+        value = item.get("value")
+        if not field or operator not in FILTER_OPERATORS:
+            warnings.append(f"Ignored filter {item!r}: unknown field or operator")
+            continue
+        if field not in fields:
+            warnings.append(f"Filter field '{field}' is not a {source_name} field")
+
+        if operator == "eq":
+            condition: Any = value
+        elif operator == "contains":
+            condition = {"$regex": re.escape(str(value)), "$options": "i"}
+            warnings.append(f"'contains' on '{field}' is an unanchored match and scans every candidate row")
+        elif operator == "in":
+            condition = {"$in": value if isinstance(value, list) else [value]}
+        else:
+            condition = {FILTER_OPERATORS[operator]: value}
+
+        if field not in indexed and operator != "contains":
+            warnings.append(f"Filter on '{field}' is not indexed for {source_name}; the collection will be scanned")
+
+        # Range filters on the same field combine (gte + lte); eq replaces
+        existing = match.get(field)
+        if isinstance(existing, dict) and isinstance(condition, dict) and "$regex" not in condition:
+            existing.update(condition)
+        else:
+            match[field] = condition
+    return match
+
+
+def _accumulators(aggregations: List[dict], warnings: List[str]) -> Dict[str, Any]:
+    accumulators: Dict[str, Any] = {"count": {"$sum": 1}}
+    for agg in aggregations or []:
+        field = agg.get("field")
+        func = agg.get("function", "count")
+        if not field or func not in AGGREGATE_FUNCTIONS:
+            warnings.append(f"Ignored aggregation {agg!r}")
+            continue
+        accumulators[f"{field}_{func}"] = {"$sum": 1} if func == "count" else {f"${func}": f"${field}"}
+    return accumulators
+
+
+def compile_report(report: Dict[str, Any], data_sources: Dict[str, dict]) -> CompiledReport:
+    """Raises ValueError for an unknown data source"""
+    source = data_sources.get(report.get("data_source"))
+    if not source:
+        raise ValueError("Invalid data source")
+    fields = {field["name"]: field for field in source.get("fields", [])}
+    indexed = set(source.get("indexed", []))
+    warnings: List[str] = []
+
+    match = _compile_filters(report.get("filters") or [], fields, indexed, source["name"], warnings)
+
+    columns = list(report.get("columns") or [])
+    projection = {"_id": 0}
+    for column in columns:
+        projection[column] = 1
+
+    sort = None
+    sort_by = report.get("sort_by")
+    if sort_by:
+        sort = [(sort_by, 1 if report.get("sort_order", "asc") == "asc" else -1)]
+        if sort_by not in indexed:
+            warnings.append(f"Sorting by '{sort_by}' is not indexed for {source['name']}; rows are sorted in memory")
+
+    accumulators = _accumulators(report.get("aggregations") or [], warnings)
+    group_by = report.get("group_by")
+    facets: Dict[str, List[dict]] = {"totals": [{"$group": {"_id": None, **accumulators}}]}
+    if group_by:
+        facets["groups"] = [
+            {"$group": {"_id": f"${group_by}", **accumulators}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": REPORT_MAX_GROUPS},
+        ]
+
+    return CompiledReport(
+        collection=source["collection"],
+        match=match,
+        projection=projection,
+        sort=sort,
+        summary_pipeline=[{"$match": match}, {"$facet": facets}],
+        columns=columns,
+        group_by=group_by,
+        warnings=list(dict.fromkeys(warnings)),
+        definition_hash=definition_hash(report),
+    )
+
+
+# ==================== CACHE VERSIONING ====================
+
+async def report_data_version(db, collection: str) -> int:
+    doc = await db[REPORT_DATA_VERSIONS].find_one({"_id": collection}, {"version": 1})
+    return doc.get("version", 0) if doc else 0
+
+
+async def touch_report_data(db, *collections: str):
+    """Call after any write to a report data source collection"""
+    now = datetime.now(timezone.utc).isoformat()
+    for collection in collections:
+        await db[REPORT_DATA_VERSIONS].update_one(
+            {"_id": collection},
+            {"$inc": {"version": 1}, "$set": {"changed_at": now}},
+            upsert=True
+        )
+
+
+# ==================== EXECUTION ====================
+
+async def execute_report(db, compiled: CompiledReport, limit: int, org_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Rows (up to `limit`), totals over every matched document and per-group
+    summaries. Served from cache while the source collection's data version
+    is unchanged.
+    """
+    version = await report_data_version(db, compiled.collection)
+    cache_key = (compiled.definition_hash, org_id, version, limit)
+    cached = report_cache.get(cache_key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    collection = db[compiled.collection]
+    rows, summary = await asyncio.gather(
+        collection.aggregate(compiled.rows_pipeline(limit)).to_list(limit),
+        collection.aggregate(compiled.summary_pipeline, allowDiskUse=True).to_list(1),
+    )
+    facets = summary[0] if summary else {}
+    totals = (facets.get("totals") or [{}])[0]
+    totals.pop("_id", None)
+    matched_rows = totals.pop("count", 0)
+
+    groups = []
+    for group in facets.get("groups", []):
+        key = group.pop("_id")
+        groups.append({"group": "Other" if key is None else key, **group})
+
+    grouped_rows = None
+    if compiled.group_by:
+        grouped_rows = {}
+        for row in rows:
+            grouped_rows.setdefault(row.get(compiled.group_by, "Other"), []).append(row)
+
+    result = {
+        "data": rows,
+        "grouped_data": grouped_rows,
+        "groups": groups,
+        "aggregations": totals,
+        "matched_rows": matched_rows,
+        "warnings": compiled.warnings,
+        "computed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    report_cache.set(cache_key, result)
+    return {**result, "cached": False}
+
+
+# ==================== EXPORTS ====================
+
+def _export_cursor(db, compiled: CompiledReport, limit: Optional[int] = None):
+    return db[compiled.collection].aggregate(
+        compiled.rows_pipeline(limit), allowDiskUse=True, batchSize=REPORT_EXPORT_BATCH_SIZE
+    )
+
+
+async def stream_csv(db, compiled: CompiledReport, chunk_bytes: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """CSV of every matched row, yielded in ~chunk_bytes pieces"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=compiled.columns, extrasaction="ignore")
+    writer.writeheader()
+    async for row in _export_cursor(db, compiled):
+        writer.writerow(row)
+        if buffer.tell() >= chunk_bytes:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+async def write_xlsx(db, compiled: CompiledReport, sheet_title: str = "Report") -> str:
+    """Write matched rows to a temporary .xlsx (write-only mode); returns its path"""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title=(sheet_title or "Report")[:31])
+    sheet.append(compiled.columns)
+    async for row in _export_cursor(db, compiled, XLSX_MAX_ROWS):
+        sheet.append([_cell(row.get(column)) for column in compiled.columns])
+
+    handle = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    handle.close()
+    await asyncio.to_thread(workbook.save, handle.name)
+    return handle.name
+
+
+async def write_report_file(db, compiled: CompiledReport, path: str,
+                            fmt: str = "xlsx", sheet_title: str = "Report") -> int:
+    """
+    Write every matched row (capped at XLSX_MAX_ROWS for xlsx) to a CSV or
+    XLSX file; returns the row count. Only one cursor batch is held at a
+    time, and each batch is written on a worker thread.
+    """
+    columns = compiled.columns
+    if fmt == "csv":
+        handle = open(path, "w", newline="", encoding="utf-8")
+        writer = csv.DictWriter(handle, fieldnames=columns, extrasaction="ignore")
+        writer.writeheader()
+        append, finish, limit = writer.writerows, handle.close, None
+    else:
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title=(sheet_title or "Report")[:31])
+        sheet.append(columns)
+
+        def append(rows: List[dict]):
+            for row in rows:
+                sheet.append([_cell(row.get(column)) for column in columns])
+
+        def finish():
+            workbook.save(path)
+
+        limit = XLSX_MAX_ROWS
+
+    count, batch = 0, []
+    try:
+        async for row in _export_cursor(db, compiled, limit):
+            batch.append(row)
+            if len(batch) >= REPORT_EXPORT_BATCH_SIZE:
+                await asyncio.to_thread(append, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            await asyncio.to_thread(append, batch)
+            count += len(batch)
+        await asyncio.to_thread(finish)
+    except BaseException:
+        if fmt == "csv":
+            handle.close()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return count
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # openpyxl cannot write timezone-aware datetimes
+        return value.replace(tzinfo=None)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+async def iter_file(path: str, chunk_bytes: int = 256 * 1024) -> AsyncIterator[bytes]:
+    """Stream a temporary export file and delete it afterwards"""
+    try:
+        with open(path, "rb") as handle:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, chunk_bytes)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
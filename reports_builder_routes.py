@@ -9,6 +9,20 @@ from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
 import uuid
 import json
+import os
+import re
+import logging
+from fastapi.responses import FileResponse, StreamingResponse
+from auth_utils import get_current_principal
+from job_scheduler import CronTrigger
+from report_compiler import (
+    compile_report, execute_report, stream_csv, write_xlsx, iter_file, write_report_file
+)
+
+logger = logging.getLogger(__name__)
+
+REPORT_OUTPUT_DIR = os.environ.get('REPORT_OUTPUT_DIR', '/app/backend/uploads/reports')
+REPORT_OUTPUT_RETENTION_DAYS = int(os.environ.get('REPORT_OUTPUT_RETENTION_DAYS', '30'))
 
 router = APIRouter(prefix="/api/reports-builder", tags=["reports-builder"])
 
@@ -16,25 +30,20 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user_simple(credentials = Depends(__import__('fastapi.security', fromlist=['HTTPBearer']).HTTPBearer())):
-    import jwt
-    import os
-    token = credentials.credentials
-    JWT_SECRET = os.environ.get("JWT_SECRET_KEY")
-    if not JWT_SECRET:
-        raise RuntimeError("JWT_SECRET_KEY is missing in environment")
-
-    payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-    return {"user_id": payload.get("user_id") or payload.get("sub"), "org_id": payload.get("org_id", "default"), "full_name": payload.get("full_name", "User"), "email": payload.get("email")}
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user_simple = get_current_principal
 
 def generate_id(prefix: str) -> str:
     return f"{prefix}-{uuid.uuid4().hex[:8].upper()}"
 
-# Available data sources and their fields
+# Available data sources and their fields.
+# "indexed" lists fields that lead an index in index_registry.py; the report
+# compiler warns about filters and sorts on anything else.
 DATA_SOURCES = {
     "leads": {
         "name": "Leads",
         "collection": "leads",
+        "indexed": [],
         "fields": [
             {"name": "lead_id", "label": "Lead ID", "type": "string"},
             {"name": "first_name", "label": "First Name", "type": "string"},
@@ -51,6 +60,7 @@ DATA_SOURCES = {
     "customers": {
         "name": "Customers",
         "collection": "customers",
+        "indexed": [],
         "fields": [
             {"name": "customer_id", "label": "Customer ID", "type": "string"},
             {"name": "name", "label": "Name", "type": "string"},
@@ -63,6 +73,7 @@ DATA_SOURCES = {
     "invoices": {
         "name": "Invoices",
         "collection": "invoices",
+        "indexed": ["invoice_number", "status"],
         "fields": [
             {"name": "invoice_id", "label": "Invoice ID", "type": "string"},
             {"name": "invoice_number", "label": "Invoice Number", "type": "string"},
@@ -76,6 +87,7 @@ DATA_SOURCES = {
     "bills": {
         "name": "Bills",
         "collection": "bills",
+        "indexed": ["bill_number", "status"],
         "fields": [
             {"name": "bill_id", "label": "Bill ID", "type": "string"},
             {"name": "bill_number", "label": "Bill Number", "type": "string"},
@@ -89,6 +101,7 @@ DATA_SOURCES = {
     "projects": {
         "name": "Projects",
         "collection": "ops_projects",
+        "indexed": [],
         "fields": [
             {"name": "project_id", "label": "Project ID", "type": "string"},
             {"name": "name", "label": "Project Name", "type": "string"},
@@ -102,6 +115,7 @@ DATA_SOURCES = {
     "tasks": {
         "name": "Tasks",
         "collection": "workspace_tasks",
+        "indexed": ["task_id"],
         "fields": [
             {"name": "task_id", "label": "Task ID", "type": "string"},
             {"name": "title", "label": "Title", "type": "string"},
@@ -114,6 +128,7 @@ DATA_SOURCES = {
     "people": {
         "name": "People",
         "collection": "wf_people",
+        "indexed": [],
         "fields": [
             {"name": "person_id", "label": "Person ID", "type": "string"},
             {"name": "full_name", "label": "Name", "type": "string"},
@@ -234,95 +249,29 @@ async def delete_report(
     
     return {"success": True}
 
+async def _load_compiled(db, report_id: str):
+    report = await db.custom_reports.find_one({"report_id": report_id})
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    try:
+        return report, compile_report(report, DATA_SOURCES)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/{report_id}/run")
 async def run_report(
     report_id: str,
     limit: int = Query(1000, le=10000),
     current_user: dict = Depends(get_current_user_simple)
 ):
-    """Execute a report and return results"""
+    """
+    Execute a report and return results.
+    Rows are capped at `limit`; aggregations and group summaries cover every matching record.
+    """
     db = get_db()
+    report, compiled = await _load_compiled(db, report_id)
     
-    report = await db.custom_reports.find_one({"report_id": report_id})
-    if not report:
-        raise HTTPException(status_code=404, detail="Report not found")
-    
-    data_source = DATA_SOURCES.get(report["data_source"])
-    if not data_source:
-        raise HTTPException(status_code=400, detail="Invalid data source")
-    
-    collection = db[data_source["collection"]]
-    
-    # Build query from filters
-    query = {}
-    for filter_item in report.get("filters", []):
-        field = filter_item.get("field")
-        operator = filter_item.get("operator", "eq")
-        value = filter_item.get("value")
-        
-        if operator == "eq":
-            query[field] = value
-        elif operator == "ne":
-            query[field] = {"$ne": value}
-        elif operator == "gt":
-            query[field] = {"$gt": value}
-        elif operator == "gte":
-            query[field] = {"$gte": value}
-        elif operator == "lt":
-            query[field] = {"$lt": value}
-        elif operator == "lte":
-            query[field] = {"$lte": value}
-        elif operator == "contains":
-            query[field] = {"$regex": value, "$options": "i"}
-        elif operator == "in":
-            query[field] = {"$in": value if isinstance(value, list) else [value]}
-    
-    # Build projection
-    projection = {"_id": 0}
-    for col in report.get("columns", []):
-        projection[col] = 1
-    
-    # Build sort
-    sort_field = report.get("sort_by")
-    sort_order = 1 if report.get("sort_order") == "asc" else -1
-    
-    # Execute query
-    cursor = collection.find(query, projection)
-    if sort_field:
-        cursor = cursor.sort(sort_field, sort_order)
-    cursor = cursor.limit(limit)
-    
-    results = await cursor.to_list(limit)
-    
-    # Handle grouping if specified
-    grouped_results = None
-    if report.get("group_by"):
-        grouped_results = {}
-        for row in results:
-            key = row.get(report["group_by"], "Other")
-            if key not in grouped_results:
-                grouped_results[key] = []
-            grouped_results[key].append(row)
-    
-    # Calculate aggregations if specified
-    aggregations_results = {}
-    for agg in report.get("aggregations", []):
-        field = agg.get("field")
-        func = agg.get("function", "count")
-        
-        if func == "count":
-            aggregations_results[f"{field}_count"] = len(results)
-        elif func == "sum":
-            aggregations_results[f"{field}_sum"] = sum(r.get(field, 0) or 0 for r in results)
-        elif func == "avg":
-            values = [r.get(field, 0) or 0 for r in results]
-            aggregations_results[f"{field}_avg"] = sum(values) / len(values) if values else 0
-        elif func == "min":
-            values = [r.get(field, 0) or 0 for r in results]
-            aggregations_results[f"{field}_min"] = min(values) if values else 0
-        elif func == "max":
-            values = [r.get(field, 0) or 0 for r in results]
-            aggregations_results[f"{field}_max"] = max(values) if values else 0
+    result = await execute_report(db, compiled, limit, current_user.get("org_id"))
     
     # Update run statistics
     await db.custom_reports.update_one(
@@ -336,62 +285,109 @@ async def run_report(
     return {
         "report_id": report_id,
         "report_name": report.get("name"),
-        "data": results,
-        "grouped_data": grouped_results,
-        "aggregations": aggregations_results,
-        "total_rows": len(results),
+        "data": result["data"],
+        "grouped_data": result["grouped_data"],
+        "groups": result["groups"],
+        "aggregations": result["aggregations"],
+        "total_rows": len(result["data"]),
+        "matched_rows": result["matched_rows"],
         "columns": report.get("columns"),
+        "warnings": result["warnings"],
+        "cached": result["cached"],
         "executed_at": datetime.now(timezone.utc).isoformat()
     }
 
+@router.get("/{report_id}/explain")
+async def explain_report(
+    report_id: str,
+    current_user: dict = Depends(get_current_user_simple)
+):
+    """Show the compiled Mongo queries and index warnings for a report"""
+    db = get_db()
+    report, compiled = await _load_compiled(db, report_id)
+    
+    return {
+        "report_id": report_id,
+        "collection": compiled.collection,
+        "rows_pipeline": compiled.rows_pipeline(),
+        "summary_pipeline": compiled.summary_pipeline,
+        "warnings": compiled.warnings
+    }
+
 @router.post("/{report_id}/export")
 async def export_report(
     report_id: str,
-    format: str = Query("json", enum=["json", "csv"]),
+    format: str = Query("json", enum=["json", "csv", "xlsx"]),
     current_user: dict = Depends(get_current_user_simple)
 ):
-    """Export report results"""
-    # Run the report first
-    result = await run_report(report_id, 10000, current_user)
-    
-    if format == "csv":
-        import io
-        import csv
-        
-        output = io.StringIO()
-        if result["data"]:
-            writer = csv.DictWriter(output, fieldnames=result["columns"])
-            writer.writeheader()
-            writer.writerows(result["data"])
-        
+    """
+    Export report results.
+    csv / xlsx stream every matching row as a file download; json returns up to 10,000 rows.
+    """
+    if format == "json":
+        result = await run_report(report_id, 10000, current_user)
         return {
-            "format": "csv",
-            "data": output.getvalue(),
-            "filename": f"{result['report_name']}_{datetime.now().strftime('%Y%m%d')}.csv"
+            "format": "json",
+            "data": result["data"],
+            "filename": f"{result['report_name']}_{datetime.now().strftime('%Y%m%d')}.json"
         }
     
-    return {
-        "format": "json",
-        "data": result["data"],
-        "filename": f"{result['report_name']}_{datetime.now().strftime('%Y%m%d')}.json"
-    }
+    db = get_db()
+    report, compiled = await _load_compiled(db, report_id)
+    filename = f"{report.get('name') or report_id}_{datetime.now().strftime('%Y%m%d')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    
+    if format == "csv":
+        return StreamingResponse(stream_csv(db, compiled), media_type="text/csv", headers=headers)
+    
+    path = await write_xlsx(db, compiled, report.get("name"))
+    return StreamingResponse(
+        iter_file(path),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers
+    )
+
+def schedule_cron(frequency: str, time: str, day: Optional[int] = None) -> str:
+    """Cron expression for a daily / weekly / monthly schedule at HH:MM"""
+    match = re.fullmatch(r"([01]?\d|2[0-3]):([0-5]\d)", time or "")
+    if not match:
+        raise ValueError("time must be HH:MM")
+    hour, minute = int(match.group(1)), int(match.group(2))
+    if frequency == "weekly":
+        return f"{minute} {hour} * * {day if day is not None else 1}"
+    if frequency == "monthly":
+        return f"{minute} {hour} {day or 1} * *"
+    return f"{minute} {hour} * * *"
 
 @router.post("/{report_id}/schedule")
 async def schedule_report(
     report_id: str,
     frequency: str = Query(..., enum=["daily", "weekly", "monthly"]),
     time: str = Query("09:00"),
+    day: Optional[int] = Query(None, ge=0, le=28, description="Weekday (0=Sunday) for weekly, day of month for monthly"),
+    format: str = Query("xlsx", enum=["xlsx", "csv"]),
     recipients: List[str] = [],
     current_user: dict = Depends(get_current_user_simple)
 ):
-    """Schedule a report to run automatically"""
+    """Schedule a report to run automatically (executed by the job scheduler)"""
     db = get_db()
     
+    try:
+        cron = schedule_cron(frequency, time, day)
+        if frequency == "weekly" and day is not None and day > 6:
+            raise ValueError("day must be 0-6 for weekly schedules")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     schedule = {
         "frequency": frequency,
         "time": time,
+        "day": day,
+        "format": format,
         "recipients": recipients,
         "enabled": True,
+        "cron": cron,
+        "next_run_at": CronTrigger(cron).next_after(datetime.now(timezone.utc)).isoformat(),
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     
@@ -405,6 +401,151 @@ async def schedule_report(
     
     return {"success": True, "schedule": schedule}
 
+@router.get("/{report_id}/runs")
+async def list_report_runs(
+    report_id: str,
+    limit: int = Query(20, le=100),
+    current_user: dict = Depends(get_current_user_simple)
+):
+    """Files produced by a report's scheduled runs"""
+    db = get_db()
+    runs = await db.report_runs.find(
+        {"report_id": report_id, "org_id": current_user.get("org_id")}, {"_id": 0, "file_path": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    return {"runs": runs}
+
+@router.get("/runs/{run_id}/download")
+async def download_report_run(
+    run_id: str,
+    current_user: dict = Depends(get_current_user_simple)
+):
+    """Download the file of a scheduled report run"""
+    db = get_db()
+    run = await db.report_runs.find_one({"run_id": run_id, "org_id": current_user.get("org_id")})
+    if not run or not os.path.exists(run.get("file_path") or ""):
+        raise HTTPException(status_code=404, detail="Report file not found")
+    return FileResponse(run["file_path"], filename=run["filename"])
+
+# ==================== SCHEDULED RUNS ====================
+
+async def run_scheduled_report(db, report: dict, scheduled_for: str) -> dict:
+    """Render one scheduled report to a file and queue it to the recipients"""
+    schedule = report.get("schedule") or {}
+    fmt = schedule.get("format", "xlsx")
+    compiled = compile_report(report, DATA_SOURCES)
+    
+    os.makedirs(REPORT_OUTPUT_DIR, exist_ok=True)
+    run_id = generate_id("RRUN")
+    filename = f"{report['report_id']}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M')}.{fmt}"
+    path = os.path.join(REPORT_OUTPUT_DIR, f"{run_id}_{filename}")
+    row_count = await write_report_file(db, compiled, path, fmt, report.get("name"))
+    
+    run = {
+        "run_id": run_id,
+        "report_id": report["report_id"],
+        "report_name": report.get("name"),
+        "org_id": report.get("org_id"),
+        "scheduled_for": scheduled_for,
+        "format": fmt,
+        "filename": filename,
+        "file_path": path,
+        "rows": row_count,
+        "recipients": schedule.get("recipients", []),
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.report_runs.insert_one(dict(run))
+    
+    if run["recipients"]:
+        await db.emails.insert_one({
+            "email_id": generate_id("EML"),
+            "org_id": report.get("org_id"),
+            "from_email": "noreply@innovatebooks.com",
+            "to": run["recipients"],
+            "subject": f"Scheduled report: {report.get('name')}",
+            "body": f"<p>{report.get('name')} ({row_count} rows) is ready: "
+                    f"/api/reports-builder/runs/{run_id}/download</p>",
+            "body_type": "html",
+            "linked_entity_type": "report_run",
+            "linked_entity_id": run_id,
+            "attachments": [],
+            "status": "queued",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "created_by": "scheduler"
+        })
+    
+    await db.custom_reports.update_one(
+        {"report_id": report["report_id"]},
+        {
+            "$set": {"last_run_at": run["created_at"]},
+            "$inc": {"run_count": 1}
+        }
+    )
+    return run
+
+async def run_due_reports(db) -> dict:
+    """Scheduler job: run every enabled report schedule whose next_run_at has passed"""
+    now = datetime.now(timezone.utc)
+    
+    # Schedules saved before cron triggers existed
+    async for report in db.custom_reports.find(
+        {"schedule.enabled": True, "schedule.cron": {"$exists": False}}, {"report_id": 1, "schedule": 1}
+    ):
+        schedule = report["schedule"]
+        try:
+            cron = schedule_cron(schedule.get("frequency"), schedule.get("time"))
+        except ValueError:
+            continue
+        await db.custom_reports.update_one(
+            {"report_id": report["report_id"]},
+            {"$set": {"schedule.cron": cron, "schedule.next_run_at": CronTrigger(cron).next_after(now).isoformat()}}
+        )
+    
+    due = await db.custom_reports.find(
+        {"schedule.enabled": True, "schedule.next_run_at": {"$lte": now.isoformat()}}, {"_id": 0}
+    ).to_list(length=500)
+    delivered = failed = 0
+    for report in due:
+        scheduled_for = report["schedule"]["next_run_at"]
+        following = CronTrigger(report["schedule"]["cron"]).next_after(now).isoformat()
+        claimed = await db.custom_reports.update_one(
+            {"report_id": report["report_id"], "schedule.next_run_at": scheduled_for},
+            {"$set": {"schedule.next_run_at": following}}
+        )
+        if claimed.modified_count != 1:
+            continue
+        try:
+            await run_scheduled_report(db, report, scheduled_for)
+            delivered += 1
+        except Exception as e:
+            failed += 1
+            logger.error(f"Scheduled report {report['report_id']} failed: {e}")
+    return {"due": len(due), "delivered": delivered, "failed": failed}
+
+async def purge_report_outputs(db) -> int:
+    """
+    Scheduler job: delete scheduled-run files older than
+    REPORT_OUTPUT_RETENTION_DAYS. The run records stay (without a file).
+    """
+    expired = (datetime.now(timezone.utc) - timedelta(days=REPORT_OUTPUT_RETENTION_DAYS)).isoformat()
+    runs = await db.report_runs.find(
+        {"file_path": {"$ne": None}, "created_at": {"$lt": expired}}, {"_id": 0, "run_id": 1, "file_path": 1}
+    ).to_list(None)
+    for run in runs:
+        try:
+            os.remove(run["file_path"])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove report output {run['file_path']}: {e}")
+            continue
+        await db.report_runs.update_one(
+            {"run_id": run["run_id"]},
+            {"$set": {"file_path": None, "purged_at": datetime.now(timezone.utc).isoformat()}}
+        )
+    if runs:
+        logger.info(f"Removed {len(runs)} expired report output files")
+    return len(runs)
+
 @router.get("/templates/list")
 async def list_report_templates():
     """Get pre-built report templates"""
@@ -5,18 +5,15 @@ Provides comprehensive analytics for organizations dashboard
 from fastapi import APIRouter, HTTPException, Depends
 import logging
 from datetime import datetime, timezone, timedelta
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 from enterprise_middleware import verify_token
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/super-admin/analytics", tags=["Super Admin Analytics"])
 
-# Direct MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Shared MongoDB connection pool
+db = get_db()
 
 def require_super_admin(token_payload: dict = Depends(verify_token)):
     """Middleware to ensure user is super admin"""
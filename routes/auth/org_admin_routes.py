@@ -9,20 +9,17 @@ from datetime import datetime, timezone
 import secrets
 
 from enterprise_models import RoleCreate, UserInvite, PermissionAssign
-from enterprise_auth_service import hash_password
+from password_hasher import hash_password_async
 from enterprise_middleware import verify_token, validate_tenant
 from rbac_engine import assign_permissions_to_role
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/enterprise/org-admin", tags=["Organization Admin"])
 
-# Direct MongoDB connection (avoid circular import)
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Shared MongoDB connection pool (avoid circular import)
+db = get_shared_db()
 
 def get_db():
     """Get database instance"""
@@ -265,7 +262,7 @@ async def invite_user(
             "user_id": user_id,
             "org_id": org_id,
             "email": user_data.email,
-            "password_hash": hash_password(temp_password),
+            "password_hash": await hash_password_async(temp_password),
             "full_name": user_data.full_name,
             "role_id": user_data.role_id,
             "is_super_admin": False,
@@ -8,7 +8,6 @@ from typing import List, Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timezone
 import uuid
-import bcrypt
 import os
 import shutil
 
@@ -16,6 +15,7 @@ router = APIRouter(prefix="/api/users", tags=["User Management"])
 
 # Import dependencies from main
 from main import get_current_user, get_database
+from password_hasher import hash_password_async
 
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = "/app/backend/uploads/profile_photos"
@@ -90,8 +90,7 @@ async def create_user(
         raise HTTPException(status_code=400, detail="User with this email already exists")
     
     # Hash password
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(user_data.password.encode('utf-8'), salt)
+    hashed_password = await hash_password_async(user_data.password)
     
     # Get current user's tenant to assign to new user
     current_user_data = await db.users.find_one({"_id": current_user.id})
@@ -105,7 +104,7 @@ async def create_user(
         "_id": user_id,
         "email": user_data.email,
         "full_name": user_data.full_name,
-        "password_hash": hashed_password.decode('utf-8'),
+        "password_hash": hashed_password,
         "role": user_data.role,
         "status": user_data.status,
         "email_verified": True,
@@ -10,15 +10,12 @@ from datetime import datetime, timezone
 import uuid
 import jwt
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 
 router = APIRouter(prefix="/api/ib-capital/scenario", tags=["Cap Table Scenario Modeling"])
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-db_name = os.environ.get('DB_NAME', 'innovate_books_db')
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+db = get_db()
 
 JWT_SECRET = os.environ["JWT_SECRET_KEY"]  # must be set in backend/.env
 
@@ -4,10 +4,9 @@ Handles all investment and asset management endpoints with multi-tenant support
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 from datetime import datetime
 from typing import Optional, List
-import os
 from uuid import uuid4
 
 # Import enterprise middleware
@@ -21,10 +20,7 @@ from enterprise_middleware import (
 router = APIRouter(prefix="/api/capital", tags=["Capital"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ['DB_NAME']
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+db = get_db()
 
 # ========================
 # PORTFOLIO
@@ -10,16 +10,12 @@ from typing import Optional, List
 from datetime import datetime, timezone
 from enum import Enum
 import uuid
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+from db_provider import get_db
 
 router = APIRouter(prefix="/api/ib-capital", tags=["IB Capital"])
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-db_name = os.environ.get('DB_NAME', 'innovate_books_db')
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+db = get_db()
 
 # Collections
 owners_col = db.capital_owners
@@ -8,8 +8,7 @@ from typing import List, Optional
 from datetime import datetime, timezone
 from commerce_models import *
 import uuid
-import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
 from dotenv import load_dotenv
 from pathlib import Path
 from auto_sop_workflow import run_complete_sop_workflow
@@ -27,9 +26,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_shared_db()
 
 # Create router
 commerce_router = APIRouter(prefix="/commerce", tags=["IB Commerce"])
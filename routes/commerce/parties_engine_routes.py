@@ -785,7 +785,6 @@ from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timezone
 
-import os
 
 # from enterprise_middleware import (
 #     get_org_scope,
@@ -800,7 +799,7 @@ from enterprise_middleware import (
 )
 
 
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 
 # ==================== ROUTER ====================
 
@@ -816,11 +815,7 @@ router = APIRouter(
 
 # ==================== DATABASE ====================
 
-MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
-DB_NAME = os.environ.get("DB_NAME", "innovatebooks")
-
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+db = get_db()
 
 parties_collection = db.parties_engine
 party_identities = db.party_identities
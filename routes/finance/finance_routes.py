@@ -4,10 +4,9 @@ Handles all finance-related endpoints with multi-tenant support
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 from datetime import datetime, timezone
 from typing import Optional, List
-import os
 
 # Import enterprise middleware
 from enterprise_middleware import (
@@ -20,10 +19,7 @@ from enterprise_middleware import (
 router = APIRouter(prefix="/api/finance", tags=["Finance"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ['DB_NAME']
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+db = get_db()
 
 # ========================
 # CUSTOMERS
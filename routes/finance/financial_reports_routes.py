@@ -3,18 +3,14 @@ Financial Reports API Routes - Companies Act 2013 Schedule III Format
 """
 
 from fastapi import APIRouter, HTTPException
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 from datetime import datetime
-import os
 from typing import Dict, List
 
 router = APIRouter(prefix="/api/financial-reports", tags=["Financial Reports"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ['DB_NAME']
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+db = get_db()
 
 @router.get("/profit-loss")
 async def get_profit_loss_statement():
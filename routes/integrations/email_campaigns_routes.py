@@ -3,22 +3,21 @@ Email Campaigns Module
 Bulk templated emails with tracking
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Header, Response
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime, timezone
 import uuid
 import jwt
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
+from campaign_sender import launch_campaign_send
+from email_tracking import TRACKING_GIF, TRACKING_GIF_HEADERS, email_tracking
 
 router = APIRouter(prefix="/api/email-campaigns", tags=["Email Campaigns"])
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-db_name = os.environ.get('DB_NAME', 'innovate_books_db')
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+db = get_db()
 
 JWT_SECRET = os.environ["JWT_SECRET_KEY"]  # must be set in backend/.env
 
@@ -392,8 +391,8 @@ async def remove_recipient(campaign_id: str, recipient_id: str, current_user: di
 # ============== CAMPAIGN ACTIONS ==============
 
 @router.post("/campaigns/{campaign_id}/send")
-async def send_campaign(campaign_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
-    """Send the campaign to all recipients"""
+async def send_campaign(campaign_id: str, current_user: dict = Depends(get_current_user)):
+    """Send the campaign to all recipients (dispatched in the background by campaign_sender)"""
     org_id = current_user.get("org_id")
     
     campaign = await campaigns_col.find_one({"campaign_id": campaign_id, "org_id": org_id})
@@ -409,73 +408,25 @@ async def send_campaign(campaign_id: str, background_tasks: BackgroundTasks, cur
         raise HTTPException(status_code=400, detail="No recipients in campaign")
     
     # Update status to sending
-    await campaigns_col.update_one(
-        {"campaign_id": campaign_id},
+    result = await campaigns_col.update_one(
+        {"campaign_id": campaign_id, "status": {"$in": ["draft", "scheduled"]}},
         {"$set": {
             "status": "sending",
-            "started_at": datetime.now(timezone.utc).isoformat()
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "send": {"owner": None, "heartbeat_at": None, "last_recipient_key": None, "error": None}
         }}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Campaign already sent or in progress")
     
-    # In a real implementation, this would trigger an async email sending job
-    # For demo, we'll simulate sending
-    background_tasks.add_task(simulate_campaign_send, campaign_id, org_id)
+    launch_campaign_send(db, campaign_id)
     
     return {"success": True, "message": "Campaign sending started", "recipient_count": recipient_count}
 
 
-async def simulate_campaign_send(campaign_id: str, org_id: str):
-    """Simulate sending emails (in real implementation, use email service)"""
-    import asyncio
-    import random
-    
-    recipients = await recipients_col.find({"campaign_id": campaign_id, "status": "pending"}).to_list(10000)
-    
-    sent = 0
-    failed = 0
-    
-    for recipient in recipients:
-        # Simulate email sending (95% success rate)
-        success = random.random() > 0.05
-        
-        if success:
-            await recipients_col.update_one(
-                {"recipient_id": recipient.get("recipient_id")},
-                {"$set": {
-                    "status": "sent",
-                    "sent_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-            sent += 1
-        else:
-            await recipients_col.update_one(
-                {"recipient_id": recipient.get("recipient_id")},
-                {"$set": {
-                    "status": "failed",
-                    "error": "Simulated delivery failure"
-                }}
-            )
-            failed += 1
-        
-        # Small delay to simulate sending
-        await asyncio.sleep(0.01)
-    
-    # Update campaign stats and status
-    await campaigns_col.update_one(
-        {"campaign_id": campaign_id},
-        {"$set": {
-            "status": "completed",
-            "completed_at": datetime.now(timezone.utc).isoformat(),
-            "stats.sent": sent,
-            "stats.delivered": sent,
-            "stats.bounced": failed
-        }}
-    )
-
-
 @router.post("/campaigns/{campaign_id}/pause")
 async def pause_campaign(campaign_id: str, current_user: dict = Depends(get_current_user)):
-    """Pause a sending campaign"""
+    """Pause a sending campaign (the sender stops before its next batch)"""
     org_id = current_user.get("org_id")
     
     result = await campaigns_col.update_one(
@@ -490,73 +441,54 @@ async def pause_campaign(campaign_id: str, current_user: dict = Depends(get_curr
 
 
 @router.post("/campaigns/{campaign_id}/resume")
-async def resume_campaign(campaign_id: str, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
-    """Resume a paused campaign"""
+async def resume_campaign(campaign_id: str, current_user: dict = Depends(get_current_user)):
+    """Resume a paused campaign from its last acknowledged recipient"""
     org_id = current_user.get("org_id")
     
-    campaign = await campaigns_col.find_one({"campaign_id": campaign_id, "org_id": org_id, "status": "paused"})
-    if not campaign:
-        raise HTTPException(status_code=400, detail="Campaign not paused")
-    
-    await campaigns_col.update_one(
-        {"campaign_id": campaign_id},
+    result = await campaigns_col.update_one(
+        {"campaign_id": campaign_id, "org_id": org_id, "status": "paused"},
         {"$set": {"status": "sending"}}
     )
+    if result.modified_count == 0:
+        raise HTTPException(status_code=400, detail="Campaign not paused")
     
-    background_tasks.add_task(simulate_campaign_send, campaign_id, org_id)
+    # A sender that has not yet noticed the pause simply carries on
+    launch_campaign_send(db, campaign_id)
     
     return {"success": True, "message": "Campaign resumed"}
 
 
 # ============== TRACKING ==============
 
-@router.get("/track/open/{recipient_id}")
-async def track_open(recipient_id: str):
-    """Track email open (called via tracking pixel)"""
-    await recipients_col.update_one(
-        {"recipient_id": recipient_id},
-        {"$set": {
-            "opened": True,
-            "opened_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
-    
-    # Update campaign stats
-    recipient = await recipients_col.find_one({"recipient_id": recipient_id})
-    if recipient:
-        await campaigns_col.update_one(
-            {"campaign_id": recipient.get("campaign_id")},
-            {"$inc": {"stats.opened": 1}}
-        )
+@router.get("/track/open/{campaign_id}/{recipient_id}")
+async def track_open(campaign_id: str, recipient_id: str):
+    """Track email open (called via tracking pixel); written behind by email_tracking"""
+    email_tracking.record_open(recipient_id, campaign_id)
     
     # Return transparent 1x1 pixel
-    return {"status": "tracked"}
+    return Response(content=TRACKING_GIF, media_type="image/gif", headers=TRACKING_GIF_HEADERS)
 
 
-@router.get("/track/click/{recipient_id}")
-async def track_click(recipient_id: str, url: str = ""):
-    """Track link click"""
-    await recipients_col.update_one(
-        {"recipient_id": recipient_id},
-        {"$set": {
-            "clicked": True,
-            "clicked_at": datetime.now(timezone.utc).isoformat()
-        },
-        "$push": {
-            "click_history": {
-                "url": url,
-                "clicked_at": datetime.now(timezone.utc).isoformat()
-            }
-        }}
-    )
+@router.get("/track/click/{campaign_id}/{recipient_id}")
+async def track_click(campaign_id: str, recipient_id: str, url: str = ""):
+    """Track link click; written behind by email_tracking"""
+    email_tracking.record_click(recipient_id, url, campaign_id)
     
-    # Update campaign stats
-    recipient = await recipients_col.find_one({"recipient_id": recipient_id})
-    if recipient:
-        await campaigns_col.update_one(
-            {"campaign_id": recipient.get("campaign_id")},
-            {"$inc": {"stats.clicked": 1}}
-        )
+    return {"status": "tracked", "redirect": url}
+
+
+@router.get("/track/open/{recipient_id}")
+async def track_open_legacy(recipient_id: str):
+    """Recipient-only pixel of emails already delivered; the campaign is resolved at flush"""
+    email_tracking.record_open(recipient_id)
+    
+    return Response(content=TRACKING_GIF, media_type="image/gif", headers=TRACKING_GIF_HEADERS)
+
+
+@router.get("/track/click/{recipient_id}")
+async def track_click_legacy(recipient_id: str, url: str = ""):
+    """Recipient-only link of emails already delivered; the campaign is resolved at flush"""
+    email_tracking.record_click(recipient_id, url)
     
     return {"status": "tracked", "redirect": url}
 
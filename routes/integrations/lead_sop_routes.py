@@ -10,7 +10,7 @@ from commerce_models import Lead, SOPStage
 import uuid
 import os
 import json
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
 from dotenv import load_dotenv
 from pathlib import Path
 from emergentintegrations.llm.chat import LlmChat, UserMessage
@@ -20,9 +20,7 @@ ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL')
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+db = get_shared_db()
 
 # Create router
 lead_sop_router = APIRouter(prefix="/commerce/leads/sop", tags=["Lead SOP"])
@@ -18,7 +18,6 @@ import uuid
 import json
 import asyncio
 import os
-import jwt
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -27,6 +26,7 @@ router = APIRouter(prefix="/intelligence", tags=["Intelligence"])
 
 # Import shared dependencies
 from main import db
+from auth_utils import verify_token
 
 # JWT configuration
 JWT_SECRET = os.environ["JWT_SECRET_KEY"]  # must be set in backend/.env
@@ -143,22 +143,14 @@ Always respond in valid JSON format with structure:
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user from JWT token with org_id for multi-tenancy"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("sub") or payload.get("user_id")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return {
-            "user_id": user_id,
-            "org_id": payload.get("org_id"),
-            "role": payload.get("role_id") or payload.get("role"),
-            "is_super_admin": payload.get("is_super_admin", False)
-        }
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    # verify_token checks the signature once per token and caches it until exp
+    payload = verify_token(credentials.credentials, verify_type="access")
+    return {
+        "user_id": payload["user_id"],
+        "org_id": payload.get("org_id"),
+        "role": payload.get("role_id") or payload.get("role"),
+        "is_super_admin": payload.get("is_super_admin", False)
+    }
 
 def get_org_filter(current_user: dict) -> dict:
     """Get MongoDB filter for multi-tenancy"""
@@ -1185,17 +1177,17 @@ async def auto_generate_recommendation_for_risk(risk: dict, user: dict):
 
 # ==================== LIVE DATA CONNECTION ====================
 
-@router.post("/scan-solutions")
-async def scan_solutions_for_signals(
-    background_tasks: BackgroundTasks,
-    current_user: dict = Depends(get_current_user)
-):
-    """Scan all solutions for potential signals - connects Intelligence to live data"""
-    org_id = current_user.get("org_id")
+async def scan_solutions(org_id: Optional[str]) -> List[str]:
+    """
+    Scan finance, workforce, operations and commerce data of one org for new
+    signals; returns the created signal ids. Also run hourly by scheduled_jobs.py.
+    """
+    scope = {"org_id": org_id} if org_id else {}
     signals_created = []
     
     # Scan Commerce - Overdue Invoices
     overdue_invoices = await db.fin_invoices.find({
+        **scope,
         "status": "overdue",
         "due_date": {"$lt": datetime.now(timezone.utc).isoformat()}
     }, {"_id": 0}).to_list(50)
@@ -1227,6 +1219,7 @@ async def scan_solutions_for_signals(
     
     # Scan Workforce - Over-allocation
     over_allocated = await db.wf_allocations.find({
+        **scope,
         "allocation_percentage": {"$gt": 100}
     }, {"_id": 0}).to_list(50)
     
@@ -1258,6 +1251,7 @@ async def scan_solutions_for_signals(
     
     # Scan Operations - Project Delays
     delayed_projects = await db.ops_projects.find({
+        **scope,
         "status": "in_progress",
         "end_date": {"$lt": datetime.now(timezone.utc).isoformat()},
         "actual_end_date": {"$exists": False}
@@ -1290,6 +1284,7 @@ async def scan_solutions_for_signals(
     
     # Scan Commerce - Low Margin Deals
     low_margin_deals = await db.deals.find({
+        **scope,
         "status": "in_progress",
         "margin": {"$lt": 20}
     }, {"_id": 0}).to_list(50)
@@ -1319,6 +1314,18 @@ async def scan_solutions_for_signals(
             await db.intel_signals.insert_one(signal)
             signals_created.append(signal["signal_id"])
     
+    return signals_created
+
+
+@router.post("/scan-solutions")
+async def scan_solutions_for_signals(
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
+    """Scan all solutions for potential signals - connects Intelligence to live data"""
+    org_id = current_user.get("org_id")
+    signals_created = await scan_solutions(org_id)
+    
     # Broadcast new signals
     if org_id and signals_created:
         background_tasks.add_task(ws_manager.broadcast_to_org, org_id, {
@@ -3,13 +3,13 @@ IB Operations - SLA Monitoring Engine
 Real-time SLA monitoring and alert generation
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header, BackgroundTasks
-from typing import List, Optional
+from fastapi import APIRouter, Depends, BackgroundTasks
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 import uuid
-import jwt
 import os
 import asyncio
+from auth_utils import get_current_principal
 
 router = APIRouter(prefix="/api/operations/sla", tags=["SLA Monitoring"])
 
@@ -20,23 +20,8 @@ def get_db():
     from main import db
     return db
 
-async def get_current_user(authorization: str = Header(None)):
-    """Extract current user from JWT token"""
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {
-            "user_id": payload.get("user_id"),
-            "org_id": payload.get("org_id"),
-            "role_id": payload.get("role_id")
-        }
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 # ==================== SLA MONITORING FUNCTIONS ====================
@@ -330,37 +315,33 @@ async def create_sla_breach(db, org_id: str, entity_type: str, entity_id: str,
 
 # ==================== API ENDPOINTS ====================
 
-@router.post("/check")
-async def run_sla_check(current_user: dict = Depends(get_current_user)):
-    """Run SLA check for the current organization"""
-    db = get_db()
-    org_id = current_user.get("org_id")
-    
-    all_alerts = []
-    
-    # Run all checks
+async def run_sla_checks(db, org_id: str) -> Dict[str, int]:
+    """Run every SLA check for one organization; alert counts per check"""
     task_alerts = await check_task_sla(db, org_id)
-    all_alerts.extend(task_alerts)
-    
     project_alerts = await check_project_sla(db, org_id)
-    all_alerts.extend(project_alerts)
-    
     service_alerts = await check_service_sla(db, org_id)
-    all_alerts.extend(service_alerts)
-    
     resource_alerts = await check_resource_allocation(db, org_id)
-    all_alerts.extend(resource_alerts)
+    
+    return {
+        "task_alerts": len(task_alerts),
+        "project_alerts": len(project_alerts),
+        "service_alerts": len(service_alerts),
+        "resource_alerts": len(resource_alerts)
+    }
+
+
+@router.post("/check")
+async def run_sla_check(current_user: dict = Depends(get_current_user)):
+    """Run SLA check for the current organization"""
+    db = get_db()
+    details = await run_sla_checks(db, current_user.get("org_id"))
+    alerts_created = sum(details.values())
     
     return {
         "success": True,
-        "message": f"SLA check completed - {len(all_alerts)} new alerts created",
-        "alerts_created": len(all_alerts),
-        "details": {
-            "task_alerts": len(task_alerts),
-            "project_alerts": len(project_alerts),
-            "service_alerts": len(service_alerts),
-            "resource_alerts": len(resource_alerts)
-        }
+        "message": f"SLA check completed - {alerts_created} new alerts created",
+        "alerts_created": alerts_created,
+        "details": details
     }
 
 
@@ -4,13 +4,12 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field
 from datetime import datetime, timezone
 import secrets
-from passlib.context import CryptContext
 
 # ✅ IMPORTANT: absolute import (fixes your import error)
 from routes.deps import get_db
+from password_hasher import hash_password_async
 
 router = APIRouter(prefix="/public/invites", tags=["public-invites"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def utc_now() -> datetime:
@@ -168,7 +167,7 @@ async def accept_invite(payload: AcceptInviteIn, db=Depends(get_db)):
     # Ensure email uniqueness via logic and later via index
     user = await db.users.find_one({"email": email})
     
-    password_hash = pwd_context.hash(password)
+    password_hash = await hash_password_async(password)
     user_id = None
 
     if user:
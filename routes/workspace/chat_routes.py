@@ -1,5 +1,5 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends, UploadFile, File
-from typing import List, Dict, Set, Optional
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends, UploadFile, File, Response
+from typing import List, Dict, Optional
 from datetime import datetime, timezone
 import uuid
 import json
@@ -12,58 +12,61 @@ from chat_models import (
     WSMessage, WSMessageType
 )
 from main import get_database, get_current_user
+from chat_fanout import ChatHub, Connection, chat_hub
+from chat_history import (
+    is_channel_member, invalidate_channel, history_page, encode_page,
+    message_search_terms, search_channel_messages
+)
 import os
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
 # WebSocket Connection Manager
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[str, Set[WebSocket]] = {}  # channel_id -> Set of websockets
-        self.user_connections: Dict[str, WebSocket] = {}  # user_id -> websocket
+    """
+    This worker's chat sockets. Delivery is queued per socket and
+    published through chat_hub so users on other workers receive it too.
+    """
+    def __init__(self, hub: ChatHub = chat_hub):
+        self.hub = hub
+        self.user_connections: Dict[str, Connection] = {}  # user_id -> latest socket
         
-    async def connect(self, websocket: WebSocket, user_id: str):
+    async def connect(self, websocket: WebSocket, user_id: str) -> Connection:
         await websocket.accept()
-        self.user_connections[user_id] = websocket
+        connection = self.hub.register(websocket, user_id)
+        self.user_connections[user_id] = connection
+        return connection
         
-    def disconnect(self, user_id: str):
-        if user_id in self.user_connections:
+    def disconnect(self, user_id: str, connection: Optional[Connection] = None):
+        connection = connection or self.user_connections.get(user_id)
+        if connection is None:
+            return
+        if self.user_connections.get(user_id) is connection:
             del self.user_connections[user_id]
+        self.hub.unregister(connection)
             
     async def join_channel(self, channel_id: str, user_id: str):
-        if channel_id not in self.active_connections:
-            self.active_connections[channel_id] = set()
         if user_id in self.user_connections:
-            self.active_connections[channel_id].add(self.user_connections[user_id])
+            self.hub.join(self.user_connections[user_id], f"channel:{channel_id}")
             
     async def leave_channel(self, channel_id: str, user_id: str):
-        if channel_id in self.active_connections and user_id in self.user_connections:
-            ws = self.user_connections[user_id]
-            self.active_connections[channel_id].discard(ws)
+        if user_id in self.user_connections:
+            self.hub.leave(self.user_connections[user_id], f"channel:{channel_id}")
             
     async def broadcast_to_channel(self, channel_id: str, message: dict):
-        if channel_id in self.active_connections:
-            for connection in self.active_connections[channel_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    pass
+        await self.hub.publish(f"channel:{channel_id}", message)
                     
     async def send_to_user(self, user_id: str, message: dict):
-        if user_id in self.user_connections:
-            try:
-                await self.user_connections[user_id].send_json(message)
-            except:
-                pass
+        await self.hub.publish_to_user(user_id, message)
+
+    async def broadcast_to_all(self, message: dict):
+        await self.hub.publish_to_all(message)
 
 manager = ConnectionManager()
 
-# Helper function to check channel membership
+# Helper function to check channel membership (cached member set, chat_history.py)
 async def check_channel_membership(db: AsyncIOMotorDatabase, channel_id: str, user_id: str) -> bool:
-    channel = await db.channels.find_one({"_id": channel_id})
-    if not channel:
-        return False
-    return user_id in channel.get("members", [])
+    return await is_channel_member(db, channel_id, user_id)
 
 # ============= CHANNEL ROUTES =============
 
@@ -92,6 +95,7 @@ async def create_channel(
     }
     
     await db.channels.insert_one(channel_doc)
+    invalidate_channel(channel_id, members)
     
     # Return without _id field
     channel_doc["id"] = channel_doc.pop("_id")
@@ -124,28 +128,25 @@ async def get_channel_messages(
     channel_id: str,
     limit: int = 50,
     before: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
-    """Get messages from a channel"""
+    """
+    Get messages from a channel, oldest first.
+    Pass the X-Next-Cursor response header back as `cursor` for older messages.
+    """
     # Check membership
     if not await check_channel_membership(db, channel_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member of this channel")
     
-    query = {"channel_id": channel_id}
-    if before:
-        query["created_at"] = {"$lt": before}
-    
-    messages = await db.messages.find(query).sort("created_at", -1).limit(limit).to_list(length=None)
-    
-    result = []
-    for msg in messages:
-        msg["id"] = msg.pop("_id")
-        msg["created_at"] = datetime.fromisoformat(msg["created_at"])
-        msg["updated_at"] = datetime.fromisoformat(msg["updated_at"])
-        result.append(Message(**msg))
+    try:
+        messages, next_cursor = await history_page(db, channel_id, limit, cursor, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return list(reversed(result))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return Response(content=encode_page(messages), media_type="application/json", headers=headers)
 
 # ============= MESSAGE ROUTES =============
 
@@ -177,6 +178,7 @@ async def send_message(
         "file_url": message_data.file_url,
         "file_name": message_data.file_name,
         "edited": False,
+        "search_terms": message_search_terms(message_data.content),
         "created_at": now.isoformat(),
         "updated_at": now.isoformat()
     }
@@ -184,6 +186,7 @@ async def send_message(
     await db.messages.insert_one(message_doc)
     
     # Broadcast to channel via WebSocket
+    message_doc.pop("search_terms")
     message_doc["id"] = message_doc.pop("_id")
     message_doc["created_at"] = now
     message_doc["updated_at"] = now
@@ -275,6 +278,7 @@ async def edit_message(
         {"$set": {
             "content": content,
             "edited": True,
+            "search_terms": message_search_terms(content),
             "updated_at": now.isoformat()
         }}
     )
@@ -326,7 +330,7 @@ async def delete_message(
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: str):
     """WebSocket endpoint for real-time messaging"""
-    await manager.connect(websocket, user_id)
+    connection = await manager.connect(websocket, user_id)
     
     try:
         while True: 
@@ -352,7 +356,9 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str):
                 await manager.broadcast_to_channel(data["channel_id"], ws_message)
                 
     except WebSocketDisconnect:
-        manager.disconnect(user_id)
+        pass
+    finally:
+        manager.disconnect(user_id, connection)
 
 # ============= SEARCH =============
 
@@ -363,18 +369,7 @@ async def search_messages(
     db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """Search messages across all channels user has access to"""
-    # Get user's channels
-    user_channels = await db.channels.find({
-        "members": current_user.id
-    }).to_list(length=None)
-    
-    channel_ids = [ch["_id"] for ch in user_channels]
-    
-    # Search messages
-    messages = await db.messages.find({
-        "channel_id": {"$in": channel_ids},
-        "content": {"$regex": q, "$options": "i"}
-    }).limit(50).to_list(length=None)
+    messages = await search_channel_messages(db, current_user.id, q, limit=50)
     
     result = []
     for msg in messages:
@@ -1015,9 +1010,8 @@ async def update_user_status(
         "timestamp": now.isoformat()
     }
     
-    # Broadcast to all users
-    for user_id, websocket in manager.user_connections.items():
-        await manager.send_to_user(user_id, ws_message)
+    # Broadcast to all users (every worker)
+    await manager.broadcast_to_all(ws_message)
     
     return {"success": True}
 
@@ -1063,6 +1057,7 @@ async def create_direct_message(
     }
     
     await db.channels.insert_one(channel_doc)
+    invalidate_channel(channel_id, channel_doc["members"])
     
     channel_doc["id"] = channel_doc.pop("_id")
     channel_doc["created_at"] = now
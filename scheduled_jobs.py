@@ -0,0 +1,91 @@
+"""
+Scheduled Jobs
+Periodic jobs run by the job scheduler (job_scheduler.py). Each wraps the
+same function its manual HTTP endpoint calls; cron expressions can be
+overridden per job through the environment.
+
+- reports.scheduled       reports-builder schedules that are due
+- leads.review_dormant    flag leads with no activity for 30 days
+- operations.sla_check    SLA checks for every organization
+- intelligence.scan       scan solutions for new signals per organization
+- finance.overdue_alerts  overdue receivable alerts per organization
+- imports.purge_staging   remove staged upload files no longer needed
+- reports.purge_output    remove scheduled report files past their retention
+"""
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from job_scheduler import scheduler
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_REPORTS_CRON = os.environ.get('SCHEDULE_REPORTS_CRON', '* * * * *')
+SCHEDULE_DORMANT_LEADS_CRON = os.environ.get('SCHEDULE_DORMANT_LEADS_CRON', '0 1 * * *')
+SCHEDULE_SLA_CHECK_CRON = os.environ.get('SCHEDULE_SLA_CHECK_CRON', '*/30 * * * *')
+SCHEDULE_SIGNAL_SCAN_CRON = os.environ.get('SCHEDULE_SIGNAL_SCAN_CRON', '15 * * * *')
+SCHEDULE_OVERDUE_ALERTS_CRON = os.environ.get('SCHEDULE_OVERDUE_ALERTS_CRON', '0 8 * * *')
+SCHEDULE_IMPORT_PURGE_CRON = os.environ.get('SCHEDULE_IMPORT_PURGE_CRON', '20 * * * *')
+SCHEDULE_REPORT_PURGE_CRON = os.environ.get('SCHEDULE_REPORT_PURGE_CRON', '40 2 * * *')
+
+
+async def active_org_ids(db) -> List[str]:
+    """Organizations to run per-org jobs for"""
+    org_ids = set(await db.organizations.distinct("org_id"))
+    org_ids.update(await db.users.distinct("org_id"))
+    return sorted(org_id for org_id in org_ids if org_id)
+
+
+@scheduler.job("reports.scheduled", SCHEDULE_REPORTS_CRON, description="Run due reports-builder schedules",
+               timeout_seconds=1800, jitter_seconds=0)
+async def run_report_schedules(db, scheduled_for: datetime):
+    from reports_builder_routes import run_due_reports
+    return await run_due_reports(db)
+
+
+@scheduler.job("leads.review_dormant", SCHEDULE_DORMANT_LEADS_CRON, description="Flag dormant commerce leads")
+async def review_dormant_leads(db, scheduled_for: datetime):
+    from lead_sop_complete import mark_dormant_leads
+    return {"marked_dormant": await mark_dormant_leads(db)}
+
+
+@scheduler.job("operations.sla_check", SCHEDULE_SLA_CHECK_CRON, description="Task / project / service SLA checks")
+async def sla_check(db, scheduled_for: datetime):
+    from sla_monitoring_routes import run_sla_checks
+    alerts: Dict[str, int] = {}
+    for org_id in await active_org_ids(db):
+        details = await run_sla_checks(db, org_id)
+        if any(details.values()):
+            alerts[org_id] = sum(details.values())
+    return {"alerts_by_org": alerts}
+
+
+@scheduler.job("intelligence.scan", SCHEDULE_SIGNAL_SCAN_CRON, description="Scan solutions for intelligence signals")
+async def scan_signals(db, scheduled_for: datetime):
+    from intelligence_routes import scan_solutions
+    created = 0
+    for org_id in await active_org_ids(db):
+        created += len(await scan_solutions(org_id))
+    return {"signals_created": created}
+
+
+@scheduler.job("finance.overdue_alerts", SCHEDULE_OVERDUE_ALERTS_CRON, description="Overdue receivable alerts")
+async def overdue_alerts(db, scheduled_for: datetime):
+    from finance_events_routes import send_overdue_alerts
+    sent = 0
+    for org_id in await active_org_ids(db):
+        sent += await send_overdue_alerts(db, org_id)
+    return {"alerts_sent": sent}
+
+
+@scheduler.job("imports.purge_staging", SCHEDULE_IMPORT_PURGE_CRON, description="Remove staged upload files")
+async def purge_import_staging(db, scheduled_for: datetime):
+    from bulk_import import purge_staged_files
+    return {"files_removed": await purge_staged_files(db)}
+
+
+@scheduler.job("reports.purge_output", SCHEDULE_REPORT_PURGE_CRON, description="Remove expired scheduled report files")
+async def purge_report_output(db, scheduled_for: datetime):
+    from reports_builder_routes import purge_report_outputs
+    return {"files_removed": await purge_report_outputs(db)}
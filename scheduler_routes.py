@@ -0,0 +1,42 @@
+"""
+INNOVATE BOOKS - JOB SCHEDULER API
+Status, run history and manual triggers for scheduled jobs (super admin)
+"""
+
+from fastapi import APIRouter, Depends, Query, HTTPException
+from auth_utils import get_current_principal
+from job_scheduler import scheduler
+
+router = APIRouter(prefix="/api/scheduler", tags=["scheduler"])
+
+def get_db():
+    from main import db
+    return db
+
+def require_super_admin(current_user: dict = Depends(get_current_principal)) -> dict:
+    if not current_user.get("is_super_admin"):
+        raise HTTPException(status_code=403, detail="Super admin access required")
+    return current_user
+
+@router.get("/jobs")
+async def list_jobs(current_user: dict = Depends(require_super_admin)):
+    """Registered jobs with their cron, next run, lease and last result"""
+    return {"jobs": await scheduler.status(get_db())}
+
+@router.get("/jobs/{name}/runs")
+async def get_job_runs(
+    name: str,
+    limit: int = Query(50, le=500),
+    current_user: dict = Depends(require_super_admin)
+):
+    """Recent runs of a job, newest first"""
+    if name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job": name, "runs": await scheduler.history(get_db(), name, limit)}
+
+@router.post("/jobs/{name}/run")
+async def run_job_now(name: str, current_user: dict = Depends(require_super_admin)):
+    """Make a job due immediately; the next scheduler tick on any worker runs it"""
+    if not await scheduler.trigger(get_db(), name):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"success": True, "message": f"Job {name} queued"}
@@ -0,0 +1,40 @@
+"""
+Add `search_terms` (chat_history.py) to chat messages written before
+message search was indexed. Safe to re-run; only messages without terms
+are touched.
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from chat_history import MESSAGE_STORES, backfill_search_terms  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db')
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    logger.info(f"Backfilling chat message search terms on {DB_NAME}")
+    updated = 0
+    for store in MESSAGE_STORES:
+        updated += await backfill_search_terms(db, store=store)
+    logger.info(f"Done: {updated} messages updated")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+"""
+Bulk import benchmark
+
+Builds a 100k-row invoice CSV (plus the customers it references) and
+imports it into a scratch database two ways:
+- per-row: find_one customer + find_one duplicate check + insert_one per
+  row (the old /invoices/upload loop), on a sample
+- engine: bulk_import.run_import_job with the registered "invoices" spec
+
+Reports rows/s for each. The scratch database (<DB_NAME>_bench) is dropped
+afterwards unless --keep.
+
+Usage:
+    python scripts/bench_bulk_import.py --rows 100000 --per-row-sample 2000
+"""
+import io
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import importlib
+from pathlib import Path
+
+import pandas as pd
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.datastructures import UploadFile
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+importlib.import_module("main")  # registers the upload import specs
+from bulk_import import create_import_job, run_import_job  # noqa: E402
+from index_registry import ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+
+def build_files(rows: int, customers: int):
+    customer_df = pd.DataFrame({
+        "name": [f"Customer {i}" for i in range(customers)],
+        "contact_person": "Buyer",
+        "email": [f"customer{i}@example.com" for i in range(customers)],
+        "phone": "9800000000",
+        "credit_limit": 500000,
+        "payment_terms": "Net 30",
+    })
+    invoice_df = pd.DataFrame({
+        "customer_id": [f"CUST-{str(random.randint(1, customers)).zfill(3)}" for _ in range(rows)],
+        "invoice_number": "",
+        "invoice_date": [f"2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}" for _ in range(rows)],
+        "base_amount": [round(random.uniform(1000, 500000), 2) for _ in range(rows)],
+        "gst_percentage": 18,
+        "tds_percentage": 2,
+        "payment_terms": 30,
+        "owner": "Bench",
+    })
+    return customer_df.to_csv(index=False).encode(), invoice_df
+
+
+async def per_row(db, invoice_df: pd.DataFrame) -> int:
+    added = 0
+    for _, row in invoice_df.iterrows():
+        customer = await db.parties_customers.find_one({"customer_id": row['customer_id']}, {"_id": 0})
+        if not customer:
+            continue
+        count = await db.invoices.count_documents({})
+        invoice_number = f"INV-{count + 1001}"
+        await db.invoices.find_one({"invoice_number": invoice_number}, {"_id": 0})
+        await db.invoices.insert_one({
+            "invoice_number": invoice_number, "customer_id": customer['id'],
+            "base_amount": float(row['base_amount']), "invoice_date": row['invoice_date']
+        })
+        added += 1
+    return added
+
+
+async def engine(db, name: str, payload: bytes) -> dict:
+    job = await create_import_job(db, name.split('.')[0], UploadFile(file=io.BytesIO(payload), filename=name), "bench")
+    return await run_import_job(db, job['job_id'])
+
+
+async def main_async():
+    parser = argparse.ArgumentParser(description="Per-row vs bulk_import upload throughput")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--per-row-sample", type=int, default=2000)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    await client.drop_database(DB_NAME)
+    try:
+        await ensure_indexes(db, ["parties_customers", "invoices", "import_jobs", "import_job_errors"])
+        customer_csv, invoice_df = build_files(args.rows, args.customers)
+        job = await engine(db, "customers.csv", customer_csv)
+        print(f"customers: {job['rows_inserted']} imported")
+
+        sample = invoice_df.head(args.per_row_sample)
+        started = time.perf_counter()
+        added = await per_row(db, sample)
+        elapsed = time.perf_counter() - started
+        print(f"per-row : {added} rows in {elapsed:.2f}s ({added / elapsed:,.0f} rows/s)")
+        await db.invoices.delete_many({})
+        await db.counters.delete_many({})
+
+        payload = invoice_df.to_csv(index=False).encode()
+        started = time.perf_counter()
+        job = await engine(db, "invoices.csv", payload)
+        elapsed = time.perf_counter() - started
+        print(f"engine  : {job['rows_inserted']} rows in {elapsed:.2f}s "
+              f"({job['rows_inserted'] / elapsed:,.0f} rows/s), {job['rows_failed']} row errors")
+    finally:
+        if not args.keep:
+            await client.drop_database(DB_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
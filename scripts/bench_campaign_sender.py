@@ -0,0 +1,183 @@
+"""
+Campaign sender benchmark
+
+Fills a scratch database (<DB_NAME>_bench) with one campaign of --recipients
+pending recipients (--bounce-ratio of them refused by the relay), starts
+the local SMTP stand-in (scripts/local_smtp_server.py) and times
+campaign_sender sending the campaign through the "smtp" transport (or
+--transport simulated). With --crash-after-seconds the first sender is
+killed part-way and a second one resumes from the checkpoint.
+
+Recipient ids are generated the way email_campaigns_routes does
+(RCP-<8 hex>), with --duplicate-ratio of them reusing an earlier id, and a
+second campaign that is not being sent reuses the same ids.
+--malformed-ratio of the recipients cannot be built into a message (CR/LF
+in the address or a subject variable, non-dict variables).
+
+Fails if a recipient is left pending, the campaign stats do not add up, a
+malformed recipient was not recorded as failed, or a recipient of the
+other campaign was touched.
+
+The scratch database is dropped afterwards unless --keep.
+
+Usage:
+    python scripts/bench_campaign_sender.py --recipients 1000000 --crash-after-seconds 5
+"""
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+sys.path.insert(0, str(ROOT_DIR / "scripts"))
+load_dotenv(ROOT_DIR / '.env')
+
+import campaign_sender  # noqa: E402
+from campaign_sender import SimulatedTransport, SMTPTransport, run_campaign_send  # noqa: E402
+from index_registry import ensure_indexes  # noqa: E402
+from local_smtp_server import LocalSMTPServer  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+CAMPAIGN_ID = "CMP-BENCH"
+OTHER_CAMPAIGN_ID = "CMP-BENCH-OTHER"
+TEMPLATE_ID = "TPL-BENCH"
+BATCH = 10000
+COLLECTIONS = ["email_campaigns", "email_templates", "email_recipients"]
+
+
+MALFORMED = [
+    {"email": "user@example.com\r\nBcc: everyone@example.com"},
+    {"variables": {"first_name": "Line\nBreak", "code": 0}},
+    {"variables": ["not", "a", "mapping"]},
+]
+
+
+async def seed(db, recipients: int, bounce_ratio: float, duplicate_ratio: float, malformed_ratio: float) -> int:
+    await db.email_templates.insert_one({
+        "template_id": TEMPLATE_ID, "org_id": "ORG_BENCH", "name": "Bench",
+        "subject": "Hello {{first_name}}", "body_html": "<p>Hi {{first_name}}, your code is {{code}}.</p>"
+    })
+    await db.email_campaigns.insert_one({
+        "campaign_id": CAMPAIGN_ID, "org_id": "ORG_BENCH", "name": "Bench", "template_id": TEMPLATE_ID,
+        "status": "sending", "send": {"owner": None, "heartbeat_at": None, "last_recipient_key": None},
+        "stats": {"total_recipients": recipients, "sent": 0, "delivered": 0, "opened": 0, "clicked": 0,
+                  "bounced": 0, "unsubscribed": 0}
+    })
+    docs, ids, malformed = [], [], 0
+    for n in range(recipients):
+        bounce = random.random() < bounce_ratio
+        if ids and random.random() < duplicate_ratio:
+            recipient_id = random.choice(ids)
+        else:
+            recipient_id = f"RCP-{uuid.uuid4().hex[:8].upper()}"
+            ids.append(recipient_id)
+        docs.append({
+            "recipient_id": recipient_id, "campaign_id": CAMPAIGN_ID, "org_id": "ORG_BENCH",
+            "email": f"{'bounce' if bounce else 'user'}{n}@example.com", "name": f"User {n}",
+            "variables": {"first_name": f"User{n}", "code": n}, "status": "pending",
+            "opened": False, "clicked": False
+        })
+        if random.random() < malformed_ratio:
+            docs[-1].update(random.choice(MALFORMED), malformed=True)
+            malformed += 1
+        if len(docs) >= BATCH:
+            await db.email_recipients.insert_many(docs)
+            docs = []
+    if docs:
+        await db.email_recipients.insert_many(docs)
+    for start in range(0, len(ids), BATCH):
+        await db.email_recipients.insert_many([
+            {"recipient_id": recipient_id, "campaign_id": OTHER_CAMPAIGN_ID, "org_id": "ORG_BENCH",
+             "email": f"other{recipient_id}@example.com", "status": "pending", "opened": False, "clicked": False}
+            for recipient_id in ids[start:start + BATCH]
+        ])
+    return malformed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark campaign sending")
+    parser.add_argument("--recipients", type=int, default=1000000)
+    parser.add_argument("--bounce-ratio", type=float, default=0.01)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.01)
+    parser.add_argument("--malformed-ratio", type=float, default=0.001)
+    parser.add_argument("--transport", choices=["smtp", "simulated"], default="smtp")
+    parser.add_argument("--concurrency", type=int, default=campaign_sender.CAMPAIGN_SEND_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=0, help="messages per second, 0 = unlimited")
+    parser.add_argument("--crash-after-seconds", type=float, default=0)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    for name in COLLECTIONS:
+        await db[name].delete_many({})
+    await ensure_indexes(db, COLLECTIONS)
+    print(f"Seeding {args.recipients} recipients into {DB_NAME} ...")
+    malformed = await seed(db, args.recipients, args.bounce_ratio, args.duplicate_ratio, args.malformed_ratio)
+
+    server = LocalSMTPServer(port=0)
+    await server.start()
+
+    def transport():
+        if args.transport == "simulated":
+            return SimulatedTransport(failure_rate=args.bounce_ratio)
+        return SMTPTransport("127.0.0.1", server.port, username="", password="", starttls=False,
+                             workers=args.concurrency)
+
+    started = time.perf_counter()
+    send = lambda: run_campaign_send(db, CAMPAIGN_ID, transport(), concurrency=args.concurrency,  # noqa: E731
+                                     rate_per_second=args.rate)
+    if args.crash_after_seconds:
+        task = asyncio.create_task(send())
+        await asyncio.sleep(args.crash_after_seconds)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        done = await db.email_recipients.count_documents({"campaign_id": CAMPAIGN_ID, "status": {"$ne": "pending"}})
+        print(f"sender killed after {args.crash_after_seconds:g} s with {done} recipients recorded; resuming")
+        await db.email_campaigns.update_one({"campaign_id": CAMPAIGN_ID}, {"$set": {"send.owner": "dead-worker"}})
+        campaign_sender.CAMPAIGN_STALE_AFTER_SECONDS = -1
+    campaign = await send()
+    elapsed = time.perf_counter() - started
+    await server.stop()
+
+    pending = await db.email_recipients.count_documents({"campaign_id": CAMPAIGN_ID, "status": "pending"})
+    unfailed = await db.email_recipients.count_documents(
+        {"campaign_id": CAMPAIGN_ID, "malformed": True, "status": {"$ne": "failed"}}
+    )
+    touched = await db.email_recipients.count_documents({"campaign_id": OTHER_CAMPAIGN_ID, "status": {"$ne": "pending"}})
+    stats = campaign["stats"]
+    print(f"{'send':<14} {elapsed:>8.1f} s  {args.recipients / elapsed:,.0f} recipients/s  "
+          f"sent {stats['sent']}, bounced {stats['bounced']} ({malformed} malformed), status {campaign['status']}")
+    if args.transport == "smtp":
+        print(f"relay accepted {server.messages} messages, refused {server.refused} recipients")
+
+    if not args.keep:
+        await client.drop_database(DB_NAME)
+    client.close()
+
+    if pending or campaign["status"] != "completed":
+        print(f"FAILED: {pending} recipients still pending")
+        sys.exit(1)
+    if stats["sent"] + stats["bounced"] != args.recipients:
+        print("FAILED: campaign stats do not add up to the recipient count")
+        sys.exit(1)
+    if unfailed:
+        print(f"FAILED: {unfailed} malformed recipients were not recorded as failed")
+        sys.exit(1)
+    if touched:
+        print(f"FAILED: {touched} recipients of another campaign were marked")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Cash flow enrichment benchmark
+
+Seeds a scratch database with N bank transactions (default 50k) linked to
+invoices / bills, then builds the cash flow statement two ways:
+- per-row: one find_one per linked transaction (the old N+1 path)
+- batched: cashflow_enrichment.resolve_linked_documents ($in per collection)
+
+Reports wall time and the number of MongoDB commands each path sent. The
+scratch database (<DB_NAME>_bench) is dropped afterwards unless --keep.
+
+Usage:
+    python scripts/bench_cashflow_enrichment.py --transactions 50000 --per-row-sample 2000
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from cashflow_enrichment import resolve_linked_documents, build_cashflow_statement  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+BILL_CATEGORIES = ["Salary", "Rent", "Purchase", "Utilities", "Equipment", "Asset", "Loan", "Interest", "General"]
+
+
+class CommandCounter(monitoring.CommandListener):
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in ("find", "aggregate", "getMore"):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def seed(db, n_transactions: int):
+    n_docs = max(1, n_transactions // 5)
+    await db.invoices.insert_many([
+        {"invoice_number": f"INV-{i:06d}", "customer_name": f"Customer {i % 300}"}
+        for i in range(n_docs)
+    ])
+    await db.bills.insert_many([
+        {"bill_number": f"BILL-{i:06d}", "vendor_name": f"Vendor {i % 200}",
+         "category": random.choice(BILL_CATEGORIES)}
+        for i in range(n_docs)
+    ])
+    await db.invoices.create_index("invoice_number")
+    await db.bills.create_index("bill_number")
+
+    batch = []
+    for i in range(n_transactions):
+        credit = i % 2 == 0
+        batch.append({
+            "transaction_date": f"2025-01-{(i % 28) + 1:02d}T10:00:00+00:00",
+            "transaction_type": "Credit" if credit else "Debit",
+            "amount": round(random.uniform(100, 100000), 2),
+            "linked_entity": (f"INV-{random.randrange(n_docs):06d}" if credit
+                              else f"BILL-{random.randrange(n_docs):06d}"),
+        })
+        if len(batch) == 10000:
+            await db.transactions.insert_many(batch)
+            batch = []
+    if batch:
+        await db.transactions.insert_many(batch)
+
+
+async def per_row_bills(db, transactions):
+    bills = {}
+    for txn in transactions:
+        linked = txn.get('linked_entity')
+        if linked and txn.get('transaction_type') == 'Debit' and linked not in bills:
+            bill = await db.bills.find_one({"bill_number": linked}, {"_id": 0})
+            if bill:
+                bills[linked] = bill
+    return bills
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Per-row vs batched cash flow enrichment")
+    parser.add_argument("--transactions", type=int, default=50000)
+    parser.add_argument("--per-row-sample", type=int, default=2000,
+                        help="Transactions to run through the slow per-row path")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    args = parser.parse_args()
+
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(MONGO_URL, event_listeners=[counter])
+    db = client[DB_NAME]
+    await client.drop_database(DB_NAME)
+
+    try:
+        print(f"Seeding {args.transactions} transactions into {DB_NAME}...")
+        await seed(db, args.transactions)
+        transactions = await db.transactions.find(
+            {}, {"_id": 0, "amount": 1, "transaction_type": 1, "linked_entity": 1}
+        ).to_list(None)
+
+        sample = transactions[:args.per_row_sample]
+        counter.count = 0
+        started = time.perf_counter()
+        bills = await per_row_bills(db, sample)
+        build_cashflow_statement(sample, bills)
+        per_row_s = time.perf_counter() - started
+        per_row_cmds = counter.count
+        print(f"per-row : {len(sample)} txns, {per_row_cmds} queries, {per_row_s:.2f}s "
+              f"(~{per_row_s * len(transactions) / max(1, len(sample)):.1f}s extrapolated to {len(transactions)})")
+
+        for size in (len(transactions) // 10, len(transactions)):
+            subset = transactions[:size]
+            counter.count = 0
+            started = time.perf_counter()
+            _, bills = await resolve_linked_documents(db, subset, include_invoices=False)
+            build_cashflow_statement(subset, bills)
+            print(f"batched : {size} txns, {counter.count} queries, {time.perf_counter() - started:.2f}s")
+    finally:
+        if not args.keep:
+            await client.drop_database(DB_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
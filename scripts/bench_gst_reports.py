@@ -0,0 +1,148 @@
+"""
+GST reports benchmark
+
+Fills a scratch database (<DB_NAME>_bench) with --invoices issued billing
+records for one org, each with an output tax transaction in the period
+(plus --input-ratio input tax transactions), builds the registry indexes,
+then times gst_returns' GSTR-1, GSTR-3B and dashboard builds and a cached
+GSTR-1 read. Fails if GSTR-1 does not report every seeded invoice.
+
+The old implementation capped both loads at 1,000 rows and scanned every
+tax transaction per invoice; --legacy-sample N times that per-invoice scan
+for N invoices and extrapolates it to the full period.
+
+The scratch database is dropped afterwards unless --keep.
+
+Usage:
+    python scripts/bench_gst_reports.py --invoices 200000
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from gst_returns import build_dashboard, build_gstr1, build_gstr3b, gst_report  # noqa: E402
+from index_registry import ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+ORG_ID = "ORG_BENCH"
+PERIOD = "2025-03"
+BATCH = 10000
+
+
+def synthetic_invoice(n: int) -> tuple:
+    gross = random.choice([random.randint(1000, 200000), random.randint(200000, 900000)])
+    rate = random.choice([0, 5, 12, 18, 28])
+    tax = round(gross * rate / 100, 2)
+    billing_id = f"BIL-{n:07d}"
+    bill = {
+        "billing_id": billing_id,
+        "billing_type": random.choice(["milestone", "milestone", "subscription", "credit_note"]),
+        "invoice_number": f"INV-202503-{n:07d}",
+        "party_name": f"Customer {n % 5000}",
+        "party_gstin": f"27AAAC{n:05d}Z1" if random.random() < 0.6 else None,
+        "place_of_supply": random.choice(["MH", "KA", "DL", "EXPORT"]),
+        "interstate": random.random() < 0.3,
+        "gross_amount": gross,
+        "tax_amount": tax,
+        "net_amount": gross + tax,
+        "status": "issued",
+        "issued_at": f"{PERIOD}-{random.randint(1, 28):02d}T10:00:00+00:00",
+        "org_id": ORG_ID,
+    }
+    txn = {
+        "tax_txn_id": f"TAX-{n:07d}",
+        "source_reference_id": billing_id,
+        "period": PERIOD,
+        "direction": "output",
+        "tax_type": "GST",
+        "jurisdiction": "IGST" if bill["interstate"] else "MH-CGST/SGST",
+        "taxable_amount": gross,
+        "tax_amount": tax,
+        "org_id": ORG_ID,
+    }
+    return bill, txn
+
+
+async def timed(label: str, coro):
+    started = time.perf_counter()
+    result = await coro
+    print(f"{label:<22} {(time.perf_counter() - started) * 1000:>10.0f} ms")
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark GST report generation")
+    parser.add_argument("--invoices", type=int, default=200000)
+    parser.add_argument("--input-ratio", type=float, default=0.5, help="input tax transactions per invoice")
+    parser.add_argument("--legacy-sample", type=int, default=200)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    await db.fin_billing_records.delete_many({"org_id": ORG_ID})
+    await db.fin_tax_transactions.delete_many({"org_id": ORG_ID})
+    await ensure_indexes(db, ["fin_billing_records", "fin_tax_transactions"])
+
+    print(f"Seeding {args.invoices} invoices into {DB_NAME} ...")
+    bills, txns = [], []
+    for n in range(args.invoices):
+        bill, txn = synthetic_invoice(n)
+        bills.append(bill)
+        txns.append(txn)
+        if random.random() < args.input_ratio:
+            txns.append({**txn, "tax_txn_id": f"ITC-{n:07d}", "source_reference_id": f"PAY-{n:07d}", "direction": "input"})
+        if len(bills) >= BATCH:
+            await db.fin_billing_records.insert_many(bills)
+            await db.fin_tax_transactions.insert_many(txns)
+            bills, txns = [], []
+    if bills:
+        await db.fin_billing_records.insert_many(bills)
+        await db.fin_tax_transactions.insert_many(txns)
+
+    gstr1 = await timed("GSTR-1", build_gstr1(db, ORG_ID, PERIOD))
+    await timed("GSTR-3B", build_gstr3b(db, ORG_ID, PERIOD))
+    await timed("dashboard", build_dashboard(db, ORG_ID, PERIOD))
+    await gst_report(db, "dashboard", ORG_ID, PERIOD)
+    await timed("dashboard (cached)", gst_report(db, "dashboard", ORG_ID, PERIOD))
+
+    sections = {key: section["summary"]["count"] for key, section in gstr1["sections"].items()}
+    print(f"GSTR-1 sections: {sections}")
+
+    if args.legacy_sample:
+        output = await db.fin_tax_transactions.find(
+            {"org_id": ORG_ID, "period": PERIOD, "direction": "output"}, {"_id": 0}
+        ).to_list(length=None)
+        sample = random.sample(range(args.invoices), min(args.legacy_sample, args.invoices))
+        started = time.perf_counter()
+        for n in sample:
+            next((t for t in output if t.get("source_reference_id") == f"BIL-{n:07d}"), None)
+        per_invoice = (time.perf_counter() - started) / len(sample)
+        print(f"legacy per-invoice scan  ~{per_invoice * args.invoices:.1f} s extrapolated for {args.invoices} invoices")
+
+    if not args.keep:
+        await client.drop_database(DB_NAME)
+    client.close()
+
+    total = gstr1["grand_total"]["total_invoices"]
+    if total != args.invoices:
+        print(f"FAILED: GSTR-1 reported {total} of {args.invoices} invoices")
+        sys.exit(1)
+    print(f"GSTR-1 covered all {total} invoices")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+"""
+Login burst microbenchmark
+
+Fires a burst of concurrent bcrypt verifications while a light "unrelated
+endpoint" coroutine keeps ticking on the same event loop, and reports the
+p50/p99 latency of those ticks. Run once with hashing inline on the loop
+(the old behaviour) and once through password_hasher's worker pool.
+
+Usage:
+    python scripts/bench_password_pool.py --logins 50 --ticks-ms 5
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from password_hasher import pwd_context, verify_password_async  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def unrelated_endpoint(stop: asyncio.Event, interval_ms: float, samples: list):
+    """Simulates a cheap request: measures how late each wakeup is"""
+    interval = interval_ms / 1000
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def run(mode: str, logins: int, interval_ms: float, stored_hash: str) -> dict:
+    samples = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(unrelated_endpoint(stop, interval_ms, samples))
+    await asyncio.sleep(interval_ms / 1000 * 2)
+
+    async def login_inline():
+        pwd_context.verify("Demo1234", stored_hash)
+
+    async def login_pooled():
+        await verify_password_async("Demo1234", stored_hash)
+
+    login = login_inline if mode == "inline" else login_pooled
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+    return {
+        "mode": mode,
+        "burst_seconds": round(elapsed, 2),
+        "ticks": len(samples),
+        "p50_ms": round(statistics.median(samples), 2) if samples else None,
+        "p99_ms": round(percentile(samples, 99), 2) if samples else None,
+        "max_ms": round(max(samples), 2) if samples else None,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Event loop latency during a login burst")
+    parser.add_argument("--logins", type=int, default=50, help="Concurrent logins in the burst")
+    parser.add_argument("--ticks-ms", type=float, default=5.0, help="Unrelated request interval (ms)")
+    args = parser.parse_args()
+
+    stored_hash = pwd_context.hash("Demo1234")
+    for mode in ("inline", "pooled"):
+        result = await run(mode, args.logins, args.ticks_ms, stored_hash)
+        print(
+            f"{result['mode']:>7}: burst {result['burst_seconds']}s, "
+            f"unrelated latency p50 {result['p50_ms']} ms, "
+            f"p99 {result['p99_ms']} ms, max {result['max_ms']} ms "
+            f"({result['ticks']} samples)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+"""
+Payroll calculation benchmark
+
+Fills a scratch database (<DB_NAME>_bench) with --employees active people
+for one org and an active compensation profile each, builds the registry
+indexes, then times payroll_engine's calculation of one pay run and a
+rerun of it. Fails if a rerun changes the payslip count or totals.
+
+The scratch database is dropped afterwards unless --keep.
+
+Usage:
+    python scripts/bench_payroll.py --employees 50000
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from payroll_engine import claim_payrun, run_calculation  # noqa: E402
+from index_registry import ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+ORG_ID = "ORG_BENCH"
+PERIOD = "2025-03"
+PAYRUN_ID = "PAY_bench"
+BATCH = 10000
+COLLECTIONS = ["wf_people", "wf_compensation", "wf_payruns", "wf_payslips"]
+
+
+async def seed(db, employees: int):
+    people, comps = [], []
+    for n in range(employees):
+        person_id = f"PER_{n:07d}"
+        people.append({"person_id": person_id, "org_id": ORG_ID, "first_name": "Emp", "last_name": str(n), "status": "active"})
+        comps.append({
+            "compensation_id": f"COMP_{n:07d}", "org_id": ORG_ID, "person_id": person_id,
+            "pay_type": "salaried", "base_pay": random.randint(25000, 250000),
+            "currency": "INR", "status": "active", "created_at": "2025-01-01T00:00:00+00:00"
+        })
+        if len(people) >= BATCH:
+            await db.wf_people.insert_many(people)
+            await db.wf_compensation.insert_many(comps)
+            people, comps = [], []
+    if people:
+        await db.wf_people.insert_many(people)
+        await db.wf_compensation.insert_many(comps)
+    await db.wf_payruns.insert_one({
+        "payrun_id": PAYRUN_ID, "org_id": ORG_ID, "period": PERIOD, "payroll_group": "default",
+        "status": "draft", "total_gross": 0, "total_deductions": 0, "total_net": 0
+    })
+
+
+async def calculate(db, label: str) -> dict:
+    started = time.perf_counter()
+    payrun = await run_calculation(db, await claim_payrun(db, PAYRUN_ID, ORG_ID))
+    print(f"{label:<14} {(time.perf_counter() - started):>8.1f} s  "
+          f"{payrun['calculation']['payslips_created']} payslips, net {payrun['total_net']:,.2f}")
+    return payrun
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark pay run calculation")
+    parser.add_argument("--employees", type=int, default=50000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    for name in COLLECTIONS:
+        await db[name].delete_many({"org_id": ORG_ID})
+    await ensure_indexes(db, COLLECTIONS)
+
+    print(f"Seeding {args.employees} employees into {DB_NAME} ...")
+    await seed(db, args.employees)
+
+    first = await calculate(db, "calculate")
+    second = await calculate(db, "rerun")
+    slips = await db.wf_payslips.count_documents({"payrun_id": PAYRUN_ID})
+
+    if not args.keep:
+        await client.drop_database(DB_NAME)
+    client.close()
+
+    if slips != args.employees or second["calculation"]["payslips_created"] != args.employees:
+        print(f"FAILED: {slips} payslips stored for {args.employees} employees")
+        sys.exit(1)
+    if abs(first["total_net"] - second["total_net"]) > 0.01:
+        print("FAILED: rerun changed the pay run totals")
+        sys.exit(1)
+    print(f"Pay run covered all {args.employees} employees")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
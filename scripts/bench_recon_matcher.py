@@ -0,0 +1,128 @@
+"""
+Reconciliation matcher benchmark
+
+Builds --records synthetic open receivables / payables and --entries bank
+entries (most paying one record, some with a drifted amount, a reference
+instead of the party name, or no match at all), then times
+recon_matcher.match_transactions, the top-3 suggestions and the one-to-one
+assignment. Fails if a record is assigned twice or if fewer than
+--min-recall of the exactly paid records are matched back to their entry.
+
+The old rule_based_matching compared every entry with every record;
+--legacy-sample N times that nested loop for N entries and extrapolates it.
+
+Usage:
+    python scripts/bench_recon_matcher.py --entries 50000 --records 50000
+"""
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from recon_matcher import RECON_AUTO_MATCH_CONFIDENCE, match_transactions  # noqa: E402
+
+WORDS = ["acme", "zenith", "orbit", "kite", "nova", "lumen", "apex", "delta", "vertex", "summit", "harbor", "cedar"]
+SUFFIXES = ["traders", "industries", "labs", "exports", "pvt", "ltd", "systems"]
+
+
+def synthetic(entries: int, records: int):
+    parties = [f"{random.choice(WORDS)} {random.choice(WORDS)}{n} {random.choice(SUFFIXES)}" for n in range(records // 4 + 1)]
+    recs = []
+    for n in range(records):
+        receivable = random.random() < 0.5
+        recs.append({
+            "receivable_id" if receivable else "payable_id": f"REC-{n:07d}",
+            "type": "receivable" if receivable else "payable",
+            "customer_name" if receivable else "vendor_name": random.choice(parties),
+            "invoice_number" if receivable else "bill_number": f"{'INV' if receivable else 'BILL'}-{n:07d}",
+            "amount": random.choice([5000, 10000, 25000, round(random.uniform(500, 900000), 2)]),
+            "due_date": f"2025-{random.randint(1, 12):02d}-{random.randint(1, 28):02d}",
+        })
+    bank, expected = [], {}
+    for n, record in enumerate(random.sample(recs, min(entries, records))):
+        party = record.get("customer_name") or record.get("vendor_name")
+        reference = record.get("invoice_number") or record.get("bill_number")
+        style = random.random()
+        amount = record["amount"] if style < 0.8 else round(record["amount"] * random.uniform(0.97, 1.03), 2)
+        description = f"NEFT {party}" if random.random() < 0.6 else f"IMPS {reference}"
+        if style > 0.95:
+            description, amount = "CASH DEPOSIT", round(random.uniform(100, 1000), 2)
+        elif style < 0.8:
+            expected[f"BST-{n:07d}"] = record.get("receivable_id") or record.get("payable_id")
+        credit = record["type"] == "receivable"
+        bank.append({
+            "entry_id": f"BST-{n:07d}",
+            "transaction_date": f"{record['due_date']}T00:00:00+00:00",
+            "description": description.upper(),
+            "credit_amount": amount if credit else 0,
+            "debit_amount": 0 if credit else amount,
+            "type": "credit" if credit else "debit",
+        })
+    return bank, recs, expected
+
+
+def legacy_pair(entry: dict, record: dict) -> float:
+    """One inner-loop iteration of the old nested matcher"""
+    confidence = 0.0
+    entry_amount = abs(float(entry.get("amount", 0)))
+    record_amount = abs(float(record.get("amount", record.get("bill_amount", record.get("invoice_amount", 0)))))
+    diff = abs(entry_amount - record_amount)
+    if diff == 0 or diff / max(entry_amount, record_amount, 1) < 0.05:
+        confidence += 0.3
+    party = record.get("party_name", record.get("vendor_name", record.get("customer_name", ""))).lower()
+    if party and party in entry.get("description", "").lower():
+        confidence += 0.35
+    return confidence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the reconciliation matcher")
+    parser.add_argument("--entries", type=int, default=50000)
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--legacy-sample", type=int, default=20)
+    parser.add_argument("--min-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    random.seed(7)
+    bank, records, expected = synthetic(args.entries, args.records)
+    print(f"{len(bank)} bank entries x {len(records)} accounting records")
+
+    started = time.perf_counter()
+    result = match_transactions(bank, records)
+    print(f"{'match':<14} {(time.perf_counter() - started) * 1000:>10.0f} ms  {result.stats}")
+
+    started = time.perf_counter()
+    result.suggestions()
+    print(f"{'suggestions':<14} {(time.perf_counter() - started) * 1000:>10.0f} ms")
+
+    started = time.perf_counter()
+    assigned = result.assignments(RECON_AUTO_MATCH_CONFIDENCE)
+    print(f"{'assignment':<14} {(time.perf_counter() - started) * 1000:>10.0f} ms  {len(assigned)} auto-matched")
+
+    if args.legacy_sample:
+        sample = random.sample(bank, min(args.legacy_sample, len(bank)))
+        started = time.perf_counter()
+        for entry in sample:
+            for record in records:
+                legacy_pair(entry, record)
+        per_entry = (time.perf_counter() - started) / len(sample)
+        print(f"legacy nested loop  ~{per_entry * len(bank):.0f} s extrapolated for {len(bank)} entries")
+
+    record_ids = [match["accounting_id"] for match in assigned]
+    if len(record_ids) != len(set(record_ids)):
+        print("FAILED: a record was assigned to more than one bank entry")
+        sys.exit(1)
+    found = sum(1 for match in assigned if expected.get(match["bank_entry_id"]) == match["accounting_id"])
+    recall = found / max(len(expected), 1)
+    print(f"recall on exactly paid records: {recall:.3f}")
+    if recall < args.min_recall:
+        print(f"FAILED: recall below {args.min_recall}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
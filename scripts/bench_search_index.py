@@ -0,0 +1,169 @@
+"""
+Global search benchmark
+
+Fills a scratch database (<DB_NAME>_bench) with index entries for
+--entities synthetic documents spread over every search module and
+--orgs organisations, builds the registry indexes, then times
+search_index.search() (all modules, one org) for --queries random
+one- and two-word prefix queries. Reports p50 / p95 / p99 against the
+50 ms p95 target.
+
+With --legacy-rows N, also loads N leads into the source collection and
+times the old unanchored $regex $or lookup on them for comparison.
+
+The scratch database is dropped afterwards unless --keep.
+
+Usage:
+    python scripts/bench_search_index.py --entities 1000000 --queries 500
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from search_index import SEARCH_INDEX, SOURCES, build_entry, search  # noqa: E402
+from index_registry import ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+FIRST = ["Aarav", "Priya", "Rohan", "Ananya", "Vikram", "Meera", "Kabir", "Isha", "Arjun", "Neha",
+         "Sanjay", "Kavya", "Rahul", "Divya", "Aditya", "Pooja", "Nikhil", "Sneha", "Varun", "Tara"]
+LAST = ["Sharma", "Patel", "Iyer", "Reddy", "Gupta", "Nair", "Mehta", "Kapoor", "Joshi", "Rao"]
+COMPANY = ["Acme", "Globex", "Initech", "Umbrella", "Stark", "Wayne", "Tata", "Infosys", "Zenith",
+           "Nimbus", "Quantum", "Vertex", "Apex", "Lotus", "Orbit", "Sapphire", "Crimson", "Falcon"]
+SUFFIX = ["Industries", "Technologies", "Traders", "Logistics", "Foods", "Pharma", "Textiles", "Motors"]
+DEPARTMENTS = ["Finance", "Sales", "Operations", "Engineering", "People", "Legal"]
+WORDS = ["renewal", "migration", "audit", "onboarding", "rollout", "quarterly", "review", "integration",
+         "compliance", "expansion", "warehouse", "payroll", "forecast", "upgrade", "support"]
+
+
+def synthetic_doc(key: str, n: int, org_id: str) -> dict:
+    company = f"{random.choice(COMPANY)} {random.choice(SUFFIX)}"
+    first, last = random.choice(FIRST), random.choice(LAST)
+    email = f"{first.lower()}.{last.lower()}{n}@{company.split()[0].lower()}.com"
+    phrase = " ".join(random.sample(WORDS, 3))
+    doc = {"_id": ObjectId(), "org_id": org_id, "created_at": f"2025-{random.randint(1, 12):02d}-01T00:00:00"}
+    if key == "leads":
+        doc.update(lead_id=f"LD-2025-{n:06d}", company=company, first_name=first, last_name=last, email=email)
+    elif key == "customers":
+        doc.update(customer_id=f"CUST-{n:04d}", name=company, email=email, gstin=f"27AAAA{n:05d}Z1")
+    elif key == "vendors":
+        doc.update(vendor_id=f"VEND-{n:04d}", name=company, email=email, gstin=f"29BBBB{n:05d}Z1")
+    elif key == "invoices":
+        doc.update(invoice_id=f"INV-{n}", invoice_number=f"INV-{n}", customer_name=company, total=n % 90000)
+    elif key == "bills":
+        doc.update(bill_id=f"BILL-{n}", bill_number=f"BILL-{n}", vendor_name=company, total=n % 90000)
+    elif key == "projects":
+        doc.update(project_id=f"PRJ-{n:05d}", name=f"{company} {random.choice(WORDS)}", description=phrase)
+    elif key == "people":
+        doc.update(person_id=f"EMP-{n}", full_name=f"{first} {last}", email=email,
+                   department=random.choice(DEPARTMENTS))
+    elif key == "tasks":
+        doc.update(task_id=f"TSK-{n:06d}", title=f"{random.choice(WORDS).title()} for {company}", description=phrase)
+    elif key == "contracts":
+        doc.update(contract_id=f"CON-{n:05d}", customer_name=company, title=f"{company} {random.choice(WORDS)}")
+    else:
+        doc.update(signal_id=f"SIG-{n:06d}", title=f"{random.choice(WORDS).title()} risk", description=phrase)
+    return doc
+
+
+def random_query() -> str:
+    pool = FIRST + LAST + COMPANY + SUFFIX + WORDS
+    words = [random.choice(pool).lower() for _ in range(random.choice((1, 1, 2)))]
+    return " ".join(w[:random.randint(2, len(w))] for w in words)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def load(db, entities: int, orgs: int):
+    keys = list(SOURCES)
+    batch = []
+    started = time.perf_counter()
+    for n in range(entities):
+        key = keys[n % len(keys)]
+        entry = build_entry(SOURCES[key], synthetic_doc(key, n, f"ORG{n % orgs:03d}"))
+        entry["indexed_at"] = entry["touched_at"]
+        batch.append(entry)
+        if len(batch) >= 5000:
+            await db[SEARCH_INDEX].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await db[SEARCH_INDEX].insert_many(batch, ordered=False)
+    print(f"loaded {entities:,} entries in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    await ensure_indexes(db, [SEARCH_INDEX])
+    print(f"built indexes in {time.perf_counter() - started:.1f}s")
+
+
+async def legacy(db, rows: int, queries: int) -> list:
+    docs = [synthetic_doc("leads", n, "ORG000") for n in range(rows)]
+    for start in range(0, rows, 5000):
+        await db.leads.insert_many(docs[start:start + 5000], ordered=False)
+    samples = []
+    for _ in range(queries):
+        regex = {"$regex": random_query().split()[0], "$options": "i"}
+        started = time.perf_counter()
+        await db.leads.find({"$or": [
+            {"company": regex}, {"first_name": regex}, {"last_name": regex}, {"email": regex}, {"lead_id": regex}
+        ]}, {"_id": 0}).limit(10).to_list(10)
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="search_index.search latency at scale")
+    parser.add_argument("--entities", type=int, default=1000000)
+    parser.add_argument("--orgs", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--legacy-rows", type=int, default=0, help="Also time the old $regex scan on N leads")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch database")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    await client.drop_database(DB_NAME)
+    try:
+        await load(db, args.entities, args.orgs)
+        for _ in range(20):  # warm up
+            await search(db, random_query(), org_id="ORG000", timeout_ms=5000)
+
+        samples, timeouts = [], 0
+        for _ in range(args.queries):
+            org_id = f"ORG{random.randrange(args.orgs):03d}"
+            started = time.perf_counter()
+            found = await search(db, random_query(), org_id=org_id, timeout_ms=5000)
+            samples.append((time.perf_counter() - started) * 1000)
+            timeouts += len(found["modules_timed_out"])
+        p95 = percentile(samples, 95)
+        print(f"indexed : p50 {percentile(samples, 50):.1f} ms, p95 {p95:.1f} ms, "
+              f"p99 {percentile(samples, 99):.1f} ms over {args.queries} queries "
+              f"({timeouts} module timeouts) -> {'PASS' if p95 < 50 else 'MISS'} (target p95 < 50 ms)")
+
+        if args.legacy_rows:
+            legacy_samples = await legacy(db, args.legacy_rows, min(args.queries, 100))
+            print(f"legacy  : p50 {percentile(legacy_samples, 50):.1f} ms, "
+                  f"p95 {percentile(legacy_samples, 95):.1f} ms ($regex over {args.legacy_rows:,} leads, one module)")
+    finally:
+        if not args.keep:
+            await client.drop_database(DB_NAME)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Workflow runtime benchmark
+
+Fills a scratch database (<DB_NAME>_bench) with one 4-step workflow per org
+(condition, two actions and a --delay-seconds durable timer), queues --runs
+runs spread across --orgs orgs, and --crashed of them as runs abandoned
+mid-way by a dead worker (status running, expired lease, cursor 1). Starts
+workflow_runtime and times until every run has completed. Fails if a run
+does not complete, a step log is missing, or throughput is below
+--target-per-minute.
+
+The scratch database is dropped afterwards unless --keep.
+
+Usage:
+    python scripts/bench_workflow_runtime.py --runs 10000 --orgs 50
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from workflow_runtime import WorkflowRuntime  # noqa: E402
+from index_registry import ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+BATCH = 1000
+COLLECTIONS = ["workflow_definitions", "workflow_runs", "workflow_step_logs", "notifications"]
+
+
+def workflow(org: int, delay_seconds: float) -> dict:
+    return {
+        "workflow_id": f"WF-BENCH{org:04d}",
+        "org_id": f"ORG_BENCH{org:04d}",
+        "name": "Bench workflow",
+        "trigger": {"type": "event", "event_type": "bench"},
+        "is_active": True,
+        "version": 1,
+        "run_count": 0,
+        "steps": [
+            {"step_id": "s1", "name": "Check amount", "step_type": "condition",
+             "config": {"field": "amount", "operator": "greater_than", "value": 100}},
+            {"step_id": "s2", "name": "Email", "step_type": "action",
+             "config": {"type": "send_email", "to": "ops@example.com", "subject": "Bench"}},
+            {"step_id": "s3", "name": "Wait", "step_type": "delay", "config": {"delay_seconds": delay_seconds}},
+            {"step_id": "s4", "name": "Notify", "step_type": "action",
+             "config": {"type": "send_notification", "title": "Bench", "recipient": "ops"}},
+        ],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark the workflow runtime")
+    parser.add_argument("--runs", type=int, default=10000)
+    parser.add_argument("--orgs", type=int, default=50)
+    parser.add_argument("--crashed", type=int, default=100)
+    parser.add_argument("--delay-seconds", type=float, default=1.0)
+    parser.add_argument("--target-per-minute", type=int, default=10000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    for name in COLLECTIONS:
+        await db[name].delete_many({})
+    await ensure_indexes(db, COLLECTIONS)
+
+    workflows = [workflow(org, args.delay_seconds) for org in range(args.orgs)]
+    await db.workflow_definitions.insert_many([dict(wf) for wf in workflows])
+
+    runtime = WorkflowRuntime()
+    print(f"Queueing {args.runs} runs across {args.orgs} orgs into {DB_NAME} ...")
+    for start in range(0, args.runs, BATCH):
+        for n in range(start, min(start + BATCH, args.runs)):
+            wf = workflows[n % args.orgs]
+            await runtime.create_runs(db, [wf], wf["org_id"], "event", {"amount": n})
+    crashed = await db.workflow_runs.find({}, {"run_id": 1}).limit(args.crashed).to_list(length=None)
+    await db.workflow_runs.update_many(
+        {"run_id": {"$in": [run["run_id"] for run in crashed]}},
+        {"$set": {"status": "running", "lease_owner": "dead-worker", "cursor": 1, "steps_completed": 1,
+                  "due_at": "2000-01-01T00:00:00+00:00"}}
+    )
+
+    started = time.perf_counter()
+    runtime.start(db)
+    while await db.workflow_runs.count_documents({"status": {"$ne": "completed"}}):
+        failed = await db.workflow_runs.count_documents({"status": "failed"})
+        if failed:
+            break
+        await asyncio.sleep(0.2)
+    elapsed = time.perf_counter() - started
+    await runtime.stop()
+
+    completed = await db.workflow_runs.count_documents({"status": "completed"})
+    logs = await db.workflow_step_logs.count_documents({})
+    expected_logs = args.runs * 4 - len(crashed)
+    per_minute = completed / elapsed * 60
+    print(f"{completed} runs completed in {elapsed:.1f} s  ({per_minute:,.0f} runs/minute), {logs} step logs")
+
+    if not args.keep:
+        await client.drop_database(DB_NAME)
+    client.close()
+
+    if completed != args.runs:
+        print(f"FAILED: {args.runs - completed} runs did not complete")
+        sys.exit(1)
+    if logs != expected_logs:
+        print(f"FAILED: {logs} step logs, expected {expected_logs}")
+        sys.exit(1)
+    if per_minute < args.target_per_minute:
+        print(f"FAILED: below {args.target_per_minute} runs/minute")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
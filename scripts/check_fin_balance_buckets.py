@@ -0,0 +1,61 @@
+"""
+Check (or rebuild) the IB Finance period balance buckets
+(ib_finance/balances.py) against posted fin_journals.
+
+Usage:
+    python scripts/check_fin_balance_buckets.py verify [--org ORG001]
+    python scripts/check_fin_balance_buckets.py rebuild [--org ORG001]
+
+`verify` exits non-zero when any bucket differs from the journals.
+"""
+import os
+import sys
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from ib_finance.balances import verify_balance_buckets, rebuild_balance_buckets  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Verify or rebuild IB Finance balance buckets")
+    parser.add_argument("action", choices=["verify", "rebuild"])
+    parser.add_argument("--org", default=None, help="Limit to one org_id (default: all orgs)")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    try:
+        if args.action == "rebuild":
+            result = await rebuild_balance_buckets(db, args.org)
+            logger.info(f"Done: {result}")
+            return 0
+
+        result = await verify_balance_buckets(db, args.org)
+        logger.info(
+            f"{result['buckets_expected']} expected / {result['buckets_stored']} stored buckets, "
+            f"{result['mismatch_count']} mismatches"
+        )
+        for mismatch in result["mismatches"][:20]:
+            logger.warning(f"  {mismatch}")
+        return 0 if result["consistent"] else 1
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
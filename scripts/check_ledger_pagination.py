@@ -0,0 +1,103 @@
+"""
+Pagination check for ledger_reports.ledger_page.
+
+Seeds journal entries the way main.py stores them (entry_date as an
+isoformat string, several entries per day, some with two lines on the same
+account) in a scratch `<DB_NAME>_bench` database, then walks the general
+ledger of one account with --limit lines per page. Fails unless page 2
+starts right after the last line of page 1, and the pages together equal
+the unpaged ledger (same lines, same running balances).
+
+Usage:
+    python scripts/check_ledger_pagination.py [--entries 500] [--limit 37]
+"""
+import os
+import sys
+import random
+import asyncio
+import argparse
+import logging
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from ledger_reports import ledger_page  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db')
+
+ACCOUNT = "Cash"
+
+
+def journal_entry(n: int, day: datetime) -> dict:
+    amount = random.randint(1, 1000)
+    lines = [
+        {"account": ACCOUNT, "debit": amount, "credit": 0, "description": "receipt"},
+        {"account": "Revenue", "debit": 0, "credit": amount, "description": "sale"},
+    ]
+    if n % 5 == 0:
+        fee = random.randint(1, 50)
+        lines += [
+            {"account": ACCOUNT, "debit": 0, "credit": fee, "description": "bank fee"},
+            {"account": "Bank Charges", "debit": fee, "credit": 0, "description": "bank fee"},
+        ]
+    return {
+        "id": f"JE-CHK-{n:06d}",
+        "entry_date": day.isoformat(),
+        "description": f"Entry {n}",
+        "line_items": lines,
+        "org_id": "ORG_BENCH",
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Check general ledger pages continue where the last one ended")
+    parser.add_argument("--entries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=37)
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[f"{DB_NAME}_bench"]
+    await db.journal_entries.delete_many({"org_id": "ORG_BENCH"})
+
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    entries = [journal_entry(n, start + timedelta(days=n // 3)) for n in range(args.entries)]
+    random.shuffle(entries)
+    await db.journal_entries.insert_many(entries)
+
+    full = await ledger_page(db, ACCOUNT, limit=args.entries * 2)
+
+    pages = [await ledger_page(db, ACCOUNT, limit=args.limit)]
+    while pages[-1]["next_cursor"]:
+        pages.append(await ledger_page(db, ACCOUNT, cursor=pages[-1]["next_cursor"], limit=args.limit))
+    paged = [line for page in pages for line in page["transactions"]]
+
+    await db.journal_entries.delete_many({"org_id": "ORG_BENCH"})
+    client.close()
+
+    key = lambda line: (line["date"], line["entry_id"], line["debit"], line["credit"], round(line["balance"], 2))  # noqa: E731
+    logger.info(f"{len(full['transactions'])} ledger lines, {len(pages)} pages of {args.limit}")
+
+    if len(pages) > 1 and not pages[1]["transactions"]:
+        logger.error("Ledger pagination FAILED: page 2 is empty")
+        sys.exit(1)
+    if len(pages) > 1 and pages[1]["transactions"][0] != full["transactions"][args.limit]:
+        logger.error("Ledger pagination FAILED: page 2 does not start after the last line of page 1")
+        sys.exit(1)
+    if [key(line) for line in paged] != [key(line) for line in full["transactions"]]:
+        logger.error(f"Ledger pagination FAILED: {len(paged)} paged lines differ from the unpaged ledger")
+        sys.exit(1)
+    logger.info("Ledger pagination check passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Concurrency check for sequence_service.py.
+
+Creates IDs concurrently from several SequenceAllocator instances (each one
+stands in for a separate worker process) plus bulk reserve_block() calls,
+all against the same counter in a scratch `<DB_NAME>_bench` database, and
+fails if any value is handed out twice.
+
+Usage:
+    python scripts/check_sequence_concurrency.py [--creates 1000] [--workers 4]
+"""
+import os
+import sys
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from sequence_service import COUNTERS, SequenceAllocator, sequence_key  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Check sequence IDs stay unique under concurrency")
+    parser.add_argument("--creates", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--bulk", type=int, default=10, help="reserve_block calls of 50 values each")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[f"{DB_NAME}_bench"]
+    key = sequence_key("CHK", "ORG_BENCH")
+    await db[COUNTERS].delete_one({"_id": key})
+
+    async def seed():
+        return 100
+
+    workers = [SequenceAllocator() for _ in range(max(1, args.workers))]
+    singles = [workers[i % len(workers)].next(db, key, seed) for i in range(args.creates)]
+    blocks = [workers[i % len(workers)].reserve(db, key, 50, seed) for i in range(args.bulk)]
+    results = await asyncio.gather(*singles, *blocks)
+
+    values = list(results[:args.creates])
+    for first in results[args.creates:]:
+        values.extend(range(first, first + 50))
+
+    duplicates = len(values) - len(set(values))
+    logger.info(
+        f"{args.creates} creates + {args.bulk} blocks over {len(workers)} workers: "
+        f"{len(values)} values, min {min(values)}, max {max(values)}, duplicates {duplicates}"
+    )
+    await db[COUNTERS].delete_one({"_id": key})
+    client.close()
+
+    if duplicates or min(values) <= 100:
+        logger.error("Sequence check FAILED")
+        sys.exit(1)
+    logger.info("Sequence check passed")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
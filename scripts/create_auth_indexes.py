@@ -1,7 +1,11 @@
 import asyncio
 import os
+import sys
+from pathlib import Path
 from motor.motor_asyncio import AsyncIOMotorClient
-import pymongo
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from index_registry import ensure_indexes  # noqa: E402
 
 # Configuration
 MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
@@ -14,29 +18,16 @@ async def create_indexes():
 
     print("Creating indexes...")
 
-    # 1. Unique index on users.email
-    # Note: partialFilterExpression allows for users where email might be missing temporarily if that's a case, 
-    # but here we want strict uniqueness.
-    try:
-        await db.users.create_index(
-            [("email", pymongo.ASCENDING)],
-            unique=True,
-            name="unique_email_idx"
-        )
-        print("✅ Created unique index on users.email")
-    except Exception as e:
-        print(f"⚠️ Could not create users.email index: {e}")
-
-    # 2. Unique compound index on org_users(user_id, org_id)
-    try:
-        await db.org_users.create_index(
-            [("user_id", pymongo.ASCENDING), ("org_id", pymongo.ASCENDING)],
-            unique=True,
-            name="unique_org_membership_idx"
-        )
-        print("✅ Created unique index on org_users(user_id, org_id)")
-    except Exception as e:
-        print(f"⚠️ Could not create org_users(user_id, org_id) index: {e}")
+    # Auth indexes are declared in index_registry.py:
+    # unique users.email and unique org_users(user_id, org_id).
+    # scripts/manage_indexes.py applies the full registry.
+    result = await ensure_indexes(db, collections=["users", "org_users"])
+    for name in result["created"]:
+        print(f"✅ Created index {name}")
+    for name in result["existing"]:
+        print(f"✅ Index {name} already exists")
+    for failure in result["failed"]:
+        print(f"⚠️ Could not create {failure['index']}: {failure['error']}")
 
 if __name__ == "__main__":
     asyncio.run(create_indexes())
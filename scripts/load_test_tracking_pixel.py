@@ -0,0 +1,158 @@
+"""
+Tracking pixel load test
+
+Fills a scratch database (<DB_NAME>_bench) with one campaign of
+--recipients recipients, mounts email_campaigns_routes in an in-process
+FastAPI app (httpx ASGI transport, no network) with email_tracking
+flushing to the scratch database, then loads /track/open pixels from
+--concurrency clients for --seconds (plus a click every --click-every
+requests). Reports sustained requests/s and latency percentiles, flushes,
+and fails unless the campaign's stats.opened / stats.clicked equal the
+requests served and every hit recipient is marked opened.
+
+--legacy-sample N also times N opens done the old way (update_one +
+find_one + $inc per pixel) for comparison.
+
+The scratch database is dropped afterwards unless --keep.
+
+Usage:
+    python scripts/load_test_tracking_pixel.py --seconds 30 --concurrency 200
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+import httpx
+from dotenv import load_dotenv
+from fastapi import FastAPI
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from email_campaigns_routes import router  # noqa: E402
+from email_tracking import TRACKING_GIF, email_tracking  # noqa: E402
+from index_registry import ensure_indexes  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db') + "_bench"
+
+CAMPAIGN_ID = "CMP-PIXEL"
+BATCH = 10000
+COLLECTIONS = ["email_campaigns", "email_recipients"]
+
+
+async def seed(db, recipients: int):
+    await db.email_campaigns.insert_one({
+        "campaign_id": CAMPAIGN_ID, "org_id": "ORG_BENCH", "name": "Pixel load", "status": "completed",
+        "stats": {"total_recipients": recipients, "sent": recipients, "opened": 0, "clicked": 0}
+    })
+    for start in range(0, recipients, BATCH):
+        await db.email_recipients.insert_many([
+            {"recipient_id": f"RCP-PX{n:08d}", "campaign_id": CAMPAIGN_ID, "org_id": "ORG_BENCH",
+             "email": f"user{n}@example.com", "status": "sent", "opened": False, "clicked": False}
+            for n in range(start, min(start + BATCH, recipients))
+        ])
+
+
+async def legacy_open(db, recipient_id: str):
+    """The pre-write-behind pixel: three round trips"""
+    await db.email_recipients.update_one({"recipient_id": recipient_id}, {"$set": {"opened": True}})
+    recipient = await db.email_recipients.find_one({"recipient_id": recipient_id})
+    if recipient:
+        await db.email_campaigns.update_one({"campaign_id": recipient["campaign_id"]}, {"$inc": {"stats.legacy": 1}})
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Load test the email tracking pixel")
+    parser.add_argument("--recipients", type=int, default=100000)
+    parser.add_argument("--seconds", type=float, default=30)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--click-every", type=int, default=10)
+    parser.add_argument("--legacy-sample", type=int, default=2000)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    for name in COLLECTIONS:
+        await db[name].delete_many({"org_id": "ORG_BENCH"})
+    await ensure_indexes(db, COLLECTIONS)
+    print(f"Seeding {args.recipients} recipients into {DB_NAME} ...")
+    await seed(db, args.recipients)
+
+    app = FastAPI()
+    app.include_router(router)
+    email_tracking.start(db)
+
+    latencies, hit, counts = [], set(), {"open": 0, "click": 0, "bad": 0}
+    deadline = time.perf_counter() + args.seconds
+
+    async def visitor(http: httpx.AsyncClient):
+        while time.perf_counter() < deadline:
+            recipient_id = f"RCP-PX{random.randrange(args.recipients):08d}"
+            kind = "click" if args.click_every and random.randrange(args.click_every) == 0 else "open"
+            started = time.perf_counter()
+            if kind == "open":
+                response = await http.get(f"/api/email-campaigns/track/open/{CAMPAIGN_ID}/{recipient_id}")
+                ok = response.status_code == 200 and response.content == TRACKING_GIF
+                hit.add(recipient_id)
+            else:
+                response = await http.get(f"/api/email-campaigns/track/click/{CAMPAIGN_ID}/{recipient_id}",
+                                          params={"url": "https://example.com/offer"})
+                ok = response.status_code == 200
+            latencies.append(time.perf_counter() - started)
+            counts[kind if ok else "bad"] += 1
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://pixel") as http:
+        await asyncio.gather(*(visitor(http) for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    flush_started = time.perf_counter()
+    await email_tracking.stop()
+    flush_ms = (time.perf_counter() - flush_started) * 1000
+
+    latencies.sort()
+    served = counts["open"] + counts["click"]
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000  # noqa: E731
+    print(f"{served} requests in {elapsed:.1f} s  {served / elapsed:,.0f} req/s  "
+          f"p50 {pct(0.5):.2f} ms  p99 {pct(0.99):.2f} ms  final flush {flush_ms:.0f} ms")
+    print(f"tracker: {email_tracking.status()}")
+
+    if args.legacy_sample:
+        sample = [f"RCP-PX{random.randrange(args.recipients):08d}" for _ in range(args.legacy_sample)]
+        legacy_started = time.perf_counter()
+        await asyncio.gather(*(legacy_open(db, recipient_id) for recipient_id in sample))
+        legacy = time.perf_counter() - legacy_started
+        print(f"legacy three-round-trip opens  {args.legacy_sample / legacy:,.0f} req/s")
+
+    campaign = await db.email_campaigns.find_one({"campaign_id": CAMPAIGN_ID})
+    opened = await db.email_recipients.count_documents(
+        {"recipient_id": {"$in": list(hit)}, "opened": True}
+    )
+
+    if not args.keep:
+        await client.drop_database(DB_NAME)
+    client.close()
+
+    stats = campaign["stats"]
+    if counts["bad"]:
+        print(f"FAILED: {counts['bad']} requests did not return a tracked response")
+        sys.exit(1)
+    if stats["opened"] != counts["open"] or stats["clicked"] != counts["click"]:
+        print(f"FAILED: stats opened {stats['opened']} / clicked {stats['clicked']}, "
+              f"served {counts['open']} opens / {counts['click']} clicks")
+        sys.exit(1)
+    if opened != len(hit):
+        print(f"FAILED: {len(hit) - opened} opened recipients not marked")
+        sys.exit(1)
+    print("Campaign counters match the requests served")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
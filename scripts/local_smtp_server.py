@@ -0,0 +1,112 @@
+"""
+Local SMTP stand-in
+
+A minimal asyncio SMTP server for exercising campaign_sender's "smtp"
+transport without a real relay. It accepts every message (nothing is
+delivered) and rejects recipients whose address contains --reject, so
+per-recipient failures can be tested too. No STARTTLS / AUTH: point the
+app at it with SMTP_STARTTLS=false and no SMTP_USER.
+
+Usage:
+    python scripts/local_smtp_server.py --port 2525
+    CAMPAIGN_TRANSPORT=smtp SMTP_HOST=127.0.0.1 SMTP_PORT=2525 SMTP_STARTTLS=false ...
+"""
+import asyncio
+import argparse
+from typing import Optional
+
+
+class LocalSMTPServer:
+    """Counts accepted messages and refused recipients"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 2525, reject: str = "bounce"):
+        self.host = host
+        self.port = port
+        self.reject = reject
+        self.messages = 0
+        self.refused = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._session, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        def reply(line: str):
+            writer.write(line.encode() + b"\r\n")
+
+        reply("220 localhost local SMTP stand-in")
+        recipients = 0
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip()
+                verb = command[:4].upper()
+                if verb == "EHLO":
+                    reply("250-localhost")
+                    reply("250 8BITMIME")
+                elif verb == "HELO":
+                    reply("250 localhost")
+                elif verb == "MAIL":
+                    recipients = 0
+                    reply("250 OK")
+                elif verb == "RCPT":
+                    if self.reject and self.reject in command.lower():
+                        self.refused += 1
+                        reply("550 Mailbox unavailable")
+                    else:
+                        recipients += 1
+                        reply("250 OK")
+                elif verb == "DATA":
+                    if not recipients:
+                        reply("554 No valid recipients")
+                        continue
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b".\n", b""):
+                        pass
+                    self.messages += 1
+                    reply("250 OK queued")
+                elif verb in ("RSET", "NOOP"):
+                    recipients = 0 if verb == "RSET" else recipients
+                    reply("250 OK")
+                elif verb == "QUIT":
+                    reply("221 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("502 Command not implemented")
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Run a local SMTP stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--reject", default="bounce", help="refuse recipients containing this text")
+    args = parser.parse_args()
+
+    server = LocalSMTPServer(args.host, args.port, args.reject)
+    await server.start()
+    print(f"Local SMTP stand-in on {server.host}:{server.port}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(f"{server.messages} messages accepted, {server.refused} recipients refused")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Manage MongoDB indexes declared in index_registry.py
+
+    python scripts/manage_indexes.py apply [--dry-run] [--collection users ...]
+    python scripts/manage_indexes.py drift [--collection users ...]
+    python scripts/manage_indexes.py profile {on,off}
+    python scripts/manage_indexes.py audit [--collection users ...]
+
+`profile on` makes the server record every operation it answers with a
+collection scan (MongoDB 4.4.2+). Exercise the app (staging traffic, a
+smoke run of the routes), then `audit` lists the unindexed query shapes it
+actually saw and fails (exit 1) if there are any. `profile off` stops it.
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from index_registry import (  # noqa: E402
+    ensure_indexes, index_drift_report, set_collscan_profiling, unindexed_query_report
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db')
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Apply or audit registry indexes")
+    parser.add_argument("command", choices=["apply", "drift", "profile", "audit"])
+    parser.add_argument("state", nargs="?", choices=["on", "off"], help="profile on|off")
+    parser.add_argument("--dry-run", action="store_true", help="Report what apply would create")
+    parser.add_argument("--collection", action="append", help="Limit to a collection (repeatable)")
+    args = parser.parse_args()
+
+    if args.command == "profile" and args.state is None:
+        parser.error("profile needs on or off")
+
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    logger.info(f"Connected to {MONGO_URL} / {DB_NAME}")
+
+    try:
+        if args.command == "apply":
+            result = await ensure_indexes(db, args.collection, dry_run=args.dry_run)
+        elif args.command == "drift":
+            result = await index_drift_report(db, args.collection)
+        elif args.command == "profile":
+            result = await set_collscan_profiling(db, args.state == "on")
+        else:
+            result = await unindexed_query_report(db, args.collection)
+            print(json.dumps(result, indent=2, default=str))
+            return 1 if result["unindexed_query_shapes"] else 0
+        print(json.dumps(result, indent=2, default=str))
+        return 1 if result.get("failed") else 0
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,38 @@
+"""
+Rebuild cash balance snapshots (balance_snapshots.py) from `transactions`.
+Run once to backfill, and after any bulk load that writes transactions
+directly (seed scripts, migrations).
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from balance_snapshots import rebuild_balance_snapshots  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db')
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    logger.info(f"Rebuilding cash balance snapshots on {DB_NAME}")
+    result = await rebuild_balance_snapshots(db)
+    logger.info(f"Done: {result}")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+"""
+Rebuild the global search index (search_index.py) from the source
+collections. Run after bulk loads or restores that bypass the running
+sync (e.g. with the API stopped), or to backfill a new module.
+
+Usage:
+    python scripts/rebuild_search_index.py [leads customers ...]
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+ROOT_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+load_dotenv(ROOT_DIR / '.env')
+
+from search_index import rebuild_search_index  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'innovate_books_db')
+
+
+async def main():
+    client = AsyncIOMotorClient(MONGO_URL)
+    db = client[DB_NAME]
+    kinds = sys.argv[1:] or None
+    logger.info(f"Rebuilding search index on {DB_NAME} ({', '.join(kinds) if kinds else 'all modules'})")
+    result = await rebuild_search_index(db, kinds)
+    logger.info(f"Done: {result}")
+    client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
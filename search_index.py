@@ -0,0 +1,650 @@
+"""
+Search Index
+Per-org prefix-token index behind /api/search/global, so the command bar
+answers from one indexed collection instead of unanchored $regex scans
+over ten source collections.
+
+Collection `search_index`, one entry per source document:
+- _id          "<module>:<source _id>"
+- kind         module key ("leads", "customers", ...), org_id, source_id
+- type, module, id, title, subtitle, status, path, icon   (the hit card)
+- terms        lowercase word prefixes (SEARCH_MIN_TOKEN..SEARCH_MAX_PREFIX
+               chars) of the searchable fields, plus the joined form of
+               identifiers ("INV-1001" -> inv, 1001, inv1001)
+- touched_at   source updated_at / created_at, newest hits first
+- indexed_at   when the entry was last written
+
+A query matches an entry when every query word is one of its terms; the
+(terms, org_id, kind, touched_at) index serves each module's lookup.
+
+SearchIndexSync keeps the index current: it follows a change stream over
+the source collections (resume token in `search_index_state`), and falls
+back to polling updated_at / created_at plus a periodic delete sweep when
+the server is not a replica set. One worker holds the sync lease.
+"""
+import os
+import re
+import time
+import uuid
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import DuplicateKeyError, ExecutionTimeout, OperationFailure, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX = "search_index"
+SEARCH_STATE = "search_index_state"
+
+SEARCH_MIN_TOKEN = 2
+SEARCH_MAX_PREFIX = int(os.environ.get('SEARCH_MAX_PREFIX', '15'))
+SEARCH_MODULE_TIMEOUT_MS = int(os.environ.get('SEARCH_MODULE_TIMEOUT_MS', '150'))
+SEARCH_CANDIDATES_PER_MODULE = int(os.environ.get('SEARCH_CANDIDATES_PER_MODULE', '50'))
+SEARCH_SYNC_ENABLED = os.environ.get('SEARCH_SYNC_ENABLED', 'true').lower() == 'true'
+SEARCH_SYNC_POLL_SECONDS = int(os.environ.get('SEARCH_SYNC_POLL_SECONDS', '30'))
+SEARCH_SWEEP_EVERY_POLLS = int(os.environ.get('SEARCH_SWEEP_EVERY_POLLS', '20'))
+
+SYNC_BATCH_SIZE = 500
+# The lease must outlive the sleep between polls (plus a slow pass), or a
+# standby worker takes over sync between two ticks of the holder
+SYNC_LEASE_SECONDS = max(int(os.environ.get('SEARCH_SYNC_LEASE_SECONDS', '90')), 3 * SEARCH_SYNC_POLL_SECONDS)
+
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+# ==================== SOURCES ====================
+
+class SearchSource:
+    """How one source collection is indexed and shown as a hit"""
+
+    def __init__(
+        self,
+        key: str,
+        collection: str,
+        id_fields: Union[str, Iterable[str]],
+        fields: Iterable[str],
+        hit_type: str,
+        module: str,
+        icon: str,
+        present: Callable[[dict], Dict[str, Any]]
+    ):
+        self.key = key
+        self.collection = collection
+        # Business id fields, first present wins (main.py writes plain `id`)
+        self.id_fields = (id_fields,) if isinstance(id_fields, str) else tuple(id_fields)
+        self.fields = tuple(fields)
+        self.hit_type = hit_type
+        self.module = module
+        self.icon = icon
+        self.present = present
+
+    def entity_id(self, doc: dict) -> Any:
+        for field in self.id_fields:
+            if doc.get(field):
+                return doc[field]
+        return None
+
+
+def _money(value) -> str:
+    try:
+        return f"₹{float(value or 0):,.0f}"
+    except (TypeError, ValueError):
+        return "₹0"
+
+
+SOURCES: Dict[str, SearchSource] = {}
+
+
+def register_search_source(source: SearchSource):
+    SOURCES[source.key] = source
+
+
+register_search_source(SearchSource(
+    "leads", "leads", "lead_id",
+    ("company", "first_name", "last_name", "email", "lead_id"),
+    "lead", "Commerce", "user-plus",
+    lambda d: {
+        "title": f"{d.get('first_name', '')} {d.get('last_name', '')}".strip() or d.get("company", "Unknown"),
+        "subtitle": d.get("company", ""),
+        "status": d.get("lead_status", "New"),
+        "path": f"/commerce/revenue/leads/{d.get('lead_id')}",
+    }
+))
+register_search_source(SearchSource(
+    "customers", "customers", "customer_id",
+    ("name", "email", "customer_id", "gstin"),
+    "customer", "Commerce", "building",
+    lambda d: {
+        "title": d.get("name", "Unknown"),
+        "subtitle": d.get("email", ""),
+        "status": d.get("status", "active"),
+        "path": f"/commerce/parties/customers/{d.get('customer_id')}",
+    }
+))
+register_search_source(SearchSource(
+    "vendors", "vendors", "vendor_id",
+    ("name", "email", "vendor_id", "gstin"),
+    "vendor", "Commerce", "truck",
+    lambda d: {
+        "title": d.get("name", "Unknown"),
+        "subtitle": d.get("email", ""),
+        "status": d.get("status", "active"),
+        "path": f"/commerce/parties/vendors/{d.get('vendor_id')}",
+    }
+))
+register_search_source(SearchSource(
+    "invoices", "invoices", ("invoice_id", "id"),
+    ("invoice_id", "invoice_number", "customer_name"),
+    "invoice", "Finance", "file-text",
+    lambda d: {
+        "title": d.get("invoice_number") or d.get("invoice_id") or d.get("id"),
+        "subtitle": f"{d.get('customer_name', '')} - {_money(d.get('total', d.get('total_amount')))}",
+        "status": d.get("status", "draft"),
+        "path": f"/invoices/{d.get('invoice_id') or d.get('id')}",
+    }
+))
+register_search_source(SearchSource(
+    "bills", "bills", ("bill_id", "id"),
+    ("bill_id", "bill_number", "vendor_name"),
+    "bill", "Finance", "receipt",
+    lambda d: {
+        "title": d.get("bill_number") or d.get("bill_id") or d.get("id"),
+        "subtitle": f"{d.get('vendor_name', '')} - {_money(d.get('total', d.get('total_amount')))}",
+        "status": d.get("status", "draft"),
+        "path": f"/bills/{d.get('bill_id') or d.get('id')}",
+    }
+))
+register_search_source(SearchSource(
+    "projects", "ops_projects", "project_id",
+    ("project_id", "name", "description"),
+    "project", "Operations", "folder",
+    lambda d: {
+        "title": d.get("name", d.get("project_id")),
+        "subtitle": d.get("customer_name", ""),
+        "status": d.get("status", "active"),
+        "path": f"/operations/projects/{d.get('project_id')}",
+    }
+))
+register_search_source(SearchSource(
+    "people", "wf_people", "person_id",
+    ("person_id", "full_name", "email", "department"),
+    "person", "Workforce", "user",
+    lambda d: {
+        "title": d.get("full_name", "Unknown"),
+        "subtitle": f"{d.get('department', '')} - {d.get('designation', '')}",
+        "status": d.get("employment_status", "active"),
+        "path": f"/ib-workforce/people/{d.get('person_id')}",
+    }
+))
+register_search_source(SearchSource(
+    "tasks", "workspace_tasks", "task_id",
+    ("task_id", "title", "description"),
+    "task", "Workspace", "check-square",
+    lambda d: {
+        "title": d.get("title", "Untitled Task"),
+        "subtitle": (d.get("description") or "")[:50],
+        "status": d.get("status", "open"),
+        "path": "/workspace/tasks",
+    }
+))
+register_search_source(SearchSource(
+    "contracts", "contracts", "contract_id",
+    ("contract_id", "customer_name", "title"),
+    "contract", "Commerce", "file-signature",
+    lambda d: {
+        "title": d.get("title") or d.get("contract_id"),
+        "subtitle": d.get("customer_name", ""),
+        "status": d.get("status", "draft"),
+        "path": f"/commerce/revenue/contracts/{d.get('contract_id')}",
+    }
+))
+register_search_source(SearchSource(
+    "signals", "intel_signals", "signal_id",
+    ("signal_id", "title", "description"),
+    "signal", "Intelligence", "zap",
+    lambda d: {
+        "title": d.get("title", "Signal"),
+        "subtitle": d.get("source_solution", ""),
+        "status": d.get("severity", "info"),
+        "path": "/intelligence/signals",
+    }
+))
+
+
+def _source_for_collection(collection: str) -> Optional[SearchSource]:
+    for source in SOURCES.values():
+        if source.collection == collection:
+            return source
+    return None
+
+
+# ==================== TOKENS ====================
+
+def index_terms(value: Any) -> set:
+    """Word prefixes of a field value, plus the joined form of identifiers"""
+    if value is None:
+        return set()
+    text = str(value).lower()
+    words = _WORD.findall(text)
+    if len(words) > 1 and not any(ch.isspace() for ch in text):
+        words.append("".join(words))  # INV-1001 -> inv1001, a.b@c.com -> abccom
+    terms = set()
+    for word in words:
+        for size in range(SEARCH_MIN_TOKEN, min(len(word), SEARCH_MAX_PREFIX) + 1):
+            terms.add(word[:size])
+    return terms
+
+
+def query_terms(q: str) -> List[str]:
+    """Query words as index terms, most selective (longest) first"""
+    words = {word[:SEARCH_MAX_PREFIX] for word in _WORD.findall((q or "").lower())}
+    return sorted((w for w in words if len(w) >= SEARCH_MIN_TOKEN), key=len, reverse=True)
+
+
+def _stamp(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.isoformat()
+    return str(value)
+
+
+def build_entry(source: SearchSource, doc: dict) -> Optional[dict]:
+    """Index entry for a source document (None when it has no business id)"""
+    entity_id = source.entity_id(doc)
+    if not entity_id or "_id" not in doc:
+        return None
+    terms = set()
+    for field in source.fields:
+        terms |= index_terms(doc.get(field))
+    card = source.present(doc)
+    title = str(card.get("title") or entity_id)
+    return {
+        "_id": f"{source.key}:{doc['_id']}",
+        "kind": source.key,
+        "org_id": doc.get("org_id"),
+        "source_id": doc["_id"],
+        "type": source.hit_type,
+        "module": source.module,
+        "id": entity_id,
+        "title": title,
+        "title_lc": title.lower(),
+        "subtitle": card.get("subtitle", ""),
+        "status": card.get("status"),
+        "path": card.get("path"),
+        "icon": source.icon,
+        "terms": sorted(terms),
+        "touched_at": _stamp(doc.get("updated_at") or doc.get("created_at")) or "",
+    }
+
+
+# ==================== WRITES ====================
+
+async def index_documents(db, source: SearchSource, docs: Iterable[dict]) -> int:
+    """Upsert index entries for source documents; returns entries written"""
+    ops = []
+    now = datetime.now(timezone.utc).isoformat()
+    for doc in docs:
+        entry = build_entry(source, doc)
+        if entry is not None:
+            entry["indexed_at"] = now
+            ops.append(ReplaceOne({"_id": entry["_id"]}, entry, upsert=True))
+        elif "_id" in doc:
+            ops.append(DeleteOne({"_id": f"{source.key}:{doc['_id']}"}))
+    if ops:
+        await db[SEARCH_INDEX].bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+async def remove_documents(db, source: SearchSource, source_ids: Iterable[Any]) -> int:
+    keys = [f"{source.key}:{source_id}" for source_id in source_ids]
+    if not keys:
+        return 0
+    result = await db[SEARCH_INDEX].delete_many({"_id": {"$in": keys}})
+    return result.deleted_count
+
+
+async def rebuild_search_index(db, kinds: Optional[Iterable[str]] = None) -> Dict[str, int]:
+    """Re-index every document of the given modules (default: all)"""
+    counts = {}
+    for key in (list(kinds) if kinds else list(SOURCES)):
+        source = SOURCES[key]
+        started = datetime.now(timezone.utc).isoformat()
+        written = 0
+        batch = []
+        async for doc in db[source.collection].find({}):
+            batch.append(doc)
+            if len(batch) >= SYNC_BATCH_SIZE:
+                written += await index_documents(db, source, batch)
+                batch = []
+        written += await index_documents(db, source, batch)
+        # Entries not rewritten above belong to deleted documents
+        await db[SEARCH_INDEX].delete_many({"kind": key, "indexed_at": {"$lt": started}})
+        await db[SEARCH_STATE].update_one(
+            {"_id": f"built:{key}"}, {"$set": {"built_at": started, "entries": written}}, upsert=True
+        )
+        counts[key] = written
+        logger.info(f"Search index rebuilt for {key}: {written} entries")
+    return counts
+
+
+async def _sweep_deleted(db, source: SearchSource) -> int:
+    """Drop entries whose source document no longer exists"""
+    removed = 0
+    cursor = db[SEARCH_INDEX].find({"kind": source.key}, {"source_id": 1})
+    batch = []
+    async for entry in cursor:
+        batch.append(entry)
+        if len(batch) >= SYNC_BATCH_SIZE:
+            removed += await _drop_orphans(db, source, batch)
+            batch = []
+    removed += await _drop_orphans(db, source, batch)
+    return removed
+
+
+async def _drop_orphans(db, source: SearchSource, entries: List[dict]) -> int:
+    if not entries:
+        return 0
+    ids = [entry["source_id"] for entry in entries]
+    alive = {
+        doc["_id"] for doc in
+        await db[source.collection].find({"_id": {"$in": ids}}, {"_id": 1}).to_list(None)
+    }
+    orphans = [entry["_id"] for entry in entries if entry["source_id"] not in alive]
+    if orphans:
+        await db[SEARCH_INDEX].delete_many({"_id": {"$in": orphans}})
+    return len(orphans)
+
+
+# ==================== QUERIES ====================
+
+HIT_PROJECTION = {
+    "_id": 0, "type": 1, "module": 1, "id": 1, "title": 1, "title_lc": 1,
+    "subtitle": 1, "status": 1, "path": 1, "icon": 1
+}
+
+
+def _relevance(hit: dict, q: str, words: List[str]) -> int:
+    title = hit.get("title_lc", "")
+    if title == q:
+        return 0
+    if title.startswith(q):
+        return 1
+    if q in title:
+        return 2
+    title_words = _WORD.findall(title)
+    if all(any(tw.startswith(w) for tw in title_words) for w in words):
+        return 3
+    return 4
+
+
+async def _search_module(db, key: str, terms: List[str], org_id: Optional[str], all_orgs: bool, limit: int) -> List[dict]:
+    query: Dict[str, Any] = {"terms": {"$all": terms}, "kind": key}
+    if not all_orgs:
+        # An org-less caller only sees org-less entries, never every org
+        query["org_id"] = org_id
+    return await db[SEARCH_INDEX].find(query, HIT_PROJECTION).sort("touched_at", -1).limit(limit).max_time_ms(SEARCH_MODULE_TIMEOUT_MS).to_list(limit)
+
+
+async def search(
+    db,
+    q: str,
+    org_id: Optional[str] = None,
+    modules: Optional[Iterable[str]] = None,
+    limit: int = 10,
+    timeout_ms: int = SEARCH_MODULE_TIMEOUT_MS,
+    all_orgs: bool = False
+) -> Dict[str, Any]:
+    """
+    Ranked hits for `q`, one concurrent lookup per module. A module that
+    misses its deadline is reported in `modules_timed_out` instead of
+    holding up the rest. Hits are limited to `org_id` unless `all_orgs`
+    (super admins) is set.
+    """
+    started = time.perf_counter()
+    keys = [key for key in (modules or SOURCES) if key in SOURCES]
+    terms = query_terms(q)
+    timed_out: List[str] = []
+    failed: List[str] = []
+    hits: List[dict] = []
+
+    if terms and keys:
+        candidates = max(limit, SEARCH_CANDIDATES_PER_MODULE)
+
+        async def run(key):
+            try:
+                return await asyncio.wait_for(
+                    _search_module(db, key, terms, org_id, all_orgs, candidates), timeout_ms / 1000
+                )
+            except (asyncio.TimeoutError, ExecutionTimeout):
+                timed_out.append(key)
+            except PyMongoError as e:
+                logger.warning(f"Search over {key} failed: {e}")
+                failed.append(key)
+            return []
+
+        for module_hits in await asyncio.gather(*(run(key) for key in keys)):
+            hits.extend(module_hits[:limit])
+
+    q_lc = (q or "").strip().lower()
+    words = _WORD.findall(q_lc)
+    hits.sort(key=lambda hit: _relevance(hit, q_lc, words))
+    for hit in hits:
+        hit.pop("title_lc", None)
+
+    return {
+        "results": hits,
+        "modules_searched": keys,
+        "modules_timed_out": timed_out,
+        "modules_failed": failed,
+        "took_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+async def index_status(db) -> Dict[str, Any]:
+    counts = await db[SEARCH_INDEX].aggregate([
+        {"$group": {"_id": "$kind", "entries": {"$sum": 1}}}
+    ]).to_list(None)
+    state = await db[SEARCH_STATE].find({}, {"resume_token": 0}).to_list(None)
+    return {
+        "entries": {row["_id"]: row["entries"] for row in counts},
+        "state": state,
+        "sync": search_sync.status(),
+    }
+
+
+# ==================== SYNC ====================
+
+class SearchIndexSync:
+    """Background task keeping search_index in step with the source collections"""
+
+    def __init__(self):
+        self.owner = f"search-sync-{uuid.uuid4().hex[:8]}"
+        self.mode: Optional[str] = None
+        self.applied = 0
+        self.last_applied_at: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "owner": self.owner,
+            "running": self._task is not None and not self._task.done(),
+            "mode": self.mode,
+            "applied": self.applied,
+            "last_applied_at": self.last_applied_at,
+        }
+
+    def start(self, db):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run(db))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _hold_lease(self, db) -> bool:
+        now = datetime.now(timezone.utc)
+        try:
+            await db[SEARCH_STATE].update_one(
+                {"_id": "sync_lease", "$or": [{"owner": self.owner}, {"expires_at": {"$lt": now.isoformat()}}]},
+                {"$set": {"owner": self.owner, "expires_at": (now + timedelta(seconds=SYNC_LEASE_SECONDS)).isoformat()}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def run(self, db):
+        while True:
+            try:
+                if not await self._hold_lease(db):
+                    self.mode = "standby"
+                    await asyncio.sleep(SYNC_LEASE_SECONDS / 2)
+                    continue
+                if self.mode != "polling":
+                    try:
+                        await self._follow_change_stream(db)
+                        continue
+                    except OperationFailure as e:
+                        # Standalone servers have no change streams (code 40573)
+                        logger.info(f"Search index sync falling back to polling: {e}")
+                await self._poll(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Search index sync error: {e}")
+                await asyncio.sleep(5)
+
+    async def _backfill_unbuilt(self, db):
+        built = {
+            doc["_id"].split(":", 1)[1]
+            for doc in await db[SEARCH_STATE].find({"_id": {"$regex": "^built:"}}, {"_id": 1}).to_list(None)
+        }
+        missing = [key for key in SOURCES if key not in built]
+        if missing:
+            await rebuild_search_index(db, missing)
+
+    async def _apply(self, db, source: SearchSource, docs: List[dict], deleted: List[Any]):
+        if docs:
+            self.applied += await index_documents(db, source, docs)
+        if deleted:
+            self.applied += await remove_documents(db, source, deleted)
+        self.last_applied_at = datetime.now(timezone.utc).isoformat()
+
+    async def _follow_change_stream(self, db):
+        collections = [source.collection for source in SOURCES.values()]
+        pipeline = [{"$match": {
+            "ns.coll": {"$in": collections},
+            "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+        }}]
+        state = await db[SEARCH_STATE].find_one({"_id": "change_stream"}) or {}
+        token = state.get("resume_token")
+        if token is None:
+            # Take a token before the backfill so writes made during it replay afterwards
+            async with db.watch(pipeline) as stream:
+                await stream.try_next()
+                token = stream.resume_token
+            await self._backfill_unbuilt(db)
+            await db[SEARCH_STATE].update_one(
+                {"_id": "change_stream"}, {"$set": {"resume_token": token}}, upsert=True
+            )
+
+        self.mode = "change_stream"
+        async with db.watch(pipeline, full_document="updateLookup", resume_after=token) as stream:
+            while stream.alive:
+                if not await self._hold_lease(db):
+                    return
+                changes = []
+                while len(changes) < SYNC_BATCH_SIZE:
+                    change = await stream.try_next()
+                    if change is None:
+                        break
+                    changes.append(change)
+                if not changes:
+                    continue
+
+                upserts: Dict[str, List[dict]] = {}
+                deletes: Dict[str, List[Any]] = {}
+                for change in changes:
+                    source = _source_for_collection(change["ns"]["coll"])
+                    if source is None:
+                        continue
+                    doc = change.get("fullDocument")
+                    if change["operationType"] == "delete" or doc is None:
+                        deletes.setdefault(source.key, []).append(change["documentKey"]["_id"])
+                    else:
+                        upserts.setdefault(source.key, []).append(doc)
+                for key in set(upserts) | set(deletes):
+                    await self._apply(db, SOURCES[key], upserts.get(key, []), deletes.get(key, []))
+                await db[SEARCH_STATE].update_one(
+                    {"_id": "change_stream"}, {"$set": {"resume_token": stream.resume_token}}, upsert=True
+                )
+
+    async def _poll(self, db):
+        self.mode = "polling"
+        polls = 0
+        while True:
+            if not await self._hold_lease(db):
+                return
+            if polls == 0:
+                await self._backfill_unbuilt(db)
+            for source in SOURCES.values():
+                # Renew per source so a slow pass (backfill, sweep) keeps the lease
+                if not await self._hold_lease(db):
+                    return
+                await self._poll_source(db, source)
+                if polls and polls % SEARCH_SWEEP_EVERY_POLLS == 0:
+                    removed = await _sweep_deleted(db, source)
+                    if removed:
+                        self.applied += removed
+                        logger.info(f"Search index sweep removed {removed} {source.key} entries")
+            polls += 1
+            await asyncio.sleep(SEARCH_SYNC_POLL_SECONDS)
+
+    async def _poll_source(self, db, source: SearchSource):
+        state_id = f"poll:{source.key}"
+        state = await db[SEARCH_STATE].find_one({"_id": state_id})
+        if state is None:
+            built = await db[SEARCH_STATE].find_one({"_id": f"built:{source.key}"}) or {}
+            watermark = built.get("built_at") or datetime.now(timezone.utc).isoformat()
+        else:
+            watermark = state["watermark"]
+        bounds: List[Any] = [watermark]
+        try:
+            bounds.append(datetime.fromisoformat(watermark))
+        except ValueError:
+            pass
+
+        changed = {"$or": [
+            {field: {"$gt": bound}}
+            for field in ("updated_at", "created_at")
+            for bound in bounds
+        ]}
+        # Stamps in the future (bad seed data) must not push the watermark past real writes
+        now = datetime.now(timezone.utc).isoformat()
+        newest = watermark
+        batch = []
+        async for doc in db[source.collection].find(changed):
+            batch.append(doc)
+            for field in ("updated_at", "created_at"):
+                stamp = _stamp(doc.get(field))
+                if stamp and newest < stamp <= now:
+                    newest = stamp
+            if len(batch) >= SYNC_BATCH_SIZE:
+                await self._apply(db, source, batch, [])
+                batch = []
+        await self._apply(db, source, batch, [])
+        await db[SEARCH_STATE].update_one({"_id": state_id}, {"$set": {"watermark": newest}}, upsert=True)
+
+
+search_sync = SearchIndexSync()
@@ -10,6 +10,8 @@ import uuid
 import random
 from typing import List
 
+from balance_snapshots import rebuild_balance_snapshots
+
 router = APIRouter(prefix="/api/seed", tags=["seed"])
 
 def get_db():
@@ -501,6 +503,9 @@ async def seed_comprehensive_data():
                 "is_active": True
             })
     
+    # Seeded transactions bypass the incremental snapshot upkeep
+    await rebuild_balance_snapshots(db)
+    
     return {
         "success": True,
         "message": "Comprehensive seed data created successfully",
@@ -540,6 +545,8 @@ async def clear_seed_data():
         result = await db[collection].delete_many({})
         results[collection] = result.deleted_count
     
+    await rebuild_balance_snapshots(db)
+    
     return {
         "success": True,
         "message": "All seed data cleared",
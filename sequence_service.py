@@ -0,0 +1,150 @@
+"""
+Sequence Service
+Human-readable document numbers (PTY-0001, LD-2025-000001, WO-...) from
+MongoDB counters instead of count_documents() + 1 or wall-clock stamps.
+
+- Counters live in `counters` as {_id: key, value: last reserved value}.
+- Each worker leases a block of SEQUENCE_BLOCK_SIZE values with one
+  findOneAndUpdate $inc and hands them out from memory, so most IDs cost
+  no round trip. Values never repeat; unused values of a lease are lost
+  when the worker stops, so sequences may have gaps.
+- Keys can be scoped per org and per period (calendar or fiscal year).
+- On first use in a worker a counter is raised ($max) to an optional seed,
+  e.g. the existing document count, so old numbering continues.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+from db_provider import get_db
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_BLOCK_SIZE = int(os.environ.get('SEQUENCE_BLOCK_SIZE', '20'))
+FISCAL_YEAR_START_MONTH = int(os.environ.get('FISCAL_YEAR_START_MONTH', '4'))
+
+COUNTERS = "counters"
+
+SeedFn = Callable[[], Awaitable[int]]
+
+
+def fiscal_year(when: Optional[datetime] = None) -> str:
+    """'2025-26' for any date from April 2025 to March 2026 (default start month)"""
+    when = when or datetime.now(timezone.utc)
+    start = when.year if when.month >= FISCAL_YEAR_START_MONTH else when.year - 1
+    if FISCAL_YEAR_START_MONTH == 1:
+        return str(start)
+    return f"{start}-{(start + 1) % 100:02d}"
+
+
+def sequence_key(prefix: str, org_id: Optional[str] = None, period: Optional[str] = None) -> str:
+    """Counter _id: 'PTY', 'INV:2025-26', 'org:ORG001:EMP'"""
+    parts = []
+    if org_id:
+        parts += ["org", org_id]
+    parts.append(prefix)
+    if period:
+        parts.append(period)
+    return ":".join(parts)
+
+
+class SequenceAllocator:
+    """Per-worker block leases over the counters collection"""
+
+    def __init__(self, block_size: int = SEQUENCE_BLOCK_SIZE):
+        self.block_size = max(1, block_size)
+        self._leases: Dict[Tuple[str, str], List[int]] = {}  # -> [next, last]
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._seeded: set = set()
+
+    async def _ensure_seed(self, db, key: str, seed: Optional[SeedFn]):
+        if seed is None or (db.name, key) in self._seeded:
+            return
+        start = int(await seed())
+        await db[COUNTERS].update_one({"_id": key}, {"$max": {"value": start}}, upsert=True)
+        self._seeded.add((db.name, key))
+
+    async def reserve(self, db, key: str, count: int, seed: Optional[SeedFn] = None) -> int:
+        """
+        Reserve `count` consecutive values straight from the counter and
+        return the first (bulk imports). Bypasses the in-memory lease.
+        """
+        if count <= 0:
+            return 0
+        await self._ensure_seed(db, key, seed)
+        counter = await db[COUNTERS].find_one_and_update(
+            {"_id": key}, {"$inc": {"value": count}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return counter["value"] - count + 1
+
+    async def next(self, db, key: str, seed: Optional[SeedFn] = None) -> int:
+        lease_key = (db.name, key)
+        lock = self._locks.setdefault(lease_key, asyncio.Lock())
+        async with lock:
+            lease = self._leases.get(lease_key)
+            if lease is None or lease[0] > lease[1]:
+                first = await self.reserve(db, key, self.block_size, seed)
+                lease = [first, first + self.block_size - 1]
+                self._leases[lease_key] = lease
+            value = lease[0]
+            lease[0] += 1
+            return value
+
+    def stats(self) -> Dict[str, int]:
+        """Remaining leased values per key"""
+        return {
+            f"{db_name}/{key}": lease[1] - lease[0] + 1
+            for (db_name, key), lease in self._leases.items()
+        }
+
+
+sequences = SequenceAllocator()
+
+
+async def next_value(
+    prefix: str,
+    org_id: Optional[str] = None,
+    period: Optional[str] = None,
+    seed: Optional[SeedFn] = None,
+    db=None
+) -> int:
+    db = db if db is not None else get_db()
+    return await sequences.next(db, sequence_key(prefix, org_id, period), seed)
+
+
+async def next_id(
+    prefix: str,
+    width: int = 4,
+    org_id: Optional[str] = None,
+    period: Optional[str] = None,
+    offset: int = 0,
+    seed: Optional[SeedFn] = None,
+    db=None
+) -> str:
+    """
+    'PTY-0001' / 'LD-2025-000001'. `offset` keeps legacy ranges such as
+    INV-1001 (offset=1000); the period, when given, is part of the ID.
+    """
+    value = await next_value(prefix, org_id, period, seed, db) + offset
+    if period:
+        return f"{prefix}-{period}-{value:0{width}d}"
+    return f"{prefix}-{value:0{width}d}"
+
+
+async def next_timestamped_id(prefix: str, db=None) -> str:
+    """
+    'WO-20250101120000-17': keeps the old timestamp shape, with a sequence
+    suffix so two IDs created in the same second no longer collide.
+    """
+    value = await next_value(prefix, db=db)
+    return f"{prefix}-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{value}"
+
+
+async def reserve_block(db, key: str, count: int, seed: Optional[SeedFn] = None) -> int:
+    """First of `count` fresh consecutive values for `key` (gap tolerant)"""
+    return await sequences.reserve(db, key, count, seed)
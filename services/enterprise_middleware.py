@@ -4,7 +4,7 @@ Handles: Authentication → Tenant Validation → Subscription Guard → RBAC Gu
 """
 from fastapi import HTTPException, status, Depends, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db as get_shared_db
 import jwt
 import os
 from datetime import datetime, timezone
@@ -24,10 +24,8 @@ security = HTTPBearer()
 JWT_SECRET = os.environ.get('JWT_SECRET_KEY')
 JWT_ALGORITHM = os.environ.get('JWT_ALGORITHM', 'HS256')
 
-# Direct MongoDB connection (avoid circular import)
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db_instance = client[os.environ['DB_NAME']]
+# Shared MongoDB connection pool (avoid circular import)
+db_instance = get_shared_db()
 
 def get_db():
     """Get database instance"""
@@ -1,17 +1,42 @@
 """
 Manufacturing Lead Module - Phase 3: Automation Engine
 Implements 20+ automation rules for manufacturing lead lifecycle
+
+- Rules declare the triggers they handle (none = every trigger) and the rules
+  they must run after; a trigger -> rules index means a trigger only invokes
+  its own rules.
+- Rules of a trigger run in dependency waves; each wave runs concurrently
+  under MFG_AUTOMATION_CONCURRENCY, every rule with a
+  MFG_AUTOMATION_RULE_TIMEOUT_SECONDS timeout.
+- Per-rule outcome and timing, plus the logs rules emit (emails, reminders),
+  are written to mfg_automation_logs in one insert_many per run.
+- enqueue_automation runs the whole automation off the request path.
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 import asyncio
-from motor.motor_asyncio import AsyncIOMotorClient
+import logging
+import time
+import uuid
+from db_provider import get_db
 import os
 
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-client = AsyncIOMotorClient(MONGO_URL)
-db = client['innovate_books_db']
+db = get_db('innovate_books_db')
+
+logger = logging.getLogger(__name__)
+
+MFG_AUTOMATION_CONCURRENCY = int(os.environ.get('MFG_AUTOMATION_CONCURRENCY', '8'))
+MFG_AUTOMATION_RULE_TIMEOUT_SECONDS = float(os.environ.get('MFG_AUTOMATION_RULE_TIMEOUT_SECONDS', '10'))
+
+
+def automation_rule(*triggers: str, after: Tuple[str, ...] = ()):
+    """Declare the triggers a rule handles (none = every trigger) and the rules it must follow"""
+    def register(func):
+        func.triggers = frozenset(triggers)
+        func.after = tuple(after)
+        return func
+    return register
 
 
 class ManufacturingAutomationEngine:
@@ -19,6 +44,10 @@ class ManufacturingAutomationEngine:
     
     def __init__(self):
         self.automation_rules = []
+        self.rules_by_trigger: Dict[str, List] = {}
+        self.any_trigger_rules: List = []
+        self._waves: Dict[str, List[List]] = {}
+        self._background: Dict[str, asyncio.Task] = {}
         self.register_all_rules()
     
     def register_all_rules(self):
@@ -49,30 +78,119 @@ class ManufacturingAutomationEngine:
             self.auto_calculate_risk_score,
             self.auto_notify_stakeholders,
         ]
-    
-    async def execute_automation(self, trigger: str, lead_data: Dict[str, Any]):
-        """Execute automation rules based on trigger"""
-        results = []
-        
+        self.rules_by_trigger = {}
+        self.any_trigger_rules = [rule for rule in self.automation_rules if not rule.triggers]
         for rule in self.automation_rules:
+            for trigger in rule.triggers:
+                self.rules_by_trigger.setdefault(trigger, [])
+        for trigger, rules in self.rules_by_trigger.items():
+            rules.extend(rule for rule in self.automation_rules if not rule.triggers or trigger in rule.triggers)
+        self._waves = {}
+    
+    def rules_for(self, trigger: str) -> List:
+        """Rules a trigger invokes, in registration order"""
+        return self.rules_by_trigger.get(trigger, self.any_trigger_rules)
+    
+    def execution_waves(self, trigger: str) -> List[List]:
+        """
+        Split a trigger's rules into waves: every rule runs after the rules it
+        declares in `after` (those handling the same trigger), rules within a
+        wave are independent.
+        """
+        if trigger not in self._waves:
+            pending = list(self.rules_for(trigger))
+            names = {rule.__name__ for rule in pending}
+            done, waves = set(), []
+            while pending:
+                ready = [rule for rule in pending
+                         if all(dep in done or dep not in names for dep in rule.after)]
+                if not ready:  # dependency cycle: run what is left together
+                    ready = pending
+                waves.append(ready)
+                done.update(rule.__name__ for rule in ready)
+                pending = [rule for rule in pending if rule not in ready]
+            self._waves[trigger] = waves
+        return self._waves[trigger]
+    
+    async def _run_rule(self, rule, trigger: str, lead_data: Dict[str, Any],
+                        semaphore: asyncio.Semaphore) -> Dict[str, Any]:
+        """Run one rule under the concurrency limit and timeout, timing it"""
+        async with semaphore:
+            started = time.perf_counter()
+            outcome = {"rule": rule.__name__, "status": "skipped", "result": None}
             try:
-                result = await rule(trigger, lead_data)
+                result = await asyncio.wait_for(rule(trigger, lead_data), MFG_AUTOMATION_RULE_TIMEOUT_SECONDS)
                 if result:
-                    results.append(result)
+                    outcome.update(status="completed", result=result)
+            except asyncio.TimeoutError:
+                outcome.update(status="timeout", error=f"Timed out after {MFG_AUTOMATION_RULE_TIMEOUT_SECONDS}s")
+                logger.warning(f"Automation rule {rule.__name__} timed out on {trigger}")
             except Exception as e:
-                print(f"Error in automation rule {rule.__name__}: {e}")
+                outcome.update(status="failed", error=str(e))
+                logger.error(f"Error in automation rule {rule.__name__}: {e}")
+            outcome["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return outcome
+    
+    async def execute_automation(self, trigger: str, lead_data: Dict[str, Any],
+                                 run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Execute the automation rules of a trigger and log the run"""
+        run_id = run_id or f"AUTO-{uuid.uuid4().hex[:12].upper()}"
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        semaphore = asyncio.Semaphore(MFG_AUTOMATION_CONCURRENCY)
+        
+        outcomes = {}
+        for wave in self.execution_waves(trigger):
+            for outcome in await asyncio.gather(*(self._run_rule(rule, trigger, lead_data, semaphore) for rule in wave)):
+                outcomes[outcome["rule"]] = outcome
+        
+        # Results in registration order; logs a rule emits are written with the run
+        results, rule_logs = [], []
+        for rule in self.rules_for(trigger):
+            result = outcomes[rule.__name__]["result"]
+            if result:
+                rule_logs.extend(result.pop("logs", []))
+                results.append(result)
+        
+        now = datetime.utcnow()
+        run_log = {
+            "run_id": run_id,
+            "lead_id": lead_data.get('lead_id'),
+            "automation_type": "automation_run",
+            "trigger": trigger,
+            "details": {
+                "rules": [{key: value for key, value in outcome.items() if key != "result"}
+                          for outcome in outcomes.values()],
+                "rules_executed": len(results),
+                "started_at": started_at,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+            },
+            "timestamp": now
+        }
+        logs = [{"run_id": run_id, "lead_id": lead_data.get('lead_id'), "trigger": trigger, **log, "timestamp": now}
+                for log in rule_logs]
+        try:
+            await db['mfg_automation_logs'].insert_many(logs + [run_log], ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to log automation run {run_id}: {e}")
         
         return results
     
+    def enqueue_automation(self, trigger: str, lead_data: Dict[str, Any]) -> str:
+        """Run a trigger's automation in the background; the run is logged under the returned run_id"""
+        run_id = f"AUTO-{uuid.uuid4().hex[:12].upper()}"
+        task = asyncio.create_task(self.execute_automation(trigger, lead_data, run_id=run_id))
+        self._background[run_id] = task
+        task.add_done_callback(lambda _: self._background.pop(run_id, None))
+        return run_id
+    
     # ========================================================================
     # AUTOMATION RULES (20+)
     # ========================================================================
     
+    @automation_rule("lead_created")
     async def auto_assign_sales_rep(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 1: Auto-assign sales rep based on region/product"""
-        if trigger != "lead_created":
-            return None
-        
         # Logic: Assign based on customer region
         customer_region = lead_data.get('customer_industry', '')
         
@@ -93,11 +211,9 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_assign_sales_rep", "action": f"Assigned to {assigned_to}"}
     
+    @automation_rule("lead_created")
     async def auto_send_rfq_acknowledgment(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 2: Send RFQ acknowledgment email to customer"""
-        if trigger != "lead_created":
-            return None
-        
         # Mock email sending (integrate with actual email service)
         email_content = {
             "to": lead_data.get('contact_email'),
@@ -105,21 +221,16 @@ class ManufacturingAutomationEngine:
             "body": f"Thank you for your RFQ. We will respond within 48 hours."
         }
         
-        # Log email event
-        await db['mfg_automation_logs'].insert_one({
-            "lead_id": lead_data['lead_id'],
-            "automation_type": "email_sent",
-            "details": email_content,
-            "timestamp": datetime.utcnow()
-        })
-        
-        return {"rule": "auto_send_rfq_acknowledgment", "action": "Acknowledgment email sent"}
+        # Email event is logged with the automation run
+        return {
+            "rule": "auto_send_rfq_acknowledgment",
+            "action": "Acknowledgment email sent",
+            "logs": [{"automation_type": "email_sent", "details": email_content}]
+        }
     
+    @automation_rule("lead_created")
     async def auto_detect_duplicate_leads(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 3: Detect duplicate leads"""
-        if trigger != "lead_created":
-            return None
-        
         # Search for potential duplicates
         duplicates = await db['mfg_leads'].find({
             'customer_id': lead_data.get('customer_id'),
@@ -139,11 +250,9 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("lead_created")
     async def auto_enrich_customer_profile(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 4: Enrich customer profile from GST/ERP"""
-        if trigger != "lead_created":
-            return None
-        
         # Mock enrichment (integrate with actual GST API / ERP)
         customer_id = lead_data.get('customer_id')
         
@@ -161,11 +270,9 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_enrich_customer_profile", "action": "Customer profile enriched"}
     
+    @automation_rule("lead_created")
     async def auto_suggest_bom_sku(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 5: Suggest BOM/SKU based on product description"""
-        if trigger != "lead_created":
-            return None
-        
         # Simple keyword matching (can be enhanced with ML)
         product_desc = lead_data.get('product_description', '').lower()
         
@@ -185,9 +292,10 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("stage_changed")
     async def auto_create_engineering_task(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 6: Auto-create Engineering feasibility task"""
-        if trigger != "stage_changed" or lead_data.get('current_stage') != 'Feasibility':
+        if lead_data.get('current_stage') != 'Feasibility':
             return None
         
         task = {
@@ -204,9 +312,10 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_create_engineering_task", "action": "Engineering task created"}
     
+    @automation_rule("stage_changed")
     async def auto_create_production_task(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 7: Auto-create Production feasibility task"""
-        if trigger != "stage_changed" or lead_data.get('current_stage') != 'Feasibility':
+        if lead_data.get('current_stage') != 'Feasibility':
             return None
         
         task = {
@@ -223,9 +332,10 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_create_production_task", "action": "Production task created"}
     
+    @automation_rule("stage_changed")
     async def auto_create_qc_task(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 8: Auto-create QC feasibility task"""
-        if trigger != "stage_changed" or lead_data.get('current_stage') != 'Feasibility':
+        if lead_data.get('current_stage') != 'Feasibility':
             return None
         
         task = {
@@ -242,11 +352,9 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_create_qc_task", "action": "QC task created"}
     
+    @automation_rule("bom_attached")
     async def auto_run_costing_engine(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 9: Auto-run costing engine when BOM is available"""
-        if trigger != "bom_attached":
-            return None
-        
         # Simple costing calculation (can be enhanced with actual BOM data)
         bom_id = lead_data.get('bom_id')
         quantity = lead_data.get('quantity', 1)
@@ -271,11 +379,9 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_run_costing_engine", "action": "Costing calculated"}
     
+    @automation_rule("costing_completed")
     async def auto_identify_margin_exceptions(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 10: Identify margin exceptions"""
-        if trigger != "costing_completed":
-            return None
-        
         costing = lead_data.get('costing', {})
         margin_pct = costing.get('margin_percentage', 0)
         
@@ -290,9 +396,10 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("stage_changed")
     async def auto_trigger_approvals(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 11: Auto-trigger approval workflow"""
-        if trigger != "stage_changed" or lead_data.get('current_stage') != 'Approval':
+        if lead_data.get('current_stage') != 'Approval':
             return None
         
         # Determine required approvals based on lead value and risk
@@ -321,14 +428,12 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_trigger_approvals", "action": f"Triggered {len(approvals_required)} approvals"}
     
+    @automation_rule("sample_approved")
     async def auto_create_sample_work_order(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 12: Auto-create sample work order"""
         if not lead_data.get('sample_required'):
             return None
         
-        if trigger != "sample_approved":
-            return None
-        
         work_order = {
             "wo_number": f"WO-SAMPLE-{lead_data['lead_id']}",
             "lead_id": lead_data['lead_id'],
@@ -343,11 +448,9 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_create_sample_work_order", "action": f"Sample WO {work_order['wo_number']} created"}
     
+    @automation_rule("task_check")
     async def auto_escalate_overdue_tasks(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 13: Auto-escalate overdue tasks"""
-        if trigger != "task_check":
-            return None
-        
         # Find overdue tasks
         overdue_tasks = await db['mfg_tasks'].find({
             'lead_id': lead_data['lead_id'],
@@ -357,21 +460,18 @@ class ManufacturingAutomationEngine:
         
         if overdue_tasks:
             # Escalate to manager
-            for task in overdue_tasks:
-                await db['mfg_tasks'].update_one(
-                    {'id': task['id']},
-                    {'$set': {'escalated': True, 'escalated_at': datetime.utcnow()}}
-                )
+            await db['mfg_tasks'].update_many(
+                {'id': {'$in': [task['id'] for task in overdue_tasks]}},
+                {'$set': {'escalated': True, 'escalated_at': datetime.utcnow()}}
+            )
             
             return {"rule": "auto_escalate_overdue_tasks", "action": f"Escalated {len(overdue_tasks)} tasks"}
         
         return None
     
+    @automation_rule("info_check")
     async def auto_send_missing_info_reminder(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 14: Send reminder for missing info"""
-        if trigger != "info_check":
-            return None
-        
         # Check for missing critical fields
         missing_fields = []
         
@@ -381,23 +481,18 @@ class ManufacturingAutomationEngine:
             missing_fields.append('bom_id')
         
         if missing_fields and (datetime.utcnow() - datetime.fromisoformat(lead_data['created_at'])).days > 2:
-            # Send reminder email
-            await db['mfg_automation_logs'].insert_one({
-                "lead_id": lead_data['lead_id'],
-                "automation_type": "reminder_sent",
-                "details": {"missing_fields": missing_fields},
-                "timestamp": datetime.utcnow()
-            })
-            
-            return {"rule": "auto_send_missing_info_reminder", "action": f"Reminder sent for {len(missing_fields)} fields"}
+            # Send reminder email (logged with the automation run)
+            return {
+                "rule": "auto_send_missing_info_reminder",
+                "action": f"Reminder sent for {len(missing_fields)} fields",
+                "logs": [{"automation_type": "reminder_sent", "details": {"missing_fields": missing_fields}}]
+            }
         
         return None
     
+    @automation_rule("lead_converted")
     async def auto_lock_converted_lead(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 15: Auto-lock lead when converted"""
-        if trigger != "lead_converted":
-            return None
-        
         await db['mfg_leads'].update_one(
             {'lead_id': lead_data['lead_id']},
             {'$set': {'locked': True, 'locked_at': datetime.utcnow(), 'locked_by': 'System'}}
@@ -405,11 +500,9 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_lock_converted_lead", "action": "Lead locked"}
     
+    @automation_rule("lead_converted")
     async def auto_create_evaluate_record(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 16: Auto-create Evaluate record"""
-        if trigger != "lead_converted":
-            return None
-        
         evaluate_record = {
             "evaluate_id": f"EVAL-{lead_data['lead_id'].split('-')[-1]}",
             "lead_id": lead_data['lead_id'],
@@ -423,6 +516,7 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_create_evaluate_record", "action": f"Evaluate {evaluate_record['evaluate_id']} created"}
     
+    @automation_rule()
     async def auto_generate_analytics_events(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 17: Generate analytics events"""
         analytics_event = {
@@ -438,11 +532,9 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_generate_analytics_events", "action": "Analytics event generated"}
     
+    @automation_rule("production_feasibility_check")
     async def auto_check_capacity_availability(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 18: Check capacity availability"""
-        if trigger != "production_feasibility_check":
-            return None
-        
         # Mock capacity check
         required_capacity = lead_data.get('quantity', 0) * 0.5  # hours
         
@@ -460,11 +552,9 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("production_feasibility_check")
     async def auto_check_rm_availability(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 19: Check raw material availability"""
-        if trigger != "production_feasibility_check":
-            return None
-        
         # Mock RM availability check
         rm_available = True  # Mock
         
@@ -478,11 +568,9 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("lead_created")
     async def auto_validate_delivery_date(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 20: Validate delivery date feasibility"""
-        if trigger != "lead_created":
-            return None
-        
         delivery_date = datetime.fromisoformat(lead_data['delivery_date_required'])
         min_lead_time = 60  # days
         
@@ -496,11 +584,9 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("bom_attached")
     async def auto_assign_tooling(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 21: Auto-assign tooling"""
-        if trigger != "bom_attached":
-            return None
-        
         # Check if tooling required
         if lead_data.get('tooling_required'):
             # Find available tooling
@@ -514,11 +600,9 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("lead_created")
     async def auto_check_certifications(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 22: Check required certifications"""
-        if trigger != "lead_created":
-            return None
-        
         required_certs = lead_data.get('technical_specs', {}).get('certifications_required', [])
         
         if required_certs:
@@ -536,11 +620,9 @@ class ManufacturingAutomationEngine:
         
         return None
     
+    @automation_rule("lead_created", after=("auto_validate_delivery_date",))
     async def auto_calculate_risk_score(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 23: Calculate overall risk score"""
-        if trigger != "lead_created":
-            return None
-        
         risk_score = 0
         
         # Calculate risk based on various factors
@@ -568,21 +650,18 @@ class ManufacturingAutomationEngine:
         
         return {"rule": "auto_calculate_risk_score", "action": f"Risk score: {risk_score} ({risk_level})"}
     
+    @automation_rule("lead_created", "stage_changed", "approval_completed")
     async def auto_notify_stakeholders(self, trigger: str, lead_data: Dict[str, Any]):
         """Rule 24: Notify relevant stakeholders"""
-        # Notify on key events
-        if trigger in ["lead_created", "stage_changed", "approval_completed"]:
-            # Mock notification
-            await db['mfg_notifications'].insert_one({
-                "lead_id": lead_data['lead_id'],
-                "notification_type": trigger,
-                "recipients": ["sales-manager", "assigned-rep"],
-                "timestamp": datetime.utcnow()
-            })
-            
-            return {"rule": "auto_notify_stakeholders", "action": "Stakeholders notified"}
+        # Mock notification on key events
+        await db['mfg_notifications'].insert_one({
+            "lead_id": lead_data['lead_id'],
+            "notification_type": trigger,
+            "recipients": ["sales-manager", "assigned-rep"],
+            "timestamp": datetime.utcnow()
+        })
         
-        return None
+        return {"rule": "auto_notify_stakeholders", "action": "Stakeholders notified"}
 
 
 # Global automation engine instance
@@ -10,13 +10,15 @@ from passlib.context import CryptContext
 import uuid
 import json
 import asyncio
-import jwt
 import os
 
 router = APIRouter(prefix="/super-admin", tags=["Super Admin"])
 
 # Import shared dependencies
-from main import db, pwd_context
+from main import db
+from password_hasher import hash_password_async
+from permission_cache import invalidate_org
+from auth_utils import verify_token, get_user_profile, invalidate_user_profile
 
 # JWT configuration (same as enterprise auth)
 JWT_SECRET = os.environ["JWT_SECRET_KEY"]  # must be set in backend/.env
@@ -25,35 +27,23 @@ security = HTTPBearer()
 
 async def get_current_user_enterprise(credentials: HTTPAuthorizationCredentials = Depends(security)):
     """Get current user from enterprise auth token"""
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("sub")  # Enterprise auth uses user_id
-        if user_id is None:
-            # Fallback to sub for standard auth
-            user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        # Check enterprise_users first
-        user = await db.enterprise_users.find_one({"user_id": user_id}, {"_id": 0})
-        if not user:
-            # Fallback to users collection
-            user = await db.users.find_one({"user_id": user_id}, {"_id": 0})
-        if not user:
-            user = await db.users.find_one({"id": user_id}, {"_id": 0})
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found")
-        
-        # Add is_super_admin from token if available
-        if payload.get("is_super_admin"):
-            user["is_super_admin"] = True
-            
-        return user
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    # Cached signature check (auth_utils.verify_token)
+    payload = verify_token(credentials.credentials, verify_type="access")
+    user_id = payload["user_id"]
+
+    # Check enterprise_users first, then fall back to users
+    user = await get_user_profile(db, user_id, collection="enterprise_users")
+    if not user:
+        user = await get_user_profile(db, user_id)
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    user.pop("_id", None)
+
+    # Add is_super_admin from token if available
+    if payload.get("is_super_admin"):
+        user["is_super_admin"] = True
+
+    return user
 
 # ==================== MODELS ====================
 
@@ -244,6 +234,7 @@ async def update_organization(org_id: str, org_data: OrganizationUpdate, current
     update_data["updated_by"] = current_user.get("user_id")
     
     await db.organizations.update_one({"org_id": org_id}, {"$set": update_data})
+    invalidate_org(org_id)
     
     updated = await db.organizations.find_one({"org_id": org_id})
     
@@ -271,6 +262,7 @@ async def deactivate_organization(org_id: str, current_user: dict = Depends(veri
             "deactivated_by": current_user.get("user_id")
         }}
     )
+    invalidate_org(org_id)
     
     # Deactivate all users in this org
     await db.users.update_many(
@@ -325,7 +317,7 @@ async def create_user(user_data: UserCreate, current_user: dict = Depends(verify
     new_user = {
         "user_id": user_id,
         "email": user_data.email,
-        "password_hash": pwd_context.hash(user_data.password),
+        "password_hash": await hash_password_async(user_data.password),
         "first_name": user_data.first_name,
         "last_name": user_data.last_name,
         "role": user_data.role,
@@ -366,6 +358,7 @@ async def update_user(user_id: str, user_data: UserUpdate, current_user: dict =
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
     
     await db.users.update_one({"user_id": user_id}, {"$set": update_data})
+    invalidate_user_profile(user_id)
     
     updated = await db.users.find_one({"user_id": user_id}, {"password_hash": 0})
     
@@ -392,6 +385,7 @@ async def deactivate_user(user_id: str, current_user: dict = Depends(verify_supe
         {"user_id": user_id},
         {"$set": {"is_active": False, "deactivated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    invalidate_user_profile(user_id)
     
     return {"success": True, "message": "User deactivated"}
 
@@ -405,7 +399,7 @@ async def reset_user_password(user_id: str, new_password: str, current_user: dic
     await db.users.update_one(
         {"user_id": user_id},
         {"$set": {
-            "password_hash": pwd_context.hash(new_password),
+            "password_hash": await hash_password_async(new_password),
             "password_reset_at": datetime.now(timezone.utc).isoformat(),
             "password_reset_by": current_user.get("user_id")
         }}
@@ -503,7 +497,7 @@ async def seed_super_admin():
     
     # Create super admin user in both collections
     user_id = f"USR-{uuid.uuid4().hex[:8].upper()}"
-    password_hash = pwd_context.hash("Admin@123")
+    password_hash = await hash_password_async("Admin@123")
     now = datetime.now(timezone.utc).isoformat()
     
     # For enterprise_users collection (used by enterprise auth)
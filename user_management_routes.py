@@ -8,7 +8,6 @@ from typing import List, Optional
 from pydantic import BaseModel, EmailStr
 from datetime import datetime, timezone
 import uuid
-import bcrypt
 import os
 import shutil
 
@@ -16,6 +15,8 @@ router = APIRouter(prefix="/api/users", tags=["User Management"])
 
 # Import dependencies from main
 from main import get_current_user, get_database
+from auth_utils import invalidate_user_profile
+from password_hasher import hash_password_async
 
 # Create uploads directory if it doesn't exist
 UPLOAD_DIR = "/app/backend/uploads/profile_photos"
@@ -94,8 +95,7 @@ async def create_user(
         raise HTTPException(status_code=400, detail="User with this email already exists")
     
     # Hash password
-    salt = bcrypt.gensalt()
-    hashed_password = bcrypt.hashpw(user_data.password.encode('utf-8'), salt)
+    hashed_password = await hash_password_async(user_data.password)
     
     # Get current user's tenant to assign to new user
     current_user_data = await db.users.find_one({"_id": current_user.id})
@@ -109,7 +109,7 @@ async def create_user(
         "_id": user_id,
         "email": user_data.email,
         "full_name": user_data.full_name,
-        "password_hash": hashed_password.decode('utf-8'),
+        "password_hash": hashed_password,
         "role": user_data.role,
         "status": user_data.status,
         "email_verified": True,
@@ -173,6 +173,7 @@ async def update_user(
     
     if update_data:
         await db.users.update_one({"_id": user_id}, {"$set": update_data})
+        invalidate_user_profile(user_id)
     
     # Get updated user
     updated_user = await db.users.find_one({"_id": user_id})
@@ -210,6 +211,7 @@ async def delete_user(
     
     # Delete user
     await db.users.delete_one({"_id": user_id})
+    invalidate_user_profile(user_id)
     
     return {"success": True, "message": "User deleted successfully"}
 
@@ -240,6 +242,7 @@ async def upload_profile_photo(
         {"_id": current_user.id},
         {"$set": {"profile_photo": photo_url}}
     )
+    invalidate_user_profile(current_user.id)
     
     return {"photo_url": photo_url, "message": "Profile photo uploaded successfully"}
 
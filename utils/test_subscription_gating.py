@@ -9,7 +9,7 @@ from dotenv import load_dotenv
 import logging
 from datetime import datetime, timezone, timedelta
 import secrets
-from enterprise_auth_service import hash_password
+from password_hasher import hash_password_async
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -59,7 +59,7 @@ async def main():
         "user_id": trial_user_id,
         "org_id": trial_org_id,
         "email": f"trial{secrets.token_urlsafe(4)}@test.com",
-        "password_hash": hash_password("Trial1234"),
+        "password_hash": await hash_password_async("Trial1234"),
         "full_name": "Trial User",
         "role_id": org_admin_role["role_id"] if org_admin_role else None,
         "is_super_admin": False,
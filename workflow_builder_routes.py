@@ -3,35 +3,26 @@ Workflow Builder Module
 Visual automation for cross-module processes
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Header, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
 import uuid
-import jwt
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
+from auth_utils import get_current_principal
+from workflow_runtime import workflow_runtime
 
 router = APIRouter(prefix="/api/workflows", tags=["Workflow Builder"])
 
 # MongoDB connection
-mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-db_name = os.environ.get('DB_NAME', 'innovate_books_db')
-client = AsyncIOMotorClient(mongo_url)
-db = client[db_name]
+db = get_db()
 
 JWT_SECRET = os.environ["JWT_SECRET_KEY"]  # must be set in backend/.env
 
 
-async def get_current_user(authorization: str = Header(None)):
-    if not authorization:
-        raise HTTPException(status_code=401, detail="Not authenticated")
-    try:
-        token = authorization.replace("Bearer ", "")
-        payload = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
-        return {"user_id": payload.get("user_id"), "org_id": payload.get("org_id")}
-    except:
-        raise HTTPException(status_code=401, detail="Invalid token")
+# Shared cached auth dependency (auth_utils.get_current_principal)
+get_current_user = get_current_principal
 
 
 def serialize_doc(doc):
@@ -200,222 +191,19 @@ async def toggle_workflow(workflow_id: str, current_user: dict = Depends(get_cur
 # ============== WORKFLOW EXECUTION ==============
 
 @router.post("/{workflow_id}/run")
-async def run_workflow_manual(workflow_id: str, data: dict, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
-    """Manually trigger a workflow run"""
+async def run_workflow_manual(workflow_id: str, data: dict, current_user: dict = Depends(get_current_user)):
+    """Manually trigger a workflow run (queued for the workflow runtime)"""
     org_id = current_user.get("org_id")
     
     workflow = await workflows_col.find_one({"workflow_id": workflow_id, "org_id": org_id})
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
-    # Create run record
-    run = {
-        "run_id": f"RUN-{uuid.uuid4().hex[:8].upper()}",
-        "workflow_id": workflow_id,
-        "org_id": org_id,
-        "trigger_type": "manual",
-        "trigger_data": data.get("trigger_data", {}),
-        "status": "running",
-        "started_at": datetime.now(timezone.utc).isoformat(),
-        "started_by": current_user.get("user_id"),
-        "steps_completed": 0,
-        "steps_total": len(workflow.get("steps", []))
-    }
+    runs = await workflow_runtime.create_runs(
+        db, [workflow], org_id, "manual", data.get("trigger_data", {}), started_by=current_user.get("user_id")
+    )
     
-    await workflow_runs_col.insert_one(run)
-    
-    # Execute workflow in background
-    background_tasks.add_task(execute_workflow, workflow, run.get("run_id"), data.get("trigger_data", {}))
-    
-    return {"success": True, "run_id": run.get("run_id"), "message": "Workflow execution started"}
-
-
-async def execute_workflow(workflow: dict, run_id: str, trigger_data: dict):
-    """Execute workflow steps"""
-    import asyncio
-    
-    steps = workflow.get("steps", [])
-    context = {"trigger_data": trigger_data, "results": {}}
-    
-    try:
-        for i, step in enumerate(steps):
-            step_log = {
-                "log_id": f"LOG-{uuid.uuid4().hex[:8].upper()}",
-                "run_id": run_id,
-                "step_id": step.get("step_id"),
-                "step_name": step.get("name"),
-                "step_type": step.get("step_type"),
-                "started_at": datetime.now(timezone.utc).isoformat(),
-                "status": "running"
-            }
-            
-            await workflow_steps_col.insert_one(step_log)
-            
-            try:
-                # Execute step based on type
-                result = await execute_step(step, context)
-                context["results"][step.get("step_id")] = result
-                
-                await workflow_steps_col.update_one(
-                    {"log_id": step_log.get("log_id")},
-                    {"$set": {
-                        "status": "completed",
-                        "completed_at": datetime.now(timezone.utc).isoformat(),
-                        "result": result
-                    }}
-                )
-                
-                await workflow_runs_col.update_one(
-                    {"run_id": run_id},
-                    {"$inc": {"steps_completed": 1}}
-                )
-                
-            except Exception as e:
-                await workflow_steps_col.update_one(
-                    {"log_id": step_log.get("log_id")},
-                    {"$set": {
-                        "status": "failed",
-                        "completed_at": datetime.now(timezone.utc).isoformat(),
-                        "error": str(e)
-                    }}
-                )
-                raise
-            
-            # Small delay between steps
-            await asyncio.sleep(0.1)
-        
-        # Mark run as completed
-        await workflow_runs_col.update_one(
-            {"run_id": run_id},
-            {"$set": {
-                "status": "completed",
-                "completed_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        # Update workflow stats
-        await workflows_col.update_one(
-            {"workflow_id": workflow.get("workflow_id")},
-            {"$inc": {"run_count": 1}, "$set": {"last_run_at": datetime.now(timezone.utc).isoformat()}}
-        )
-        
-    except Exception as e:
-        await workflow_runs_col.update_one(
-            {"run_id": run_id},
-            {"$set": {
-                "status": "failed",
-                "completed_at": datetime.now(timezone.utc).isoformat(),
-                "error": str(e)
-            }}
-        )
-
-
-async def execute_step(step: dict, context: dict) -> dict:
-    """Execute a single workflow step"""
-    step_type = step.get("step_type")
-    config = step.get("config", {})
-    
-    if step_type == "condition":
-        # Evaluate condition
-        return await execute_condition(config, context)
-    
-    elif step_type == "action":
-        return await execute_action(config, context)
-    
-    elif step_type == "delay":
-        # Wait for specified time
-        import asyncio
-        delay_seconds = config.get("delay_seconds", 0)
-        await asyncio.sleep(min(delay_seconds, 60))  # Max 60s delay in demo
-        return {"delayed": delay_seconds}
-    
-    elif step_type == "branch":
-        # Branch logic
-        return {"branch": "default"}
-    
-    return {"executed": True}
-
-
-async def execute_condition(config: dict, context: dict) -> dict:
-    """Evaluate a condition"""
-    field = config.get("field", "")
-    operator = config.get("operator", "equals")
-    value = config.get("value")
-    
-    # Get field value from context
-    field_value = context.get("trigger_data", {}).get(field)
-    
-    result = False
-    if operator == "equals":
-        result = field_value == value
-    elif operator == "not_equals":
-        result = field_value != value
-    elif operator == "greater_than":
-        result = float(field_value or 0) > float(value or 0)
-    elif operator == "less_than":
-        result = float(field_value or 0) < float(value or 0)
-    elif operator == "contains":
-        result = str(value) in str(field_value or "")
-    elif operator == "is_empty":
-        result = not field_value
-    elif operator == "is_not_empty":
-        result = bool(field_value)
-    
-    return {"condition_met": result, "field": field, "operator": operator, "value": value, "actual": field_value}
-
-
-async def execute_action(config: dict, context: dict) -> dict:
-    """Execute an action step"""
-    action_type = config.get("type")
-    
-    if action_type == "create_task":
-        # Create a task in the system
-        task_data = {
-            "task_id": f"TSK-{uuid.uuid4().hex[:8].upper()}",
-            "title": config.get("title", "Auto-generated task"),
-            "description": config.get("description", ""),
-            "assignee": config.get("assignee"),
-            "due_date": config.get("due_date"),
-            "priority": config.get("priority", "medium"),
-            "source": "workflow",
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.tasks.insert_one(task_data)
-        return {"action": "create_task", "task_id": task_data.get("task_id")}
-    
-    elif action_type == "send_notification":
-        # Create notification
-        notification = {
-            "notification_id": f"NTF-{uuid.uuid4().hex[:8].upper()}",
-            "type": config.get("notification_type", "info"),
-            "title": config.get("title", "Workflow Notification"),
-            "message": config.get("message", ""),
-            "recipient": config.get("recipient"),
-            "read": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.notifications.insert_one(notification)
-        return {"action": "send_notification", "notification_id": notification.get("notification_id")}
-    
-    elif action_type == "update_record":
-        # Update a record in specified collection
-        collection_name = config.get("collection")
-        record_id_field = config.get("id_field", "id")
-        record_id = config.get("record_id") or context.get("trigger_data", {}).get(record_id_field)
-        updates = config.get("updates", {})
-        
-        if collection_name and record_id and updates:
-            await db[collection_name].update_one(
-                {record_id_field: record_id},
-                {"$set": updates}
-            )
-            return {"action": "update_record", "collection": collection_name, "record_id": record_id}
-    
-    elif action_type == "send_email":
-        # Queue email (simulated)
-        return {"action": "send_email", "to": config.get("to"), "subject": config.get("subject"), "queued": True}
-    
-    return {"action": action_type, "executed": True}
+    return {"success": True, "run_id": runs[0].get("run_id"), "message": "Workflow execution started"}
 
 
 # ============== WORKFLOW RUNS ==============
@@ -657,7 +445,7 @@ async def use_workflow_template(template_id: str, current_user: dict = Depends(g
 # ============== EVENT TRIGGERS ==============
 
 @router.post("/trigger-event")
-async def trigger_event(data: dict, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+async def trigger_event(data: dict, current_user: dict = Depends(get_current_user)):
     """Trigger workflows based on an event"""
     org_id = current_user.get("org_id")
     event_type = data.get("event_type")
@@ -674,23 +462,7 @@ async def trigger_event(data: dict, background_tasks: BackgroundTasks, current_u
         "trigger.event_type": event_type
     }).to_list(100)
     
-    triggered = []
-    for workflow in workflows:
-        # Create run
-        run = {
-            "run_id": f"RUN-{uuid.uuid4().hex[:8].upper()}",
-            "workflow_id": workflow.get("workflow_id"),
-            "org_id": org_id,
-            "trigger_type": "event",
-            "trigger_data": event_data,
-            "status": "running",
-            "started_at": datetime.now(timezone.utc).isoformat(),
-            "steps_completed": 0,
-            "steps_total": len(workflow.get("steps", []))
-        }
-        
-        await workflow_runs_col.insert_one(run)
-        background_tasks.add_task(execute_workflow, workflow, run.get("run_id"), event_data)
-        triggered.append({"workflow_id": workflow.get("workflow_id"), "run_id": run.get("run_id")})
+    runs = await workflow_runtime.create_runs(db, workflows, org_id, "event", event_data)
+    triggered = [{"workflow_id": run.get("workflow_id"), "run_id": run.get("run_id")} for run in runs]
     
     return {"success": True, "triggered_workflows": len(triggered), "runs": triggered}
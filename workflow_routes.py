@@ -13,6 +13,9 @@ import uuid
 import jwt
 import os
 
+from sequence_service import next_timestamped_id
+from report_compiler import touch_report_data
+
 JWT_SECRET = os.environ["JWT_SECRET_KEY"]  # must be set in backend/.env
 
 logger = logging.getLogger(__name__)
@@ -54,6 +57,7 @@ async def create_workspace_task(db, task_data: dict):
     }
     
     await db.workspace_tasks.insert_one(task_doc)
+    await touch_report_data(db, "workspace_tasks")
     return task_id
 
 
@@ -601,7 +605,7 @@ async def create_revenue_lead(lead: RevenueLeadCreate, db = Depends(get_db)):
                 data[k] = addr[k]
 
     # ✅ system fields
-    data["lead_id"] = f"REV-LEAD-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["lead_id"] = await next_timestamped_id("REV-LEAD", db=db)
     data["stage"] = LeadStage.NEW.value
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     data["updated_at"] = data["created_at"]
@@ -786,7 +790,7 @@ async def convert_lead_to_evaluate(lead_id: str, db = Depends(get_db)):
     
     # Create Draft Party
     party_data = {
-        "party_id": f"PARTY-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "party_id": await next_timestamped_id("PARTY", db=db),
         "display_name": lead.get("company_name"),
         "legal_name": lead.get("company_name"),
         "country": lead.get("country"),
@@ -805,7 +809,7 @@ async def convert_lead_to_evaluate(lead_id: str, db = Depends(get_db)):
     
     # Create Evaluation record
     eval_data = {
-        "evaluation_id": f"REV-EVAL-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "evaluation_id": await next_timestamped_id("REV-EVAL", db=db),
         "lead_id": lead_id,
         "party_id": party_data["party_id"],
         "deal_type": "one-time",
@@ -937,7 +941,7 @@ async def submit_evaluation_for_commit(evaluation_id: str, db = Depends(get_db))
     
     # Create Commit record
     commit_data = {
-        "commit_id": f"REV-COMMIT-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "commit_id": await next_timestamped_id("REV-COMMIT", db=db),
         "evaluation_id": evaluation_id,
         "lead_id": eval_data.get("lead_id"),
         "party_id": eval_data.get("party_id"),
@@ -1116,7 +1120,7 @@ async def create_contract_from_commit(commit_id: str, db = Depends(get_db)):
     now = datetime.now(timezone.utc).isoformat()
     
     contract_data = {
-        "contract_id": f"REV-CONTRACT-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "contract_id": await next_timestamped_id("REV-CONTRACT", db=db),
         "commit_id": commit_id,
         "evaluation_id": commit.get("evaluation_id"),
         "lead_id": commit.get("lead_id"),
@@ -1242,7 +1246,7 @@ async def create_handoff_from_contract(contract_id: str, authorization: str = He
     now = datetime.now(timezone.utc).isoformat()
     
     handoff_data = {
-        "handoff_id": f"REV-HANDOFF-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "handoff_id": await next_timestamped_id("REV-HANDOFF", db=db),
         "contract_id": contract_id,
         "party_id": contract.get("party_id"),
         "party_name": contract.get("party_name"),
@@ -1272,7 +1276,7 @@ async def create_handoff_from_contract(contract_id: str, authorization: str = He
     )
     
     # AUTO-CREATE WORK ORDER IN OPERATIONS
-    work_order_id = f"WO-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    work_order_id = await next_timestamped_id("WO", db=db)
     
     # Determine delivery type based on contract items
     delivery_type = "project"  # Default
@@ -1415,7 +1419,7 @@ async def get_procure_requests(status: Optional[str] = None, db = Depends(get_db
 async def create_procure_request(request: ProcureRequestCreate, db = Depends(get_db)):
     """Create procurement request - Stage 1"""
     data = request.dict()
-    data["request_id"] = f"PROC-REQ-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    data["request_id"] = await next_timestamped_id("PROC-REQ", db=db)
     data["status"] = ProcureRequestStatus.DRAFT.value
     data["created_at"] = datetime.now(timezone.utc).isoformat()
     data["updated_at"] = data["created_at"]
@@ -1455,7 +1459,7 @@ async def submit_procure_request(request_id: str, db = Depends(get_db)):
     
     # Create evaluation record
     eval_data = {
-        "evaluation_id": f"PROC-EVAL-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "evaluation_id": await next_timestamped_id("PROC-EVAL", db=db),
         "request_id": request_id,
         "vendor_id": None,
         "vendor_status": "draft",
@@ -1581,7 +1585,7 @@ async def submit_procure_evaluation(evaluation_id: str, db = Depends(get_db)):
     
     # Create commit record
     commit_data = {
-        "commit_id": f"PROC-COMMIT-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "commit_id": await next_timestamped_id("PROC-COMMIT", db=db),
         "evaluation_id": evaluation_id,
         "request_id": eval_data.get("request_id"),
         "vendor_id": eval_data.get("vendor_id"),
@@ -1714,7 +1718,7 @@ async def create_procure_contract(commit_id: str, db = Depends(get_db)):
     now = datetime.now(timezone.utc).isoformat()
     
     contract_data = {
-        "contract_id": f"PROC-CONTRACT-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "contract_id": await next_timestamped_id("PROC-CONTRACT", db=db),
         "commit_id": commit_id,
         "evaluation_id": commit.get("evaluation_id"),
         "request_id": commit.get("request_id"),
@@ -1792,7 +1796,7 @@ async def create_procure_handoff(contract_id: str, db = Depends(get_db)):
     now = datetime.now(timezone.utc).isoformat()
     
     handoff_data = {
-        "handoff_id": f"PROC-HANDOFF-{datetime.now().strftime('%Y%m%d%H%M%S')}",
+        "handoff_id": await next_timestamped_id("PROC-HANDOFF", db=db),
         "contract_id": contract_id,
         "vendor_id": contract.get("vendor_id"),
         "vendor_name": contract.get("vendor_name"),
@@ -1817,7 +1821,7 @@ async def create_procure_handoff(contract_id: str, db = Depends(get_db)):
     )
     
     # AUTO-CREATE WORK ORDER IN OPERATIONS
-    work_order_id = f"WO-PROC-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    work_order_id = await next_timestamped_id("WO-PROC", db=db)
     
     # Build scope snapshot from procurement contract
     scope_snapshot = {
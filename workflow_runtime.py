@@ -0,0 +1,429 @@
+"""
+Workflow Runtime
+Durable executor for workflow builder runs.
+
+- A run document (workflow_runs) carries a snapshot of the workflow's steps,
+  a step cursor and the results so far. status: queued | running | waiting |
+  completed | failed; due_at is when a worker may next pick it up.
+- Each worker polls for due runs and claims one with an update on its
+  current status + due_at (only one worker wins). At most WORKFLOW_WORKERS
+  runs execute per worker, and at most WORKFLOW_ORG_CONCURRENCY of them for
+  one org.
+- Every completed step moves the cursor in one update, which also extends
+  the lease. A run whose worker died is picked up again once its lease
+  lapses and continues from the last completed step (the step in flight at
+  the crash runs again). claims counts the claims since the last completed
+  step; a run claimed WORKFLOW_MAX_CLAIMS times without progress (a step
+  that keeps killing its worker) is failed instead of claimed again.
+- Delay steps are durable timers: the run is parked as waiting with due_at
+  at the wake-up time and released, instead of sleeping in the worker.
+- Step logs and workflow run counters are buffered and written in batches
+  every WORKFLOW_LOG_FLUSH_SECONDS. A failed write keeps them buffered for
+  the next flush; they are dropped (and logged) only after
+  LOG_FLUSH_MAX_ATTEMPTS consecutive failures.
+"""
+import os
+import uuid
+import socket
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_RUNTIME_ENABLED = os.environ.get('WORKFLOW_RUNTIME_ENABLED', 'true').lower() == 'true'
+WORKFLOW_WORKERS = int(os.environ.get('WORKFLOW_WORKERS', '32'))
+WORKFLOW_ORG_CONCURRENCY = int(os.environ.get('WORKFLOW_ORG_CONCURRENCY', '8'))
+WORKFLOW_POLL_SECONDS = float(os.environ.get('WORKFLOW_POLL_SECONDS', '1'))
+WORKFLOW_STEP_TIMEOUT_SECONDS = float(os.environ.get('WORKFLOW_STEP_TIMEOUT_SECONDS', '30'))
+WORKFLOW_LOG_FLUSH_SECONDS = float(os.environ.get('WORKFLOW_LOG_FLUSH_SECONDS', '1'))
+WORKFLOW_MAX_CLAIMS = int(os.environ.get('WORKFLOW_MAX_CLAIMS', '5'))
+
+WORKFLOW_DEFINITIONS = "workflow_definitions"
+WORKFLOW_RUNS = "workflow_runs"
+WORKFLOW_STEP_LOGS = "workflow_step_logs"
+
+RUNNABLE_STATUSES = ["queued", "waiting", "running"]
+# Lease on a claimed run beyond the step timeout before another worker may take over
+LEASE_GRACE_SECONDS = 30
+LOG_BATCH_SIZE = 1000
+LOG_FLUSH_MAX_ATTEMPTS = 30
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lease_until() -> str:
+    return (_utcnow() + timedelta(seconds=WORKFLOW_STEP_TIMEOUT_SECONDS + LEASE_GRACE_SECONDS)).isoformat()
+
+
+# ==================== STEPS ====================
+
+async def execute_step(db, step: dict, context: dict) -> dict:
+    """Execute a single (non-delay) workflow step"""
+    step_type = step.get("step_type")
+    config = step.get("config", {})
+
+    if step_type == "condition":
+        return await execute_condition(config, context)
+
+    elif step_type == "action":
+        return await execute_action(db, config, context)
+
+    elif step_type == "branch":
+        # Branch logic
+        return {"branch": "default"}
+
+    return {"executed": True}
+
+
+async def execute_condition(config: dict, context: dict) -> dict:
+    """Evaluate a condition"""
+    field = config.get("field", "")
+    operator = config.get("operator", "equals")
+    value = config.get("value")
+
+    # Get field value from context
+    field_value = context.get("trigger_data", {}).get(field)
+
+    result = False
+    if operator == "equals":
+        result = field_value == value
+    elif operator == "not_equals":
+        result = field_value != value
+    elif operator == "greater_than":
+        result = float(field_value or 0) > float(value or 0)
+    elif operator == "less_than":
+        result = float(field_value or 0) < float(value or 0)
+    elif operator == "contains":
+        result = str(value) in str(field_value or "")
+    elif operator == "is_empty":
+        result = not field_value
+    elif operator == "is_not_empty":
+        result = bool(field_value)
+
+    return {"condition_met": result, "field": field, "operator": operator, "value": value, "actual": field_value}
+
+
+async def execute_action(db, config: dict, context: dict) -> dict:
+    """Execute an action step"""
+    action_type = config.get("type")
+
+    if action_type == "create_task":
+        # Create a task in the system
+        task_data = {
+            "task_id": f"TSK-{uuid.uuid4().hex[:8].upper()}",
+            "title": config.get("title", "Auto-generated task"),
+            "description": config.get("description", ""),
+            "assignee": config.get("assignee"),
+            "due_date": config.get("due_date"),
+            "priority": config.get("priority", "medium"),
+            "source": "workflow",
+            "created_at": _utcnow().isoformat()
+        }
+        await db.tasks.insert_one(task_data)
+        return {"action": "create_task", "task_id": task_data.get("task_id")}
+
+    elif action_type == "send_notification":
+        # Create notification
+        notification = {
+            "notification_id": f"NTF-{uuid.uuid4().hex[:8].upper()}",
+            "type": config.get("notification_type", "info"),
+            "title": config.get("title", "Workflow Notification"),
+            "message": config.get("message", ""),
+            "recipient": config.get("recipient"),
+            "read": False,
+            "created_at": _utcnow().isoformat()
+        }
+        await db.notifications.insert_one(notification)
+        return {"action": "send_notification", "notification_id": notification.get("notification_id")}
+
+    elif action_type == "update_record":
+        # Update a record in specified collection
+        collection_name = config.get("collection")
+        record_id_field = config.get("id_field", "id")
+        record_id = config.get("record_id") or context.get("trigger_data", {}).get(record_id_field)
+        updates = config.get("updates", {})
+
+        if collection_name and record_id and updates:
+            await db[collection_name].update_one(
+                {record_id_field: record_id},
+                {"$set": updates}
+            )
+            return {"action": "update_record", "collection": collection_name, "record_id": record_id}
+
+    elif action_type == "send_email":
+        # Queue email (simulated)
+        return {"action": "send_email", "to": config.get("to"), "subject": config.get("subject"), "queued": True}
+
+    return {"action": action_type, "executed": True}
+
+
+# ==================== RUNTIME ====================
+
+class WorkflowRuntime:
+    """Bounded pool executing durable workflow runs, coordinated with other workers through Mongo"""
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._active: Dict[str, asyncio.Task] = {}
+        self._org_active: Dict[str, int] = defaultdict(int)
+        self._logs: List[dict] = []
+        self._run_counts: Dict[str, int] = defaultdict(int)
+        self._last_run_at: Dict[str, str] = {}
+        self._flush_failures = 0
+        self._wake = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self, db):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._dispatch(db)), asyncio.create_task(self._flusher(db))]
+            logger.info(f"Workflow runtime started as {self.owner} with {WORKFLOW_WORKERS} workers")
+
+    async def stop(self):
+        tasks = [*self._tasks, *self._active.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._active.clear()
+        self._org_active.clear()
+
+    def notify(self):
+        """Poll for due runs now instead of at the next tick"""
+        self._wake.set()
+
+    # ---------- runs ----------
+
+    async def create_runs(self, db, workflows: List[dict], org_id: str, trigger_type: str,
+                          trigger_data: dict, started_by: Optional[str] = None) -> List[dict]:
+        """Queue one run per workflow; workers pick them up"""
+        now = _utcnow().isoformat()
+        runs = []
+        for workflow in workflows:
+            steps = workflow.get("steps", [])
+            runs.append({
+                "run_id": f"RUN-{uuid.uuid4().hex[:8].upper()}",
+                "workflow_id": workflow.get("workflow_id"),
+                "workflow_version": workflow.get("version", 1),
+                "org_id": org_id,
+                "trigger_type": trigger_type,
+                "trigger_data": trigger_data,
+                "status": "queued",
+                "started_at": now,
+                "started_by": started_by,
+                "steps": steps,
+                "cursor": 0,
+                "results": {},
+                "steps_completed": 0,
+                "steps_total": len(steps),
+                "due_at": now,
+                "lease_owner": None,
+                "claims": 0
+            })
+        if runs:
+            await db[WORKFLOW_RUNS].insert_many([dict(run) for run in runs])
+            self.notify()
+        return runs
+
+    async def _dispatch(self, db):
+        while True:
+            try:
+                await self._claim_due(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Workflow runtime poll failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), WORKFLOW_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _claim_due(self, db):
+        free = WORKFLOW_WORKERS - len(self._active)
+        if free <= 0:
+            return
+        now = _utcnow().isoformat()
+        query = {"status": {"$in": RUNNABLE_STATUSES}, "due_at": {"$lte": now}}
+        full = [org for org, count in self._org_active.items() if count >= WORKFLOW_ORG_CONCURRENCY]
+        if full:
+            query["org_id"] = {"$nin": full}
+        candidates = await db[WORKFLOW_RUNS].find(query).sort("due_at", 1).limit(free * 2).to_list(length=None)
+        for run in candidates:
+            if len(self._active) >= WORKFLOW_WORKERS:
+                break
+            if run["run_id"] in self._active or self._org_active[run["org_id"]] >= WORKFLOW_ORG_CONCURRENCY:
+                continue
+            current = {"run_id": run["run_id"], "status": run["status"], "due_at": run["due_at"]}
+            if run.get("claims", 0) >= WORKFLOW_MAX_CLAIMS:
+                await self._abandon(db, run, current)
+                continue
+            claimed = await db[WORKFLOW_RUNS].update_one(
+                current,
+                {"$set": {"status": "running", "lease_owner": self.owner, "due_at": _lease_until()},
+                 "$inc": {"claims": 1}}
+            )
+            if claimed.modified_count == 0:
+                continue  # another worker took it
+            self._org_active[run["org_id"]] += 1
+            task = asyncio.create_task(self._execute(db, run))
+            self._active[run["run_id"]] = task
+            task.add_done_callback(lambda _t, run=run: self._finished(run))
+
+    async def _abandon(self, db, run: dict, current: dict):
+        """Fail a run whose steps keep losing their worker instead of claiming it again"""
+        error = f"Abandoned after {run.get('claims', 0)} claims without completing a step"
+        failed = await db[WORKFLOW_RUNS].update_one(current, {"$set": {
+            "status": "failed", "completed_at": _utcnow().isoformat(), "error": error,
+            "due_at": None, "lease_owner": None
+        }})
+        if failed.modified_count:
+            logger.error(f"Workflow run {run['run_id']} failed: {error}")
+
+    def _finished(self, run: dict):
+        self._active.pop(run["run_id"], None)
+        self._org_active[run["org_id"]] -= 1
+        if self._org_active[run["org_id"]] <= 0:
+            self._org_active.pop(run["org_id"], None)
+        self._wake.set()
+
+    async def _execute(self, db, run: dict):
+        """Advance a claimed run from its cursor until it completes, fails or parks on a delay"""
+        run_id = run["run_id"]
+        owned = {"run_id": run_id, "lease_owner": self.owner}
+        steps = run.get("steps", [])
+        cursor = run.get("cursor", 0)
+        context = {"trigger_data": run.get("trigger_data", {}), "results": run.get("results") or {}}
+        try:
+            while cursor < len(steps):
+                step = steps[cursor]
+                step_id = step.get("step_id")
+                started_at = _utcnow().isoformat()
+                update: Dict[str, Any] = {}
+
+                if step.get("step_type") == "delay":
+                    delay_seconds = float(step.get("config", {}).get("delay_seconds", 0) or 0)
+                    resume_at = (_utcnow() + timedelta(seconds=delay_seconds)).isoformat()
+                    result = {"delayed": delay_seconds, "resume_at": resume_at}
+                    if delay_seconds > 0:
+                        update = {"status": "waiting", "due_at": resume_at, "lease_owner": None}
+                else:
+                    try:
+                        result = await asyncio.wait_for(
+                            execute_step(db, step, context), WORKFLOW_STEP_TIMEOUT_SECONDS
+                        )
+                    except asyncio.TimeoutError:
+                        error = f"Step {step_id} timed out after {WORKFLOW_STEP_TIMEOUT_SECONDS:g}s"
+                        self._log(run, step, started_at, "failed", error=error)
+                        raise RuntimeError(error)
+                    except Exception as e:
+                        self._log(run, step, started_at, "failed", error=str(e))
+                        raise
+
+                context["results"][step_id] = result
+                cursor += 1
+                self._log(run, step, started_at, "completed", result=result)
+                checkpoint = await db[WORKFLOW_RUNS].update_one(owned, {
+                    "$set": {"cursor": cursor, "results": context["results"], "due_at": _lease_until(), "claims": 0, **update},
+                    "$inc": {"steps_completed": 1}
+                })
+                if checkpoint.matched_count == 0:
+                    logger.warning(f"Workflow run {run_id} lost its lease at step {step_id}")
+                    return
+                if update:
+                    return  # parked on a durable timer
+
+            finished = _utcnow().isoformat()
+            await db[WORKFLOW_RUNS].update_one(owned, {"$set": {
+                "status": "completed", "completed_at": finished, "due_at": None, "lease_owner": None
+            }})
+            self._run_counts[run["workflow_id"]] += 1
+            self._last_run_at[run["workflow_id"]] = finished
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Workflow run {run_id} failed: {e}")
+            await db[WORKFLOW_RUNS].update_one(owned, {"$set": {
+                "status": "failed", "completed_at": _utcnow().isoformat(), "error": str(e),
+                "due_at": None, "lease_owner": None
+            }})
+
+    # ---------- batched writes ----------
+
+    def _log(self, run: dict, step: dict, started_at: str, status: str,
+             result: Optional[dict] = None, error: Optional[str] = None):
+        log = {
+            "log_id": f"LOG-{uuid.uuid4().hex[:8].upper()}",
+            "run_id": run["run_id"],
+            "step_id": step.get("step_id"),
+            "step_name": step.get("name"),
+            "step_type": step.get("step_type"),
+            "started_at": started_at,
+            "completed_at": _utcnow().isoformat(),
+            "status": status
+        }
+        if result is not None:
+            log["result"] = result
+        if error is not None:
+            log["error"] = error
+        self._logs.append(log)
+
+    async def flush(self, db):
+        """Write buffered step logs and workflow run counters; a failed write keeps them for the next flush"""
+        try:
+            while self._logs:
+                try:
+                    await db[WORKFLOW_STEP_LOGS].insert_many(self._logs[:LOG_BATCH_SIZE], ordered=False)
+                except BulkWriteError as e:
+                    # insert_many sets _id on the logs, so a retry only collides with the ones already written
+                    if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                        raise
+                del self._logs[:LOG_BATCH_SIZE]
+            if self._run_counts:
+                counts, last_run_at = self._run_counts, self._last_run_at
+                self._run_counts, self._last_run_at = defaultdict(int), {}
+                try:
+                    await db[WORKFLOW_DEFINITIONS].bulk_write([
+                        UpdateOne({"workflow_id": workflow_id},
+                                  {"$inc": {"run_count": count}, "$set": {"last_run_at": last_run_at[workflow_id]}})
+                        for workflow_id, count in counts.items()
+                    ], ordered=False)
+                except BaseException:
+                    for workflow_id, count in counts.items():
+                        self._run_counts[workflow_id] += count
+                        self._last_run_at[workflow_id] = max(last_run_at[workflow_id],
+                                                             self._last_run_at.get(workflow_id, ""))
+                    raise
+        except Exception:
+            self._flush_failures += 1
+            if self._flush_failures >= LOG_FLUSH_MAX_ATTEMPTS:
+                logger.error(f"Dropping {len(self._logs)} workflow step logs and {len(self._run_counts)} "
+                             f"run counters after {self._flush_failures} failed flushes")
+                self._logs, self._run_counts, self._last_run_at = [], defaultdict(int), {}
+                self._flush_failures = 0
+            raise
+        self._flush_failures = 0
+
+    async def _flusher(self, db):
+        try:
+            while True:
+                await asyncio.sleep(WORKFLOW_LOG_FLUSH_SECONDS)
+                try:
+                    await self.flush(db)
+                except Exception as e:
+                    logger.error(f"Workflow step log flush failed: {e}")
+        finally:
+            try:
+                await asyncio.shield(self.flush(db))
+            except Exception as e:
+                logger.error(f"Workflow step log flush on shutdown failed: {e}")
+
+
+workflow_runtime = WorkflowRuntime()
@@ -4,11 +4,11 @@ Handles all HR and workforce-related endpoints with multi-tenant support
 """
 
 from fastapi import APIRouter, HTTPException, Depends
-from motor.motor_asyncio import AsyncIOMotorClient
+from db_provider import get_db
 from datetime import datetime, timedelta
 from typing import Optional, List
-import os
 from uuid import uuid4
+from sequence_service import next_id
 
 # Import enterprise middleware
 from enterprise_middleware import (
@@ -21,10 +21,7 @@ from enterprise_middleware import (
 router = APIRouter(prefix="/api/workforce", tags=["Workforce"])
 
 # MongoDB connection
-MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-DB_NAME = os.environ['DB_NAME']
-client = AsyncIOMotorClient(MONGO_URL)
-db = client[DB_NAME]
+db = get_db()
 
 # ========================
 # EMPLOYEES
@@ -60,7 +57,10 @@ async def create_employee(employee_data: dict, org_id: Optional[str] = Depends(g
     try:
         query = {"org_id": org_id} if org_id else {}
         employee_data["id"] = str(uuid4())
-        employee_data["employee_code"] = f"EMP-{str(await db.employees.count_documents(query) + 1001)}"
+        employee_data["employee_code"] = await next_id(
+            "EMP", width=1, org_id=org_id, offset=1000,
+            seed=lambda: db.employees.count_documents(query)
+        )
         employee_data["created_at"] = datetime.utcnow()
         if org_id:
             employee_data["org_id"] = org_id
@@ -5,7 +5,7 @@ INNOVATE BOOKS - WORKSPACE LAYER API ROUTES
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Query, UploadFile, File, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 import shutil
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional
@@ -14,7 +14,14 @@ import uuid
 import jwt
 import os
 from typing import List, Optional, Dict, Any
-from auth_utils import verify_token  # (kept as-is; NOT used in WS)
+from auth_utils import verify_token, get_user_profile
+from chat_fanout import ChatHub, Connection, chat_hub
+from report_compiler import touch_report_data
+from chat_history import (
+    WORKSPACE_CHANNEL_STORE, WORKSPACE_CHAT_STORE,
+    channel_members, invalidate_channel, history_page, encode_page,
+    message_search_terms, search_channel_messages
+)
 
 from workspace_models import (
     # Enums
@@ -60,41 +67,30 @@ JWT_ALGORITHM = os.environ.get("JWT_ALGORITHM", "HS256")
 # Room format required: chat:{chat_id}
 
 class WorkspaceConnectionManager:
-    def __init__(self):
-        # room_id -> List[WebSocket]
-        self.rooms: Dict[str, List[WebSocket]] = {}
+    """
+    Room sockets on this worker. Broadcasts go through chat_hub
+    (chat_fanout.py): queued per socket, and relayed to the other workers.
+    """
+    def __init__(self, hub: ChatHub = chat_hub):
+        self.hub = hub
+        # websocket -> Connection
+        self.connections: Dict[WebSocket, Connection] = {}
 
     async def connect(self, websocket: WebSocket, room_id: str):
         await websocket.accept()
-        self.rooms.setdefault(room_id, []).append(websocket)
-        print(f"DEBUG: WS ACCEPTED + joined room={room_id} total={len(self.rooms[room_id])}")
+        connection = self.hub.register(websocket)
+        self.hub.join(connection, room_id)
+        self.connections[websocket] = connection
+        print(f"DEBUG: WS ACCEPTED + joined room={room_id} total={len(self.hub.by_topic.get(room_id, ()))}")
 
     def disconnect(self, websocket: WebSocket, room_id: str):
-        if room_id in self.rooms and websocket in self.rooms[room_id]:
-            self.rooms[room_id].remove(websocket)
-            if not self.rooms[room_id]:
-                del self.rooms[room_id]
+        connection = self.connections.pop(websocket, None)
+        if connection is not None:
+            self.hub.unregister(connection)
         print(f"DEBUG: WS LEFT room={room_id}")
 
     async def broadcast(self, room_id: str, message: dict):
-        conns = self.rooms.get(room_id, [])
-        if not conns:
-            print(f"DEBUG: broadcast skipped (no connections) room={room_id}")
-            return
-
-        dead = []
-        for ws in conns:
-            try:
-                await ws.send_json(message)
-            except Exception as e:
-                print(f"DEBUG: Broadcast error room={room_id}: {e}")
-                dead.append(ws)
-
-        for ws in dead:
-            try:
-                self.disconnect(ws, room_id)
-            except Exception:
-                pass
+        await self.hub.publish(room_id, message)
 
 
 manager = WorkspaceConnectionManager()
@@ -109,34 +105,27 @@ def get_db():
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> WorkspaceUser:
     """Local get_current_user to avoid circular imports"""
     db = get_db()
-    try:
-        token = credentials.credentials
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id = payload.get("sub") or payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        # Try to find user by _id first in users collection
-        user = await db.users.find_one({"_id": user_id})
-
-        # If not found, try enterprise_users collection
-        if user is None:
-            user = await db.enterprise_users.find_one({"user_id": user_id}, {"_id": 0})
-
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-
-        return WorkspaceUser(
-            id=user.get("_id") or user.get("user_id") or user_id,
-            email=user.get("email", ""),
-            full_name=user.get("full_name", "User"),
-            org_id=payload.get("org_id", "default"),
-            roles=user.get("roles", [])
-        )
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError as e:
-        raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
+    # Cached signature check + cached profile lookups (see auth_utils)
+    payload = verify_token(credentials.credentials, verify_type="access")
+    user_id = payload["user_id"]
+
+    # Try users collection first, then enterprise_users
+    user = await get_user_profile(db, user_id)
+    if user is None:
+        user = await get_user_profile(db, user_id, collection="enterprise_users")
+        if user is not None:
+            user.pop("_id", None)
+
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    return WorkspaceUser(
+        id=user.get("_id") or user.get("user_id") or user_id,
+        email=user.get("email", ""),
+        full_name=user.get("full_name", "User"),
+        org_id=payload.get("org_id", "default"),
+        roles=user.get("roles", [])
+    )
 
 
 # ============= HELPER FUNCTIONS =============
@@ -282,6 +271,7 @@ async def create_task(
     }
 
     await db.workspace_tasks.insert_one(task_doc)
+    await touch_report_data(db, "workspace_tasks")
 
     # Notify assigned user if different
     if data.assigned_to_user and data.assigned_to_user != current_user.id:
@@ -398,6 +388,7 @@ async def update_task(
         update_data["notes"] = data.notes
 
     await db.workspace_tasks.update_one({"task_id": task_id}, {"$set": update_data})
+    await touch_report_data(db, "workspace_tasks")
 
     updated_task = await db.workspace_tasks.find_one({"task_id": task_id})
     updated_task["created_at"] = datetime.fromisoformat(updated_task["created_at"])
@@ -432,6 +423,7 @@ async def complete_task(
             "updated_at": now.isoformat()
         }}
     )
+    await touch_report_data(db, "workspace_tasks")
 
     return {"success": True, "message": "Task completed"}
 
@@ -603,6 +595,24 @@ async def decide_approval(
 
 # ============= CHANNEL ROUTES =============
 
+async def require_channel_member(db, channel_id: str, user_id: str):
+    """404 / 403 unless the user is in the channel (cached member set, chat_history.py)"""
+    members = await channel_members(db, channel_id, WORKSPACE_CHANNEL_STORE)
+    if members is None:
+        raise HTTPException(status_code=404, detail="Channel not found")
+    if user_id not in members:
+        raise HTTPException(status_code=403, detail="No access to this channel")
+
+
+async def _history_response(db, parent_id: str, limit: int, cursor: Optional[str], before: Optional[str], store) -> Response:
+    try:
+        messages, next_cursor = await history_page(db, parent_id, limit, cursor, before, store)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return Response(content=encode_page(messages), media_type="application/json", headers=headers)
+
+
 @router.post("/channels", response_model=WorkspaceChannel)
 async def create_channel(
     data: WorkspaceChannelCreate,
@@ -630,6 +640,7 @@ async def create_channel(
     }
 
     await db.workspace_channels.insert_one(channel_doc)
+    invalidate_channel(channel_id, member_users, WORKSPACE_CHANNEL_STORE)
 
     channel_doc["created_at"] = now
     return WorkspaceChannel(**channel_doc)
@@ -686,12 +697,7 @@ async def send_channel_message(
 ):
     """Send a message in a channel"""
     db = get_db()
-    channel = await db.workspace_channels.find_one({"channel_id": channel_id})
-    if not channel:
-        raise HTTPException(status_code=404, detail="Channel not found")
-
-    if current_user.id not in channel["member_users"]:
-        raise HTTPException(status_code=403, detail="No access to this channel")
+    await require_channel_member(db, channel_id, current_user.id)
 
     message_id = f"CMSG-{str(uuid.uuid4())[:8].upper()}"
     now = datetime.now(timezone.utc)
@@ -707,6 +713,7 @@ async def send_channel_message(
         "mentions": data.mentions,
         "file_url": data.file_url,
         "file_name": data.file_name,
+        "search_terms": message_search_terms(data.payload),
         "created_at": now.isoformat(),
         "edited": False
     }
@@ -721,25 +728,17 @@ async def send_channel_message(
 async def get_channel_messages(
     channel_id: str,
     limit: int = 50,
+    before: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: WorkspaceUser = Depends(get_current_user)
 ):
-    """Get messages from a channel"""
+    """
+    Get messages from a channel, oldest first.
+    Pass the X-Next-Cursor response header back as `cursor` for older messages.
+    """
     db = get_db()
-    channel = await db.workspace_channels.find_one({"channel_id": channel_id})
-    if not channel:
-        raise HTTPException(status_code=404, detail="Channel not found")
-
-    if current_user.id not in channel["member_users"]:
-        raise HTTPException(status_code=403, detail="No access to this channel")
-
-    messages = await db.workspace_channel_messages.find({"channel_id": channel_id}).sort("created_at", -1).limit(limit).to_list(limit)
-
-    result = []
-    for msg in messages:
-        msg["created_at"] = datetime.fromisoformat(msg["created_at"])
-        result.append(ChannelMessage(**msg))
-
-    return list(reversed(result))
+    await require_channel_member(db, channel_id, current_user.id)
+    return await _history_response(db, channel_id, limit, cursor, before, WORKSPACE_CHANNEL_STORE)
 
 
 # ============= CHAT ROUTES =============
@@ -795,6 +794,7 @@ async def create_chat(
     }
 
     await db.workspace_chats.insert_one(chat_doc)
+    invalidate_channel(chat_id, participants, WORKSPACE_CHAT_STORE)
 
     chat_doc["created_at"] = now
     return WorkspaceChat(**chat_doc)
@@ -876,6 +876,7 @@ async def send_chat_message(
         "payload": data.payload,       # DO NOT RENAME
         "file_url": data.file_url,
         "file_name": data.file_name,
+        "search_terms": message_search_terms(data.payload),
         "created_at": now.isoformat(),
         "edited": False
     }
@@ -924,9 +925,14 @@ async def send_chat_message(
 async def get_chat_messages(
     chat_id: str,
     limit: int = 50,
+    before: Optional[str] = None,
+    cursor: Optional[str] = None,
     current_user: WorkspaceUser = Depends(get_current_user)
 ):
-    """Get messages from a chat"""
+    """
+    Get messages from a chat, oldest first.
+    Pass the X-Next-Cursor response header back as `cursor` for older messages.
+    """
     db = get_db()
     chat = await db.workspace_chats.find_one({"chat_id": chat_id})
     if not chat:
@@ -935,14 +941,22 @@ async def get_chat_messages(
     if current_user.id not in chat["participants"]:
         raise HTTPException(status_code=403, detail="Not a participant")
 
-    messages = await db.workspace_chat_messages.find({"chat_id": chat_id}).sort("created_at", -1).limit(limit).to_list(limit)
+    return await _history_response(db, chat_id, limit, cursor, before, WORKSPACE_CHAT_STORE)
 
-    result = []
-    for msg in messages:
-        msg["created_at"] = datetime.fromisoformat(msg["created_at"])
-        result.append(ChatMessage(**msg))
 
-    return list(reversed(result))
+# ============= MESSAGE SEARCH =============
+
+@router.get("/messages/search")
+async def search_workspace_messages(
+    q: str,
+    limit: int = Query(50, ge=1, le=200),
+    current_user: WorkspaceUser = Depends(get_current_user)
+):
+    """Messages containing every word of `q` in the user's channels and chats"""
+    db = get_db()
+    channel_messages = await search_channel_messages(db, current_user.id, q, limit, WORKSPACE_CHANNEL_STORE)
+    chat_messages = await search_channel_messages(db, current_user.id, q, limit, WORKSPACE_CHAT_STORE)
+    return {"channel_messages": channel_messages, "chat_messages": chat_messages}
 
 
 # ==========================
@@ -1200,6 +1214,7 @@ async def seed_workspace_data(
                 "created_at": now.isoformat(),
                 "is_active": True
             })
+            invalidate_channel(channel_id, [current_user.id], WORKSPACE_CHANNEL_STORE)
 
     # Create sample tasks
     tasks = [
@@ -1233,6 +1248,7 @@ async def seed_workspace_data(
                 "completed_by": None,
                 "notes": None
             })
+            await touch_report_data(db, "workspace_tasks")
 
     # Create sample approvals
     approvals = [
@@ -1339,6 +1355,7 @@ async def upload_chat_attachment(
         "payload": f"Uploaded file: {file.filename}",
         "file_url": file_url,
         "file_name": file.filename,
+        "search_terms": message_search_terms(file.filename),
         "created_at": now.isoformat(),
         "edited": False
     }